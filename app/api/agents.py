@@ -1,8 +1,21 @@
-from fastapi import APIRouter, HTTPException, status
+from contextlib import nullcontext
+from datetime import datetime
+from typing import Literal, Optional
 
-from app.models.requests import AgentCreate, AgentQueries
-from app.models.response import AgentOut, AgentQueryResponseOut
-from app.services import research_service
+from fastapi import APIRouter, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+
+from app.api.conditional import is_conditional, is_not_modified, validator_headers
+from app.api.responses import FastJSONResponse
+from app.models.requests import AgentBulkCreate, AgentBulkDelete, AgentCreate, AgentQueries
+from app.data.entities.models import RetentionPolicy
+from app.models.response import AgentOut, AgentQueryResponseOut, AgentsCreatedOut, AgentsDeletedOut, \
+    ArchivedConversationsOut
+from app.services import agent_transfer, research_service
+from app.services.admission import AdmissionRejected
+from app.utils.profiling import ADMIN_TOKEN_HEADER, PROFILE_HEADER, PROFILE_ID_HEADER, RequestProfile, \
+    check_admin_token
+from app.workflows.retrieval import resolve_retrieval_options
 
 router = APIRouter(prefix="/agents", tags=["agents"])
 
@@ -20,14 +33,56 @@ async def create_agent(agent_in: AgentCreate):
             detail=str(e)
         )
 
+@router.post("/bulk", response_model=AgentsCreatedOut, status_code=status.HTTP_201_CREATED)
+async def create_agents(agents_in: AgentBulkCreate):
+    """
+    Creates many research agents with a single database insert.
+    """
+    agents = await research_service.create_agents(agents_in.agents)
+    return FastJSONResponse({"created": len(agents), "agents": agents}, status_code=status.HTTP_201_CREATED)
+
+@router.post("/bulk/delete", response_model=AgentsDeletedOut)
+async def delete_agents(agent_delete: AgentBulkDelete):
+    """
+    Deletes the research agents with the given ids or matching all the given filters,
+    with their archived conversations, query checkpoints and pending summary updates.
+    """
+    try:
+        return await research_service.delete_agents(agent_delete)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+@router.post("/import", status_code=status.HTTP_201_CREATED)
+async def import_agent(request: Request):
+    """
+    Creates a new research agent from an NDJSON export, streamed from the request body.
+    """
+    try:
+        return await agent_transfer.import_agent(request.stream())
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
 @router.get("/{agent_id}", response_model=AgentOut)
-async def get_agent(agent_id: str):
+async def get_agent(agent_id: str, request: Request):
     """
-    Returns a research agent specified by the id.
+    Returns a research agent specified by the id. Conditional requests whose
+    If-None-Match or If-Modified-Since still matches get 304 without the messages
+    being read.
     """
     try:
-        agents = await research_service.get_agent(agent_id)
-        return agents
+        if is_conditional(request.headers):
+            version = await research_service.get_agent_version(agent_id)
+            if is_not_modified(request.headers, version):
+                return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=validator_headers(version))
+        agent, version = await research_service.get_agent_payload(agent_id)
+        # Returning the response directly skips validating every message against AgentOut again
+        return FastJSONResponse(agent, headers=validator_headers(version))
     except KeyError as e:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -48,18 +103,118 @@ async def delete_agent(agent_id: str):
         )
 
 @router.post("/{agent_id}/queries", response_model=AgentQueryResponseOut, status_code=status.HTTP_201_CREATED)
-async def send_queries(agent_id: str, query: AgentQueries):
+async def send_queries(agent_id: str, query: AgentQueries, request: Request, response: Response,
+                       profiling: bool = Query(False, description="Profile this request; needs the admin token")):
     """
-    Sends new queries for the agent specified.
+    Sends new queries for the agent specified. A profiled request returns the id of
+    its profile in the X-Profile-Id header.
     """
+    profiled = profiling or request.headers.get(PROFILE_HEADER, "").lower() in ("1", "true", "yes")
     try:
-        query_result = await research_service.send_queries(agent_id, query.message)
+        request_profile = nullcontext()
+        if profiled:
+            check_admin_token(request.headers.get(ADMIN_TOKEN_HEADER))
+            request_profile = RequestProfile(f"POST /agents/{agent_id}/queries", agent_id=agent_id,
+                                             query=query.message[:200])
+            response.headers[PROFILE_ID_HEADER] = request_profile.id
+        retrieval = resolve_retrieval_options(query.profile, query.top_k, query.max_chars, query.sources)
+        async with request_profile:
+            query_result = await research_service.send_queries(agent_id, query.message, retrieval,
+                                                                query.request_id, query.priority)
         return AgentQueryResponseOut(agent_id=agent_id,
                                      response=query_result.agent_response,
                                      domain=query_result.domain,
                                      documents=query_result.documents)
+    except PermissionError as e:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=str(e)
+        )
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+@router.get("/{agent_id}/archive", response_model=ArchivedConversationsOut)
+async def get_archived_conversations(agent_id: str, offset: int = Query(0, ge=0),
+                                     limit: int = Query(50, ge=1, le=500)):
+    """
+    Returns archived conversations of the agent specified, oldest first.
+    """
+    try:
+        archived = await research_service.get_archived_conversations(agent_id, offset, limit)
+        return FastJSONResponse(archived)
+    except KeyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=e.args[0] if e.args else str(e)
+        )
+
+@router.put("/{agent_id}/retention", response_model=RetentionPolicy)
+async def set_retention(agent_id: str, retention: RetentionPolicy):
+    """
+    Sets the retention policy of the agent specified and returns the policy in effect for it.
+    """
+    try:
+        return await research_service.set_retention(agent_id, retention)
+    except KeyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=e.args[0] if e.args else str(e)
+        )
+
+@router.post("/{agent_id}/compact")
+async def compact_conversations(agent_id: str):
+    """
+    Archives the conversations of the agent specified that are beyond its retention policy.
+    """
+    try:
+        archived = await research_service.compact_conversations(agent_id)
+        return {"agent_id": agent_id, "archived": archived}
+    except KeyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=e.args[0] if e.args else str(e)
+        )
+
+@router.get("/{agent_id}/usage")
+async def get_usage(agent_id: str, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                    bucket: Literal["hour", "day", "month"] = "day"):
+    """
+    Returns the tokens, cost, fallbacks and timings of the agent specified over a time
+    window, in total, per node and model, per fetcher and per time bucket.
+    """
+    try:
+        return await research_service.get_agent_usage(agent_id, since, until, bucket)
+    except KeyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=e.args[0] if e.args else str(e)
+        )
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e)
-        )
\ No newline at end of file
+        )
+
+@router.get("/{agent_id}/export")
+async def export_agent(agent_id: str):
+    """
+    Streams the agent specified with its whole conversation history as NDJSON.
+    """
+    try:
+        lines = await agent_transfer.export_agent(agent_id)
+    except KeyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=e.args[0] if e.args else str(e)
+        )
+    return StreamingResponse(lines, media_type="application/x-ndjson",
+                             headers={"Content-Disposition": f'attachment; filename="{agent_id}.ndjson"'})
@@ -0,0 +1,61 @@
+"""
+HTTP validators of agent reads, so pollers can revalidate with a cheap lookup.
+
+The ETag is the agent's version, a counter every change to its conversations
+increments; Last-Modified is the time of that change. A weak ETag is used since
+the same version may be sent gzip-compressed or not.
+"""
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, Optional
+
+from starlette.datastructures import Headers
+
+from app.models.results import AgentVersion
+
+
+def agent_etag(version: AgentVersion) -> str:
+    return f'W/"v{version.version}"'
+
+
+def _as_utc(moment: datetime) -> datetime:
+    # pymongo returns naive datetimes in UTC
+    return moment.replace(tzinfo=timezone.utc) if moment.tzinfo is None else moment.astimezone(timezone.utc)
+
+
+def validator_headers(version: AgentVersion) -> Dict[str, str]:
+    # no-cache lets clients store the agent but makes them revalidate it on every read
+    headers = {"ETag": agent_etag(version), "Cache-Control": "no-cache"}
+    if version.updated_at is not None:
+        headers["Last-Modified"] = format_datetime(_as_utc(version.updated_at), usegmt=True)
+    return headers
+
+
+def _parse_http_date(value: str) -> Optional[datetime]:
+    try:
+        moment = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return _as_utc(moment)
+
+
+def is_conditional(headers: Headers) -> bool:
+    return "if-none-match" in headers or "if-modified-since" in headers
+
+
+def is_not_modified(headers: Headers, version: AgentVersion) -> bool:
+    """
+    Evaluates If-None-Match, or If-Modified-Since when there is none, as RFC 9110
+    does for a GET: with weak comparison of entity tags and at one-second precision.
+    """
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        etag = agent_etag(version)
+        return any(candidate.strip().removeprefix("W/") == etag.removeprefix("W/")
+                   for candidate in if_none_match.split(","))
+    if_modified_since = _parse_http_date(headers.get("if-modified-since", ""))
+    if if_modified_since is None or version.updated_at is None:
+        return False
+    return _as_utc(version.updated_at).replace(microsecond=0) <= if_modified_since
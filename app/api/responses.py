@@ -0,0 +1,13 @@
+from typing import Any
+
+import orjson
+from starlette.responses import JSONResponse
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response rendered with orjson, for payloads that are already plain dicts and lists.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content)
@@ -0,0 +1,112 @@
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Header, HTTPException, status
+from fastapi.responses import PlainTextResponse
+
+from app.api.responses import FastJSONResponse
+from app.core.warmup import get_warmup_state
+from app.services import research_service
+from app.utils.cache import cache_snapshot
+from app.utils.profiling import ADMIN_TOKEN_HEADER, check_admin_token, get_profile_store
+from app.utils.resilience import breaker_snapshots
+from app.workflows.routing import routing_snapshot
+
+router = APIRouter(prefix="/status", tags=["status"])
+health_router = APIRouter(tags=["health"])
+
+@router.get("/breakers")
+async def get_breakers():
+    """
+    Returns the state of the circuit breaker of every upstream called so far.
+    """
+    return breaker_snapshots()
+
+@router.get("/single-flight")
+async def get_single_flight():
+    """
+    Returns how many identical in-flight queries were coalesced into a shared pipeline run.
+    """
+    return research_service.query_flight_stats()
+
+@router.get("/admission")
+async def get_admission():
+    """
+    Returns the pipelines in flight, the queue depth and wait times of every priority lane.
+    """
+    return research_service.admission_stats()
+
+@router.get("/cache")
+async def get_cache_stats():
+    """
+    Returns the size and the L1 and L2 hit rates of every cache namespace of this worker.
+    """
+    return cache_snapshot()
+
+@router.get("/routing")
+async def get_routing():
+    """
+    Returns the routing mode and the latency, empty-result and error rates of every fetcher searched so far.
+    """
+    return routing_snapshot()
+
+def _require_admin(token: Optional[str]):
+    try:
+        check_admin_token(token)
+    except PermissionError as e:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=str(e)
+        )
+
+@router.get("/profiles")
+async def get_profiles(admin_token: Optional[str] = Header(None, alias=ADMIN_TOKEN_HEADER)):
+    """
+    Returns the summaries of the most recent request profiles of this worker, newest first.
+    """
+    _require_admin(admin_token)
+    return get_profile_store().list()
+
+@router.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str, format: Literal["collapsed", "json"] = "collapsed",
+                      admin_token: Optional[str] = Header(None, alias=ADMIN_TOKEN_HEADER)):
+    """
+    Returns a request profile as collapsed stacks, ready for flamegraph.pl or speedscope,
+    or as JSON with its summary.
+    """
+    _require_admin(admin_token)
+    try:
+        profile = get_profile_store().get(profile_id)
+    except KeyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=e.args[0] if e.args else str(e)
+        )
+    if format == "json":
+        return {**profile.summary(),
+                "stacks": [{"stack": stack, "count": count} for stack, count in profile.stacks.most_common()]}
+    return PlainTextResponse(profile.collapsed())
+
+@router.get("/warmup")
+async def get_warmup():
+    """
+    Returns the status and duration of every warm-up step of this worker.
+    """
+    return get_warmup_state().snapshot()
+
+@health_router.get("/live")
+async def live():
+    """
+    Returns 200 as long as the worker can serve requests at all.
+    """
+    return {"status": "live"}
+
+@health_router.get("/ready")
+async def ready():
+    """
+    Returns 200 once the warm-up has finished, and 503 until then.
+    """
+    state = get_warmup_state()
+    if not state.ready:
+        return FastJSONResponse({"status": "warming up", **state.snapshot()},
+                                status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
+    return {"status": "ready", **state.snapshot()}
@@ -0,0 +1,23 @@
+from datetime import datetime
+from typing import Literal, Optional
+
+from fastapi import APIRouter, HTTPException, Query, status
+
+from app.services import research_service
+
+router = APIRouter(prefix="/usage", tags=["usage"])
+
+@router.get("/")
+async def get_usage(since: Optional[datetime] = None, until: Optional[datetime] = None,
+                    bucket: Literal["hour", "day", "month"] = "day", top: int = Query(10, ge=1, le=100)):
+    """
+    Returns the tokens, cost, fallbacks and timings of all agents over a time window,
+    with the `top` agents by tokens used.
+    """
+    try:
+        return await research_service.get_global_usage(since, until, bucket, top)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
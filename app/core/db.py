@@ -3,22 +3,33 @@ import os
 from beanie import init_beanie
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
 
-from app.data.entities.models import AgentInDB, ConversationInDB
+from app.data.entities.models import AgentInDB, ConversationInDB, UsageRecordInDB
+from app.data.repositories.archive_repository import get_archive
 
 _client: AsyncIOMotorClient | None = None
 _db: AsyncIOMotorDatabase | None = None
 
 async def init_db():
     """
-    Initialize MongoDB client and Beanie document models.
+    Initialize MongoDB client, Beanie document models and the conversation archive.
     """
+    global _client, _db
     mongodb_uri = os.getenv("MONGODB_URI")
     mongodb_db = os.getenv("MONGODB_DB")
 
     _client = AsyncIOMotorClient(mongodb_uri)
     _db = _client[mongodb_db]
 
-    await init_beanie(database=_db, document_models=[AgentInDB, ConversationInDB])
+    await init_beanie(database=_db, document_models=[AgentInDB, ConversationInDB, UsageRecordInDB])
+    await get_archive().setup()
+
+def get_client() -> AsyncIOMotorClient:
+    """
+    Returns the MongoDB client opened by init_db.
+    """
+    if _client is None:
+        raise RuntimeError("Database has not been initialized")
+    return _client
 
 async def close_db():
     """
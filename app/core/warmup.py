@@ -0,0 +1,179 @@
+"""
+Warm-up run by the lifespan on a fresh worker, so the first queries do not pay for
+graph compilation, connection setup to the LLM and sources, and cold caches.
+
+Steps run in WARMUP_STEPS order (default "graph,llm,fetchers,cache", empty to skip
+warm-up). The worker reports ready on /ready once every step has finished, whether
+it succeeded or not: a failed warm-up only means the first queries run cold.
+"""
+import asyncio
+import os
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from app.data.entities.models import TIMEZONE_OFFSET
+
+WARMUP_STEPS = "graph,llm,fetchers,cache"
+PENDING, RUNNING, DONE, SKIPPED, FAILED = "pending", "running", "done", "skipped", "failed"
+
+
+@dataclass
+class StepStatus:
+    name: str
+    status: str = PENDING
+    seconds: float = 0.0
+    detail: str = ""
+
+
+@dataclass
+class WarmupState:
+    """Progress of the warm-up of this worker."""
+    ready: bool = False
+    steps: List[StepStatus] = field(default_factory=list)
+
+    def snapshot(self) -> dict:
+        return asdict(self)
+
+
+_state = WarmupState()
+
+
+def get_warmup_state() -> WarmupState:
+    return _state
+
+
+class _Skip(Exception):
+    """Raised by a step that has nothing to do in the current configuration."""
+
+
+def _compile_graph() -> str:
+    from app.workflows.research_graph import get_research_graph
+
+    get_research_graph(checkpointed=False)
+    checkpointer = get_research_graph().checkpointer
+    return f"research graph compiled, checkpoints in {type(checkpointer).__name__ if checkpointer else 'none'}"
+
+
+def _open_llm_connection() -> str:
+    from app.utils.llm import warm_openai_connection
+
+    if not warm_openai_connection():
+        raise _Skip("no OpenAI requests in this configuration")
+    return "OpenAI connection opened"
+
+
+def _open_fetcher_connections() -> str:
+    from app.workflows.research_graph import _retrieve_fetcher
+    from app.workflows.research_type import ResearchType
+
+    warmed, failed = [], []
+    for domain in ResearchType:
+        try:
+            fetcher = _retrieve_fetcher(domain)
+            fetcher.warm()
+            warmed.append(domain.name.lower())
+        except Exception as e:
+            print(f"Warm-up of the {domain.name.lower()} fetcher failed: {e}")
+            failed.append(domain.name.lower())
+    if failed and not warmed:
+        raise RuntimeError(f"no fetcher could be warmed ({', '.join(failed)})")
+    return f"warmed {', '.join(warmed)}" + (f"; failed {', '.join(failed)}" if failed else "")
+
+
+async def _prime_caches() -> str:
+    """
+    Runs the most popular recent queries through their fetchers to fill the fetcher
+    result cache. Medical queries are skipped, because their cache key includes the
+    terms extracted by the LLM at query time.
+    """
+    from app.data.repositories.agent_repository import get_popular_queries
+    from app.utils.cache import get_fetcher_cache
+    from app.workflows.research_graph import _retrieve_fetcher, search_sources
+    from app.workflows.research_type import ResearchType
+
+    if get_fetcher_cache().maxsize <= 0:
+        raise _Skip("fetcher cache is disabled")
+    since = datetime.now(TIMEZONE_OFFSET) - timedelta(hours=float(os.getenv("WARMUP_LOOKBACK_HOURS", "24")))
+    popular = await get_popular_queries(since, int(os.getenv("WARMUP_PRIME_QUERIES", "20")))
+
+    primed = 0
+    for entry in popular:
+        # Conversations store the domain as the lower-cased research type name
+        domain = ResearchType.__members__.get(str(entry["source"]).upper())
+        if domain is None or domain == ResearchType.MEDICAL:
+            continue
+        fetcher = _retrieve_fetcher(domain)
+        try:
+            # Sequential on purpose: priming must not eat the rate limit budget of live queries
+            result = await asyncio.to_thread(search_sources, fetcher, entry["query"])
+        except Exception as e:
+            print(f"Priming query {entry['query']!r} failed: {e}")
+            continue
+        primed += bool(result.documents)
+    return f"primed {primed} of {len(popular)} popular queries"
+
+
+STEPS: Dict[str, Callable[[], object]] = {
+    "graph": _compile_graph,
+    "llm": _open_llm_connection,
+    "fetchers": _open_fetcher_connections,
+    "cache": _prime_caches,
+}
+
+
+def warmup_steps() -> List[str]:
+    """
+    Returns the configured warm-up steps, raising ValueError for unknown ones so a
+    misconfigured worker fails at startup instead of never warming up.
+    """
+    names = [name.strip() for name in os.getenv("WARMUP_STEPS", WARMUP_STEPS).split(",") if name.strip()]
+    unknown = [name for name in names if name not in STEPS]
+    if unknown:
+        raise ValueError(f"Unknown warm-up steps {unknown}, expected some of {list(STEPS)}")
+    return names
+
+
+async def _run_step(step: StepStatus):
+    run = STEPS[step.name]
+    step.status = RUNNING
+    started = time.perf_counter()
+    try:
+        if asyncio.iscoroutinefunction(run):
+            step.detail = await run()
+        else:
+            # Blocking steps run in a thread so /live keeps answering during warm-up
+            step.detail = await asyncio.to_thread(run)
+        step.status = DONE
+    except _Skip as e:
+        step.status, step.detail = SKIPPED, str(e)
+    except Exception as e:
+        step.status, step.detail = FAILED, f"{type(e).__name__}: {e}"
+        print(f"Warm-up step {step.name} failed: {step.detail}")
+    finally:
+        step.seconds = round(time.perf_counter() - started, 3)
+
+
+async def run_warmup(names: List[str], state: Optional[WarmupState] = None) -> WarmupState:
+    """
+    Runs the warm-up steps in order and marks the worker ready, even when steps fail
+    or the whole warm-up exceeds WARMUP_TIMEOUT seconds.
+    """
+    state = state or _state
+    state.ready = False
+    state.steps = [StepStatus(name) for name in names]
+
+    async def run_all():
+        for step in state.steps:
+            await _run_step(step)
+
+    try:
+        await asyncio.wait_for(run_all(), timeout=float(os.getenv("WARMUP_TIMEOUT", "60")))
+    except asyncio.TimeoutError:
+        for step in state.steps:
+            if step.status in (PENDING, RUNNING):
+                step.status, step.detail = FAILED, "warm-up timed out"
+    finally:
+        state.ready = True
+    return state
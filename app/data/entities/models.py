@@ -1,16 +1,46 @@
 from beanie import Document
 from datetime import datetime, timezone, timedelta
 from typing import List, Optional
-from pydantic import Field
+from pydantic import BaseModel, Field
+from pymongo import ASCENDING, IndexModel
 
 TIMEZONE_OFFSET = timezone(timedelta(hours=8))
 
+class RetentionPolicy(BaseModel):
+    max_age_days: Optional[float] = Field(
+        None, ge=0, description="Conversations older than this many days are archived; 0 keeps them, unset inherits")
+    max_count: Optional[int] = Field(
+        None, ge=0, description="Conversations kept hot beyond which the oldest are archived; 0 keeps all, unset inherits")
+
+class NodeUsage(BaseModel):
+    node: str = Field(..., description="The research graph node")
+    wall_ms: float = Field(0.0, description="Wall time of the node in milliseconds")
+    model: Optional[str] = Field(None, description="The model that answered the node, if it called one")
+    prompt_tokens: int = Field(0, description="Prompt tokens of the node's completions")
+    completion_tokens: int = Field(0, description="Completion tokens of the node's completions")
+    cost_usd: float = Field(0.0, description="Cost of the node's completions in USD")
+    fetcher: Optional[str] = Field(None, description="The fetcher that answered the node, if it searched one")
+    fallback: bool = Field(False, description="Whether the node fell back to another model or fetcher")
+
+class ConversationUsage(BaseModel):
+    prompt_tokens: int = Field(0, description="Prompt tokens of the whole run")
+    completion_tokens: int = Field(0, description="Completion tokens of the whole run")
+    total_tokens: int = Field(0, description="Prompt and completion tokens of the whole run")
+    cost_usd: float = Field(0.0, description="Cost of the whole run in USD")
+    wall_ms: float = Field(0.0, description="Wall time of the run in milliseconds")
+    fetcher: Optional[str] = Field(None, description="The fetcher that answered the query")
+    fallback: bool = Field(False, description="Whether any node fell back to another model or fetcher")
+    cached: bool = Field(False, description="Whether the answer came from the query result cache")
+    shared: bool = Field(False, description="Whether the answer came from an identical query of another agent")
+    nodes: List[NodeUsage] = Field(default_factory=list, description="Usage of every node that ran")
+
 class ConversationInDB(Document):
     id: str = Field(..., description="The conversation id")
     query: str = Field(..., description="The user query")
     agent_response: str = Field(..., description="The agent's response")
     source: str = Field(..., description="The source used for the response")
     documents: List[str] = Field(default_factory=list, description="List of documents used for the research")
+    usage: Optional[ConversationUsage] = Field(default=None, description="Tokens, cost and timings of the answer")
     created_at: datetime = Field(default_factory=lambda: datetime.now(TIMEZONE_OFFSET))
 
     class Settings:
@@ -21,7 +51,30 @@ class AgentInDB(Document):
     name: str = Field(..., description="The agent name")
     created_at: datetime = Field(default_factory=lambda: datetime.now(TIMEZONE_OFFSET))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(TIMEZONE_OFFSET))
+    version: int = Field(default=0, description="Incremented by every change to the agent's conversations")
     messages: Optional[List[ConversationInDB]] = Field(default_factory=list, description="List of conversation messages")
+    summary: str = Field(default="", description="Rolling summary of the conversation before the recent turns")
+    summarized_count: int = Field(default=0, description="Number of leading messages folded into the summary")
+    archived_count: int = Field(default=0, description="Number of earlier messages moved to the conversation archive")
+    retention: Optional[RetentionPolicy] = Field(default=None, description="Retention policy overriding the global one")
+    compacting_until: Optional[datetime] = Field(default=None, description="Lease of the compaction running on the agent")
+
+    class Settings:
+        name = "agents"
+
+class UsageRecordInDB(Document):
+    id: str = Field(..., description="The usage record id")
+    agent_id: str = Field(..., description="The agent the usage is accounted to")
+    kind: str = Field(..., description="What used the tokens: query or summary")
+    conversation_id: Optional[str] = Field(None, description="The conversation of a query")
+    domain: Optional[str] = Field(None, description="The domain a query was answered from")
+    usage: ConversationUsage = Field(..., description="Tokens, cost and timings")
+    created_at: datetime = Field(default_factory=lambda: datetime.now(TIMEZONE_OFFSET))
 
     class Settings:
-        name = "agents"
\ No newline at end of file
+        name = "usage_records"
+        # Agent reports match on the agent and a time window, global reports on the window alone
+        indexes = [
+            IndexModel([("agent_id", ASCENDING), ("created_at", ASCENDING)]),
+            IndexModel([("created_at", ASCENDING)]),
+        ]
@@ -1,9 +1,14 @@
+import re
 from uuid import uuid4
 
-from app.data.entities.models import AgentInDB, ConversationInDB, TIMEZONE_OFFSET
-from app.models.results import QueryResult
+from beanie.odm.utils.encoder import Encoder
+
+from app.data.entities.models import AgentInDB, ConversationInDB, RetentionPolicy, TIMEZONE_OFFSET
+from app.data.repositories.archive_repository import get_archive
+from app.models.results import AgentVersion, QueryResult
 from app.models.requests import AgentCreate
 from datetime import datetime
+from typing import AsyncIterator, List, Optional
 
 async def create_agent_entity(agent_in: AgentCreate) -> AgentInDB:
     new_agent = AgentInDB(id=str(uuid4()), **agent_in.model_dump())
@@ -11,6 +16,21 @@ async def create_agent_entity(agent_in: AgentCreate) -> AgentInDB:
 
     return new_agent
 
+async def create_agent_documents(agents_in: List[AgentCreate]) -> List[dict]:
+    """
+    Creates the agents with a single insert_many of raw documents and returns the documents.
+    """
+    now = datetime.now(TIMEZONE_OFFSET)
+    agent_documents = [{
+        "_id": str(uuid4()), "name": agent_in.name, "summary": "", "summarized_count": 0, "archived_count": 0,
+        "version": 0, "retention": agent_in.retention.model_dump() if agent_in.retention else None,
+        "messages": [], "created_at": now, "updated_at": now,
+    } for agent_in in agents_in]
+    if agent_documents:
+        await AgentInDB.get_pymongo_collection().insert_many(agent_documents)
+
+    return agent_documents
+
 async def get_agent_entity(agent_id: str) -> AgentInDB:
     current_agent = await AgentInDB.find_one(AgentInDB.id == agent_id)
     if current_agent is None:
@@ -18,23 +38,273 @@ async def get_agent_entity(agent_id: str) -> AgentInDB:
 
     return current_agent
 
+# Only the fields rendered by the API and their validators, read as raw BSON without building Beanie documents
+AGENT_OUT_PROJECTION = {
+    "name": 1,
+    "version": 1,
+    "updated_at": 1,
+    "messages._id": 1,
+    "messages.query": 1,
+    "messages.agent_response": 1,
+    "messages.source": 1,
+    "messages.documents": 1,
+}
+
+async def get_agent_document(agent_id: str) -> dict:
+    agent_document = await AgentInDB.get_pymongo_collection().find_one({"_id": agent_id}, AGENT_OUT_PROJECTION)
+    if agent_document is None:
+        raise KeyError(f"Agent with id {agent_id} does not exist and cannot be retrieved")
+
+    return agent_document
+
+def agent_version(agent_document: dict) -> AgentVersion:
+    # Agents stored before versioning are at version 0 until their next change
+    return AgentVersion(agent_document.get("version", 0), agent_document.get("updated_at"))
+
+async def find_agent_version(agent_id: str) -> AgentVersion:
+    """
+    Returns the version of the agent from a lookup of the version fields alone.
+    """
+    agent_document = await AgentInDB.get_pymongo_collection().find_one({"_id": agent_id},
+                                                                      {"version": 1, "updated_at": 1})
+    if agent_document is None:
+        raise KeyError(f"Agent with id {agent_id} does not exist and cannot be retrieved")
+
+    return agent_version(agent_document)
+
 async def delete_agent_entity(agent_id: str):
-    agent_to_delete = await get_agent_entity(agent_id)
+    # Deleted on the server, returning only the counter the archive cleanup needs
+    deleted_agent = await AgentInDB.get_pymongo_collection().find_one_and_delete(
+        {"_id": agent_id}, projection={"archived_count": 1})
+    if deleted_agent is None:
+        raise KeyError(f"Agent with id {agent_id} does not exist and cannot be deleted")
 
-    await agent_to_delete.delete()
+    if deleted_agent.get("archived_count"):
+        await get_archive().delete(agent_id)
 
-async def add_conversations(agent_id: str, query: str, query_result: QueryResult):
-    current_agent = await get_agent_entity(agent_id)
+def agents_query(agent_ids: Optional[List[str]] = None, name_prefix: Optional[str] = None,
+                 created_before: Optional[datetime] = None, updated_before: Optional[datetime] = None) -> dict:
+    """
+    Returns the query matching the agents that meet all the given criteria. Raises
+    ValueError without any criterion, rather than matching every agent.
+    """
+    query = {}
+    if agent_ids is not None:
+        query["_id"] = {"$in": agent_ids}
+    if name_prefix:
+        query["name"] = {"$regex": f"^{re.escape(name_prefix)}"}
+    if created_before is not None:
+        query["created_at"] = {"$lt": created_before}
+    if updated_before is not None:
+        query["updated_at"] = {"$lt": updated_before}
+    if not query:
+        raise ValueError("Deleting agents needs ids or at least one filter")
 
+    return query
+
+async def delete_agent_documents(query: dict, batch_size: int = 1000) -> dict:
+    """
+    Deletes the agents matching the query, with their archives, in batches of one
+    delete_many each. Returns the ids of the deleted agents with the number of agents
+    and of conversations, hot and archived, deleted.
+    """
+    collection = AgentInDB.get_pymongo_collection()
+    # Only ids and counters leave the server, the messages are counted there
+    cursor = collection.aggregate(
+        [{"$match": query},
+         {"$project": {"archived_count": 1, "message_count": {"$size": {"$ifNull": ["$messages", []]}}}}],
+        batchSize=batch_size)
+    matched = await cursor.to_list(length=None)
+
+    archive = get_archive()
+    deleted_ids = []
+    conversations = 0
+    for start in range(0, len(matched), batch_size):
+        batch = matched[start:start + batch_size]
+        batch_ids = [agent_document["_id"] for agent_document in batch]
+        # The query is applied again, so an agent that stopped matching since it was read is kept
+        result = await collection.delete_many({**query, "_id": {"$in": batch_ids}})
+        if result.deleted_count < len(batch):
+            kept = await collection.find({"_id": {"$in": batch_ids}}, {"_id": 1}).to_list(length=None)
+            kept_ids = {agent_document["_id"] for agent_document in kept}
+            batch = [agent_document for agent_document in batch if agent_document["_id"] not in kept_ids]
+        deleted_ids.extend(agent_document["_id"] for agent_document in batch)
+        conversations += sum(agent_document["message_count"] + agent_document.get("archived_count", 0)
+                             for agent_document in batch)
+        archived_ids = [agent_document["_id"] for agent_document in batch if agent_document.get("archived_count")]
+        if archived_ids:
+            await archive.delete_many(archived_ids)
+
+    return {"agent_ids": deleted_ids, "agents": len(deleted_ids), "conversations": conversations}
+
+async def add_conversations(agent_id: str, query: str, query_result: QueryResult) -> str:
+    """
+    Appends the turn to the agent and returns the id of the new conversation.
+    """
     new_conversation = ConversationInDB(
         id=str(uuid4()),
         query=query,
         agent_response=query_result.agent_response,
         source=query_result.domain,
-        documents=query_result.documents
+        documents=query_result.documents,
+        usage=query_result.usage
+    )
+
+    # An atomic push, so a concurrent compaction of older messages is never undone
+    result = await AgentInDB.get_pymongo_collection().update_one(
+        {"_id": agent_id},
+        {"$push": {"messages": Encoder(to_db=True).encode(new_conversation)},
+         "$set": {"updated_at": datetime.now(TIMEZONE_OFFSET)},
+         "$inc": {"version": 1}}
+    )
+    if not result.matched_count:
+        raise KeyError(f"Agent with id {agent_id} does not exist and cannot be retrieved")
+
+    return new_conversation.id
+
+async def update_summary(agent_id: str, summary: str, summarized_count: int, previous_count: int) -> bool:
+    """
+    Stores a new rolling summary unless another update moved the cursor first.
+    Returns whether the summary was stored.
+    """
+    result = await AgentInDB.find_one(
+        AgentInDB.id == agent_id,
+        AgentInDB.summarized_count == previous_count
+    ).update({"$set": {"summary": summary, "summarized_count": summarized_count}})
+
+    return bool(result and result.modified_count)
+
+async def get_popular_queries(since: datetime, limit: int) -> List[dict]:
+    """
+    Returns the most frequent queries asked since the given time, lower-cased, with
+    the domain they were answered from and how often they were asked.
+    """
+    pipeline = [
+        {"$match": {"updated_at": {"$gte": since}}},
+        {"$unwind": "$messages"},
+        {"$match": {"messages.created_at": {"$gte": since}}},
+        {"$group": {"_id": {"query": {"$toLower": "$messages.query"}, "source": "$messages.source"},
+                    "count": {"$sum": 1}}},
+        {"$sort": {"count": -1}},
+        {"$limit": limit},
+        {"$project": {"_id": 0, "query": "$_id.query", "source": "$_id.source", "count": 1}},
+    ]
+    cursor = AgentInDB.get_pymongo_collection().aggregate(pipeline)
+
+    return await cursor.to_list(length=limit)
+
+async def get_context_document(agent_id: str) -> dict:
+    """
+    Returns the agent's rolling summary with the query and response of the turns not
+    folded into it yet, without reading the rest of its messages.
+    """
+    messages = {"$ifNull": ["$messages", []]}
+    cursor = AgentInDB.get_pymongo_collection().aggregate([
+        {"$match": {"_id": agent_id}},
+        {"$project": {"summary": 1, "summarized_count": 1, "messages": {"$map": {
+            # $slice takes a positive count, and skips everything from a position past the end
+            "input": {"$slice": [messages, {"$ifNull": ["$summarized_count", 0]}, {"$max": [{"$size": messages}, 1]}]},
+            "as": "message",
+            "in": {"query": "$$message.query", "agent_response": "$$message.agent_response"},
+        }}}},
+    ])
+    agent_documents = await cursor.to_list(length=1)
+    if not agent_documents:
+        raise KeyError(f"Agent with id {agent_id} does not exist and cannot be retrieved")
+
+    return agent_documents[0]
+
+async def lease_retention_document(agent_id: str, now: datetime, until: datetime) -> Optional[dict]:
+    """
+    Takes the agent's compaction lease until `until` and returns the raw messages with
+    the counters and policy compaction needs, or None while another compaction holds it.
+    """
+    collection = AgentInDB.get_pymongo_collection()
+    agent_document = await collection.find_one_and_update(
+        {"_id": agent_id, "$or": [{"compacting_until": None}, {"compacting_until": {"$lt": now}}]},
+        {"$set": {"compacting_until": until}},
+        projection={"messages": 1, "summarized_count": 1, "archived_count": 1, "retention": 1})
+    if agent_document is None and await collection.find_one({"_id": agent_id}, {"_id": 1}) is None:
+        raise KeyError(f"Agent with id {agent_id} does not exist and cannot be retrieved")
+
+    return agent_document
+
+async def release_compaction_lease(agent_id: str, until: datetime):
+    """
+    Releases the compaction lease taken until `until`, unless another compaction took it over.
+    """
+    await AgentInDB.get_pymongo_collection().update_one(
+        {"_id": agent_id, "compacting_until": until}, {"$unset": {"compacting_until": ""}})
+
+async def remove_archived_messages(agent_id: str, message_ids: List[str], summarized_count: int,
+                                   archived_count: int) -> bool:
+    """
+    Removes the leading messages that were archived and shifts the summary cursor,
+    unless a concurrent summary update or compaction changed the agent first.
+    Returns whether the messages were removed.
+    """
+    result = await AgentInDB.get_pymongo_collection().update_one(
+        {"_id": agent_id, "summarized_count": summarized_count, "archived_count": archived_count,
+         "messages.0._id": message_ids[0]},
+        {"$pull": {"messages": {"_id": {"$in": message_ids}}},
+         "$set": {"updated_at": datetime.now(TIMEZONE_OFFSET)},
+         "$inc": {"summarized_count": -len(message_ids), "archived_count": len(message_ids), "version": 1}}
     )
-    
-    current_agent.messages.append(new_conversation)
-    current_agent.updated_at = datetime.now(TIMEZONE_OFFSET)
-    
-    await current_agent.save()
+
+    return bool(result.modified_count)
+
+async def update_retention(agent_id: str, retention: Optional[RetentionPolicy]):
+    result = await AgentInDB.get_pymongo_collection().update_one(
+        {"_id": agent_id}, {"$set": {"retention": retention.model_dump() if retention else None}})
+    if not result.matched_count:
+        raise KeyError(f"Agent with id {agent_id} does not exist and cannot be retrieved")
+
+async def get_compactable_agent_ids(with_retention_only: bool = False) -> List[str]:
+    """
+    Returns the agents with messages folded into their summary, the only ones compaction
+    may archive, optionally only those with a retention policy of their own.
+    """
+    query = {"summarized_count": {"$gt": 0}}
+    if with_retention_only:
+        query["retention"] = {"$ne": None}
+    cursor = AgentInDB.get_pymongo_collection().find(query, {"_id": 1})
+
+    return [agent_document["_id"] for agent_document in await cursor.to_list(length=None)]
+
+async def get_agent_header(agent_id: str) -> dict:
+    """
+    Returns the raw agent document without its messages.
+    """
+    agent_document = await AgentInDB.get_pymongo_collection().find_one({"_id": agent_id}, {"messages": 0})
+    if agent_document is None:
+        raise KeyError(f"Agent with id {agent_id} does not exist and cannot be retrieved")
+
+    return agent_document
+
+async def iter_messages(agent_id: str, batch_size: int = 500) -> AsyncIterator[dict]:
+    """
+    Yields the raw messages of the agent one by one from a cursor, never holding them all.
+    """
+    cursor = AgentInDB.get_pymongo_collection().aggregate(
+        [{"$match": {"_id": agent_id}}, {"$unwind": "$messages"}, {"$replaceRoot": {"newRoot": "$messages"}}],
+        batchSize=batch_size)
+    async for message in cursor:
+        yield message
+
+async def insert_agent_document(agent_document: dict):
+    await AgentInDB.get_pymongo_collection().insert_one(agent_document)
+
+async def push_messages(agent_id: str, messages: List[dict], archived: int = 0):
+    """
+    Appends a batch of raw messages to the agent, counting `archived` messages moved to the archive.
+    """
+    update = {"$inc": {"archived_count": archived}} if archived else {}
+    if messages:
+        update["$push"] = {"messages": {"$each": messages}}
+        update["$set"] = {"updated_at": datetime.now(TIMEZONE_OFFSET)}
+        update.setdefault("$inc", {})["version"] = 1
+    if update:
+        await AgentInDB.get_pymongo_collection().update_one({"_id": agent_id}, update)
+
+async def delete_agent_document(agent_id: str):
+    await AgentInDB.get_pymongo_collection().delete_one({"_id": agent_id})
@@ -0,0 +1,203 @@
+"""
+Archive of conversations compacted out of their agent document.
+
+Each compaction stores one chunk: the raw conversation documents it moved, as a
+zlib-compressed orjson array, keyed by the agent and the position of its first
+conversation in the agent's full history. Every chunk gets an id of its own, so a
+compaction that loses a race to another one removes only the chunk it wrote, and
+the winner discards what earlier failed attempts left at its position, so
+conversations are never duplicated. CONVERSATION_ARCHIVE selects the store: mongo (default) for the
+conversation_archives collection, or files for CONVERSATION_ARCHIVE_DIR.
+"""
+import asyncio
+import os
+import shutil
+import zlib
+from pathlib import Path
+from typing import AsyncIterator, List, Tuple
+from uuid import uuid4
+
+import orjson
+from pymongo import ASCENDING
+
+from app.data.entities.models import AgentInDB
+
+ARCHIVE_COLLECTION = "conversation_archives"
+ARCHIVE_MONGO = "mongo"
+ARCHIVE_FILES = "files"
+
+
+def pack_messages(messages: List[dict]) -> bytes:
+    return zlib.compress(orjson.dumps(messages), 6)
+
+
+def unpack_messages(data: bytes) -> List[dict]:
+    return orjson.loads(zlib.decompress(bytes(data)))
+
+
+def _page(chunks: List[Tuple[int, int]], offset: int, limit: int) -> List[int]:
+    """
+    Returns the indexes of the (offset, count) chunks that hold conversations
+    offset to offset + limit of the archive.
+    """
+    wanted = []
+    position = 0
+    for index, (_, count) in enumerate(chunks):
+        if position + count > offset and position < offset + limit:
+            wanted.append(index)
+        position += count
+    return wanted
+
+
+class MongoArchive:
+    name = ARCHIVE_MONGO
+
+    @staticmethod
+    def _collection():
+        return AgentInDB.get_pymongo_collection().database[ARCHIVE_COLLECTION]
+
+    async def setup(self):
+        """
+        Creates the index every read, compaction and delete of an agent's chunks uses.
+        """
+        await self._collection().create_index([("agent_id", ASCENDING), ("offset", ASCENDING)])
+
+    async def put(self, agent_id: str, offset: int, messages: List[dict]) -> str:
+        """
+        Stores the messages as a new chunk at `offset` and returns the chunk id.
+        """
+        chunk_id = f"{agent_id}:{offset:010d}:{uuid4().hex}"
+        await self._collection().insert_one(
+            {"_id": chunk_id, "agent_id": agent_id, "offset": offset, "count": len(messages),
+             "first_created_at": messages[0].get("created_at"), "last_created_at": messages[-1].get("created_at"),
+             "data": pack_messages(messages)})
+        return chunk_id
+
+    async def remove(self, agent_id: str, chunk_id: str):
+        await self._collection().delete_one({"_id": chunk_id, "agent_id": agent_id})
+
+    async def discard(self, agent_id: str, offset: int, keep: str):
+        """
+        Removes the chunks at `offset` other than `keep`, left by compactions that failed.
+        """
+        await self._collection().delete_many({"agent_id": agent_id, "offset": offset, "_id": {"$ne": keep}})
+
+    async def read(self, agent_id: str, offset: int, limit: int) -> Tuple[int, List[dict]]:
+        collection = self._collection()
+        chunks = await collection.find({"agent_id": agent_id}, {"offset": 1, "count": 1}) \
+            .sort("offset", 1).to_list(length=None)
+        total = sum(chunk["count"] for chunk in chunks)
+        wanted = _page([(chunk["offset"], chunk["count"]) for chunk in chunks], offset, limit)
+        if not wanted:
+            return total, []
+        ids = [chunks[index]["_id"] for index in wanted]
+        documents = await collection.find({"_id": {"$in": ids}}).sort("offset", 1).to_list(length=None)
+        skip = offset - sum(chunk["count"] for chunk in chunks[:wanted[0]])
+        messages = [message for document in documents for message in unpack_messages(document["data"])]
+        return total, messages[skip:skip + limit]
+
+    async def chunks(self, agent_id: str) -> AsyncIterator[List[dict]]:
+        """
+        Yields the archived conversations of the agent chunk by chunk, oldest first.
+        """
+        cursor = self._collection().find({"agent_id": agent_id}).sort("offset", 1).batch_size(4)
+        async for document in cursor:
+            yield unpack_messages(document["data"])
+
+    async def delete(self, agent_id: str):
+        await self._collection().delete_many({"agent_id": agent_id})
+
+    async def delete_many(self, agent_ids: List[str]):
+        await self._collection().delete_many({"agent_id": {"$in": agent_ids}})
+
+
+class FileArchive:
+    """
+    Chunks as <directory>/<agent id>/<offset>-<count>-<token>.zlib files, the file
+    name being the chunk id.
+    """
+    name = ARCHIVE_FILES
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+
+    async def setup(self):
+        await asyncio.to_thread(self.directory.mkdir, parents=True, exist_ok=True)
+
+    def _agent_directory(self, agent_id: str) -> Path:
+        # Agent ids are generated UUIDs, but never let one escape the archive directory
+        return self.directory / Path(agent_id).name
+
+    def _chunks(self, agent_id: str) -> List[Tuple[int, int, Path]]:
+        directory = self._agent_directory(agent_id)
+        if not directory.is_dir():
+            return []
+        chunks = []
+        for path in directory.glob("*.zlib"):
+            # Chunks archived before they had a token are named <offset>-<count>
+            offset, count = path.stem.split("-")[:2]
+            chunks.append((int(offset), int(count), path))
+        return sorted(chunks)
+
+    def _put(self, agent_id: str, offset: int, messages: List[dict]) -> str:
+        directory = self._agent_directory(agent_id)
+        directory.mkdir(parents=True, exist_ok=True)
+        token = uuid4().hex
+        chunk_id = f"{offset:010d}-{len(messages)}-{token}.zlib"
+        temporary = directory / f"{offset:010d}-{token}.tmp"
+        temporary.write_bytes(pack_messages(messages))
+        temporary.replace(directory / chunk_id)
+        return chunk_id
+
+    def _remove(self, agent_id: str, chunk_id: str):
+        (self._agent_directory(agent_id) / Path(chunk_id).name).unlink(missing_ok=True)
+
+    def _discard(self, agent_id: str, offset: int, keep: str):
+        for chunk_offset, _, path in self._chunks(agent_id):
+            if chunk_offset == offset and path.name != keep:
+                path.unlink(missing_ok=True)
+
+    def _read(self, agent_id: str, offset: int, limit: int) -> Tuple[int, List[dict]]:
+        chunks = self._chunks(agent_id)
+        total = sum(count for _, count, _ in chunks)
+        wanted = _page([(chunk_offset, count) for chunk_offset, count, _ in chunks], offset, limit)
+        if not wanted:
+            return total, []
+        skip = offset - sum(count for _, count, _ in chunks[:wanted[0]])
+        messages = [message for index in wanted for message in unpack_messages(chunks[index][2].read_bytes())]
+        return total, messages[skip:skip + limit]
+
+    async def put(self, agent_id: str, offset: int, messages: List[dict]) -> str:
+        return await asyncio.to_thread(self._put, agent_id, offset, messages)
+
+    async def remove(self, agent_id: str, chunk_id: str):
+        await asyncio.to_thread(self._remove, agent_id, chunk_id)
+
+    async def discard(self, agent_id: str, offset: int, keep: str):
+        await asyncio.to_thread(self._discard, agent_id, offset, keep)
+
+    async def read(self, agent_id: str, offset: int, limit: int) -> Tuple[int, List[dict]]:
+        return await asyncio.to_thread(self._read, agent_id, offset, limit)
+
+    async def chunks(self, agent_id: str) -> AsyncIterator[List[dict]]:
+        for _, _, path in await asyncio.to_thread(self._chunks, agent_id):
+            yield unpack_messages(await asyncio.to_thread(path.read_bytes))
+
+    async def delete(self, agent_id: str):
+        await asyncio.to_thread(shutil.rmtree, self._agent_directory(agent_id), True)
+
+    def _delete_many(self, agent_ids: List[str]):
+        for agent_id in agent_ids:
+            shutil.rmtree(self._agent_directory(agent_id), True)
+
+    async def delete_many(self, agent_ids: List[str]):
+        await asyncio.to_thread(self._delete_many, agent_ids)
+
+
+def get_archive():
+    mode = os.getenv("CONVERSATION_ARCHIVE", ARCHIVE_MONGO).lower()
+    if mode == ARCHIVE_FILES:
+        return FileArchive(os.getenv("CONVERSATION_ARCHIVE_DIR", "archives"))
+    if mode != ARCHIVE_MONGO:
+        raise ValueError(f"CONVERSATION_ARCHIVE must be {ARCHIVE_MONGO} or {ARCHIVE_FILES}, not {mode}")
+    return MongoArchive()
@@ -0,0 +1,157 @@
+"""
+Usage records: one flat document per answered query or summary update, kept apart
+from the agent documents so reports never unwind conversation histories, and so
+usage outlives compaction into the archive. Reports are single aggregation
+pipelines over a time window, matched on the (agent_id, created_at) or created_at
+index before anything else.
+"""
+from datetime import datetime
+from typing import List, Optional
+from uuid import uuid4
+
+from app.data.entities.models import TIMEZONE_OFFSET, UsageRecordInDB
+
+KIND_QUERY = "query"
+KIND_SUMMARY = "summary"
+# $dateToString formats of the report buckets, in UTC
+BUCKET_FORMATS = {
+    "hour": "%Y-%m-%dT%H:00:00Z",
+    "day": "%Y-%m-%d",
+    "month": "%Y-%m",
+}
+
+
+async def insert_usage_record(agent_id: str, usage: dict, kind: str = KIND_QUERY,
+                              conversation_id: Optional[str] = None, domain: Optional[str] = None):
+    await UsageRecordInDB.get_pymongo_collection().insert_one({
+        "_id": str(uuid4()),
+        "agent_id": agent_id,
+        "kind": kind,
+        "conversation_id": conversation_id,
+        "domain": domain,
+        "usage": usage,
+        "created_at": datetime.now(TIMEZONE_OFFSET),
+    })
+
+
+def _count_if(condition) -> dict:
+    return {"$sum": {"$cond": [condition, 1, 0]}}
+
+
+def _token_sums(prefix: str) -> dict:
+    return {
+        "prompt_tokens": {"$sum": f"${prefix}.prompt_tokens"},
+        "completion_tokens": {"$sum": f"${prefix}.completion_tokens"},
+        "cost_usd": {"$sum": f"${prefix}.cost_usd"},
+    }
+
+
+def usage_report_pipeline(since: datetime, until: datetime, agent_id: Optional[str] = None,
+                          bucket: str = "day", top_agents: int = 10) -> List[dict]:
+    """
+    Returns the aggregation pipeline of a usage report over [since, until): totals,
+    usage per node and model, per fetcher, per time bucket and, without an agent,
+    the agents with the most tokens.
+    """
+    if bucket not in BUCKET_FORMATS:
+        raise ValueError(f"Unknown bucket {bucket}, expected one of {list(BUCKET_FORMATS)}")
+    match = {"created_at": {"$gte": since, "$lt": until}}
+    if agent_id is not None:
+        match = {"agent_id": agent_id, **match}
+    is_query = {"$eq": ["$kind", KIND_QUERY]}
+
+    facets = {
+        "totals": [{"$group": {
+            "_id": None,
+            "queries": _count_if(is_query),
+            "summaries": _count_if({"$eq": ["$kind", KIND_SUMMARY]}),
+            "cached": _count_if("$usage.cached"),
+            "shared": _count_if("$usage.shared"),
+            "fallbacks": _count_if("$usage.fallback"),
+            **_token_sums("usage"),
+            "wall_ms_avg": {"$avg": {"$cond": [is_query, "$usage.wall_ms", None]}},
+        }}],
+        "nodes": [
+            {"$unwind": "$usage.nodes"},
+            {"$group": {
+                "_id": {"node": "$usage.nodes.node", "model": "$usage.nodes.model"},
+                "calls": {"$sum": 1},
+                "fallbacks": _count_if("$usage.nodes.fallback"),
+                **_token_sums("usage.nodes"),
+                "wall_ms_avg": {"$avg": "$usage.nodes.wall_ms"},
+            }},
+            {"$sort": {"_id.node": 1, "_id.model": 1}},
+        ],
+        "fetchers": [
+            {"$match": {"usage.fetcher": {"$ne": None}}},
+            {"$group": {"_id": "$usage.fetcher", "queries": {"$sum": 1}, "fallbacks": _count_if("$usage.fallback")}},
+            {"$sort": {"queries": -1, "_id": 1}},
+        ],
+        "buckets": [
+            {"$group": {
+                "_id": {"$dateToString": {"format": BUCKET_FORMATS[bucket], "date": "$created_at"}},
+                "queries": _count_if(is_query),
+                **_token_sums("usage"),
+            }},
+            {"$sort": {"_id": 1}},
+        ],
+    }
+    if agent_id is None:
+        facets["agents"] = [
+            {"$group": {"_id": "$agent_id", "queries": _count_if(is_query), **_token_sums("usage"),
+                        "total_tokens": {"$sum": "$usage.total_tokens"}}},
+            {"$sort": {"total_tokens": -1, "_id": 1}},
+            {"$limit": top_agents},
+        ]
+    return [{"$match": match}, {"$facet": facets}]
+
+
+def _round_cost(row: dict) -> dict:
+    if "cost_usd" in row:
+        row["cost_usd"] = round(row["cost_usd"], 6)
+    if row.get("wall_ms_avg") is not None:
+        row["wall_ms_avg"] = round(row["wall_ms_avg"], 1)
+    return row
+
+
+def usage_report_from_facets(facets: dict) -> dict:
+    """
+    Shapes the single document of a usage report pipeline into the report payload.
+    """
+    totals = facets["totals"][0] if facets["totals"] else {}
+    totals.pop("_id", None)
+    report = {
+        "totals": _round_cost({
+            "queries": totals.get("queries", 0),
+            "summaries": totals.get("summaries", 0),
+            "cached": totals.get("cached", 0),
+            "shared": totals.get("shared", 0),
+            "fallbacks": totals.get("fallbacks", 0),
+            "prompt_tokens": totals.get("prompt_tokens", 0),
+            "completion_tokens": totals.get("completion_tokens", 0),
+            "total_tokens": totals.get("prompt_tokens", 0) + totals.get("completion_tokens", 0),
+            "cost_usd": totals.get("cost_usd", 0.0),
+            "wall_ms_avg": totals.get("wall_ms_avg"),
+        }),
+        "nodes": [_round_cost({"node": row["_id"]["node"], "model": row["_id"].get("model"),
+                               **{name: value for name, value in row.items() if name != "_id"}})
+                  for row in facets["nodes"]],
+        "fetchers": [{"fetcher": row["_id"], "queries": row["queries"], "fallbacks": row["fallbacks"]}
+                     for row in facets["fetchers"]],
+        "buckets": [_round_cost({"start": row["_id"], **{name: value for name, value in row.items() if name != "_id"}})
+                    for row in facets["buckets"]],
+    }
+    if "agents" in facets:
+        report["agents"] = [_round_cost({"agent_id": row["_id"],
+                                         **{name: value for name, value in row.items() if name != "_id"}})
+                            for row in facets["agents"]]
+    return report
+
+
+async def get_usage_report(since: datetime, until: datetime, agent_id: Optional[str] = None,
+                           bucket: str = "day", top_agents: int = 10) -> dict:
+    cursor = UsageRecordInDB.get_pymongo_collection().aggregate(
+        usage_report_pipeline(since, until, agent_id, bucket, top_agents))
+    documents = await cursor.to_list(length=1)
+
+    return usage_report_from_facets(documents[0])
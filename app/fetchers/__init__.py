@@ -1,11 +1,36 @@
 from abc import abstractmethod, ABC
+from typing import Optional
 
+from app.fetchers.rate_limit import RateLimit
 from app.models.results import FetcherResult
+from app.utils.resilience import BreakerPolicy, RetryPolicy
 
 TOP_K_RESULTS = 5
 MAX_CHARACTERS = 5000
 
 class Fetcher(ABC):
+    source: str = ""
+    top_k: int = TOP_K_RESULTS
+    max_chars: int = MAX_CHARACTERS
+    rate_limit: Optional[RateLimit] = None
+    requests_per_search: int = 1
+    breaker_policy: BreakerPolicy = BreakerPolicy()
+    retry_policy: RetryPolicy = RetryPolicy()
+
     @abstractmethod
     def search(self, query: str, terms:str="") -> FetcherResult:
-        pass
\ No newline at end of file
+        pass
+
+    def configure(self, top_k: int, max_chars: int) -> "Fetcher":
+        """
+        Sets the number of results and the characters kept per result of this instance.
+        """
+        self.top_k = top_k
+        self.max_chars = max_chars
+        return self
+
+    def warm(self):
+        """
+        Opens connections to the source ahead of the first search. Does nothing by default.
+        """
+        pass
@@ -1,34 +1,62 @@
-from typing import List
+from typing import List, Optional
 
-from langchain_community.utilities import ArxivAPIWrapper
+import arxiv
 
 from app.fetchers import Fetcher, MAX_CHARACTERS, TOP_K_RESULTS
+from app.fetchers.arxiv_pdf import ArxivPdfExtractor, arxiv_deep_mode, get_pdf_extractor, relevant_text
+from app.fetchers.rate_limit import RateLimit, charge_rate_limit, rate_limited
 from app.models.results import FetcherResult
+from app.utils.resilience import BreakerPolicy, resilient
+
+ARXIV_MAX_QUERY_LENGTH = 300
 
 
 class ArxivFetcher(Fetcher):
     """
-    Fetcher around LangChain's ArxivAPIWrapper to fetch research papers.
+    Fetcher around the arXiv API client to fetch research papers.
+
+    Returns abstracts by default. In deep mode (ARXIV_DEEP_MODE) the PDFs of the top
+    hits are parsed and their most relevant pages returned instead.
     """
+    source = "arxiv"
+    # arXiv asks for no more than one request every three seconds
+    rate_limit = RateLimit(rate=1 / 3, burst=1, max_wait=10.0)
+    # Deep mode downloads and parses PDFs, so only treat much longer calls as slow
+    breaker_policy = BreakerPolicy(slow_call_duration=20.0)
 
-    def __init__(self):
-        self.wrapper = ArxivAPIWrapper(top_k_results=TOP_K_RESULTS, load_all_available_meta=False)
+    def __init__(self, deep: Optional[bool] = None, extractor: Optional[ArxivPdfExtractor] = None):
+        self.client = arxiv.Client()
         self.max_chars = MAX_CHARACTERS
+        self.top_k = TOP_K_RESULTS
+        self.deep = arxiv_deep_mode() if deep is None else deep
+        self.extractor = extractor
 
+    def _full_texts(self, papers: List[arxiv.Result], query: str) -> dict:
+        extractor = self.extractor or get_pdf_extractor()
+        # PDFs come from arxiv.org too, so every download is charged to the arXiv rate limit
+        pages = extractor.pages([(paper.get_short_id(), paper.pdf_url) for paper in papers if paper.pdf_url],
+                                before_download=lambda: charge_rate_limit(self, 1))
+        return {paper_id: relevant_text(paper_pages, query, self.max_chars) for paper_id, paper_pages in pages.items()}
+
+    @resilient
+    @rate_limited
     def search(self, query: str, terms:str="") -> FetcherResult:
         """
         Returns a list of string snippets from arXiv relevant to the query.
         """
-        docs = self.wrapper.load(query)
+        search = arxiv.Search(query=query[:ARXIV_MAX_QUERY_LENGTH], max_results=self.top_k)
+        papers = list(self.client.results(search))
+        full_texts = self._full_texts(papers, query) if self.deep else {}
+
         results: List[str] = []
         documents: List[str] = []
-        for doc in docs:
-            content = (doc.page_content or "").strip()
+        for paper in papers:
+            content = (full_texts.get(paper.get_short_id()) or paper.summary or "").strip()
             if not content:
                 continue
             if len(content) > self.max_chars:
                 content = content[: self.max_chars] + "..."
             results.append(content)
-            documents.append(doc.metadata["Title"] or "Unknown source")
+            documents.append(paper.title or "Unknown source")
         print(f"ArxivFetcher found {len(results)} documents: {documents}")
         return FetcherResult(results, documents)
@@ -0,0 +1,261 @@
+"""
+Offline arXiv search over a local SQLite FTS5 index built from arXiv metadata dumps.
+
+Build or refresh the index from the JSON-lines metadata snapshot:
+    python -m app.fetchers.arxiv_index ingest arxiv-metadata-oai-snapshot.json --index arxiv.sqlite
+"""
+import argparse
+import json
+import os
+import sqlite3
+import threading
+from dataclasses import dataclass
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+from app.fetchers import Fetcher, MAX_CHARACTERS, TOP_K_RESULTS
+from app.fetchers.text_search import to_match_expression
+from app.models.results import FetcherResult
+
+ARXIV_INDEX_LIVE = "live"
+ARXIV_INDEX_LOCAL = "local"
+ARXIV_INDEX_HYBRID = "hybrid"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS papers (
+    rowid INTEGER PRIMARY KEY,
+    arxiv_id TEXT NOT NULL UNIQUE,
+    title TEXT NOT NULL,
+    abstract TEXT NOT NULL,
+    authors TEXT NOT NULL,
+    categories TEXT NOT NULL,
+    updated TEXT NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS papers_fts USING fts5(
+    title, abstract, authors, categories,
+    content='papers', content_rowid='rowid', tokenize='porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS papers_ai AFTER INSERT ON papers BEGIN
+    INSERT INTO papers_fts(rowid, title, abstract, authors, categories)
+    VALUES (new.rowid, new.title, new.abstract, new.authors, new.categories);
+END;
+CREATE TRIGGER IF NOT EXISTS papers_ad AFTER DELETE ON papers BEGIN
+    INSERT INTO papers_fts(papers_fts, rowid, title, abstract, authors, categories)
+    VALUES ('delete', old.rowid, old.title, old.abstract, old.authors, old.categories);
+END;
+CREATE TRIGGER IF NOT EXISTS papers_au AFTER UPDATE ON papers BEGIN
+    INSERT INTO papers_fts(papers_fts, rowid, title, abstract, authors, categories)
+    VALUES ('delete', old.rowid, old.title, old.abstract, old.authors, old.categories);
+    INSERT INTO papers_fts(rowid, title, abstract, authors, categories)
+    VALUES (new.rowid, new.title, new.abstract, new.authors, new.categories);
+END;
+"""
+
+# Title matches weigh most, then abstract, categories and authors
+_BM25_WEIGHTS = (10.0, 1.0, 0.5, 2.0)
+
+@dataclass
+class ArxivPaper:
+    """A paper from the local index with its BM25 relevance score (higher is better)."""
+    arxiv_id: str
+    title: str
+    abstract: str
+    authors: str
+    categories: str
+    score: float
+
+
+def _clean(text: Optional[str]) -> str:
+    return " ".join((text or "").split())
+
+
+class ArxivIndex:
+    """
+    SQLite FTS5 index of arXiv metadata with BM25 ranking.
+
+    Each thread gets its own connection; the database runs in WAL mode so searches
+    never wait for an ingest in progress.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._connection().executescript(_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def ingest(self, records: Iterable[dict], batch_size: int = 5000) -> Tuple[int, int]:
+        """
+        Inserts new papers and updates changed ones, skipping papers whose update date
+        is unchanged. Returns the number of (inserted, updated) papers.
+        """
+        connection = self._connection()
+        inserted = updated = 0
+        batch: List[tuple] = []
+
+        def flush():
+            nonlocal inserted, updated
+            with connection:
+                for arxiv_id, title, abstract, authors, categories, update_date in batch:
+                    existing = connection.execute(
+                        "SELECT updated FROM papers WHERE arxiv_id = ?", (arxiv_id,)).fetchone()
+                    if existing is None:
+                        connection.execute(
+                            "INSERT INTO papers (arxiv_id, title, abstract, authors, categories, updated) "
+                            "VALUES (?, ?, ?, ?, ?, ?)",
+                            (arxiv_id, title, abstract, authors, categories, update_date))
+                        inserted += 1
+                    elif existing[0] != update_date:
+                        connection.execute(
+                            "UPDATE papers SET title = ?, abstract = ?, authors = ?, categories = ?, updated = ? "
+                            "WHERE arxiv_id = ?",
+                            (title, abstract, authors, categories, update_date, arxiv_id))
+                        updated += 1
+            batch.clear()
+
+        for record in records:
+            arxiv_id = (record.get("id") or "").strip()
+            title = _clean(record.get("title"))
+            if not arxiv_id or not title:
+                continue
+            batch.append((arxiv_id, title, _clean(record.get("abstract")), _clean(record.get("authors")),
+                          _clean(record.get("categories")), record.get("update_date") or ""))
+            if len(batch) >= batch_size:
+                flush()
+        flush()
+        return inserted, updated
+
+    def search(self, query: str, limit: int = TOP_K_RESULTS) -> List[ArxivPaper]:
+        expression = to_match_expression(query)
+        if not expression:
+            return []
+        rows = self._connection().execute(
+            "SELECT p.arxiv_id, p.title, p.abstract, p.authors, p.categories, bm25(papers_fts, ?, ?, ?, ?) AS rank "
+            "FROM papers_fts JOIN papers p ON p.rowid = papers_fts.rowid "
+            "WHERE papers_fts MATCH ? ORDER BY rank LIMIT ?",
+            (*_BM25_WEIGHTS, expression, limit)).fetchall()
+        return [ArxivPaper(*row[:5], score=-row[5]) for row in rows]
+
+    def count(self) -> int:
+        return self._connection().execute("SELECT count(*) FROM papers").fetchone()[0]
+
+
+def read_metadata_dump(path: str) -> Iterator[dict]:
+    """
+    Streams records from an arXiv JSON-lines metadata snapshot.
+    """
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+_indexes = {}
+
+
+def get_arxiv_index() -> ArxivIndex:
+    """
+    Returns the index at ARXIV_INDEX_PATH, opened once per process.
+    """
+    path = os.getenv("ARXIV_INDEX_PATH")
+    if not path:
+        raise ValueError("ARXIV_INDEX_PATH must be set to use the local arXiv index")
+    if path not in _indexes:
+        _indexes[path] = ArxivIndex(path)
+    return _indexes[path]
+
+
+def arxiv_index_mode() -> str:
+    """
+    Returns ARXIV_INDEX_MODE: live (default), local or hybrid.
+    """
+    mode = (os.getenv("ARXIV_INDEX_MODE") or ARXIV_INDEX_LIVE).strip().lower()
+    if mode not in (ARXIV_INDEX_LIVE, ARXIV_INDEX_LOCAL, ARXIV_INDEX_HYBRID):
+        raise ValueError(f"Unknown arXiv index mode {mode}, expected live, local or hybrid")
+    return mode
+
+
+class LocalArxivFetcher(Fetcher):
+    """
+    Fetcher searching the local arXiv metadata index.
+    """
+    source = "arxiv_local"
+
+    def __init__(self, index: Optional[ArxivIndex] = None):
+        self.index = index or get_arxiv_index()
+        self.max_chars = MAX_CHARACTERS
+        self.top_k = TOP_K_RESULTS
+        self.min_score = float(os.getenv("ARXIV_INDEX_MIN_SCORE", "0"))
+
+    def search_papers(self, query: str) -> List[ArxivPaper]:
+        return self.index.search(query, self.top_k)
+
+    def search(self, query: str, terms:str="") -> FetcherResult:
+        """
+        Returns abstracts from the local arXiv index relevant to the query.
+        """
+        return self._to_result(self.search_papers(query))
+
+    def _to_result(self, papers: List[ArxivPaper]) -> FetcherResult:
+        results: List[str] = []
+        documents: List[str] = []
+        for paper in papers:
+            content = paper.abstract
+            if not content:
+                continue
+            if len(content) > self.max_chars:
+                content = content[: self.max_chars] + "..."
+            results.append(content)
+            documents.append(paper.title or "Unknown source")
+        print(f"LocalArxivFetcher found {len(results)} documents: {documents}")
+        return FetcherResult(results, documents)
+
+
+class HybridArxivFetcher(LocalArxivFetcher):
+    """
+    Searches the local index first and only calls the live arXiv API when it has
+    no hit scoring at least ARXIV_INDEX_MIN_SCORE.
+    """
+
+    def __init__(self, live_fetcher: Callable[[], Fetcher], index: Optional[ArxivIndex] = None):
+        super().__init__(index)
+        self.live_fetcher = live_fetcher
+
+    def search(self, query: str, terms:str="") -> FetcherResult:
+        papers = self.search_papers(query)
+        if papers and papers[0].score >= self.min_score:
+            return self._to_result(papers)
+        print("Local arXiv index has no good hits, searching the live arXiv API...")
+        return self.live_fetcher().configure(self.top_k, self.max_chars).search(query, terms)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Build and query the local arXiv index")
+    parser.add_argument("--index", default=os.getenv("ARXIV_INDEX_PATH"), help="Path of the SQLite index")
+    commands = parser.add_subparsers(dest="command", required=True)
+    ingest = commands.add_parser("ingest", help="Add or update papers from a JSON-lines metadata dump")
+    ingest.add_argument("dump")
+    search = commands.add_parser("search", help="Search the index")
+    search.add_argument("query")
+    args = parser.parse_args(argv)
+
+    if not args.index:
+        parser.error("--index or ARXIV_INDEX_PATH is required")
+    index = ArxivIndex(args.index)
+    if args.command == "ingest":
+        inserted, updated = index.ingest(read_metadata_dump(args.dump))
+        print(f"Inserted {inserted} and updated {updated} papers, {index.count()} papers indexed")
+    else:
+        for paper in index.search(args.query):
+            print(f"{paper.score:8.2f}  {paper.arxiv_id}  {paper.title}")
+
+
+if __name__ == "__main__":
+    main()
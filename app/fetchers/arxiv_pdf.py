@@ -0,0 +1,227 @@
+"""
+Full-text extraction of arXiv PDFs for the deep arXiv mode.
+
+PDFs are downloaded concurrently under one deadline per search and parsed page by
+page in a process pool, so the CPU-bound work never runs on the server's threads.
+The extracted pages are cached on disk by versioned arXiv id, so each version of a
+paper is downloaded and parsed once.
+"""
+import gzip
+import json
+import math
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from app.fetchers.rate_limit import RateLimitExceeded
+from app.fetchers.text_search import significant_terms
+
+PDF_TIMEOUT = 30.0
+# Papers whose full text is not ready this long after the search are returned as abstracts
+PDF_DEADLINE = 10.0
+
+
+@dataclass(frozen=True)
+class PdfLimits:
+    """Bounds on the work and memory spent on one document."""
+    max_pages: int = 30
+    max_bytes: int = 20 * 1024 * 1024
+
+
+class PdfTooLarge(ValueError):
+    pass
+
+
+def arxiv_deep_mode() -> bool:
+    """
+    Returns whether ARXIV_DEEP_MODE asks for full-text extraction of the top arXiv hits.
+    """
+    return (os.getenv("ARXIV_DEEP_MODE") or "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def pdf_limits() -> PdfLimits:
+    return PdfLimits(max_pages=int(os.getenv("ARXIV_PDF_MAX_PAGES", "30")),
+                     max_bytes=int(os.getenv("ARXIV_PDF_MAX_BYTES", str(20 * 1024 * 1024))))
+
+
+def extract_pages(pdf: bytes, max_pages: int) -> List[str]:
+    """
+    Returns the text of the first max_pages pages of the PDF. Runs in pool workers.
+    """
+    import fitz
+
+    with fitz.open(stream=pdf, filetype="pdf") as document:
+        return [" ".join(document[number].get_text().split())
+                for number in range(min(max_pages, document.page_count))]
+
+
+def download_pdf(url: str, max_bytes: int) -> bytes:
+    """
+    Downloads the PDF, giving up as soon as it grows past max_bytes.
+    """
+    with httpx.stream("GET", url, follow_redirects=True, timeout=PDF_TIMEOUT) as response:
+        response.raise_for_status()
+        if int(response.headers.get("Content-Length") or 0) > max_bytes:
+            raise PdfTooLarge(f"{url} is larger than {max_bytes} bytes")
+        chunks = []
+        size = 0
+        for chunk in response.iter_bytes():
+            size += len(chunk)
+            if size > max_bytes:
+                raise PdfTooLarge(f"{url} is larger than {max_bytes} bytes")
+            chunks.append(chunk)
+        return b"".join(chunks)
+
+
+class PdfTextCache:
+    """
+    Extracted pages stored as gzipped JSON files named by versioned arXiv id.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _path(self, paper_id: str) -> str:
+        # Old-style ids such as hep-th/9901001v1 contain a slash
+        return os.path.join(self.directory, f"{paper_id.replace('/', '_')}.json.gz")
+
+    def get(self, paper_id: str) -> Optional[List[str]]:
+        try:
+            with gzip.open(self._path(paper_id), "rt", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def put(self, paper_id: str, pages: List[str]):
+        path = self._path(paper_id)
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump(pages, f, separators=(",", ":"), ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def get_pdf_executor() -> ProcessPoolExecutor:
+    """
+    Returns the process-wide pool for PDF parsing, sized by ARXIV_PDF_WORKERS.
+    """
+    global _executor
+    if _executor is None:
+        workers = int(os.getenv("ARXIV_PDF_WORKERS") or min(4, os.cpu_count() or 1))
+        # The server runs several threads, which are not safe to fork
+        _executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    return _executor
+
+
+def _term_pattern(term: str) -> re.Pattern:
+    # Match on a prefix so that plurals and other inflections still count
+    return re.compile(r"\b" + re.escape(term[:max(4, len(term) - 2)]))
+
+
+def relevant_text(pages: List[str], query: str, max_chars: int) -> str:
+    """
+    Picks the pages that best match the query, up to max_chars, and returns them in
+    document order. Pages are scored by how many query terms they mention, damping
+    repeated mentions of the same term.
+    """
+    patterns = [_term_pattern(term) for term in significant_terms(query)]
+    scored = []
+    for number, page in enumerate(pages):
+        lowered = page.lower()
+        score = sum(math.log1p(len(pattern.findall(lowered))) for pattern in patterns)
+        if page and (score > 0 or not patterns):
+            scored.append((score, number))
+    scored.sort(key=lambda item: (-item[0], item[1]))
+
+    chosen = []
+    remaining = max_chars
+    for _, number in scored:
+        if remaining <= 0:
+            break
+        chosen.append((number, pages[number][:remaining]))
+        remaining -= len(pages[number])
+    return "\n\n".join(text for _, text in sorted(chosen))
+
+
+class ArxivPdfExtractor:
+    """
+    Downloads, parses and caches the full text of arXiv papers.
+    """
+
+    def __init__(self, cache: PdfTextCache, limits: PdfLimits = PdfLimits(), executor: Optional[Executor] = None,
+                 download: Callable[[str, int], bytes] = download_pdf, deadline: float = PDF_DEADLINE,
+                 download_workers: int = 5):
+        self.cache = cache
+        self.limits = limits
+        self.executor = executor
+        self.download = download
+        self.deadline = deadline
+        self._downloads = ThreadPoolExecutor(max_workers=download_workers, thread_name_prefix="arxiv-pdf")
+
+    def _extract(self, paper_id: str, url: str, before_download: Optional[Callable[[], None]]) -> List[str]:
+        if before_download is not None:
+            before_download()
+        pdf = self.download(url, self.limits.max_bytes)
+        pages = (self.executor or get_pdf_executor()).submit(extract_pages, pdf, self.limits.max_pages).result()
+        # Cached even when the search stopped waiting for it, so the next search has it
+        self.cache.put(paper_id, pages)
+        return pages
+
+    def pages(self, papers: List[Tuple[str, str]],
+              before_download: Optional[Callable[[], None]] = None) -> Dict[str, List[str]]:
+        """
+        Returns the pages of each (versioned arXiv id, PDF URL) pair. Uncached papers are
+        downloaded concurrently, each after `before_download` (which charges the rate
+        limit), and parsed in parallel. Papers that fail, exceed the limits or are not
+        ready within the deadline are left out.
+        """
+        started = time.monotonic()
+        found: Dict[str, List[str]] = {}
+        pending = {}
+        for paper_id, url in papers:
+            cached = self.cache.get(paper_id)
+            if cached is not None:
+                found[paper_id] = cached
+            else:
+                pending[self._downloads.submit(self._extract, paper_id, url, before_download)] = paper_id
+        if not pending:
+            return found
+
+        done, late = wait(pending, timeout=max(0.0, self.deadline - (time.monotonic() - started)))
+        for future in done:
+            paper_id = pending[future]
+            try:
+                found[paper_id] = future.result()
+            except (httpx.HTTPError, PdfTooLarge, RateLimitExceeded) as e:
+                print(f"Skipping PDF of arXiv {paper_id}: {e}")
+            except Exception as e:
+                print(f"Could not extract the PDF of arXiv {paper_id}: {e}")
+        for future in late:
+            # Downloads that have not started yet are dropped, the others finish into the cache
+            future.cancel()
+            print(f"PDF of arXiv {pending[future]} missed the {self.deadline}s deadline")
+        return found
+
+
+_extractors: Dict[str, ArxivPdfExtractor] = {}
+
+
+def get_pdf_extractor() -> ArxivPdfExtractor:
+    """
+    Returns the extractor caching into ARXIV_PDF_CACHE_DIR, waiting ARXIV_PDF_DEADLINE
+    seconds at most for the full texts of one search.
+    """
+    directory = os.getenv("ARXIV_PDF_CACHE_DIR") or ".arxiv_pdf_cache"
+    if directory not in _extractors:
+        _extractors[directory] = ArxivPdfExtractor(PdfTextCache(directory), pdf_limits(),
+                                                   deadline=float(os.getenv("ARXIV_PDF_DEADLINE", str(PDF_DEADLINE))))
+    return _extractors[directory]
@@ -3,7 +3,9 @@ from typing import List
 from langchain_community.utilities import DuckDuckGoSearchAPIWrapper
 
 from app.fetchers import Fetcher, TOP_K_RESULTS, MAX_CHARACTERS
+from app.fetchers.rate_limit import RateLimit, rate_limited
 from app.models.results import FetcherResult
+from app.utils.resilience import resilient
 
 
 class DuckDuckGoFetcher(Fetcher):
@@ -11,12 +13,17 @@ class DuckDuckGoFetcher(Fetcher):
     Fetcher around LangChain's DuckDuckGoSearchAPIWrapper for general web information
     such as travel, hotels, news, and sports.
     """
+    source = "duckduckgo"
+    # DuckDuckGo has no published limit but throttles bursts aggressively
+    rate_limit = RateLimit(rate=1, burst=3, max_wait=5.0)
 
     def __init__(self):
         self.wrapper = DuckDuckGoSearchAPIWrapper()
         self.max_chars = MAX_CHARACTERS
         self.top_k = TOP_K_RESULTS
 
+    @resilient
+    @rate_limited
     def search(self, query: str, terms:str="") -> FetcherResult:
         results_raw = self.wrapper.results(query, max_results=self.top_k)
         results: List[str] = []
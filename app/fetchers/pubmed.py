@@ -1,37 +1,193 @@
 import os
-from typing import List
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
 
-from langchain_community.utilities.pubmed import PubMedAPIWrapper
+import httpx
+import xmltodict
 
 from app.fetchers import TOP_K_RESULTS, Fetcher, MAX_CHARACTERS
+from app.fetchers.rate_limit import RateLimit, rate_limited
 from app.models.results import FetcherResult
+from app.utils.aio import run_sync
+from app.utils.resilience import resilient
+
+# E-utilities allow 3 requests per second without an API key and 10 with one
+PUBMED_RATE_LIMIT = RateLimit(rate=3, burst=3, max_wait=10.0)
+PUBMED_KEYED_RATE_LIMIT = RateLimit(rate=10, burst=10, max_wait=10.0)
+
+EUTILS_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
+PUBMED_TIMEOUT = 15.0
+
+# Inline formatting inside titles and abstracts, which would otherwise split their text
+_INLINE_MARKUP = re.compile(rb"</?(?:i|b|u|sup|sub|em|strong|mml:[a-z]+)(?:\s[^>]*)?>")
+
+
+@dataclass
+class PubMedArticle:
+    """The fields of a PubMed article used for research."""
+    pmid: str
+    title: str
+    abstract: str
+    year: Optional[str]
+
+
+def _text(node: Any) -> str:
+    """
+    Flattens an xmltodict node (string, element with attributes or list of them) to text.
+    """
+    if node is None:
+        return ""
+    if isinstance(node, str):
+        return node
+    if isinstance(node, list):
+        return " ".join(filter(None, (_text(item) for item in node)))
+    if isinstance(node, dict):
+        text = node.get("#text", "")
+        label = node.get("@Label")
+        return f"{label}: {text}" if label and text else text
+    return str(node)
+
+
+def _parse_article(item: Dict[str, Any]) -> PubMedArticle:
+    citation = item.get("MedlineCitation") or {}
+    article = citation.get("Article") or {}
+    pub_date = ((article.get("Journal") or {}).get("JournalIssue") or {}).get("PubDate") or {}
+    return PubMedArticle(
+        pmid=_text(citation.get("PMID")),
+        title=_text(article.get("ArticleTitle")).strip(),
+        abstract=_text((article.get("Abstract") or {}).get("AbstractText")).strip(),
+        year=pub_date.get("Year") or (pub_date.get("MedlineDate") or "")[:4] or None,
+    )
+
+
+def parse_efetch(xml: bytes) -> List[PubMedArticle]:
+    """
+    Parses an efetch PubmedArticleSet, handing over one article at a time so that
+    the whole document tree is never materialized.
+    """
+    articles: List[PubMedArticle] = []
+
+    def on_article(path: List[Tuple[str, Any]], item: Any) -> bool:
+        if path[-1][0] == "PubmedArticle" and isinstance(item, dict):
+            articles.append(_parse_article(item))
+        return True
+
+    xmltodict.parse(_INLINE_MARKUP.sub(b"", xml), item_depth=2, item_callback=on_article)
+    return articles
+
+
+class PubMedClient:
+    """
+    Async E-utilities client: one esearch with usehistory=y, then one batched efetch
+    of all matching articles from the search history.
+    """
+
+    def __init__(self, base_url: str = EUTILS_URL, api_key: Optional[str] = None, email: Optional[str] = None,
+                 timeout: float = PUBMED_TIMEOUT):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.email = email
+        self.timeout = timeout
+        self._http: Optional[httpx.AsyncClient] = None
+
+    def _params(self, **params) -> Dict[str, Any]:
+        params = {"db": "pubmed", "tool": "research-agent", **params}
+        if self.api_key:
+            params["api_key"] = self.api_key
+        if self.email:
+            params["email"] = self.email
+        return params
+
+    def _client(self) -> httpx.AsyncClient:
+        if self._http is None:
+            self._http = httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout)
+        return self._http
+
+    async def esearch(self, term: str, retmax: int) -> Tuple[int, Optional[str], Optional[str]]:
+        """
+        Returns the hit count, WebEnv and query_key of the search stored on the history server.
+        """
+        response = await self._client().get(
+            "/esearch.fcgi", params=self._params(term=term, retmax=retmax, usehistory="y", retmode="json"))
+        response.raise_for_status()
+        result = response.json().get("esearchresult", {})
+        return int(result.get("count", 0)), result.get("webenv"), result.get("querykey")
+
+    async def efetch(self, webenv: str, query_key: str, retmax: int) -> List[PubMedArticle]:
+        response = await self._client().get(
+            "/efetch.fcgi",
+            params=self._params(WebEnv=webenv, query_key=query_key, retstart=0, retmax=retmax,
+                                retmode="xml", rettype="abstract"))
+        response.raise_for_status()
+        return parse_efetch(response.content)
+
+    async def search(self, term: str, retmax: int = TOP_K_RESULTS) -> List[PubMedArticle]:
+        count, webenv, query_key = await self.esearch(term, retmax)
+        if not count or not webenv or not query_key:
+            return []
+        return await self.efetch(webenv, query_key, retmax)
+
+    async def warm(self):
+        """
+        Opens a pooled connection (DNS and TLS) to E-utilities without running a search.
+        """
+        await self._client().head("/einfo.fcgi")
+
+    async def aclose(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+
+_clients: Dict[Tuple[str, Optional[str], Optional[str]], PubMedClient] = {}
+
+
+def get_pubmed_client() -> PubMedClient:
+    """
+    Returns the shared client for the configured endpoint and credentials, whose
+    connection pool lives on the background event loop.
+    """
+    config = (os.getenv("PUBMED_EUTILS_URL") or EUTILS_URL, os.getenv("PUBMED_API_KEY"), os.getenv("PUBMED_EMAIL"))
+    client = _clients.get(config)
+    if client is None:
+        client = _clients.setdefault(config, PubMedClient(*config))
+    return client
 
 
 class PubMedFetcher(Fetcher):
     """
-    Fetcher around LangChain's PubMedAPIWrapper to fetch medical literature.
+    Fetcher around a native E-utilities client to fetch medical literature.
     """
+    source = "pubmed"
+    # One esearch plus one batched efetch
+    requests_per_search = 2
+
     def __init__(self):
-        self.wrapper = PubMedAPIWrapper(top_k_results=TOP_K_RESULTS, load_max_docs=TOP_K_RESULTS,
-                                        email=os.getenv("PUBMED_EMAIL"),
-                                        api_key=os.getenv("PUBMED_API_KEY")
-                                        )
+        self.client = get_pubmed_client()
         self.max_chars = MAX_CHARACTERS
+        self.top_k = TOP_K_RESULTS
+        self.rate_limit = PUBMED_KEYED_RATE_LIMIT if self.client.api_key else PUBMED_RATE_LIMIT
 
+    @resilient
+    @rate_limited
     def search(self, query: str, terms:str="") -> FetcherResult:
         """
         Returns a list of string snippets from PubMed relevant to the terms.
         """
-        docs = self.wrapper.load(terms)
+        articles = run_sync(self.client.search(terms or query, self.top_k), timeout=2 * self.client.timeout)
         results: List[str] = []
         documents: List[str] = []
-        for doc in docs:
-            content = (doc['Summary'] or "").strip()
+        for article in articles:
+            content = article.abstract
             if not content:
                 continue
             if len(content) > self.max_chars:
                 content = content[: self.max_chars] + "..."
             results.append(content)
-            documents.append(doc['Title'] or "Unknown source")
+            documents.append(article.title or "Unknown source")
         print(f"PubMedFetcher found {len(results)} summaries: {documents}")
         return FetcherResult(results, documents)
+
+    def warm(self):
+        run_sync(self.client.warm(), timeout=self.client.timeout)
@@ -0,0 +1,159 @@
+import functools
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional
+
+from pymongo import ReturnDocument
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    """Sustained requests per second, burst size and longest time a caller may queue."""
+    rate: float
+    burst: int = 1
+    max_wait: float = 10.0
+
+
+class RateLimitExceeded(TimeoutError):
+    """Raised when a caller would have to queue longer than the limit's max_wait."""
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket shared by every fetcher of one upstream in this worker.
+
+    Callers reserve a token up front and then sleep until it is theirs, so waiting
+    callers are served in arrival order instead of racing for refills.
+    """
+
+    def __init__(self, name: str, limit: RateLimit,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        self.name = name
+        self.limit = limit
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = float(limit.burst)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _reserve(self, cost: float) -> float:
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.limit.burst, self._tokens + (now - self._updated) * self.limit.rate)
+            self._updated = now
+
+            wait = max(0.0, (cost - self._tokens) / self.limit.rate)
+            if wait > self.limit.max_wait:
+                raise RateLimitExceeded(
+                    f"Rate limit for {self.name} would queue for {wait:.1f}s, more than {self.limit.max_wait}s")
+            self._tokens -= cost
+            return wait
+
+    def acquire(self, cost: float = 1) -> float:
+        """
+        Blocks until `cost` requests may be sent upstream and returns the time spent queueing.
+        Raises ValueError for a cost above the burst, which would queue even on an idle worker.
+        """
+        if cost > self.limit.burst:
+            raise ValueError(f"A cost of {cost} requests exceeds the {self.name} burst of {self.limit.burst}")
+        wait = self._reserve(cost)
+        if wait:
+            self._sleep(wait)
+        return wait
+
+
+class MongoTokenBucket(TokenBucket):
+    """
+    Token bucket kept in a MongoDB document so that all workers share one budget.
+
+    The refill and reservation happen in a single atomic pipeline update.
+    """
+
+    def __init__(self, name: str, limit: RateLimit, collection, sleep: Callable[[float], None] = time.sleep):
+        super().__init__(name, limit, sleep=sleep)
+        self.collection = collection
+
+    def _reserve(self, cost: float) -> float:
+        now = time.time()
+        rate, burst = self.limit.rate, self.limit.burst
+        elapsed = {"$max": [0, {"$subtract": [now, {"$ifNull": ["$updated", now]}]}]}
+        refilled = {"$min": [burst, {"$add": [{"$ifNull": ["$tokens", burst]}, {"$multiply": [elapsed, rate]}]}]}
+        bucket = self.collection.find_one_and_update(
+            {"_id": self.name},
+            [
+                {"$set": {"tokens": refilled, "updated": now}},
+                {"$set": {"granted": {"$lte": [{"$subtract": [cost, "$tokens"]}, self.limit.max_wait * rate]}}},
+                {"$set": {"tokens": {"$cond": ["$granted", {"$subtract": ["$tokens", cost]}, "$tokens"]}}},
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        if not bucket["granted"]:
+            raise RateLimitExceeded(f"Shared rate limit for {self.name} would queue more than {self.limit.max_wait}s")
+        return max(0.0, -bucket["tokens"] / rate)
+
+
+_queueing = threading.local()
+
+
+def queued_seconds() -> float:
+    """
+    Total time the current thread has spent queueing on rate limiters.
+    """
+    return getattr(_queueing, "seconds", 0.0)
+
+
+_limiters: Dict[str, TokenBucket] = {}
+_limiters_lock = threading.Lock()
+
+
+def _create_limiter(source: str, limit: RateLimit) -> TokenBucket:
+    if (os.getenv("RATE_LIMIT_BACKEND") or "local").lower() == "mongo":
+        from app.core.db import get_client
+
+        collection = get_client().delegate[os.getenv("MONGODB_DB")]["rate_limits"]
+        return MongoTokenBucket(source, limit, collection)
+    return TokenBucket(source, limit)
+
+
+def get_limiter(source: str, limit: RateLimit) -> TokenBucket:
+    """
+    Returns the limiter shared by all fetchers of the source, creating it on first use.
+    Set RATE_LIMIT_BACKEND=mongo to share the budget across workers through MongoDB.
+    """
+    limiter = _limiters.get(source)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.get(source)
+            if limiter is None:
+                limiter = _limiters[source] = _create_limiter(source, limit)
+    return limiter
+
+
+def charge_rate_limit(fetcher, cost: float):
+    """
+    Queues on the shared limiter of the fetcher's source for `cost` upstream requests.
+    Raises RateLimitExceeded when that would take longer than the limit's max_wait.
+    """
+    limit: Optional[RateLimit] = getattr(fetcher, "rate_limit", None)
+    if limit is None:
+        return
+    waited = get_limiter(fetcher.source, limit).acquire(cost)
+    if waited:
+        _queueing.seconds = queued_seconds() + waited
+        print(f"{type(fetcher).__name__} queued {waited:.2f}s for the {fetcher.source} rate limit")
+
+
+def rate_limited(search):
+    """
+    Decorates a fetcher's search to first queue on the shared limiter of its source
+    for the number of upstream requests one search makes.
+    """
+    @functools.wraps(search)
+    def wrapper(self, *args, **kwargs):
+        charge_rate_limit(self, self.requests_per_search)
+        return search(self, *args, **kwargs)
+
+    return wrapper
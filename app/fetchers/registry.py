@@ -0,0 +1,43 @@
+"""
+Registry of fetcher implementations, imported on first use.
+
+Importing a fetcher pulls in its client library, so a worker only pays for the
+sources it actually queries instead of all of them at boot.
+"""
+import importlib
+import threading
+from typing import Dict, Type
+
+from app.fetchers import Fetcher
+
+FETCHERS: Dict[str, str] = {
+    "pubmed": "app.fetchers.pubmed:PubMedFetcher",
+    "arxiv": "app.fetchers.arxiv:ArxivFetcher",
+    "arxiv_local": "app.fetchers.arxiv_index:LocalArxivFetcher",
+    "arxiv_hybrid": "app.fetchers.arxiv_index:HybridArxivFetcher",
+    "wikipedia": "app.fetchers.wikipedia:WikipediaFetcher",
+    "wikipedia_local": "app.fetchers.wikipedia_local:LocalWikipediaFetcher",
+    "duckduckgo": "app.fetchers.duckduckgo:DuckDuckGoFetcher",
+}
+
+_classes: Dict[str, Type[Fetcher]] = {}
+_lock = threading.Lock()
+
+
+def get_fetcher_class(name: str) -> Type[Fetcher]:
+    """
+    Returns the fetcher class registered under the name, importing its module on first use.
+    """
+    fetcher_class = _classes.get(name)
+    if fetcher_class is None:
+        if name not in FETCHERS:
+            raise KeyError(f"Unknown fetcher {name}")
+        module_name, class_name = FETCHERS[name].split(":")
+        # Module imports hold the import lock anyway; this keeps concurrent first uses from racing the cache
+        with _lock:
+            fetcher_class = _classes.setdefault(name, getattr(importlib.import_module(module_name), class_name))
+    return fetcher_class
+
+
+def create_fetcher(name: str, *args, **kwargs) -> Fetcher:
+    return get_fetcher_class(name)(*args, **kwargs)
@@ -0,0 +1,22 @@
+import re
+from typing import List
+
+_STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how in is it of on or that the this to was what when "
+    "where which who why with about into than then there these those their paper papers research".split()
+)
+
+
+def significant_terms(query: str) -> List[str]:
+    """
+    Returns the distinct lowercase terms of the query, without stopwords and single characters.
+    """
+    terms = [term for term in re.findall(r"\w+", query.lower()) if term not in _STOPWORDS and len(term) > 1]
+    return list(dict.fromkeys(terms))
+
+
+def to_match_expression(query: str) -> str:
+    """
+    Turns free text into an SQLite FTS5 expression matching any of its significant terms.
+    """
+    return " OR ".join(f'"{term}"' for term in significant_terms(query))
@@ -3,18 +3,30 @@ from typing import List
 from langchain_community.utilities import WikipediaAPIWrapper
 
 from app.fetchers import Fetcher, MAX_CHARACTERS, TOP_K_RESULTS
+from app.fetchers.rate_limit import RateLimit, rate_limited
 from app.models.results import FetcherResult
+from app.utils.resilience import resilient
 
 
 class WikipediaFetcher(Fetcher):
     """
     Fetcher around LangChain's WikipediaAPIWrapper for general factual knowledge.
     """
+    source = "wikipedia"
+    rate_limit = RateLimit(rate=5, burst=5, max_wait=5.0)
 
     def __init__(self):
         self.wrapper = WikipediaAPIWrapper(top_k_results=TOP_K_RESULTS, doc_content_chars_max=MAX_CHARACTERS)
         self.max_chars = MAX_CHARACTERS
+        self.top_k = TOP_K_RESULTS
 
+    def configure(self, top_k: int, max_chars: int) -> Fetcher:
+        self.wrapper.top_k_results = top_k
+        self.wrapper.doc_content_chars_max = max_chars
+        return super().configure(top_k, max_chars)
+
+    @resilient
+    @rate_limited
     def search(self, query: str, terms:str="") -> FetcherResult:
         docs = self.wrapper.load(query)
         results: List[str] = []
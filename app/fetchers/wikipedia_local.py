@@ -0,0 +1,263 @@
+"""
+Offline Wikipedia search over a local store built from an abstracts dump.
+
+The store is a directory holding:
+    articles.dat   title, URL and abstract of every article, back to back (UTF-8)
+    offsets.dat    native uint64 start offset of each article plus the end offset
+    index.sqlite   contentless FTS5 index of titles and abstracts, keyed by article number
+
+Article text is only read through read-only memory maps, so every worker process
+serves pages from the shared OS page cache instead of loading its own copy.
+
+Build a store from enwiki-latest-abstract.xml[.gz] or a JSON-lines file of
+{"title", "url", "abstract"} records:
+    python -m app.fetchers.wikipedia_local build enwiki-latest-abstract.xml.gz --store wikipedia
+"""
+import argparse
+import gzip
+import json
+import mmap
+import os
+import sqlite3
+import threading
+import xml.etree.ElementTree as ElementTree
+from array import array
+from dataclasses import dataclass
+from typing import IO, Iterable, Iterator, List, Optional
+
+from app.fetchers import Fetcher, MAX_CHARACTERS, TOP_K_RESULTS
+from app.fetchers.text_search import to_match_expression
+from app.models.results import FetcherResult
+
+ARTICLES_FILE = "articles.dat"
+OFFSETS_FILE = "offsets.dat"
+INDEX_FILE = "index.sqlite"
+
+_SCHEMA = """
+CREATE VIRTUAL TABLE articles USING fts5(
+    title, abstract, content='', tokenize='porter unicode61'
+);
+"""
+
+# Title matches weigh most
+_BM25_WEIGHTS = (10.0, 1.0)
+
+# Let SQLite map the index too, so its pages are shared between workers as well
+_INDEX_MMAP_SIZE = 1 << 30
+
+_SEPARATOR = "\0"
+_DUMP_TITLE_PREFIX = "Wikipedia: "
+
+
+@dataclass
+class WikipediaArticle:
+    """An article from the local store with its BM25 relevance score (higher is better)."""
+    title: str
+    url: str
+    abstract: str
+    score: float = 0.0
+
+
+def _clean(text: Optional[str]) -> str:
+    return " ".join((text or "").replace(_SEPARATOR, " ").split())
+
+
+def _map(path: str):
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        # The mapping stays valid after the file is closed
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class WikipediaStore:
+    """
+    Read-only view of a store directory. Searches run against the FTS5 index and
+    only the matching articles are read from the memory-mapped article file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._articles = _map(os.path.join(path, ARTICLES_FILE))
+        self._offsets = memoryview(_map(os.path.join(path, OFFSETS_FILE))).cast("Q")
+        if len(self._offsets) == 0:
+            raise ValueError(f"{path} is not a Wikipedia store, its offsets file is empty")
+        self._local = threading.local()
+        self._connection()
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            index_path = os.path.abspath(os.path.join(self.path, INDEX_FILE))
+            connection = sqlite3.connect(f"file:{index_path}?mode=ro", uri=True)
+            connection.execute(f"PRAGMA mmap_size={_INDEX_MMAP_SIZE}")
+            self._local.connection = connection
+        return connection
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def article(self, number: int, score: float = 0.0) -> WikipediaArticle:
+        if not 0 <= number < len(self):
+            raise KeyError(f"Article {number} not found")
+        data = self._articles[self._offsets[number]:self._offsets[number + 1]]
+        title, url, abstract = data.decode("utf-8").split(_SEPARATOR, 2)
+        return WikipediaArticle(title, url, abstract, score)
+
+    def search(self, query: str, limit: int = TOP_K_RESULTS) -> List[WikipediaArticle]:
+        expression = to_match_expression(query)
+        if not expression:
+            return []
+        rows = self._connection().execute(
+            "SELECT rowid, bm25(articles, ?, ?) AS rank FROM articles WHERE articles MATCH ? ORDER BY rank LIMIT ?",
+            (*_BM25_WEIGHTS, expression, limit)).fetchall()
+        return [self.article(rowid, score=-rank) for rowid, rank in rows]
+
+
+def build_store(records: Iterable[dict], path: str, batch_size: int = 10000) -> int:
+    """
+    Writes a new store into the directory from title/url/abstract records and returns
+    the number of articles. Articles without a title or abstract are skipped.
+
+    Existing files are replaced, so build into a fresh directory and point
+    WIKIPEDIA_STORE_PATH at it to swap stores under running workers.
+    """
+    os.makedirs(path, exist_ok=True)
+    index_path = os.path.join(path, INDEX_FILE)
+    for suffix in ("", "-journal", "-wal", "-shm"):
+        if os.path.exists(index_path + suffix):
+            os.remove(index_path + suffix)
+
+    connection = sqlite3.connect(index_path)
+    connection.execute("PRAGMA journal_mode=OFF")
+    connection.execute("PRAGMA synchronous=OFF")
+    connection.executescript(_SCHEMA)
+    offsets = array("Q", [0])
+    batch: List[tuple] = []
+
+    def flush():
+        with connection:
+            connection.executemany("INSERT INTO articles (rowid, title, abstract) VALUES (?, ?, ?)", batch)
+        batch.clear()
+
+    try:
+        with open(os.path.join(path, ARTICLES_FILE), "wb") as articles:
+            for record in records:
+                title = _clean(record.get("title"))
+                abstract = _clean(record.get("abstract"))
+                if not title or not abstract:
+                    continue
+                data = _SEPARATOR.join((title, _clean(record.get("url")), abstract)).encode("utf-8")
+                articles.write(data)
+                batch.append((len(offsets) - 1, title, abstract))
+                offsets.append(offsets[-1] + len(data))
+                if len(batch) >= batch_size:
+                    flush()
+        flush()
+        # Merge the index segments written batch by batch into one b-tree
+        with connection:
+            connection.execute("INSERT INTO articles (articles) VALUES ('optimize')")
+    finally:
+        connection.close()
+
+    with open(os.path.join(path, OFFSETS_FILE), "wb") as f:
+        offsets.tofile(f)
+    return len(offsets) - 1
+
+
+def _open_dump(path: str) -> IO[bytes]:
+    return gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")
+
+
+def read_abstracts_dump(path: str) -> Iterator[dict]:
+    """
+    Streams title/url/abstract records from a Wikipedia abstract XML dump or a
+    JSON-lines file, optionally gzipped.
+    """
+    with _open_dump(path) as f:
+        if ".xml" not in os.path.basename(path):
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+            return
+
+        for _, element in ElementTree.iterparse(f):
+            if element.tag != "doc":
+                continue
+            title = element.findtext("title") or ""
+            if title.startswith(_DUMP_TITLE_PREFIX):
+                title = title[len(_DUMP_TITLE_PREFIX):]
+            yield {"title": title, "url": element.findtext("url"), "abstract": element.findtext("abstract")}
+            # Drop the parsed document so memory stays flat over the whole dump
+            element.clear()
+
+
+_stores = {}
+
+
+def get_wikipedia_store() -> WikipediaStore:
+    """
+    Returns the store at WIKIPEDIA_STORE_PATH, mapped once per process.
+    """
+    path = os.getenv("WIKIPEDIA_STORE_PATH")
+    if not path:
+        raise ValueError("WIKIPEDIA_STORE_PATH must be set to use the local Wikipedia store")
+    if path not in _stores:
+        _stores[path] = WikipediaStore(path)
+    return _stores[path]
+
+
+def local_wikipedia_enabled() -> bool:
+    return bool(os.getenv("WIKIPEDIA_STORE_PATH"))
+
+
+class LocalWikipediaFetcher(Fetcher):
+    """
+    Fetcher searching the local Wikipedia abstracts store.
+    """
+    source = "wikipedia_local"
+
+    def __init__(self, store: Optional[WikipediaStore] = None):
+        self.store = store or get_wikipedia_store()
+        self.max_chars = MAX_CHARACTERS
+        self.top_k = TOP_K_RESULTS
+
+    def search(self, query: str, terms:str="") -> FetcherResult:
+        """
+        Returns abstracts from the local Wikipedia store relevant to the query.
+        """
+        results: List[str] = []
+        documents: List[str] = []
+        for article in self.store.search(query, self.top_k):
+            content = article.abstract
+            if len(content) > self.max_chars:
+                content = content[: self.max_chars] + "..."
+            results.append(content)
+            documents.append(article.url or article.title)
+        print(f"LocalWikipediaFetcher found {len(results)} summaries: {documents}")
+        return FetcherResult(results, documents)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Build and query the local Wikipedia store")
+    parser.add_argument("--store", default=os.getenv("WIKIPEDIA_STORE_PATH"), help="Directory of the store")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="Build the store from an abstracts dump")
+    build.add_argument("dump")
+    search = commands.add_parser("search", help="Search the store")
+    search.add_argument("query")
+    args = parser.parse_args(argv)
+
+    if not args.store:
+        parser.error("--store or WIKIPEDIA_STORE_PATH is required")
+    if args.command == "build":
+        count = build_store(read_abstracts_dump(args.dump), args.store)
+        print(f"Stored {count} articles in {args.store}")
+    else:
+        for article in WikipediaStore(args.store).search(args.query):
+            print(f"{article.score:8.2f}  {article.title}  {article.url}")
+
+
+if __name__ == "__main__":
+    main()
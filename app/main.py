@@ -1,25 +1,45 @@
+import asyncio
+import os
 import traceback
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, status, Request
 from fastapi.exceptions import RequestValidationError
+from fastapi.middleware.gzip import GZipMiddleware
 from starlette.responses import JSONResponse
 from dotenv import load_dotenv
 
-from app.api import agents
+from app.api import agents, status as status_api, usage
 from app.core.db import init_db, close_db
+from app.core.warmup import run_warmup, warmup_steps
+from app.services.retention import compaction_interval, run_compaction
 
 load_dotenv()
 
 @asynccontextmanager
 async def lifespan(_: FastAPI):
     await init_db()
+    # Warm-up runs after the port opens; /ready reports when it is done
+    warmup_task = asyncio.create_task(run_warmup(warmup_steps()))
+    interval = compaction_interval()
+    compaction_task = asyncio.create_task(run_compaction(interval)) if interval > 0 else None
     yield
+    warmup_task.cancel()
+    if compaction_task:
+        compaction_task.cancel()
     await close_db()
 
 def create_app() -> FastAPI:
     fastapi_app = FastAPI(title="Research Agent API", version="1.0", lifespan=lifespan)
+    # Compress responses above GZIP_MIN_BYTES when the client accepts it; 0 disables compression.
+    # Level 5 compresses large agents about as well as the default 9 at a fraction of the CPU.
+    gzip_min_bytes = int(os.getenv("GZIP_MIN_BYTES", "4096"))
+    if gzip_min_bytes > 0:
+        fastapi_app.add_middleware(GZipMiddleware, minimum_size=gzip_min_bytes, compresslevel=5)
     fastapi_app.include_router(agents.router)
+    fastapi_app.include_router(usage.router)
+    fastapi_app.include_router(status_api.router)
+    fastapi_app.include_router(status_api.health_router)
     return fastapi_app
 
 app = create_app()
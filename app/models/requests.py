@@ -1,8 +1,56 @@
+from datetime import datetime
+from typing import List, Literal, Optional
+
 from pydantic import Field, BaseModel
 
+from app.data.entities.models import ConversationUsage, RetentionPolicy
+
+# Most agents a bulk request may create, or name by id
+MAX_BULK_AGENTS = 10_000
 
 class AgentCreate(BaseModel):
     name: str = Field(..., description="Name of the research agent")
+    retention: Optional[RetentionPolicy] = Field(None, description="Retention policy overriding the global one")
+
+class AgentBulkCreate(BaseModel):
+    agents: List[AgentCreate] = Field(..., min_length=1, max_length=MAX_BULK_AGENTS,
+                                      description="The research agents to create")
+
+class AgentBulkDelete(BaseModel):
+    ids: Optional[List[str]] = Field(None, min_length=1, max_length=MAX_BULK_AGENTS,
+                                     description="Ids of the agents to delete")
+    name_prefix: Optional[str] = Field(None, min_length=1, description="Deletes agents whose name starts with this")
+    created_before: Optional[datetime] = Field(None, description="Deletes agents created before this time")
+    updated_before: Optional[datetime] = Field(None, description="Deletes agents without a conversation since this time")
 
 class AgentQueries(BaseModel):
     message: str = Field(..., description="The query message to be sent to the agent")
+    profile: Optional[Literal["fast", "thorough"]] = Field(
+        None, description="Retrieval profile: fast for a few short snippets and a brief answer, thorough for more context")
+    top_k: Optional[int] = Field(None, ge=1, description="Results per source, overriding the profile")
+    max_chars: Optional[int] = Field(None, ge=1, description="Characters kept per result, overriding the profile")
+    sources: Optional[List[Literal["medical", "academic", "knowledge", "web"]]] = Field(
+        None, min_length=1, description="Sources the query may be answered from")
+    request_id: Optional[str] = Field(
+        None, min_length=1, max_length=128,
+        description="Client id of the request; a retry with the same id resumes the interrupted run")
+    priority: Literal["interactive", "batch"] = Field(
+        "interactive", description="Admission lane: interactive queries are served before batch queries")
+
+class AgentImportHeader(BaseModel):
+    type: Literal["agent"] = Field(..., description="Marks the first line of an import")
+    name: str = Field(..., description="Name of the research agent")
+    summary: str = Field("", description="Rolling summary of the conversation")
+    summarized_count: int = Field(0, ge=0, description="Number of leading conversations folded into the summary")
+    retention: Optional[RetentionPolicy] = Field(None, description="Retention policy overriding the global one")
+    created_at: Optional[datetime] = Field(None, description="Creation time of the exported agent")
+
+class ConversationImport(BaseModel):
+    type: Literal["conversation"] = Field(..., description="Marks a conversation line of an import")
+    id: Optional[str] = Field(None, description="The conversation id; a new one is generated when missing")
+    query: str = Field(..., description="The user query")
+    agent_response: str = Field(..., description="The agent's response")
+    source: str = Field(..., description="The source used for the response")
+    documents: List[str] = Field(default_factory=list, description="List of documents used for the research")
+    usage: Optional[ConversationUsage] = Field(None, description="Tokens, cost and timings of the answer")
+    created_at: Optional[datetime] = Field(None, description="When the conversation took place")
@@ -23,11 +23,47 @@ class AgentQueryResponseOut(BaseModel):
     documents: list[str] = Field(..., description="List of documents used by the source")
     response: str = Field(..., description="Response from the research agent to the query")
 
+class ArchivedConversationsOut(BaseModel):
+    agent_id: str = Field(..., description="Unique identifier for the research agent")
+    total: int = Field(..., description="Number of archived conversations of the agent")
+    offset: int = Field(..., description="Position of the first returned conversation in the archive")
+    messages: List[ConversationsOut] = Field(default_factory=list, description="Archived conversations, oldest first")
+
+class AgentsCreatedOut(BaseModel):
+    created: int = Field(..., description="Number of research agents created")
+    agents: List[AgentOut] = Field(default_factory=list, description="The created research agents, in request order")
+
+class AgentsDeletedOut(BaseModel):
+    agents: int = Field(..., description="Number of research agents deleted")
+    conversations: int = Field(..., description="Number of their conversations deleted, archived ones included")
+    checkpoints: int = Field(..., description="Number of checkpoints of their query runs deleted")
+    summary_jobs: int = Field(..., description="Number of their pending summary updates cancelled")
+
 def agent_in_db_to_out(agent_in_db: AgentInDB) -> AgentOut:
     return AgentOut(id=agent_in_db.id,
                     name=agent_in_db.name,
                     messages=list_conversation_in_db_to_out(agent_in_db.messages))
 
+def agent_document_to_out(agent_document: dict) -> dict:
+    """
+    Builds the AgentOut payload straight from a raw agent document, without
+    creating a model per conversation.
+    """
+    return {
+        "id": agent_document["_id"],
+        "name": agent_document["name"],
+        "messages": [message_document_to_out(message) for message in agent_document.get("messages") or []],
+    }
+
+def message_document_to_out(message: dict) -> dict:
+    return {
+        "id": message["_id"],
+        "query": message["query"],
+        "agent_response": message["agent_response"],
+        "domain": message["source"],
+        "documents": message.get("documents", []),
+    }
+
 def list_conversation_in_db_to_out(
         conversations_in_db: Optional[List[ConversationInDB]]
 ) -> List[ConversationsOut]:
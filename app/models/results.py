@@ -1,5 +1,6 @@
-from dataclasses import dataclass
-from typing import List
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import List, Optional
 
 @dataclass
 class QueryResult:
@@ -7,9 +8,17 @@ class QueryResult:
     agent_response: str
     domain: str
     documents: List[str]
+    # Tokens, cost and timings of the run that produced the result; not part of the result itself
+    usage: Optional[dict] = field(default=None, compare=False)
 
 @dataclass
 class FetcherResult:
     """Result of a fetcher search containing the results and documents."""
     raw_sources: List[str]
     documents: List[str]
+
+@dataclass(frozen=True)
+class AgentVersion:
+    """Version of an agent's rendered conversations and when they last changed."""
+    version: int
+    updated_at: Optional[datetime]
@@ -0,0 +1,184 @@
+"""
+Admission control for research pipelines.
+
+Each worker runs at most ADMISSION_MAX_IN_FLIGHT pipelines at once (0 disables the
+limit). Further queries wait in a bounded queue per priority lane; a freed slot goes
+to the interactive lane before the batch lane. A query whose lane is full, or that
+waited longer than its lane allows, is rejected with a Retry-After estimate, so a
+burst is turned away quickly instead of timing out in the upstream APIs.
+"""
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Callable, Deque, Dict, Optional
+
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_BATCH = "batch"
+# Weight of the newest sample in the wait and service time averages
+EWMA_ALPHA = 0.2
+
+
+class AdmissionRejected(RuntimeError):
+    """Raised when a query cannot be admitted; `retry_after` is the suggested wait in seconds."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+@dataclass(frozen=True)
+class LanePolicy:
+    """How many queries of a lane may wait for a slot, and for how many seconds."""
+    queue_limit: int
+    max_wait: float
+
+
+@dataclass
+class LaneStats:
+    admitted: int = 0
+    rejected: int = 0
+    timed_out: int = 0
+    wait_avg: float = 0.0
+    wait_max: float = 0.0
+
+
+class AdmissionController:
+    """
+    Caps the pipelines in flight on one event loop, with a FIFO wait queue per lane.
+    Lanes are served in the order of `lanes`.
+    """
+
+    def __init__(self, max_in_flight: int, lanes: Dict[str, LanePolicy],
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_in_flight = max_in_flight
+        self.lanes = lanes
+        self._clock = clock
+        self._waiters: Dict[str, Deque[asyncio.Future]] = {lane: deque() for lane in lanes}
+        self._stats = {lane: LaneStats() for lane in lanes}
+        self.in_flight = 0
+        self.service_avg = 0.0
+        self._served = 0
+
+    def _queued(self) -> int:
+        return sum(len(waiters) for waiters in self._waiters.values())
+
+    def retry_after(self) -> int:
+        """
+        Seconds until a slot is likely to be free for a query arriving now: the queries
+        ahead of it times the average pipeline duration, spread over the slots.
+        """
+        service = self.service_avg if self._served else 1.0
+        return max(1, math.ceil(service * (self._queued() + 1) / max(self.max_in_flight, 1)))
+
+    def _record_wait(self, lane: str, seconds: float):
+        stats = self._stats[lane]
+        stats.admitted += 1
+        stats.wait_avg = seconds if stats.admitted == 1 else stats.wait_avg + EWMA_ALPHA * (seconds - stats.wait_avg)
+        stats.wait_max = max(stats.wait_max, seconds)
+
+    def _reject(self, reason: str):
+        raise AdmissionRejected(f"Too many research queries in progress: {reason}", self.retry_after())
+
+    async def acquire(self, lane: str):
+        """
+        Waits for a pipeline slot. Raises ValueError for an unknown lane and
+        AdmissionRejected when the lane is full or the wait exceeds its limit.
+        """
+        if lane not in self.lanes:
+            raise ValueError(f"Unknown priority {lane}, expected one of {list(self.lanes)}")
+        if self.in_flight < self.max_in_flight and not self._queued():
+            self.in_flight += 1
+            self._record_wait(lane, 0.0)
+            return
+
+        policy, waiters = self.lanes[lane], self._waiters[lane]
+        if len(waiters) >= policy.queue_limit:
+            self._stats[lane].rejected += 1
+            self._reject(f"the {lane} queue is full")
+        future = asyncio.get_running_loop().create_future()
+        waiters.append(future)
+        enqueued = self._clock()
+        try:
+            await asyncio.wait([future], timeout=policy.max_wait)
+        except asyncio.CancelledError:
+            self._abandon(lane, future)
+            raise
+        if not future.done():
+            self._abandon(lane, future)
+            self._stats[lane].timed_out += 1
+            self._reject(f"waited more than {policy.max_wait:g}s in the {lane} queue")
+        self._record_wait(lane, self._clock() - enqueued)
+
+    def _abandon(self, lane: str, future: asyncio.Future):
+        if future.done():
+            # The slot was handed over just as the waiter gave up, so pass it on
+            self.release()
+        else:
+            self._waiters[lane].remove(future)
+            future.cancel()
+
+    def release(self, service_seconds: Optional[float] = None):
+        """
+        Frees a slot, handing it straight to the first waiter of the highest priority lane.
+        """
+        if service_seconds is not None:
+            self._served += 1
+            self.service_avg = service_seconds if self._served == 1 else \
+                self.service_avg + EWMA_ALPHA * (service_seconds - self.service_avg)
+        for waiters in self._waiters.values():
+            while waiters:
+                future = waiters.popleft()
+                if not future.done():
+                    future.set_result(None)
+                    return
+        self.in_flight -= 1
+
+    @asynccontextmanager
+    async def slot(self, lane: str = PRIORITY_INTERACTIVE):
+        if self.max_in_flight <= 0:
+            yield
+            return
+        await self.acquire(lane)
+        started = self._clock()
+        try:
+            yield
+        finally:
+            self.release(self._clock() - started)
+
+    def stats(self) -> dict:
+        return {
+            "max_in_flight": self.max_in_flight,
+            "in_flight": self.in_flight,
+            "queued": self._queued(),
+            "service_avg": round(self.service_avg, 3),
+            "retry_after": self.retry_after(),
+            "lanes": {
+                lane: {"queued": len(self._waiters[lane]), "queue_limit": policy.queue_limit,
+                       "max_wait": policy.max_wait, "admitted": self._stats[lane].admitted,
+                       "rejected": self._stats[lane].rejected, "timed_out": self._stats[lane].timed_out,
+                       "wait_avg": round(self._stats[lane].wait_avg, 3),
+                       "wait_max": round(self._stats[lane].wait_max, 3)}
+                for lane, policy in self.lanes.items()
+            },
+        }
+
+
+def admission_lanes() -> Dict[str, LanePolicy]:
+    """
+    Returns the lanes in priority order, sized by ADMISSION_QUEUE_<LANE> and
+    ADMISSION_MAX_WAIT_<LANE> (seconds).
+    """
+    return {
+        PRIORITY_INTERACTIVE: LanePolicy(int(os.getenv("ADMISSION_QUEUE_INTERACTIVE", "32")),
+                                         float(os.getenv("ADMISSION_MAX_WAIT_INTERACTIVE", "10"))),
+        PRIORITY_BATCH: LanePolicy(int(os.getenv("ADMISSION_QUEUE_BATCH", "64")),
+                                   float(os.getenv("ADMISSION_MAX_WAIT_BATCH", "60"))),
+    }
+
+
+def create_admission_controller() -> AdmissionController:
+    return AdmissionController(int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "16")), admission_lanes())
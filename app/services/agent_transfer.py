@@ -0,0 +1,166 @@
+"""
+NDJSON export and import of agents with their whole conversation history.
+
+An export is one line describing the agent followed by one line per conversation,
+oldest first: archived conversations chunk by chunk, then the agent's own messages
+from a cursor. An import reads the same format line by line and writes it in
+batches of IMPORT_BATCH_SIZE, so neither side ever holds the whole history.
+Imported conversations already folded into the summary go straight to the archive,
+keeping the new agent document small however long the history is.
+"""
+import os
+from datetime import datetime
+from typing import AsyncIterator, List, Optional
+from uuid import uuid4
+
+import orjson
+from pydantic import ValidationError
+
+from app.data.entities.models import TIMEZONE_OFFSET
+from app.data.repositories.agent_repository import delete_agent_document, get_agent_header, \
+    insert_agent_document, iter_messages, push_messages
+from app.data.repositories.archive_repository import get_archive
+from app.models.requests import AgentImportHeader, ConversationImport
+
+AGENT_LINE = "agent"
+CONVERSATION_LINE = "conversation"
+# Longest line an import accepts, so a body without newlines cannot exhaust memory
+MAX_LINE_BYTES = 4 * 1024 * 1024
+
+
+def _conversation_line(message: dict) -> bytes:
+    return orjson.dumps({
+        "type": CONVERSATION_LINE,
+        "id": message["_id"],
+        "query": message["query"],
+        "agent_response": message["agent_response"],
+        "source": message["source"],
+        "documents": message.get("documents", []),
+        "usage": message.get("usage"),
+        "created_at": message.get("created_at"),
+    }) + b"\n"
+
+
+async def export_agent(agent_id: str) -> AsyncIterator[bytes]:
+    """
+    Returns the NDJSON lines of the agent. Raises KeyError before the first line
+    when the agent does not exist.
+    """
+    header = await get_agent_header(agent_id)
+
+    async def lines() -> AsyncIterator[bytes]:
+        archived = header.get("archived_count", 0)
+        yield orjson.dumps({
+            "type": AGENT_LINE,
+            "id": header["_id"],
+            "name": header["name"],
+            "summary": header.get("summary", ""),
+            # Absolute position in the full history, archive included
+            "summarized_count": archived + header.get("summarized_count", 0),
+            "retention": header.get("retention"),
+            "created_at": header.get("created_at"),
+        }) + b"\n"
+        if archived:
+            async for chunk in get_archive().chunks(agent_id):
+                for message in chunk:
+                    yield _conversation_line(message)
+        async for message in iter_messages(agent_id):
+            yield _conversation_line(message)
+
+    return lines()
+
+
+async def _lines(body: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    pending: List[bytes] = []
+    pending_bytes = 0
+    async for chunk in body:
+        *complete, rest = chunk.split(b"\n")
+        if complete:
+            # Only the start of the first complete line can still be pending
+            complete[0] = b"".join(pending) + complete[0]
+            pending, pending_bytes = [], 0
+            for line in complete:
+                if line.strip():
+                    yield line
+        pending.append(rest)
+        pending_bytes += len(rest)
+        if pending_bytes > MAX_LINE_BYTES:
+            raise ValueError(f"Import lines must be shorter than {MAX_LINE_BYTES} bytes")
+    line = b"".join(pending)
+    if line.strip():
+        yield line
+
+
+def _parse(line: bytes, number: int, model):
+    try:
+        return model.model_validate_json(line)
+    except ValidationError as e:
+        raise ValueError(f"Line {number} is not a valid {model.__name__}: {e.errors()[0]['msg']}")
+
+
+def import_batch_size() -> int:
+    return int(os.getenv("IMPORT_BATCH_SIZE", "1000"))
+
+
+async def import_agent(body: AsyncIterator[bytes], batch_size: Optional[int] = None) -> dict:
+    """
+    Creates a new agent from an NDJSON export and returns its id with the number of
+    conversations imported. Raises ValueError for a malformed body, after removing
+    whatever was already imported.
+    """
+    batch_size = batch_size or import_batch_size()
+    agent_id = str(uuid4())
+    lines = _lines(body)
+    header: Optional[AgentImportHeader] = None
+    archive = get_archive()
+    imported = archived = 0
+    batch: List[dict] = []
+
+    async def flush():
+        nonlocal archived
+        # Conversations folded into the summary are archived, the others stay hot
+        to_archive = max(0, min(len(batch), header.summarized_count - archived))
+        if to_archive:
+            await archive.put(agent_id, archived, batch[:to_archive])
+        await push_messages(agent_id, batch[to_archive:], archived=to_archive)
+        archived += to_archive
+        batch.clear()
+
+    try:
+        number = 0
+        async for line in lines:
+            number += 1
+            if header is None:
+                header = _parse(line, number, AgentImportHeader)
+                now = datetime.now(TIMEZONE_OFFSET)
+                await insert_agent_document({
+                    "_id": agent_id, "name": header.name, "summary": header.summary,
+                    "summarized_count": 0, "archived_count": 0, "version": 0,
+                    "retention": header.retention.model_dump() if header.retention else None,
+                    "messages": [], "created_at": header.created_at or now, "updated_at": now,
+                })
+                continue
+            conversation = _parse(line, number, ConversationImport)
+            batch.append({
+                "_id": conversation.id or str(uuid4()),
+                "query": conversation.query,
+                "agent_response": conversation.agent_response,
+                "source": conversation.source,
+                "documents": conversation.documents,
+                "usage": conversation.usage.model_dump() if conversation.usage else None,
+                "created_at": conversation.created_at or datetime.now(TIMEZONE_OFFSET),
+            })
+            imported += 1
+            if len(batch) >= batch_size:
+                await flush()
+        if header is None:
+            raise ValueError("The import is empty, expected an agent line first")
+        await flush()
+    except Exception:
+        if header is not None:
+            await delete_agent_document(agent_id)
+            if archived:
+                await archive.delete(agent_id)
+        raise
+
+    return {"agent_id": agent_id, "imported": imported, "archived": archived}
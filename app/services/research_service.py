@@ -1,15 +1,50 @@
+import asyncio
+import os
+from dataclasses import replace
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from app.data.entities.models import RetentionPolicy
 from app.data.repositories.agent_repository import create_agent_entity, delete_agent_entity, get_agent_entity, \
-    add_conversations
-from app.models.requests import AgentCreate
-from app.models.response import AgentOut, agent_in_db_to_out
-from app.models.results import QueryResult
-from app.workflows.research_graph import process_query
+    add_conversations, update_summary, get_agent_document, update_retention, get_agent_header, agent_version, \
+    find_agent_version, create_agent_documents, agents_query, delete_agent_documents, get_context_document
+from app.data.repositories.archive_repository import get_archive
+from app.data.repositories.usage_repository import KIND_QUERY, KIND_SUMMARY, get_usage_report, insert_usage_record
+from app.models.requests import AgentBulkDelete, AgentCreate
+from app.models.response import AgentOut, agent_in_db_to_out, agent_document_to_out, message_document_to_out
+from app.models.results import AgentVersion, QueryResult
+from app.services.admission import PRIORITY_INTERACTIVE, create_admission_controller
+from app.services.retention import compact_agent, effective_retention
+from app.utils import profiling
+from app.utils.single_flight import SingleFlight
+from app.workflows.checkpoints import delete_agent_checkpoints
+from app.workflows.conversation_memory import HISTORY_TURNS, conversation_context, turns_to_fold
+from app.workflows.research_graph import get_research_graph, process_query, summarize_history
+from app.workflows.retrieval import DEFAULT_RETRIEVAL, RetrievalOptions
+from app.workflows.usage import run_recorded, shared_usage
+
+_query_flights = SingleFlight(max_followers=int(os.getenv("SINGLE_FLIGHT_MAX_FOLLOWERS", "50")))
+_admission = create_admission_controller()
+# Agents whose summary is being updated with the task updating each, and all the tasks running
+_summarizing: Dict[str, asyncio.Task] = {}
+_summary_tasks = set()
 
 async def get_agent(agent_id: str) -> AgentOut:
     current_agent = await get_agent_entity(agent_id)
 
     return agent_in_db_to_out(current_agent)
 
+async def get_agent_payload(agent_id: str) -> Tuple[dict, AgentVersion]:
+    """
+    Returns the AgentOut payload of the agent with the version it was read at.
+    """
+    agent_document = await get_agent_document(agent_id)
+
+    return agent_document_to_out(agent_document), agent_version(agent_document)
+
+async def get_agent_version(agent_id: str) -> AgentVersion:
+    return await find_agent_version(agent_id)
+
 async def create_agent(agent_in: AgentCreate) -> AgentOut:
     new_agent = await create_agent_entity(agent_in)
 
@@ -17,12 +52,189 @@ async def create_agent(agent_in: AgentCreate) -> AgentOut:
 
 async def delete_agent(agent_id: str):
     await delete_agent_entity(agent_id)
+    await _delete_agent_jobs([agent_id])
+
+async def create_agents(agents_in: List[AgentCreate]) -> List[dict]:
+    """
+    Creates the agents with one insert and returns their AgentOut payloads.
+    """
+    agent_documents = await create_agent_documents(agents_in)
+
+    return [agent_document_to_out(agent_document) for agent_document in agent_documents]
+
+async def delete_agents(agent_delete: AgentBulkDelete) -> dict:
+    """
+    Deletes the agents with the given ids or matching all the given filters, with
+    everything tied to them, and returns how much was deleted. Raises ValueError
+    without ids or a filter.
+    """
+    query = agents_query(agent_delete.ids, agent_delete.name_prefix, agent_delete.created_before,
+                         agent_delete.updated_before)
+    deleted = await delete_agent_documents(query, int(os.getenv("BULK_DELETE_BATCH_SIZE", "1000")))
+    agent_ids = deleted.pop("agent_ids")
+
+    return {**deleted, **await _delete_agent_jobs(agent_ids)}
+
+async def _delete_agent_jobs(agent_ids: List[str]) -> dict:
+    """
+    Cancels the pending summary updates of deleted agents and deletes the checkpoints
+    of their query runs.
+    """
+    summary_jobs = 0
+    for agent_id in agent_ids:
+        task = _summarizing.pop(agent_id, None)
+        if task is not None and task.cancel():
+            summary_jobs += 1
+    checkpoints = 0
+    try:
+        checkpoints = await asyncio.to_thread(delete_agent_checkpoints, get_research_graph().checkpointer, agent_ids)
+    except Exception as e:
+        # The agents are deleted already, and their checkpoints expire on their own
+        print(f"Could not delete the checkpoints of {len(agent_ids)} deleted agents: {type(e).__name__}: {e}")
+
+    return {"checkpoints": checkpoints, "summary_jobs": summary_jobs}
+
+async def get_archived_conversations(agent_id: str, offset: int, limit: int) -> dict:
+    agent_header = await get_agent_header(agent_id)
+    if not agent_header.get("archived_count"):
+        return {"agent_id": agent_id, "total": 0, "offset": offset, "messages": []}
+    total, messages = await get_archive().read(agent_id, offset, limit)
+
+    return {"agent_id": agent_id, "total": total, "offset": offset,
+            "messages": [message_document_to_out(message) for message in messages]}
+
+async def set_retention(agent_id: str, retention: RetentionPolicy) -> RetentionPolicy:
+    """
+    Stores the agent's own retention policy and returns the policy in effect for it.
+    """
+    await update_retention(agent_id, retention)
+
+    return effective_retention(retention.model_dump())
+
+async def compact_conversations(agent_id: str) -> int:
+    return await compact_agent(agent_id)
+
+def _normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
 
-async def send_queries(agent_id: str, query: str) -> QueryResult:
+async def _run_pipeline(priority: str, query: str, history: str, retrieval: RetrievalOptions,
+                        thread_id: Optional[str]) -> QueryResult:
+    async with _admission.slot(priority):
+        return await profiling.to_thread(process_query, query, history, retrieval, thread_id)
+
+async def send_queries(agent_id: str, query: str, retrieval: RetrievalOptions = DEFAULT_RETRIEVAL,
+                       request_id: Optional[str] = None, priority: str = PRIORITY_INTERACTIVE) -> QueryResult:
+    """
+    Answers the query for the agent and stores the turn. Raises AdmissionRejected when
+    the worker already runs as many pipelines as it admits and the query cannot wait.
+    """
     if not query or not query.strip():
         raise ValueError("Query message must be a non-empty string")
 
-    query_result = process_query(query)
-    await add_conversations(agent_id, query, query_result)
+    context = conversation_context(await get_context_document(agent_id))
+    flight_key = _normalize_query(query)
+    if context:
+        flight_key = f"{flight_key}#{context.key()}"
+    if retrieval != DEFAULT_RETRIEVAL:
+        flight_key = f"{flight_key}@{retrieval.key()}"
+
+    # A retry of the request resumes the checkpoints of its earlier run
+    thread_id = f"{agent_id}:{request_id}" if request_id else None
+
+    led = False
+
+    async def run_pipeline() -> QueryResult:
+        nonlocal led
+        led = True
+        return await _run_pipeline(priority, query, context.render(), retrieval, thread_id)
+
+    if profiling.active_profile() is not None:
+        # A profiled query runs its own pipeline, so the profile shows what it costs
+        query_result = await run_pipeline()
+    else:
+        # Identical queries in flight share one pipeline run, which alone goes through admission,
+        # but every agent stores its own conversation
+        query_result = await _query_flights.do(flight_key, run_pipeline)
+    if not led and query_result.usage:
+        # The agent that started the shared run is the one its tokens are accounted to
+        query_result = replace(query_result, usage=shared_usage(query_result.usage))
+    conversation_id = await add_conversations(agent_id, query, query_result)
+    await _record_usage(agent_id, query_result.usage, KIND_QUERY, conversation_id, query_result.domain)
+
+    # The new turn pushes the oldest verbatim turn out of the window
+    if len(context.turns) + 1 > HISTORY_TURNS:
+        _schedule_summary(agent_id)
 
     return query_result
+
+async def _record_usage(agent_id: str, usage: Optional[dict], kind: str, conversation_id: Optional[str] = None,
+                        domain: Optional[str] = None):
+    if not usage:
+        return
+    try:
+        await insert_usage_record(agent_id, usage, kind, conversation_id, domain)
+    except Exception as e:
+        # The turn is stored already, so a lost usage record must not fail the query
+        print(f"Could not record the usage of agent {agent_id}: {type(e).__name__}: {e}")
+
+def _schedule_summary(agent_id: str):
+    if agent_id in _summarizing:
+        return
+    task = asyncio.create_task(refresh_summary(agent_id))
+    _summarizing[agent_id] = task
+    _summary_tasks.add(task)
+    task.add_done_callback(_summary_tasks.discard)
+
+async def refresh_summary(agent_id: str):
+    """
+    Folds the turns that left the verbatim window into the agent's rolling summary.
+    """
+    try:
+        agent = await get_agent_entity(agent_id)
+        turns = turns_to_fold(agent)
+        if not turns:
+            return
+        summary, usage = await asyncio.to_thread(run_recorded, "summarize", summarize_history, agent.summary, turns)
+        # The tokens are spent even if a concurrent update stores its summary first
+        if usage["total_tokens"]:
+            await _record_usage(agent_id, usage, KIND_SUMMARY)
+        await update_summary(agent_id, summary, agent.summarized_count + len(turns), agent.summarized_count)
+    except Exception as e:
+        # The turns stay verbatim in the prompt until a later update succeeds
+        print(f"Could not update the conversation summary of agent {agent_id}: {type(e).__name__}: {e}")
+    finally:
+        _summarizing.pop(agent_id, None)
+
+def usage_window(since: Optional[datetime], until: Optional[datetime]) -> tuple:
+    """
+    Returns the report window, by default the USAGE_REPORT_DAYS (30) days up to now.
+    Naive datetimes are taken as UTC. Raises ValueError for an empty window.
+    """
+    until = until or datetime.now(timezone.utc)
+    since = since or until - timedelta(days=float(os.getenv("USAGE_REPORT_DAYS", "30")))
+    since, until = (moment.replace(tzinfo=timezone.utc) if moment.tzinfo is None else moment
+                    for moment in (since, until))
+    if since >= until:
+        raise ValueError("The usage report window must start before it ends")
+    return since, until
+
+async def get_agent_usage(agent_id: str, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                          bucket: str = "day") -> dict:
+    since, until = usage_window(since, until)
+    await get_agent_header(agent_id)
+    report = await get_usage_report(since, until, agent_id=agent_id, bucket=bucket)
+
+    return {"agent_id": agent_id, "since": since, "until": until, "bucket": bucket, **report}
+
+async def get_global_usage(since: Optional[datetime] = None, until: Optional[datetime] = None,
+                           bucket: str = "day", top_agents: int = 10) -> dict:
+    since, until = usage_window(since, until)
+    report = await get_usage_report(since, until, bucket=bucket, top_agents=top_agents)
+
+    return {"since": since, "until": until, "bucket": bucket, **report}
+
+def query_flight_stats() -> dict:
+    return _query_flights.stats()
+
+def admission_stats() -> dict:
+    return _admission.stats()
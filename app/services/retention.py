@@ -0,0 +1,146 @@
+"""
+Conversation retention: compaction moves old conversations out of the agent
+document into the conversation archive, so agents stay small and reads fast.
+
+The global policy comes from CONVERSATION_MAX_AGE_DAYS and CONVERSATION_MAX_COUNT
+(0, the default, keeps everything); an agent's own policy overrides either limit.
+Only conversations already folded into the agent's rolling summary are archived,
+so the prompt context never loses a turn. Compaction runs in the background every
+CONVERSATION_COMPACTION_INTERVAL seconds (0 disables it) and on demand per agent,
+one compaction per agent at a time under a lease of CONVERSATION_COMPACTION_LEASE
+seconds.
+"""
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+from app.data.entities.models import RetentionPolicy
+from app.data.repositories.agent_repository import get_compactable_agent_ids, lease_retention_document, \
+    release_compaction_lease, remove_archived_messages
+from app.data.repositories.archive_repository import get_archive
+
+
+def default_retention() -> RetentionPolicy:
+    return RetentionPolicy(max_age_days=float(os.getenv("CONVERSATION_MAX_AGE_DAYS", "0")),
+                           max_count=int(os.getenv("CONVERSATION_MAX_COUNT", "0")))
+
+
+def effective_retention(agent_retention: Optional[dict]) -> RetentionPolicy:
+    """
+    Returns the global policy with the limits the agent sets itself.
+    """
+    policy = default_retention()
+    overrides = {name: value for name, value in (agent_retention or {}).items() if value is not None}
+    return policy.model_copy(update=overrides)
+
+
+def _as_utc(moment: datetime) -> datetime:
+    # pymongo returns naive datetimes in UTC
+    return moment.replace(tzinfo=timezone.utc) if moment.tzinfo is None else moment
+
+
+def messages_to_archive(messages: List[dict], summarized_count: int, policy: RetentionPolicy,
+                        now: datetime) -> int:
+    """
+    Returns how many leading messages the policy archives, at most the summarized ones.
+    """
+    count = 0
+    if policy.max_count:
+        count = max(count, len(messages) - policy.max_count)
+    if policy.max_age_days:
+        cutoff = now - timedelta(days=policy.max_age_days)
+        expired = 0
+        for message in messages:
+            created_at = message.get("created_at")
+            if created_at is None or _as_utc(created_at) >= cutoff:
+                break
+            expired += 1
+        count = max(count, expired)
+    return min(count, summarized_count, len(messages))
+
+
+async def compact_agent(agent_id: str, now: Optional[datetime] = None) -> int:
+    """
+    Archives the agent's conversations beyond its retention policy and returns how
+    many were archived. Returns 0 when another compaction holds the agent's lease or
+    a concurrent update changed the agent first; the next compaction picks them up.
+    """
+    started = datetime.now(timezone.utc)
+    # MongoDB keeps milliseconds, the lease must compare equal when it is released
+    until = started + timedelta(seconds=compaction_lease())
+    until = until.replace(microsecond=until.microsecond // 1000 * 1000)
+    agent_document = await lease_retention_document(agent_id, started, until)
+    if agent_document is None:
+        return 0
+    try:
+        return await _compact(agent_id, agent_document, now)
+    finally:
+        await release_compaction_lease(agent_id, until)
+
+
+async def _compact(agent_id: str, agent_document: dict, now: Optional[datetime]) -> int:
+    messages = agent_document.get("messages") or []
+    summarized_count = agent_document.get("summarized_count", 0)
+    archived_count = agent_document.get("archived_count", 0)
+    count = messages_to_archive(messages, summarized_count,
+                                effective_retention(agent_document.get("retention")),
+                                now or datetime.now(timezone.utc))
+    if not count:
+        return 0
+
+    archive = get_archive()
+    archived = messages[:count]
+    # Archive first: if the agent update then fails, the chunk is removed and nothing is lost
+    chunk_id = await archive.put(agent_id, archived_count, archived)
+    if not await remove_archived_messages(agent_id, [message["_id"] for message in archived],
+                                          summarized_count, archived_count):
+        # Only this call's chunk: another compaction may have archived the same offset
+        await archive.remove(agent_id, chunk_id)
+        return 0
+    await archive.discard(agent_id, archived_count, chunk_id)
+    return count
+
+
+async def compact_all(now: Optional[datetime] = None) -> Tuple[int, int]:
+    """
+    Compacts every agent with summarized conversations. Returns the number of
+    agents compacted and of conversations archived.
+    """
+    policy = default_retention()
+    agents = archived = 0
+    # Without global limits only agents with a policy of their own can have anything to archive
+    for agent_id in await get_compactable_agent_ids(
+            with_retention_only=not (policy.max_age_days or policy.max_count)):
+        try:
+            count = await compact_agent(agent_id, now)
+        except KeyError:
+            continue
+        except Exception as e:
+            print(f"Could not compact the conversations of agent {agent_id}: {type(e).__name__}: {e}")
+            continue
+        agents += bool(count)
+        archived += count
+    return agents, archived
+
+
+def compaction_interval() -> float:
+    return float(os.getenv("CONVERSATION_COMPACTION_INTERVAL", "3600"))
+
+
+def compaction_lease() -> float:
+    return float(os.getenv("CONVERSATION_COMPACTION_LEASE", "300"))
+
+
+async def run_compaction(interval: float):
+    """
+    Compacts all agents every `interval` seconds until cancelled.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            agents, archived = await compact_all()
+            if archived:
+                print(f"Archived {archived} conversations of {agents} agents")
+        except Exception as e:
+            print(f"Conversation compaction failed: {type(e).__name__}: {e}")
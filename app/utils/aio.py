@@ -0,0 +1,33 @@
+import asyncio
+import threading
+from typing import Awaitable, Optional, TypeVar
+
+T = TypeVar("T")
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def get_background_loop() -> asyncio.AbstractEventLoop:
+    """
+    Returns a process-wide event loop running in a daemon thread.
+
+    Async clients that live on this loop keep their connection pools across calls
+    made from the synchronous research graph.
+    """
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="background-io-loop", daemon=True).start()
+                _loop = loop
+    return _loop
+
+
+def run_sync(coro: Awaitable[T], timeout: Optional[float] = None) -> T:
+    """
+    Runs the coroutine on the background loop and blocks the calling thread for its result.
+    Must not be called from the background loop itself.
+    """
+    return asyncio.run_coroutine_threadsafe(coro, get_background_loop()).result(timeout)
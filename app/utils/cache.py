@@ -0,0 +1,382 @@
+"""
+Caches shared by the research pipeline.
+
+Every namespace (fetcher results, domain classifications, query results) is a
+tiered cache: a bounded per-process LRU (L1) in front of an optional store shared
+by all workers (L2). CACHE_BACKEND selects the L2: none (default), mongo for a
+MongoDB collection with a TTL index, or sqlite for a file shared by the workers of
+one host (CACHE_SQLITE_PATH). L2 values are orjson documents, zlib-compressed when
+large. A failing L2 only costs cache misses.
+"""
+import hashlib
+import os
+from abc import abstractmethod, ABC
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import asdict
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Generic, Hashable, Optional, TypeVar
+
+import orjson
+
+from app.models.results import FetcherResult, QueryResult
+
+V = TypeVar("V")
+
+FETCHER_NAMESPACE = "fetcher"
+CLASSIFICATION_NAMESPACE = "classification"
+QUERY_NAMESPACE = "query"
+# Environment prefix, default L1 size and default TTL of each namespace. Query results
+# are opt-in, since a cached answer does not reflect sources updated since.
+NAMESPACES = {
+    FETCHER_NAMESPACE: ("FETCHER_CACHE", 1024, 600),
+    CLASSIFICATION_NAMESPACE: ("CLASSIFICATION_CACHE", 4096, 86400),
+    QUERY_NAMESPACE: ("QUERY_CACHE", 0, 300),
+}
+CACHE_BACKEND_NONE = "none"
+CACHE_BACKEND_MONGO = "mongo"
+CACHE_BACKEND_SQLITE = "sqlite"
+
+
+class TTLCache(Generic[V]):
+    """
+    Thread-safe LRU cache whose entries also expire `ttl` seconds after being stored.
+    A cache with `maxsize` 0 stores nothing.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, clock: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[V]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= self.clock():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Hashable, value: V):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (self.clock() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "maxsize": self.maxsize, "ttl": self.ttl,
+                "hits": self.hits, "misses": self.misses}
+
+
+# Result types that can be stored in an L2, by their tag in the serialized document
+_RESULT_TYPES = {cls.__name__: cls for cls in (FetcherResult, QueryResult)}
+# Serialized values from this size on are compressed
+COMPRESS_MIN_BYTES = 512
+_RAW, _ZLIB = b"\x00", b"\x01"
+
+
+def encode_value(value) -> bytes:
+    """
+    Serializes a cache value: a FetcherResult, a QueryResult or a JSON-compatible value.
+    """
+    type_name = type(value).__name__
+    if type_name in _RESULT_TYPES:
+        data = orjson.dumps({"t": type_name, "v": asdict(value)})
+    else:
+        data = orjson.dumps({"v": value})
+    if len(data) >= COMPRESS_MIN_BYTES:
+        return _ZLIB + zlib.compress(data, 6)
+    return _RAW + data
+
+
+def decode_value(data: bytes):
+    data = bytes(data)
+    document = orjson.loads(zlib.decompress(data[1:]) if data[:1] == _ZLIB else data[1:])
+    result_type = _RESULT_TYPES.get(document.get("t"))
+    return result_type(**document["v"]) if result_type else document["v"]
+
+
+class CacheBackend(ABC):
+    """
+    Store of serialized cache values shared by workers. Keys are namespaced strings.
+    """
+    name = ""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        pass
+
+    @abstractmethod
+    def put(self, key: str, value: bytes, ttl: float):
+        pass
+
+    @abstractmethod
+    def clear(self, prefix: str = ""):
+        pass
+
+
+class MongoCacheBackend(CacheBackend):
+    """
+    Cache entries in a MongoDB collection, removed by a TTL index once expired.
+    Reads also check the expiry, since the TTL monitor only runs once a minute.
+    """
+    name = CACHE_BACKEND_MONGO
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def setup(self):
+        self.collection.create_index("expires_at", expireAfterSeconds=0)
+
+    def get(self, key: str) -> Optional[bytes]:
+        document = self.collection.find_one({"_id": key, "expires_at": {"$gt": datetime.now(timezone.utc)}},
+                                            {"value": 1})
+        return document["value"] if document else None
+
+    def put(self, key: str, value: bytes, ttl: float):
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=ttl)
+        self.collection.update_one({"_id": key}, {"$set": {"value": value, "expires_at": expires_at}}, upsert=True)
+
+    def clear(self, prefix: str = ""):
+        self.collection.delete_many({"_id": {"$regex": f"^{prefix}"}} if prefix else {})
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """
+    Cache entries in a SQLite file shared by the workers of one host. Each thread
+    gets its own connection and the file runs in WAL mode, so readers never wait
+    for a writer. Expired rows are purged every PURGE_EVERY writes.
+    """
+    name = CACHE_BACKEND_SQLITE
+    PURGE_EVERY = 256
+
+    def __init__(self, path: str, clock: Callable[[], float] = time.time):
+        self.path = path
+        self.clock = clock
+        self._local = threading.local()
+        self._writes = 0
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)")
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def get(self, key: str) -> Optional[bytes]:
+        row = self._connection().execute("SELECT value FROM cache WHERE key = ? AND expires_at > ?",
+                                         (key, self.clock())).fetchone()
+        return row[0] if row else None
+
+    def put(self, key: str, value: bytes, ttl: float):
+        connection = self._connection()
+        connection.execute("INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                           (key, value, self.clock() + ttl))
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            connection.execute("DELETE FROM cache WHERE expires_at <= ?", (self.clock(),))
+
+    def clear(self, prefix: str = ""):
+        if prefix:
+            self._connection().execute("DELETE FROM cache WHERE substr(key, 1, ?) = ?", (len(prefix), prefix))
+        else:
+            self._connection().execute("DELETE FROM cache")
+
+
+class TieredCache:
+    """
+    Namespace of the shared cache: a TTLCache as L1 in front of an optional L2,
+    resolved through `l2` on use so an L2 that needs the database can come up later.
+    Values found in the L2 are copied into the L1.
+    """
+
+    def __init__(self, namespace: str, l1: TTLCache, l2: Callable[[], Optional[CacheBackend]] = lambda: None):
+        self.namespace = namespace
+        self.l1 = l1
+        self._l2 = l2
+        self._lock = threading.Lock()
+        self.l2_hits = 0
+        self.l2_misses = 0
+        self.l2_errors = 0
+
+    @property
+    def maxsize(self) -> int:
+        return self.l1.maxsize
+
+    @property
+    def ttl(self) -> float:
+        return self.l1.ttl
+
+    def _l2_key(self, key: Hashable) -> str:
+        # repr of the tuples of strings and numbers used as keys is the same in every process
+        return f"{self.namespace}:{hashlib.sha1(repr(key).encode()).hexdigest()}"
+
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get(self, key: Hashable):
+        if self.maxsize <= 0:
+            return None
+        value = self.l1.get(key)
+        if value is not None:
+            return value
+        backend = self._l2()
+        if backend is None:
+            return None
+        try:
+            data = backend.get(self._l2_key(key))
+        except Exception as e:
+            self._count("l2_errors")
+            print(f"Cache {self.namespace} could not read from {backend.name}: {type(e).__name__}: {e}")
+            return None
+        if data is None:
+            self._count("l2_misses")
+            return None
+        self._count("l2_hits")
+        value = decode_value(data)
+        self.l1.put(key, value)
+        return value
+
+    def put(self, key: Hashable, value):
+        if self.maxsize <= 0:
+            return
+        self.l1.put(key, value)
+        backend = self._l2()
+        if backend is None:
+            return
+        try:
+            backend.put(self._l2_key(key), encode_value(value), self.ttl)
+        except Exception as e:
+            self._count("l2_errors")
+            print(f"Cache {self.namespace} could not write to {backend.name}: {type(e).__name__}: {e}")
+
+    def clear(self):
+        """
+        Clears the L1 of this worker only; L2 entries expire by their TTL.
+        """
+        self.l1.clear()
+
+    def __len__(self) -> int:
+        return len(self.l1)
+
+    def stats(self) -> dict:
+        l1 = self.l1.stats()
+        l1_lookups = l1["hits"] + l1["misses"]
+        l2_lookups = self.l2_hits + self.l2_misses
+        backend = self._l2()
+        return {
+            "l1": {**l1, "hit_rate": round(l1["hits"] / l1_lookups, 4) if l1_lookups else 0.0},
+            "l2": {"backend": backend.name if backend else CACHE_BACKEND_NONE, "hits": self.l2_hits,
+                   "misses": self.l2_misses, "errors": self.l2_errors,
+                   "hit_rate": round(self.l2_hits / l2_lookups, 4) if l2_lookups else 0.0},
+            "hit_rate": round((l1["hits"] + self.l2_hits) / l1_lookups, 4) if l1_lookups else 0.0,
+        }
+
+
+def cache_backend_mode() -> str:
+    mode = (os.getenv("CACHE_BACKEND") or CACHE_BACKEND_NONE).lower()
+    if mode not in (CACHE_BACKEND_NONE, CACHE_BACKEND_MONGO, CACHE_BACKEND_SQLITE):
+        raise ValueError(f"CACHE_BACKEND must be {CACHE_BACKEND_NONE}, {CACHE_BACKEND_MONGO} or "
+                         f"{CACHE_BACKEND_SQLITE}, not {mode}")
+    return mode
+
+
+_l2_backend: Optional[CacheBackend] = None
+_l2_lock = threading.Lock()
+
+
+def get_l2_backend() -> Optional[CacheBackend]:
+    """
+    Returns the shared L2 of CACHE_BACKEND, or None when there is none. The MongoDB
+    backend uses the client opened by init_db, and is None until it is initialized.
+    """
+    global _l2_backend
+    if _l2_backend is not None:
+        return _l2_backend
+    mode = cache_backend_mode()
+    if mode == CACHE_BACKEND_NONE:
+        return None
+    with _l2_lock:
+        if _l2_backend is None:
+            if mode == CACHE_BACKEND_SQLITE:
+                _l2_backend = SQLiteCacheBackend(os.getenv("CACHE_SQLITE_PATH", "cache.sqlite3"))
+            else:
+                from app.core.db import get_client
+
+                try:
+                    client = get_client()
+                except RuntimeError:
+                    return None
+                backend = MongoCacheBackend(client.delegate[os.getenv("MONGODB_DB")][
+                                                os.getenv("CACHE_COLLECTION", "cache_entries")])
+                backend.setup()
+                _l2_backend = backend
+    return _l2_backend
+
+
+_caches: Dict[str, TieredCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(namespace: str) -> TieredCache:
+    """
+    Returns the process-wide cache of the namespace, whose L1 is sized by
+    <PREFIX>_SIZE (0 disables the namespace) with entries kept for <PREFIX>_TTL seconds.
+    """
+    cache = _caches.get(namespace)
+    if cache is None:
+        prefix, size, ttl = NAMESPACES[namespace]
+        with _caches_lock:
+            cache = _caches.get(namespace)
+            if cache is None:
+                cache = TieredCache(namespace,
+                                    TTLCache(maxsize=int(os.getenv(f"{prefix}_SIZE", str(size))),
+                                             ttl=float(os.getenv(f"{prefix}_TTL", str(ttl)))),
+                                    get_l2_backend)
+                _caches[namespace] = cache
+    return cache
+
+
+def get_fetcher_cache() -> TieredCache:
+    """
+    Returns the process-wide cache of fetcher results (FETCHER_CACHE_SIZE, FETCHER_CACHE_TTL).
+    """
+    return get_cache(FETCHER_NAMESPACE)
+
+
+def clear_caches():
+    """
+    Clears the L1 of every namespace of this worker.
+    """
+    for namespace in NAMESPACES:
+        get_cache(namespace).clear()
+
+
+def cache_snapshot() -> dict:
+    return {namespace: get_cache(namespace).stats() for namespace in NAMESPACES}
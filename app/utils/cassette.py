@@ -0,0 +1,175 @@
+import gzip
+import hashlib
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import ConfigDict
+
+from app.fetchers import Fetcher
+from app.models.results import FetcherResult
+
+CASSETTE_OFF = "off"
+CASSETTE_RECORD = "record"
+CASSETTE_REPLAY = "replay"
+
+_stores: Dict[str, "CassetteStore"] = {}
+
+
+def cassette_mode() -> str:
+    """
+    Returns the cassette mode from RESEARCH_CASSETTE_MODE: off, record or replay.
+    """
+    mode = (os.getenv("RESEARCH_CASSETTE_MODE") or CASSETTE_OFF).strip().lower()
+    if mode not in (CASSETTE_OFF, CASSETTE_RECORD, CASSETTE_REPLAY):
+        raise ValueError(f"Unknown cassette mode {mode}, expected off, record or replay")
+    return mode
+
+
+def get_cassette_store() -> "CassetteStore":
+    """
+    Returns the store for the directory configured in RESEARCH_CASSETTE_DIR.
+    """
+    directory = os.getenv("RESEARCH_CASSETTE_DIR") or ".cassettes"
+    if directory not in _stores:
+        _stores[directory] = CassetteStore(directory)
+    return _stores[directory]
+
+
+def _replay_latency(recorded: float) -> float:
+    """
+    Delay to simulate on replay from RESEARCH_CASSETTE_LATENCY: unset for none,
+    `recorded` for the latency seen while recording, or a fixed number of seconds.
+    """
+    setting = (os.getenv("RESEARCH_CASSETTE_LATENCY") or "").strip().lower()
+    if not setting:
+        return 0.0
+    if setting == "recorded":
+        return recorded
+    return float(setting)
+
+
+class CassetteStore:
+    """
+    Content-addressed on-disk store of request/response pairs.
+
+    Each entry is a gzipped JSON file named by the SHA-256 of its canonical request,
+    sharded into sub-directories by the first two hex digits.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    @staticmethod
+    def key(request: Dict[str, Any]) -> str:
+        canonical = json.dumps(request, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json.gz")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            with gzip.open(self._path(key), "rt", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, entry: Dict[str, Any]):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump(entry, f, separators=(",", ":"), ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def call(self, mode: str, request: Dict[str, Any], compute) -> Dict[str, Any]:
+        """
+        Serves the response for the request from the store, or computes and records it.
+        """
+        key = self.key(request)
+        if mode == CASSETTE_REPLAY:
+            entry = self.get(key)
+            if entry is None:
+                raise KeyError(f"No cassette recorded for {request.get('kind')} request {key}")
+            delay = _replay_latency(entry.get("elapsed", 0.0))
+            if delay:
+                time.sleep(delay)
+            return entry["response"]
+
+        started = time.perf_counter()
+        response = compute()
+        self.put(key, {"request": request, "response": response, "elapsed": time.perf_counter() - started})
+        return response
+
+
+class CassetteFetcher(Fetcher):
+    """
+    Fetcher that records or replays the results of the wrapped fetcher.
+    """
+
+    def __init__(self, fetcher: Fetcher, mode: str, store: CassetteStore):
+        self.fetcher = fetcher
+        self.mode = mode
+        self.store = store
+
+    def search(self, query: str, terms: str = "") -> FetcherResult:
+        # Keyed on the result count and length too, so each retrieval profile replays its own context
+        request = {"kind": "fetcher", "fetcher": type(self.fetcher).__name__, "query": query, "terms": terms,
+                   "top_k": self.fetcher.top_k, "max_chars": self.fetcher.max_chars}
+
+        def compute():
+            result = self.fetcher.search(query, terms)
+            return {"raw_sources": result.raw_sources, "documents": result.documents}
+
+        response = self.store.call(self.mode, request, compute)
+        return FetcherResult(response["raw_sources"], response["documents"])
+
+
+class CassetteChatModel(BaseChatModel):
+    """
+    Chat model that records or replays the completions of the wrapped model.
+
+    Requests are keyed on the model parameters and the rendered prompt messages,
+    so the wrapped model is only needed while recording.
+    """
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    params: Dict[str, Any]
+    mode: str
+    store: CassetteStore
+    inner: Optional[BaseChatModel] = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "cassette"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs) -> ChatResult:
+        request = {
+            "kind": "llm",
+            "params": self.params,
+            "messages": [{"type": m.type, "content": m.content} for m in messages],
+        }
+
+        def compute():
+            response = self.inner.invoke(messages, stop=stop, **kwargs)
+            return {"content": response.content, "usage_metadata": response.usage_metadata}
+
+        response = self.store.call(self.mode, request, compute)
+        message = AIMessage(content=response["content"], usage_metadata=response.get("usage_metadata"))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def use_cassette_fetcher(fetcher: Fetcher) -> Fetcher:
+    """
+    Wraps the fetcher in a cassette when recording or replaying, else returns it unchanged.
+    """
+    mode = cassette_mode()
+    if mode == CASSETTE_OFF:
+        return fetcher
+    return CassetteFetcher(fetcher, mode, get_cassette_store())
@@ -1,12 +1,115 @@
+import json
 import os
+from dataclasses import dataclass, replace
+from typing import Dict, Optional, Tuple
 
-from langchain_openai import ChatOpenAI
+from langchain_core.language_models.chat_models import BaseChatModel
 
+from app.utils.cassette import CASSETTE_OFF, CASSETTE_REPLAY, CassetteChatModel, cassette_mode, get_cassette_store
 
-def get_openai_llm(model: str = "gpt-4o-mini", temperature: float = 0.2) -> ChatOpenAI:
+
+@dataclass(frozen=True)
+class LLMConfig:
+    """Model settings of one node of the research graph."""
+    model: str = "gpt-4o-mini"
+    temperature: float = 0.2
+    max_tokens: Optional[int] = None
+    timeout: Optional[float] = None
+    # Model tried when the primary model fails or times out; empty for none
+    fallback_model: str = "gpt-4.1-mini"
+    # OpenAI client retries of the primary model when it has a fallback, which is tried
+    # instead of waiting out more timeouts; without a fallback the client default applies
+    primary_retries: int = 0
+
+# The classifier answers with one word, the term extraction with a short list and the
+# rewrite with one query, so tight max_tokens caps cut their generation time without
+# changing their output
+NODE_LLM_CONFIGS = {
+    "rewrite": LLMConfig(temperature=0.0, max_tokens=64, timeout=10.0),
+    "classify": LLMConfig(temperature=0.0, max_tokens=5, timeout=10.0),
+    "identify": LLMConfig(temperature=0.0, max_tokens=48, timeout=10.0),
+    "synthesize": LLMConfig(timeout=60.0),
+    "summarize": LLMConfig(temperature=0.0, max_tokens=300, timeout=30.0),
+}
+
+def llm_config(node: str) -> LLMConfig:
+    """
+    Returns the model settings of the node, overridden by LLM_<NODE>_MODEL, _TEMPERATURE,
+    _MAX_TOKENS, _TIMEOUT, _FALLBACK_MODEL and _PRIMARY_RETRIES. LLM_FALLBACK_MODEL sets the
+    fallback of every node.
+    """
+    config = NODE_LLM_CONFIGS.get(node, LLMConfig())
+    fallback_model = os.getenv("LLM_FALLBACK_MODEL")
+    if fallback_model is not None:
+        config = replace(config, fallback_model=fallback_model)
+
+    prefix = f"LLM_{node.upper()}_"
+    overrides = {}
+    for field, parse in (("model", str), ("temperature", float), ("max_tokens", int), ("timeout", float),
+                         ("fallback_model", str), ("primary_retries", int)):
+        value = os.getenv(prefix + field.upper())
+        if value is not None:
+            # An empty max_tokens or timeout lifts the cap
+            overrides[field] = parse(value) if value or parse is str else None
+    return replace(config, **overrides)
+
+# USD per million prompt and completion tokens. LLM_PRICES, a JSON object of model names
+# to [prompt, completion] prices, overrides or extends the table
+MODEL_PRICES: Dict[str, Tuple[float, float]] = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1": (2.00, 8.00),
+}
+
+def model_prices() -> Dict[str, Tuple[float, float]]:
+    overrides = json.loads(os.getenv("LLM_PRICES") or "{}")
+    return {**MODEL_PRICES, **{model: (float(prompt), float(completion)) for model, (prompt, completion) in overrides.items()}}
+
+def llm_cost(model: Optional[str], prompt_tokens: int, completion_tokens: int) -> float:
+    """
+    Returns the cost in USD of a completion, 0 for models without a price.
+    """
+    prompt_price, completion_price = model_prices().get(model, (0.0, 0.0))
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+
+def get_openai_llm(model: str = "gpt-4o-mini", temperature: float = 0.2, max_tokens: Optional[int] = None,
+                   timeout: Optional[float] = None, max_retries: Optional[int] = None) -> BaseChatModel:
     """
     Returns an OpenAI Chat model instance. Uses a dummy key if not provided.
+    When a cassette mode is set, the model is wrapped to record or replay its completions.
+    max_retries None keeps the OpenAI client's default of 2 retries.
     """
+    mode = cassette_mode()
+    if mode == CASSETTE_OFF:
+        return _create_openai_llm(model, temperature, max_tokens, timeout, max_retries)
+
+    inner = None if mode == CASSETTE_REPLAY else _create_openai_llm(model, temperature, max_tokens, timeout,
+                                                                     max_retries)
+    params = {"model": model, "temperature": temperature}
+    if max_tokens is not None:
+        # Only set when capped, so cassettes recorded without a cap still replay
+        params["max_tokens"] = max_tokens
+    return CassetteChatModel(params=params, mode=mode, store=get_cassette_store(), inner=inner)
+
+def warm_openai_connection() -> bool:
+    """
+    Opens the pooled connection to the OpenAI API, which chat models share, ahead of
+    the first completion. Returns False when no requests would reach the API.
+    """
+    if cassette_mode() == CASSETTE_REPLAY or not os.getenv("OPENAI_API_KEY"):
+        return False
+    # Chat models share one connection pool per timeout, so open one for every node's timeout
+    for timeout in {llm_config(node).timeout for node in NODE_LLM_CONFIGS}:
+        _create_openai_llm("gpt-4o-mini", 0.2, timeout=timeout).root_client.models.list()
+    return True
+
+def _create_openai_llm(model: str, temperature: float, max_tokens: Optional[int] = None,
+                       timeout: Optional[float] = None, max_retries: Optional[int] = None) -> BaseChatModel:
+    # Imported on first use: the OpenAI SDK is one of the slowest imports at worker boot
+    from langchain_openai import ChatOpenAI
+
     api_key = os.getenv("OPENAI_API_KEY")
 
-    return ChatOpenAI(model=model, temperature=temperature, api_key=api_key)
+    return ChatOpenAI(model=model, temperature=temperature, api_key=api_key, max_tokens=max_tokens, timeout=timeout,
+                      max_retries=max_retries)
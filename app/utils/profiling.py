@@ -0,0 +1,269 @@
+"""
+Opt-in sampling profiler for single requests.
+
+A profiled request starts a sampler thread that, every PROFILE_INTERVAL_MS, reads
+the stacks of the threads working for the request: the event loop thread while the
+request's own coroutine runs on it, and the worker threads started through
+`to_thread` on its behalf. While the request waits on the loop with none of its
+worker threads busy, the sample is the chain of coroutines it is suspended in, so
+time spent waiting on MongoDB or a lock shows up too. Samples are wall-clock and
+folded into collapsed stacks, the input format of flamegraph.pl and speedscope.
+
+Profiles are kept in a ring buffer of the last PROFILE_BUFFER_SIZE requests of the
+worker. Profiling is available only when PROFILING_TOKEN is set, and requests that
+are not profiled only pay for one context variable lookup per worker thread.
+"""
+import asyncio
+import hmac
+import os
+import sys
+import sysconfig
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from types import FrameType
+from typing import Callable, Deque, Dict, List, Optional, Tuple, TypeVar
+from uuid import uuid4
+
+T = TypeVar("T")
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+ADMIN_TOKEN_HEADER = "X-Admin-Token"
+# Frames of the profiler itself, left out of worker thread stacks
+_PROFILER_FILE = __file__
+# Frame file names are shown relative to the first of these directories they are in
+_PATH_PREFIXES = ("site-packages/", sysconfig.get_paths()["stdlib"].replace("\\", "/") + "/",
+                  os.getcwd().replace("\\", "/") + "/")
+
+_active: ContextVar[Optional["RequestProfile"]] = ContextVar("active_profile", default=None)
+
+
+def profiling_token() -> str:
+    return os.getenv("PROFILING_TOKEN", "")
+
+
+def check_admin_token(token: Optional[str]):
+    """
+    Raises PermissionError unless profiling is enabled and the token is the admin token.
+    """
+    expected = profiling_token()
+    if not expected:
+        raise PermissionError("Profiling is disabled, set PROFILING_TOKEN to enable it")
+    if not token or not hmac.compare_digest(token.encode(), expected.encode()):
+        raise PermissionError(f"Profiling requires a valid {ADMIN_TOKEN_HEADER} header")
+
+
+def _frame_name(frame: FrameType) -> str:
+    code = frame.f_code
+    filename = code.co_filename.replace("\\", "/")
+    for prefix in _PATH_PREFIXES:
+        if prefix in filename:
+            filename = filename.split(prefix, 1)[1]
+            break
+    return f"{code.co_qualname} ({filename}:{code.co_firstlineno})"
+
+
+def _stack_from(frame: Optional[FrameType], root: FrameType) -> Optional[List[str]]:
+    """
+    Returns the names of the frames from `root` up to `frame`, or None when `root`
+    is not on the stack.
+    """
+    names = []
+    while frame is not None:
+        if frame is root:
+            names.append(_frame_name(frame))
+            return names[::-1]
+        if frame.f_code.co_filename != _PROFILER_FILE:
+            names.append(_frame_name(frame))
+        frame = frame.f_back
+    return None
+
+
+def _awaited_stack(coroutine, root: FrameType) -> Optional[List[str]]:
+    """
+    Returns the chain of coroutines a suspended task waits in, from `root` to the
+    awaitable it is blocked on.
+    """
+    names, awaitable, found = [], coroutine, False
+    while awaitable is not None:
+        frame = getattr(awaitable, "cr_frame", None) or getattr(awaitable, "gi_frame", None) \
+            or getattr(awaitable, "ag_frame", None)
+        if frame is None:
+            break
+        found = found or frame is root
+        if found:
+            names.append(_frame_name(frame))
+        awaitable = getattr(awaitable, "cr_await", None) or getattr(awaitable, "gi_yieldfrom", None) \
+            or getattr(awaitable, "ag_await", None)
+    if not found:
+        return None
+    # Futures await through an iterator that does not expose the future itself
+    kind = type(awaitable).__name__ if awaitable is not None else "event loop"
+    names.append(f"[awaiting {'future' if kind in ('Future', 'FutureIter') else kind}]")
+    return names
+
+
+class RequestProfile:
+    """
+    Async context manager profiling the code run under it, with the worker threads
+    it starts through `to_thread`. On exit the profile is added to the profile store,
+    also when the request failed.
+    """
+
+    def __init__(self, label: str, interval: Optional[float] = None, max_seconds: Optional[float] = None,
+                 **details):
+        self.id = uuid4().hex[:16]
+        self.label = label
+        self.details = details
+        self.interval = interval if interval is not None else float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000
+        self.max_seconds = max_seconds if max_seconds is not None else float(os.getenv("PROFILE_MAX_SECONDS", "120"))
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started_at: Optional[datetime] = None
+        self.duration = 0.0
+        self.error: Optional[str] = None
+        self._threads: Dict[int, Tuple[str, FrameType]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+
+    async def __aenter__(self) -> "RequestProfile":
+        self._root = sys._getframe(1)
+        self._task = asyncio.current_task()
+        self._loop_thread = threading.get_ident()
+        self._token = _active.set(self)
+        self.started_at = datetime.now(timezone.utc)
+        self._started = time.perf_counter()
+        self._sampler = threading.Thread(target=self._run, name=f"profiler-{self.id}", daemon=True)
+        self._sampler.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._sampler.join()
+        self.duration = time.perf_counter() - self._started
+        _active.reset(self._token)
+        if exc is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        get_profile_store().add(self)
+        return False
+
+    def run_tracked(self, fn: Callable[..., T], *args) -> T:
+        """
+        Calls fn, sampling the calling thread while it runs.
+        """
+        thread_id = threading.get_ident()
+        with self._lock:
+            self._threads[thread_id] = (f"[thread] {getattr(fn, '__qualname__', repr(fn))}", sys._getframe())
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self._threads.pop(thread_id, None)
+
+    def _run(self):
+        deadline = time.perf_counter() + self.max_seconds
+        while not self._stop.wait(self.interval) and time.perf_counter() < deadline:
+            self._sample()
+
+    def _sample(self):
+        frames = sys._current_frames()
+        with self._lock:
+            threads = list(self._threads.items())
+        for thread_id, (label, root) in threads:
+            stack = _stack_from(frames.get(thread_id), root)
+            if stack:
+                # The root is the tracking wrapper itself, named after the function it runs
+                self._add([label] + stack[1:])
+        stack = _stack_from(frames.get(self._loop_thread), self._root)
+        if stack is None and not threads and self._task is not None:
+            stack = _awaited_stack(self._task.get_coro(), self._root)
+        if stack:
+            self._add(stack)
+
+    def _add(self, stack: List[str]):
+        self.stacks[";".join(stack)] += 1
+        self.samples += 1
+
+    def collapsed(self) -> str:
+        """
+        Returns the profile as collapsed stacks, one `frame;frame;frame count` line per stack.
+        """
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "label": self.label,
+            **self.details,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration * 1000, 1),
+            "interval_ms": self.interval * 1000,
+            "samples": self.samples,
+            "stacks": len(self.stacks),
+            "error": self.error,
+        }
+
+
+def active_profile() -> Optional[RequestProfile]:
+    return _active.get()
+
+
+async def to_thread(fn: Callable[..., T], *args) -> T:
+    """
+    Runs fn in a worker thread like asyncio.to_thread, sampled when the calling
+    request is profiled.
+    """
+    profile = _active.get()
+    if profile is None:
+        return await asyncio.to_thread(fn, *args)
+    return await asyncio.to_thread(profile.run_tracked, fn, *args)
+
+
+class ProfileStore:
+    """
+    Ring buffer of the most recent profiles of this worker.
+    """
+
+    def __init__(self, size: int):
+        self._profiles: Deque[RequestProfile] = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, profile: RequestProfile):
+        with self._lock:
+            self._profiles.append(profile)
+
+    def get(self, profile_id: str) -> RequestProfile:
+        with self._lock:
+            for profile in self._profiles:
+                if profile.id == profile_id:
+                    return profile
+        raise KeyError(f"Profile {profile_id} does not exist or was evicted")
+
+    def list(self) -> List[dict]:
+        """
+        Returns the summaries of the stored profiles, newest first.
+        """
+        with self._lock:
+            profiles = list(self._profiles)
+        return [profile.summary() for profile in reversed(profiles)]
+
+    def clear(self):
+        with self._lock:
+            self._profiles.clear()
+
+
+_store: Optional[ProfileStore] = None
+_store_lock = threading.Lock()
+
+
+def get_profile_store() -> ProfileStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ProfileStore(int(os.getenv("PROFILE_BUFFER_SIZE", "20")))
+    return _store
@@ -0,0 +1,236 @@
+import functools
+import random
+import sys
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Tuple, Type
+
+import httpx
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Errors worth retrying: network failures, timeouts, throttling and upstream 5xx.
+# requests and urllib errors are OSError subclasses.
+TRANSIENT_ERRORS: Tuple[Type[BaseException], ...] = (
+    OSError,
+    httpx.TransportError,
+)
+# OpenAI errors are looked up only once the SDK is loaded, so importing this module stays cheap
+OPENAI_TRANSIENT_ERRORS = ("APIConnectionError", "RateLimitError", "InternalServerError")
+
+
+def is_transient(error: BaseException) -> bool:
+    """
+    Whether the error is worth retrying, including HTTP 429 and 5xx responses.
+    """
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code == 429 or error.response.status_code >= 500
+    if isinstance(error, TRANSIENT_ERRORS):
+        return True
+    openai = sys.modules.get("openai")
+    return openai is not None and isinstance(error, tuple(getattr(openai, name) for name in OPENAI_TRANSIENT_ERRORS))
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling an upstream whose circuit breaker is open."""
+
+
+@dataclass(frozen=True)
+class BreakerPolicy:
+    """Thresholds over the last `window` calls that open a breaker, and how it recovers."""
+    failure_rate: float = 0.5
+    slow_call_rate: float = 0.5
+    slow_call_duration: float = 5.0
+    window: int = 20
+    min_calls: int = 5
+    open_duration: float = 30.0
+    half_open_probes: int = 2
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """Bounded retries with full-jitter exponential backoff."""
+    attempts: int = 3
+    base_delay: float = 0.2
+    max_delay: float = 2.0
+
+
+class CircuitBreaker:
+    """
+    Thread-safe circuit breaker for one upstream.
+
+    Opens when the failure or slow-call rate over a rolling window crosses its
+    threshold, rejects calls while open, and after `open_duration` lets a few
+    half-open probes through to decide whether to close again.
+    """
+
+    def __init__(self, name: str, policy: BreakerPolicy, clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.policy = policy
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._outcomes = deque(maxlen=policy.window)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        self._probe_successes = 0
+        self._calls = 0
+        self._failures = 0
+        self._rejected = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def _maybe_half_open(self):
+        if self._state == OPEN and self._clock() - self._opened_at >= self.policy.open_duration:
+            self._state = HALF_OPEN
+            self._probes = 0
+            self._probe_successes = 0
+
+    def _open(self):
+        self._state = OPEN
+        self._opened_at = self._clock()
+        self._outcomes.clear()
+        print(f"Circuit breaker for {self.name} opened")
+
+    def before_call(self):
+        """
+        Reserves a call, raising CircuitOpenError if the breaker rejects it.
+        """
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == OPEN or (self._state == HALF_OPEN and self._probes >= self.policy.half_open_probes):
+                self._rejected += 1
+                raise CircuitOpenError(f"Circuit breaker for {self.name} is open")
+            if self._state == HALF_OPEN:
+                self._probes += 1
+
+    def release(self):
+        """
+        Gives back a reserved call whose outcome says nothing about the upstream.
+        """
+        with self._lock:
+            if self._state == HALF_OPEN and self._probes:
+                self._probes -= 1
+
+    def record(self, failed: bool, duration: float):
+        with self._lock:
+            slow = duration >= self.policy.slow_call_duration
+            self._calls += 1
+            self._failures += failed
+
+            if self._state == HALF_OPEN:
+                if failed or slow:
+                    self._open()
+                else:
+                    self._probe_successes += 1
+                    if self._probe_successes >= self.policy.half_open_probes:
+                        self._state = CLOSED
+                        print(f"Circuit breaker for {self.name} closed")
+                return
+
+            self._outcomes.append((failed, slow))
+            if len(self._outcomes) >= self.policy.min_calls:
+                failure_rate = sum(f for f, _ in self._outcomes) / len(self._outcomes)
+                slow_rate = sum(s for _, s in self._outcomes) / len(self._outcomes)
+                if failure_rate >= self.policy.failure_rate or slow_rate >= self.policy.slow_call_rate:
+                    self._open()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            self._maybe_half_open()
+            outcomes = list(self._outcomes)
+            retry_in = max(0.0, self.policy.open_duration - (self._clock() - self._opened_at))
+            return {
+                "state": self._state,
+                "window_calls": len(outcomes),
+                "failure_rate": sum(f for f, _ in outcomes) / len(outcomes) if outcomes else 0.0,
+                "slow_call_rate": sum(s for _, s in outcomes) / len(outcomes) if outcomes else 0.0,
+                "retry_in": retry_in if self._state == OPEN else 0.0,
+                "total_calls": self._calls,
+                "total_failures": self._failures,
+                "total_rejected": self._rejected,
+            }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str, policy: Optional[BreakerPolicy] = None) -> CircuitBreaker:
+    """
+    Returns the breaker of the upstream, creating it on first use.
+    """
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get(name)
+            if breaker is None:
+                breaker = _breakers[name] = CircuitBreaker(name, policy or BreakerPolicy())
+    return breaker
+
+
+def breaker_snapshots() -> Dict[str, dict]:
+    return {name: breaker.snapshot() for name, breaker in sorted(_breakers.items())}
+
+
+def retry_with_backoff(fn: Callable, policy: RetryPolicy, *args,
+                       sleep: Callable[[float], None] = time.sleep, **kwargs):
+    """
+    Calls fn, retrying transient errors up to `policy.attempts` times in total.
+    """
+    from app.fetchers.rate_limit import RateLimitExceeded
+
+    for attempt in range(policy.attempts):
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            if attempt + 1 >= policy.attempts or not is_transient(e) or isinstance(e, RateLimitExceeded):
+                raise
+            delay = random.uniform(0, min(policy.max_delay, policy.base_delay * 2 ** attempt))
+            print(f"Transient error {type(e).__name__}: {e}, retrying in {delay:.2f}s")
+            sleep(delay)
+
+
+def resilient_call(name: str, fn: Callable, *args, breaker_policy: Optional[BreakerPolicy] = None,
+                   retry_policy: RetryPolicy = RetryPolicy(), **kwargs):
+    """
+    Calls fn through the circuit breaker of the upstream, with retries on transient errors.
+    Fails fast with CircuitOpenError while the breaker is open. Time spent queueing on
+    our own rate limiters, and running out of that queue, are not held against the upstream.
+    """
+    from app.fetchers.rate_limit import RateLimitExceeded, queued_seconds
+
+    breaker = get_breaker(name, breaker_policy)
+    breaker.before_call()
+    started = time.perf_counter()
+    queued_before = queued_seconds()
+    try:
+        result = retry_with_backoff(fn, retry_policy, *args, **kwargs)
+    except RateLimitExceeded:
+        breaker.release()
+        raise
+    except Exception:
+        breaker.record(failed=True, duration=time.perf_counter() - started - (queued_seconds() - queued_before))
+        raise
+    breaker.record(failed=False, duration=time.perf_counter() - started - (queued_seconds() - queued_before))
+    return result
+
+
+def resilient(search):
+    """
+    Decorates a fetcher's search to run through the breaker and retry policy of its source.
+    """
+    @functools.wraps(search)
+    def wrapper(self, *args, **kwargs):
+        return resilient_call(self.source, search, self, *args,
+                              breaker_policy=self.breaker_policy, retry_policy=self.retry_policy, **kwargs)
+
+    return wrapper
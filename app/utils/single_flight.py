@@ -0,0 +1,55 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one shared execution.
+
+    The first caller for a key becomes the leader and starts the work as its own task;
+    later callers wait on that task instead of starting another one. At most
+    `max_followers` callers join one execution, beyond that callers run their own.
+    Cancelling any one caller never cancels the shared work of the others.
+    """
+
+    def __init__(self, max_followers: int = 50):
+        self.max_followers = max_followers
+        self._flights: Dict[Hashable, list] = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.overflowed = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        flight = self._flights.get(key)
+        if flight is not None:
+            task, followers = flight
+            if followers < self.max_followers:
+                flight[1] += 1
+                self.coalesced += 1
+                return await asyncio.shield(task)
+            self.overflowed += 1
+            return await fn()
+
+        task = asyncio.ensure_future(fn())
+        self._flights[key] = [task, 0]
+        self.leaders += 1
+        task.add_done_callback(lambda finished: self._land(key, finished))
+        return await asyncio.shield(task)
+
+    def _land(self, key: Hashable, task: asyncio.Task):
+        if self._flights.get(key, [None])[0] is task:
+            del self._flights[key]
+        if not task.cancelled():
+            # Mark the exception as retrieved in case every caller was cancelled
+            task.exception()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._flights),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "overflowed": self.overflowed,
+            "max_followers": self.max_followers,
+        }
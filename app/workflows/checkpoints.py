@@ -0,0 +1,250 @@
+"""
+Durable checkpoints of research graph runs in MongoDB.
+
+With a checkpointer the graph stores its state after every node, keyed by the
+run's thread id, so a run interrupted by a failed LLM call or a worker restart
+resumes from the last completed node instead of starting over. Checkpoints are
+removed by MongoDB TTL indexes GRAPH_CHECKPOINT_TTL seconds after they are written.
+"""
+import os
+import re
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+    writes_sort_key,
+)
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from pymongo import ASCENDING, DESCENDING
+
+CHECKPOINTS_COLLECTION = "graph_checkpoints"
+BLOBS_COLLECTION = "graph_checkpoint_blobs"
+WRITES_COLLECTION = "graph_checkpoint_writes"
+# Non-builtin types stored in the research state, allowed back out of checkpoints
+STATE_TYPES = [
+    ("app.workflows.research_type", "ResearchType"),
+    ("app.workflows.retrieval", "RetrievalOptions"),
+]
+
+
+def checkpoint_serializer() -> JsonPlusSerializer:
+    return JsonPlusSerializer(allowed_msgpack_modules=STATE_TYPES)
+
+
+class MongoCheckpointSaver(BaseCheckpointSaver):
+    """
+    Synchronous LangGraph checkpoint saver on pymongo collections.
+
+    Like LangGraph's in-memory saver, channel values are stored once per channel
+    version, so a checkpoint only writes the channels its node changed.
+    """
+
+    def __init__(self, database, ttl: float = 86400.0):
+        super().__init__(serde=checkpoint_serializer())
+        self.checkpoints = database[CHECKPOINTS_COLLECTION]
+        self.blobs = database[BLOBS_COLLECTION]
+        self.writes = database[WRITES_COLLECTION]
+        self.ttl = ttl
+
+    def setup(self):
+        """
+        Creates the lookup and TTL indexes. Safe to call on every start.
+        """
+        self.checkpoints.create_index([("thread_id", ASCENDING), ("checkpoint_ns", ASCENDING),
+                                       ("checkpoint_id", DESCENDING)], unique=True)
+        self.blobs.create_index([("thread_id", ASCENDING), ("checkpoint_ns", ASCENDING), ("channel", ASCENDING),
+                                 ("version", ASCENDING)], unique=True)
+        self.writes.create_index([("thread_id", ASCENDING), ("checkpoint_ns", ASCENDING),
+                                  ("checkpoint_id", ASCENDING), ("task_id", ASCENDING), ("idx", ASCENDING)],
+                                 unique=True)
+        for collection in (self.checkpoints, self.blobs, self.writes):
+            collection.create_index("created_at", expireAfterSeconds=int(self.ttl))
+
+    @staticmethod
+    def _now() -> datetime:
+        return datetime.now(timezone.utc)
+
+    def _dump(self, value: Any) -> Dict[str, Any]:
+        type_, data = self.serde.dumps_typed(value)
+        return {"type": type_, "data": data}
+
+    def _load(self, document: Dict[str, Any]) -> Any:
+        return self.serde.loads_typed((document["type"], document["data"]))
+
+    def _load_blobs(self, thread_id: str, checkpoint_ns: str, versions: ChannelVersions) -> Dict[str, Any]:
+        if not versions:
+            return {}
+        wanted = [{"channel": channel, "version": str(version)} for channel, version in versions.items()]
+        values = {}
+        for blob in self.blobs.find({"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "$or": wanted}):
+            if blob["type"] != "empty":
+                values[blob["channel"]] = self._load(blob)
+        return values
+
+    def _pending_writes(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str) -> List[Tuple[str, str, Any]]:
+        writes = list(self.writes.find({"thread_id": thread_id, "checkpoint_ns": checkpoint_ns,
+                                        "checkpoint_id": checkpoint_id}))
+        writes.sort(key=lambda write: writes_sort_key(write["task_path"], write["task_id"], write["idx"]))
+        return [(write["task_id"], write["channel"], self._load(write)) for write in writes]
+
+    def _to_tuple(self, document: Dict[str, Any]) -> CheckpointTuple:
+        thread_id, checkpoint_ns = document["thread_id"], document["checkpoint_ns"]
+        checkpoint: Checkpoint = self._load(document["checkpoint"])
+        checkpoint = {**checkpoint,
+                      "channel_values": self._load_blobs(thread_id, checkpoint_ns, checkpoint["channel_versions"])}
+        parent_id = document.get("parent_checkpoint_id")
+        return CheckpointTuple(
+            config={"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns,
+                                     "checkpoint_id": document["checkpoint_id"]}},
+            checkpoint=checkpoint,
+            metadata=self._load(document["metadata"]),
+            pending_writes=self._pending_writes(thread_id, checkpoint_ns, document["checkpoint_id"]),
+            parent_config={"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns,
+                                            "checkpoint_id": parent_id}} if parent_id else None,
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        query = {"thread_id": config["configurable"]["thread_id"],
+                 "checkpoint_ns": config["configurable"].get("checkpoint_ns", "")}
+        checkpoint_id = get_checkpoint_id(config)
+        if checkpoint_id:
+            query["checkpoint_id"] = checkpoint_id
+        document = self.checkpoints.find_one(query, sort=[("checkpoint_id", DESCENDING)])
+        return self._to_tuple(document) if document else None
+
+    def list(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+             before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> Iterator[CheckpointTuple]:
+        query: Dict[str, Any] = {}
+        if config:
+            query["thread_id"] = config["configurable"]["thread_id"]
+            if "checkpoint_ns" in config["configurable"]:
+                query["checkpoint_ns"] = config["configurable"]["checkpoint_ns"]
+        if before and get_checkpoint_id(before):
+            query["checkpoint_id"] = {"$lt": get_checkpoint_id(before)}
+        cursor = self.checkpoints.find(query, sort=[("checkpoint_id", DESCENDING)])
+        returned = 0
+        for document in cursor:
+            checkpoint_tuple = self._to_tuple(document)
+            if filter and any(checkpoint_tuple.metadata.get(key) != value for key, value in filter.items()):
+                continue
+            yield checkpoint_tuple
+            returned += 1
+            if limit is not None and returned >= limit:
+                return
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        now = self._now()
+        stored = checkpoint.copy()
+        values = stored.pop("channel_values")
+
+        for channel, version in new_versions.items():
+            key = {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "channel": channel, "version": str(version)}
+            blob = self._dump(values[channel]) if channel in values else {"type": "empty", "data": b""}
+            self.blobs.update_one(key, {"$set": {**blob, "created_at": now}}, upsert=True)
+
+        self.checkpoints.update_one(
+            {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint["id"]},
+            {"$set": {"parent_checkpoint_id": config["configurable"].get("checkpoint_id"),
+                      "checkpoint": self._dump(stored),
+                      "metadata": self._dump(get_checkpoint_metadata(config, metadata)),
+                      "created_at": now}},
+            upsert=True,
+        )
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns,
+                                 "checkpoint_id": checkpoint["id"]}}
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                   task_path: str = "") -> None:
+        key = {"thread_id": config["configurable"]["thread_id"],
+               "checkpoint_ns": config["configurable"].get("checkpoint_ns", ""),
+               "checkpoint_id": config["configurable"]["checkpoint_id"],
+               "task_id": task_id}
+        now = self._now()
+        for idx, (channel, value) in enumerate(writes):
+            idx = WRITES_IDX_MAP.get(channel, idx)
+            update = {**self._dump(value), "channel": channel, "task_path": task_path, "created_at": now}
+            # Special writes (errors, interrupts) keep their first value, like the in-memory saver
+            operator = "$setOnInsert" if idx < 0 else "$set"
+            self.writes.update_one({**key, "idx": idx}, {operator: update}, upsert=True)
+
+    def delete_thread(self, thread_id: str) -> None:
+        for collection in (self.checkpoints, self.blobs, self.writes):
+            collection.delete_many({"thread_id": thread_id})
+
+    def delete_thread_prefixes(self, prefixes: List[str], batch_size: int = 500) -> int:
+        """
+        Deletes the threads whose ids start with any of the prefixes and returns the
+        number of checkpoints deleted. Anchored prefixes are matched on the thread_id index.
+        """
+        deleted = 0
+        for start in range(0, len(prefixes), batch_size):
+            query = {"$or": [{"thread_id": {"$regex": f"^{re.escape(prefix)}"}}
+                             for prefix in prefixes[start:start + batch_size]]}
+            deleted += self.checkpoints.delete_many(query).deleted_count
+            self.blobs.delete_many(query)
+            self.writes.delete_many(query)
+        return deleted
+
+
+def delete_agent_checkpoints(saver: Optional[BaseCheckpointSaver], agent_ids: List[str]) -> int:
+    """
+    Deletes the checkpoints of the runs of the agents, whose thread ids are
+    `<agent id>:<request id>`, and returns how many were deleted.
+    """
+    if saver is None or not agent_ids:
+        return 0
+    if isinstance(saver, MongoCheckpointSaver):
+        return saver.delete_thread_prefixes([f"{agent_id}:" for agent_id in agent_ids])
+    # LangGraph's in-memory saver keeps checkpoints per thread id and namespace
+    wanted = set(agent_ids)
+    deleted = 0
+    for thread_id in [thread_id for thread_id in getattr(saver, "storage", {})
+                      if thread_id.split(":", 1)[0] in wanted]:
+        deleted += sum(len(checkpoints) for checkpoints in saver.storage[thread_id].values())
+        saver.delete_thread(thread_id)
+    return deleted
+
+
+def checkpointer_mode() -> str:
+    return (os.getenv("GRAPH_CHECKPOINTER") or "mongo").lower()
+
+
+def get_checkpointer() -> Optional[BaseCheckpointSaver]:
+    """
+    Returns the checkpointer for the research graph: MongoDB through the client opened
+    by init_db (GRAPH_CHECKPOINTER=mongo, the default), LangGraph's in-memory saver
+    (memory), or None (off, or mongo before the database is initialized).
+    """
+    mode = checkpointer_mode()
+    if mode == "off":
+        return None
+    if mode == "memory":
+        from langgraph.checkpoint.memory import InMemorySaver
+
+        return InMemorySaver(serde=checkpoint_serializer())
+    if mode != "mongo":
+        raise ValueError(f"GRAPH_CHECKPOINTER must be mongo, memory or off, not {mode}")
+
+    from app.core.db import get_client
+
+    try:
+        client = get_client()
+    except RuntimeError:
+        print("Database is not initialized, research graph runs without checkpoints")
+        return None
+    saver = MongoCheckpointSaver(client.delegate[os.getenv("MONGODB_DB")],
+                                 ttl=float(os.getenv("GRAPH_CHECKPOINT_TTL", "86400")))
+    saver.setup()
+    return saver
@@ -0,0 +1,52 @@
+import hashlib
+import os
+from dataclasses import dataclass, field
+from typing import List, Tuple
+
+# Turns kept verbatim in the prompt; older turns are folded into the rolling summary
+HISTORY_TURNS = int(os.getenv("CONVERSATION_HISTORY_TURNS", "3"))
+# Longest agent response quoted verbatim from a recent turn
+TURN_RESPONSE_CHARS = 1000
+
+
+@dataclass
+class ConversationContext:
+    """The rolling summary of an agent's conversation plus its most recent turns."""
+    summary: str = ""
+    turns: List[Tuple[str, str]] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.summary or self.turns)
+
+    def render(self) -> str:
+        parts = []
+        if self.summary:
+            parts.append(f"Summary of earlier conversation: {self.summary}")
+        for query, response in self.turns:
+            if len(response) > TURN_RESPONSE_CHARS:
+                response = response[:TURN_RESPONSE_CHARS] + "..."
+            parts.append(f"User: {query}\nAssistant: {response}")
+        return "\n\n".join(parts)
+
+    def key(self) -> str:
+        """
+        Short fingerprint of the context, so only queries with the same history share a pipeline run.
+        """
+        return hashlib.sha256(self.render().encode()).hexdigest()[:16]
+
+
+def conversation_context(agent_document: dict) -> ConversationContext:
+    """
+    Returns the summary and every turn not folded into it yet, which is normally
+    the last HISTORY_TURNS turns, from the document read by get_context_document.
+    """
+    return ConversationContext(agent_document.get("summary") or "",
+                               [(m["query"], m["agent_response"]) for m in agent_document.get("messages") or []])
+
+
+def turns_to_fold(agent, keep: int = HISTORY_TURNS) -> List[Tuple[str, str]]:
+    """
+    Returns the turns that fell out of the verbatim window and still need folding into the summary.
+    """
+    messages = agent.messages or []
+    return [(m.query, m.agent_response) for m in messages[agent.summarized_count:max(0, len(messages) - keep)]]
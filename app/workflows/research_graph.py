@@ -1,52 +1,138 @@
+import functools
+import hashlib
+import math
+import time
+from dataclasses import replace
+from typing import List, Optional, Tuple
+
 from langgraph.graph import END, StateGraph
 from langchain_core.prompts import ChatPromptTemplate
 
 from app.fetchers import Fetcher
-from app.fetchers.arxiv import ArxivFetcher
-from app.fetchers.pubmed import PubMedFetcher
-from app.fetchers.wikipedia import WikipediaFetcher
-from app.fetchers.duckduckgo import DuckDuckGoFetcher
-from app.utils.llm import get_openai_llm
+from app.fetchers.arxiv_index import ARXIV_INDEX_HYBRID, ARXIV_INDEX_LOCAL, arxiv_index_mode
+from app.fetchers.registry import create_fetcher
+from app.fetchers.wikipedia_local import local_wikipedia_enabled
+from app.utils.cache import CLASSIFICATION_NAMESPACE, QUERY_NAMESPACE, get_cache, get_fetcher_cache
+from app.utils.cassette import use_cassette_fetcher
+from app.utils.llm import get_openai_llm, llm_config
+from app.utils.resilience import BreakerPolicy, RetryPolicy, resilient_call
+from app.workflows.checkpoints import get_checkpointer
 from app.workflows.research_type import ResearchType
 from app.workflows.research_state import ResearchState
+from app.workflows.retrieval import ANSWER_STYLES, DEFAULT_RETRIEVAL, RetrievalOptions
+from app.workflows.routing import ROUTING_STATIC, allowed_sources, get_router, latency_budget, routing_mode
+from app.workflows.usage import UsageRecorder, answered_by, metered, record_fetcher, record_tokens, recording
 from app.models.results import QueryResult, FetcherResult
 
 
+# The OpenAI client already retries internally, so keep our own retries short
+LLM_RETRY_POLICY = RetryPolicy(attempts=2, base_delay=0.5, max_delay=2.0)
+# A synthesis can take most of its 60s timeout when healthy, and a call running past its
+# node timeout fails anyway, so LLM breakers open on failures only, never on slow calls
+LLM_BREAKER_POLICY = BreakerPolicy(slow_call_duration=math.inf)
+
+def _invoke_chain(node: str, chain, inputs: dict):
+    # One breaker per node, so failing synthesis calls never open the breaker of classification
+    response = resilient_call(f"openai:{node}", chain.invoke, inputs, breaker_policy=LLM_BREAKER_POLICY,
+                              retry_policy=LLM_RETRY_POLICY)
+    record_tokens(response)
+    return response
+
+def _node_llm(node: str):
+    """
+    Returns the chat model configured for the graph node, falling back to the
+    alternate model when the primary one fails or times out.
+    """
+    config = llm_config(node)
+    has_fallback = bool(config.fallback_model) and config.fallback_model != config.model
+    # With a fallback, a timed out primary call switches over instead of being retried by the client
+    llm = answered_by(get_openai_llm(config.model, config.temperature, config.max_tokens, config.timeout,
+                                     config.primary_retries if has_fallback else None), config.model)
+    if has_fallback:
+        fallback = get_openai_llm(config.fallback_model, config.temperature, config.max_tokens, config.timeout)
+        return llm.with_fallbacks([answered_by(fallback, config.fallback_model, fallback=True)])
+    return llm
+
+# Prompts keep their static text first and the query last, so provider-side prompt
+# caching can reuse the shared prefix across requests
+REWRITE_SYSTEM_PROMPT = (
+    "You rewrite the follow-up question of a research conversation into a standalone search query. "
+    "Replace pronouns and references to earlier turns with what they refer to in the conversation, "
+    "keep the rest of the question as it is, and reply with the query only.")
+CLASSIFY_SYSTEM_PROMPT = (
+    f"You are a classifier that outputs exactly one word: "
+    f"{ResearchType.MEDICAL.name},  {ResearchType.ACADEMIC.name},  {ResearchType.KNOWLEDGE.name}, or  {ResearchType.WEB.name}.\n"
+    "Classify the domain of the user's query. "
+    f"If medical, clinical, health or biological → '{ResearchType.MEDICAL.name}'. "
+    f"If encyclopedic, factual, trivial, or general knowledge → '{ResearchType.KNOWLEDGE.name}'. "
+    f"If academic, research papers, scientific → '{ResearchType.ACADEMIC.name}'. "
+    f"If travel/hotels/flights, current events/news, sports, or general web info → '{ResearchType.WEB.name}'. "
+    f"Else → '{ResearchType.WEB.name}'.")
+IDENTIFY_SYSTEM_PROMPT = (
+    "You are an expert in health and medical field. Identify the important medical terms in the query that would still capture the idea of the query. "
+    "Use a maximum of 5 terms, separated by commas")
+SYNTHESIZE_SYSTEM_PROMPT = (
+    "You are an expert research assistant. Synthesize a helpful, well-cited, concise answer using the provided sources. Cite inline with [n]. "
+    "Provide a factual, neutral, safety-conscious answer suitable for general audiences.")
+
+def _normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+def _search_query(state: ResearchState) -> str:
+    return state.get("search_query") or state["query"]
+
+def _route_entry(state: ResearchState) -> str:
+    return "rewrite" if state.get("history") else "classify"
+
+def _rewrite_query(state: ResearchState) -> ResearchState:
+    """
+    Rewrites a follow-up question into a standalone query from the conversation so far,
+    so classification and retrieval know what "it" or "that study" refers to.
+    """
+    llm = _node_llm("rewrite")
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", REWRITE_SYSTEM_PROMPT),
+        ("user", "Conversation so far:\n{history}\n\nFollow-up question: {query}")
+    ])
+    chain = prompt | llm
+    response = _invoke_chain("rewrite", chain, {"history": state["history"], "query": state["query"]})
+
+    state["search_query"] = response.content.strip() or state["query"]
+    print(f"Standalone query: {state['search_query']}")
+    return state
+
 def _classify_domain(state: ResearchState) -> ResearchState:
-    llm = get_openai_llm()
-
-    system_prompt = (f"You are a classifier that outputs exactly one word: "
-                     f"{ResearchType.MEDICAL.name},  {ResearchType.ACADEMIC.name},  {ResearchType.KNOWLEDGE.name}, or  {ResearchType.WEB.name}.")
-    query_prompt = ("Query: {query}\n"
-                  "Classify the domain of the query above. "
-                  f"If medical, clinical, health or biological → '{ResearchType.MEDICAL.name}'. "
-                  f"If encyclopedic, factual, trivial, or general knowledge → '{ResearchType.KNOWLEDGE.name}'. "
-                  f"If academic, research papers, scientific → '{ResearchType.ACADEMIC.name}'. "
-                  f"If travel/hotels/flights, current events/news, sports, or general web info → '{ResearchType.WEB.name}'. "
-                  f"Else → '{ResearchType.WEB.name}'.")
+    cache = get_cache(CLASSIFICATION_NAMESPACE)
+    query = _search_query(state)
+    key = _normalize_query(query)
+    cached = cache.get(key)
+    if cached is not None:
+        state["domain"] = ResearchType[cached]
+        return state
+
+    llm = _node_llm("classify")
 
     prompt = ChatPromptTemplate.from_messages([
-        ("system", system_prompt),
-        ("user", ("%s" % query_prompt))
+        ("system", CLASSIFY_SYSTEM_PROMPT),
+        ("user", "Query: {query}")
     ])
     chain = prompt | llm
-    response = chain.invoke({"query": state["query"]})
+    response = _invoke_chain("classify", chain, {"query": query})
 
     domain: ResearchType = ResearchType[response.content.strip().upper()]
+    cache.put(key, domain.name)
     state["domain"] = domain
     print(f"Domain identified: {domain}")
     return state
 
 def _identify_medical_terms(state: ResearchState) -> ResearchState:
-    llm = get_openai_llm()
-    system_prompt = (f"You are an expert in health and medical field. Identify the important medical terms in the query that would still capture the idea of the query. "
-                     f"Use a maximum of 5 terms, separated by commas")
+    llm = _node_llm("identify")
     prompt = ChatPromptTemplate.from_messages([
-        ("system", system_prompt),
-        ("user", ("%s" % "Query: {query}"))
+        ("system", IDENTIFY_SYSTEM_PROMPT),
+        ("user", "Query: {query}")
     ])
     chain = prompt | llm
-    response = chain.invoke({"query": state["query"]})
+    response = _invoke_chain("identify", chain, {"query": _search_query(state)})
 
     terms = response.content.strip()
     state["terms"] = terms
@@ -55,13 +141,20 @@ def _identify_medical_terms(state: ResearchState) -> ResearchState:
 
 def _retrieve_fetcher(domain: ResearchType) -> Fetcher:
     if domain == ResearchType.MEDICAL:
-        return PubMedFetcher()
+        return create_fetcher("pubmed")
     elif domain == ResearchType.KNOWLEDGE:
-        return WikipediaFetcher()
+        if local_wikipedia_enabled():
+            return create_fetcher("wikipedia_local")
+        return create_fetcher("wikipedia")
     elif domain == ResearchType.ACADEMIC:
-        return ArxivFetcher()
+        mode = arxiv_index_mode()
+        if mode == ARXIV_INDEX_LOCAL:
+            return create_fetcher("arxiv_local")
+        if mode == ARXIV_INDEX_HYBRID:
+            return create_fetcher("arxiv_hybrid", live_fetcher=functools.partial(create_fetcher, "arxiv"))
+        return create_fetcher("arxiv")
     else:
-        return DuckDuckGoFetcher()
+        return create_fetcher("duckduckgo")
 
 def _route_after_classify(state: ResearchState) -> str:
     if state["domain"] == ResearchType.MEDICAL:
@@ -69,49 +162,142 @@ def _route_after_classify(state: ResearchState) -> str:
     else:
         return "retrieve"
 
+def _source_key(fetcher: Fetcher) -> str:
+    return str(fetcher.source or type(fetcher).__name__)
+
+def search_sources(fetcher: Fetcher, query: str, terms: str = "") -> FetcherResult:
+    """
+    Searches the fetcher through the fetcher result cache. Only non-empty results are
+    cached, so an empty answer is retried, and falls back to web search, every time.
+    Searches that miss the cache update the routing stats of the fetcher.
+    """
+    cache = get_fetcher_cache()
+    source = _source_key(fetcher)
+    key = (source, _normalize_query(query), terms, fetcher.top_k, fetcher.max_chars)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+    started = time.perf_counter()
+    try:
+        fetcher_result: FetcherResult = use_cassette_fetcher(fetcher).search(query, terms)
+    except Exception:
+        get_router().record(source, time.perf_counter() - started, error=True)
+        raise
+    found = bool(fetcher_result.raw_sources and fetcher_result.documents)
+    get_router().record(source, time.perf_counter() - started, empty=not found)
+    if found:
+        cache.put(key, fetcher_result)
+    return fetcher_result
+
+def _route_fetcher(domain: ResearchType, research_type: ResearchType) -> Fetcher:
+    # Web search as a fallback is always DuckDuckGo, whatever the domain's own fetcher is
+    if research_type == ResearchType.WEB and domain != ResearchType.WEB:
+        return create_fetcher("duckduckgo")
+    return _retrieve_fetcher(research_type)
+
+def _route(domain: ResearchType, retrieval: RetrievalOptions) -> List[Tuple[ResearchType, Fetcher]]:
+    """
+    Returns the fetchers to try for the domain in order, configured with the retrieval
+    options: the static route, or the allowed fetchers ordered by the adaptive router.
+    """
+    candidates = []
+    for research_type, relevance in allowed_sources(domain, retrieval.sources).items():
+        fetcher = _route_fetcher(domain, research_type)
+        fetcher.configure(retrieval.top_k, retrieval.max_chars)
+        candidates.append((research_type, relevance, fetcher))
+    if routing_mode() != ROUTING_STATIC and len(candidates) > 1:
+        ranked = get_router().order([(_source_key(fetcher), relevance, research_type, fetcher)
+                                     for research_type, relevance, fetcher in candidates], latency_budget())
+        return [(research_type, fetcher) for _, _, research_type, fetcher in ranked]
+    return [(research_type, fetcher) for research_type, _, fetcher in candidates]
+
 def _retrieve_sources(state: ResearchState) -> ResearchState:
     print(f"Retrieving sources for query...")
-    query = state["query"]
+    query = _search_query(state)
     terms = state.get("terms", "")  # Use empty string if terms not set
     domain = state.get("domain")
+    retrieval = state.get("retrieval") or DEFAULT_RETRIEVAL
 
-    fetcher = _retrieve_fetcher(domain)
-    fetcher_result: FetcherResult = fetcher.search(query, terms)
-
-    # Check if medical domain returned empty results and fallback to web search
-    if domain != ResearchType.WEB and (not fetcher_result.raw_sources or not fetcher_result.documents):
-        print(f"PubMed returned empty results, falling back to web search...")
-        web_fetcher = DuckDuckGoFetcher()
-        fallback_result: FetcherResult = web_fetcher.search(query, terms)
-        state["sources"] = fallback_result.raw_sources
-        state["documents"] = fallback_result.documents
-        state["domain"] = ResearchType.WEB
-    else:
-        state["sources"] = fetcher_result.raw_sources
-        state["documents"] = fetcher_result.documents
+    budget = latency_budget()
+    started = time.perf_counter()
+    result_type, fetcher_result, failure = domain, FetcherResult([], []), None
+    source, fell_back = None, False
+    for attempt, (research_type, fetcher) in enumerate(_route(domain, retrieval)):
+        if attempt:
+            if time.perf_counter() - started > budget:
+                print(f"Retrieval latency budget of {budget}s spent, not trying the {research_type.name} fetcher")
+                break
+            print(f"{result_type.name} fetcher returned no results, falling back to {research_type.name} fetcher...")
+        try:
+            fetcher_result, failure = search_sources(fetcher, query, terms), None
+        except Exception as e:
+            # An open circuit breaker fails here in milliseconds, so outages go straight to the next fetcher
+            print(f"{research_type.name} fetcher failed with {type(e).__name__}: {e}")
+            fetcher_result, failure = FetcherResult([], []), e
+        result_type, source, fell_back = research_type, _source_key(fetcher), attempt > 0
+        if fetcher_result.raw_sources and fetcher_result.documents:
+            break
+    if failure is not None:
+        raise failure
+    if source is not None:
+        record_fetcher(source, fell_back)
+
+    state["sources"] = fetcher_result.raw_sources
+    state["documents"] = fetcher_result.documents
+    state["domain"] = result_type
 
     return state
 
 def _synthesize_answer(state: ResearchState) -> ResearchState:
-    llm = get_openai_llm()
+    llm = _node_llm("synthesize")
+    query_prompt = "Sources:\n{sources}\n\nQuery: {query}"
+    inputs = {"query": state["query"]}
+    history = state.get("history")
+    if history:
+        # Follow-up questions are answered in the context of the conversation so far,
+        # which only grows between turns and so stays a cacheable prefix
+        query_prompt = "Conversation so far:\n{history}\n\n" + query_prompt
+        inputs["history"] = history
+    retrieval = state.get("retrieval") or DEFAULT_RETRIEVAL
+    if retrieval.profile in ANSWER_STYLES:
+        query_prompt += "\n\nInstructions: " + ANSWER_STYLES[retrieval.profile]
     prompt = ChatPromptTemplate.from_messages([
-        ("system", "You are an expert research assistant. Synthesize a helpful, well-cited, concise answer using the provided sources. Cite inline with [n]."),
-        ("user", "Query: {query}\n\nSources:\n{sources}\n\nInstructions: Provide a factual, neutral, safety-conscious answer suitable for general audiences.")
+        ("system", SYNTHESIZE_SYSTEM_PROMPT),
+        ("user", query_prompt)
     ])
-    sources_text = "\n\n".join(f"[{i+1}] {s}" for i, s in enumerate(state.get("sources", []))) or "No sources found"
+    inputs["sources"] = "\n\n".join(f"[{i+1}] {s}" for i, s in enumerate(state.get("sources", []))) or "No sources found"
     chain = prompt | llm
-    response = chain.invoke({"query": state["query"], "sources": sources_text})
+    response = _invoke_chain("synthesize", chain, inputs)
     state["answer"] = response.content
     return state
 
-def _build_research_graph():
+def summarize_history(summary: str, turns: List[Tuple[str, str]]) -> str:
+    """
+    Folds conversation turns into the rolling summary of an agent's conversation.
+    """
+    llm = _node_llm("summarize")
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", "You maintain a running summary of a research conversation. Merge the new turns into the summary, "
+                   "keeping the topics, key facts and open questions a follow-up question might refer to. "
+                   "Reply with the updated summary only, in at most 150 words."),
+        ("user", "Current summary:\n{summary}\n\nNew turns:\n{turns}")
+    ])
+    turns_text = "\n\n".join(f"User: {query}\nAssistant: {response}" for query, response in turns)
+    chain = prompt | llm
+    response = _invoke_chain("summarize", chain, {"summary": summary or "(empty)", "turns": turns_text})
+    return response.content.strip()
+
+def _build_research_graph(checkpointed: bool = True):
     graph = StateGraph(ResearchState)
-    graph.add_node("classify", _classify_domain)
-    graph.add_node("identify", _identify_medical_terms)
-    graph.add_node("retrieve", _retrieve_sources)
-    graph.add_node("synthesize", _synthesize_answer)
+    graph.add_node("rewrite", metered("rewrite", _rewrite_query))
+    graph.add_node("classify", metered("classify", _classify_domain))
+    graph.add_node("identify", metered("identify", _identify_medical_terms))
+    graph.add_node("retrieve", metered("retrieve", _retrieve_sources))
+    graph.add_node("synthesize", metered("synthesize", _synthesize_answer))
 
-    graph.set_entry_point("classify")
+    # Follow-up questions are made standalone before they are classified and searched
+    graph.set_conditional_entry_point(_route_entry, {"rewrite": "rewrite", "classify": "classify"})
+    graph.add_edge("rewrite", "classify")
     graph.add_conditional_edges(
         "classify",
         _route_after_classify, {
@@ -123,17 +309,54 @@ def _build_research_graph():
     graph.add_edge("retrieve", "synthesize")
     graph.add_edge("synthesize", END)
 
-    return graph.compile()
+    return graph.compile(checkpointer=get_checkpointer() if checkpointed else None)
+
+@functools.lru_cache(maxsize=None)
+def get_research_graph(checkpointed: bool = True):
+    """
+    Returns the research graph, compiled once per process with the configured
+    checkpointer, or without one.
+    """
+    return _build_research_graph(checkpointed)
+
+def process_query(query: str, history: str = "", retrieval: RetrievalOptions = DEFAULT_RETRIEVAL,
+                  thread_id: Optional[str] = None) -> QueryResult:
+    """
+    Runs the research graph for the query. With a checkpointer, a run given the thread id
+    of an earlier run of the same query continues from the last node that run completed,
+    or returns its answer when it finished. Raises ValueError when the thread id belongs
+    to a different query. Runs without a thread id are not checkpointed.
+    The result carries the usage of the nodes this call ran.
+    """
+    cache = get_cache(QUERY_NAMESPACE)
+    key = (_normalize_query(query), hashlib.sha1(history.encode()).hexdigest(), retrieval.key())
+    cached = cache.get(key)
+    if cached is not None:
+        return replace(cached, usage=UsageRecorder().summary(cached=True))
 
-def process_query(query: str) -> QueryResult:
-    graph = _build_research_graph()
-    final_state = graph.invoke({"query": query, "domain": ResearchType.WEB})
+    inputs = {"query": query, "domain": ResearchType.WEB, "history": history, "retrieval": retrieval}
+    graph = get_research_graph(checkpointed=bool(thread_id))
+    with recording() as recorder:
+        if not thread_id or graph.checkpointer is None:
+            # Nothing can resume a run without a thread id, so it is not worth checkpointing
+            final_state = graph.invoke(inputs)
+        else:
+            config = {"configurable": {"thread_id": thread_id}}
+            snapshot = graph.get_state(config)
+            if not snapshot.values:
+                final_state = graph.invoke(inputs, config)
+            elif snapshot.values.get("query") != query:
+                raise ValueError(f"Request {thread_id} was already used for a different query")
+            else:
+                final_state = graph.invoke(None, config) if snapshot.next else snapshot.values
     answer = final_state.get("answer")
     domain = final_state.get("domain").name.lower()
     documents = final_state.get("documents", [])
 
-    return QueryResult(
+    query_result = QueryResult(
         agent_response=answer,
         domain=domain,
         documents=documents
     )
+    cache.put(key, query_result)
+    return replace(query_result, usage=recorder.summary())
@@ -1,12 +1,17 @@
 from typing import TypedDict, Optional, List, Literal
 
 from app.workflows.research_type import ResearchType
+from app.workflows.retrieval import RetrievalOptions
 
 
 class ResearchState(TypedDict):
     query: str
+    # The query rewritten to stand on its own when it follows up on the conversation
+    search_query: str
     domain: ResearchType
     sources: List[str]
     documents: List[str]
     terms: str
-    answer: Optional[str]
\ No newline at end of file
+    answer: Optional[str]
+    history: str
+    retrieval: RetrievalOptions
\ No newline at end of file
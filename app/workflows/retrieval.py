@@ -0,0 +1,76 @@
+"""
+Per-query retrieval options: how many results each fetcher returns, how much of
+each result is kept, which sources may be searched, and how long the answer is.
+"""
+import os
+from dataclasses import dataclass
+from typing import Optional, Sequence, Tuple
+
+from app.fetchers import MAX_CHARACTERS, TOP_K_RESULTS
+from app.workflows.research_type import ResearchType
+
+PROFILE_FAST = "fast"
+PROFILE_THOROUGH = "thorough"
+# Results per source and characters per result of each profile
+PROFILES = {
+    PROFILE_FAST: (2, 800),
+    PROFILE_THOROUGH: (8, 6000),
+}
+# Instruction appended to the synthesis prompt for each profile
+ANSWER_STYLES = {
+    PROFILE_FAST: "Answer in at most three sentences.",
+    PROFILE_THOROUGH: "Give a detailed, structured answer that covers every relevant source.",
+}
+
+
+@dataclass(frozen=True)
+class RetrievalOptions:
+    """Retrieval settings of one query; the defaults are those of a query without options."""
+    top_k: int = TOP_K_RESULTS
+    max_chars: int = MAX_CHARACTERS
+    # None allows every source the query's domain allows
+    sources: Optional[Tuple[ResearchType, ...]] = None
+    profile: str = ""
+
+    def key(self) -> str:
+        """
+        Short fingerprint of the options, so only queries with the same options share a pipeline run.
+        """
+        sources = ",".join(source.name.lower() for source in self.sources) if self.sources else "*"
+        return f"{self.top_k}:{self.max_chars}:{sources}:{self.profile}"
+
+
+DEFAULT_RETRIEVAL = RetrievalOptions()
+
+
+def retrieval_caps() -> Tuple[int, int]:
+    return int(os.getenv("RETRIEVAL_MAX_TOP_K", "10")), int(os.getenv("RETRIEVAL_MAX_CHARS", "8000"))
+
+
+def resolve_retrieval_options(profile: Optional[str] = None, top_k: Optional[int] = None,
+                              max_chars: Optional[int] = None,
+                              sources: Optional[Sequence[str]] = None) -> RetrievalOptions:
+    """
+    Combines the profile defaults with explicit overrides. Raises ValueError for an
+    unknown profile or source, and for values above the server-side caps.
+    """
+    if profile and profile not in PROFILES:
+        raise ValueError(f"Unknown retrieval profile {profile}, expected one of {list(PROFILES)}")
+    default_top_k, default_max_chars = PROFILES.get(profile, (TOP_K_RESULTS, MAX_CHARACTERS))
+    top_k = default_top_k if top_k is None else top_k
+    max_chars = default_max_chars if max_chars is None else max_chars
+
+    max_top_k, max_max_chars = retrieval_caps()
+    if not 1 <= top_k <= max_top_k:
+        raise ValueError(f"top_k must be between 1 and {max_top_k}")
+    if not 1 <= max_chars <= max_max_chars:
+        raise ValueError(f"max_chars must be between 1 and {max_max_chars}")
+
+    research_types = None
+    if sources:
+        try:
+            research_types = tuple(dict.fromkeys(ResearchType[source.upper()] for source in sources))
+        except KeyError as e:
+            raise ValueError(f"Unknown source {e.args[0].lower()}, expected some of "
+                             f"{[research_type.name.lower() for research_type in ResearchType]}")
+    return RetrievalOptions(top_k, max_chars, research_types, profile or "")
@@ -0,0 +1,161 @@
+"""
+Adaptive routing of retrieval across fetchers.
+
+Every fetcher search that misses the result cache updates the rolling stats of its
+source: latency, empty-result rate and error rate, each an exponentially weighted
+moving average. Each domain has its allowed research types in static order; the
+adaptive router orders them by expected utility
+
+    relevance * (1 - error rate) * (1 - empty rate) / (1 + latency / budget)
+
+where sources whose average latency exceeds the budget go last. Stats decay towards
+an optimistic prior with a half-life, so a source demoted during an outage is
+retried once the outage is old news. FETCHER_ROUTING=static restores the fixed
+route: the domain's own fetcher, then web search.
+"""
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, List, Optional, Sequence
+
+from app.workflows.research_type import ResearchType
+
+ROUTING_ADAPTIVE = "adaptive"
+ROUTING_STATIC = "static"
+
+# Allowed research types per domain, in static order, with their relevance to the domain
+ALLOWED_SOURCES: Dict[ResearchType, Dict[ResearchType, float]] = {
+    ResearchType.MEDICAL: {ResearchType.MEDICAL: 1.0, ResearchType.WEB: 0.6},
+    ResearchType.ACADEMIC: {ResearchType.ACADEMIC: 1.0, ResearchType.WEB: 0.6, ResearchType.KNOWLEDGE: 0.5},
+    ResearchType.KNOWLEDGE: {ResearchType.KNOWLEDGE: 1.0, ResearchType.WEB: 0.7},
+    ResearchType.WEB: {ResearchType.WEB: 1.0},
+}
+# Weight of the newest sample in the moving averages
+EWMA_ALPHA = 0.2
+
+
+def routing_mode() -> str:
+    mode = os.getenv("FETCHER_ROUTING", ROUTING_ADAPTIVE).lower()
+    if mode not in (ROUTING_ADAPTIVE, ROUTING_STATIC):
+        raise ValueError(f"FETCHER_ROUTING must be {ROUTING_ADAPTIVE} or {ROUTING_STATIC}, not {mode}")
+    return mode
+
+
+def latency_budget() -> float:
+    return float(os.getenv("ROUTING_LATENCY_BUDGET", "8"))
+
+
+@dataclass
+class FetcherStats:
+    """Rolling outcome stats of one fetcher source."""
+    calls: int = 0
+    latency: float = 0.0
+    empty_rate: float = 0.0
+    error_rate: float = 0.0
+    updated_at: float = 0.0
+
+
+class FetcherRouter:
+    """
+    Thread-safe per-source stats and the route ordering derived from them.
+    """
+
+    def __init__(self, half_life: float = 300.0, alpha: float = EWMA_ALPHA,
+                 clock: Callable[[], float] = time.monotonic):
+        self.half_life = half_life
+        self.alpha = alpha
+        self._clock = clock
+        self._stats: Dict[str, FetcherStats] = {}
+        self._lock = threading.Lock()
+
+    def record(self, source: str, seconds: float, empty: bool = False, error: bool = False):
+        with self._lock:
+            stats = self._stats.setdefault(source, FetcherStats())
+            if stats.calls == 0:
+                stats.latency, stats.empty_rate, stats.error_rate = seconds, float(empty), float(error)
+            else:
+                stats.latency += self.alpha * (seconds - stats.latency)
+                stats.empty_rate += self.alpha * (float(empty) - stats.empty_rate)
+                stats.error_rate += self.alpha * (float(error) - stats.error_rate)
+            stats.calls += 1
+            stats.updated_at = self._clock()
+
+    def expected(self, source: str) -> FetcherStats:
+        """
+        Returns the stats of the source decayed towards the prior of a fast source
+        that always answers, by how long ago they were last updated.
+        """
+        with self._lock:
+            stats = self._stats.get(source)
+            if stats is None:
+                return FetcherStats()
+            weight = 0.5 ** ((self._clock() - stats.updated_at) / self.half_life) if self.half_life > 0 else 1.0
+            return FetcherStats(stats.calls, stats.latency * weight, stats.empty_rate * weight,
+                                stats.error_rate * weight, stats.updated_at)
+
+    def utility(self, source: str, relevance: float, budget: float) -> float:
+        stats = self.expected(source)
+        return relevance * (1 - stats.error_rate) * (1 - stats.empty_rate) / (1 + stats.latency / budget)
+
+    def order(self, candidates: Sequence[tuple], budget: float) -> List[tuple]:
+        """
+        Orders (source, relevance, ...) candidates by expected utility, keeping sources
+        expected to exceed the latency budget last. Ties keep the static order.
+        """
+        def rank(candidate: tuple):
+            source, relevance = candidate[0], candidate[1]
+            over_budget = self.expected(source).latency > budget
+            return over_budget, -self.utility(source, relevance, budget)
+
+        return sorted(candidates, key=rank)
+
+    def snapshot(self) -> Dict[str, dict]:
+        """
+        Returns the decayed stats the router ranks by, and the raw moving averages, per source.
+        """
+        with self._lock:
+            raw = {source: asdict(stats) for source, stats in sorted(self._stats.items())}
+        return {source: {**asdict(self.expected(source)), "raw": stats} for source, stats in raw.items()}
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+_router: Optional[FetcherRouter] = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> FetcherRouter:
+    """
+    Returns the process-wide router, whose stats decay with ROUTING_HALF_LIFE seconds.
+    """
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = FetcherRouter(half_life=float(os.getenv("ROUTING_HALF_LIFE", "300")))
+    return _router
+
+
+def allowed_sources(domain: ResearchType,
+                    sources: Optional[Sequence[ResearchType]] = None) -> Dict[ResearchType, float]:
+    """
+    Returns the research types a query of the domain may search, with their relevance.
+    Sources requested for the query narrow them down; when none of them suits the
+    domain, the requested sources are searched in the order given.
+    """
+    allowed = ALLOWED_SOURCES[domain]
+    if routing_mode() == ROUTING_STATIC:
+        # The route before adaptive routing: the domain's own fetcher, then web search
+        allowed = {research_type: relevance for research_type, relevance in allowed.items()
+                   if research_type in (domain, ResearchType.WEB)}
+    if sources:
+        allowed = {research_type: relevance for research_type, relevance in allowed.items()
+                   if research_type in sources} or {research_type: 0.5 for research_type in sources}
+    return allowed
+
+
+def routing_snapshot() -> dict:
+    return {"mode": routing_mode(), "latency_budget": latency_budget(), "fetchers": get_router().snapshot()}
@@ -0,0 +1,152 @@
+"""
+Usage accounting of research graph runs.
+
+While a run is recorded, every graph node that runs notes its wall time, the model
+that answered it with its prompt and completion tokens, and, for retrieval, the
+fetcher that answered and whether a fallback was taken. The recorder is bound to the
+run through a context variable rather than the graph state, so usage never ends up
+in checkpoints or cached results.
+"""
+import functools
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Iterator, List, Optional, Tuple
+
+from app.utils.llm import llm_cost
+
+_recorder: ContextVar[Optional["UsageRecorder"]] = ContextVar("usage_recorder", default=None)
+
+
+class UsageRecorder:
+    """
+    Collects the usage of the nodes of one run. Nodes run one after another, so the
+    node running is the one that LLM calls and fetcher results are recorded against.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.perf_counter):
+        self.nodes: List[dict] = []
+        self.current: Optional[dict] = None
+        self._clock = clock
+        self._started = clock()
+
+    @contextmanager
+    def node(self, name: str) -> Iterator[dict]:
+        usage = {"node": name, "wall_ms": 0.0, "model": None, "prompt_tokens": 0, "completion_tokens": 0,
+                 "fetcher": None, "fallback": False}
+        self.current = usage
+        started = self._clock()
+        try:
+            yield usage
+        finally:
+            usage["wall_ms"] = round((self._clock() - started) * 1000, 1)
+            self.nodes.append(usage)
+            self.current = None
+
+    def summary(self, cached: bool = False) -> dict:
+        """
+        Returns the usage of the run: token and cost totals, the fetcher that answered,
+        whether any node fell back, and the usage of every node.
+        """
+        nodes = [{**node, "cost_usd": llm_cost(node["model"], node["prompt_tokens"], node["completion_tokens"])}
+                 for node in self.nodes]
+        prompt_tokens = sum(node["prompt_tokens"] for node in nodes)
+        completion_tokens = sum(node["completion_tokens"] for node in nodes)
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "cost_usd": sum(node["cost_usd"] for node in nodes),
+            "wall_ms": round((self._clock() - self._started) * 1000, 1),
+            "fetcher": next((node["fetcher"] for node in reversed(nodes) if node["fetcher"]), None),
+            "fallback": any(node["fallback"] for node in nodes),
+            "cached": cached,
+            "shared": False,
+            "nodes": nodes,
+        }
+
+
+@contextmanager
+def recording() -> Iterator[UsageRecorder]:
+    """
+    Records the usage of the graph nodes run in this context.
+    """
+    recorder = UsageRecorder()
+    token = _recorder.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _recorder.reset(token)
+
+
+def _current_node() -> Optional[dict]:
+    recorder = _recorder.get()
+    return recorder.current if recorder else None
+
+
+def metered(name: str, node: Callable) -> Callable:
+    """
+    Wraps a graph node to record its usage under `name` when the run is recorded.
+    """
+    @functools.wraps(node)
+    def run(state):
+        recorder = _recorder.get()
+        if recorder is None:
+            return node(state)
+        with recorder.node(name):
+            return node(state)
+    return run
+
+
+def answered_by(llm, model: str, fallback: bool = False):
+    """
+    Returns the chat model, recording `model` as the one that answered the running
+    node when it completes. Failed attempts record nothing, so after a fallback the
+    fallback model is the one recorded.
+    """
+    usage = _current_node()
+    if usage is None:
+        return llm
+
+    def on_end(_run):
+        usage["model"] = model
+        usage["fallback"] = fallback
+    return llm.with_listeners(on_end=on_end)
+
+
+def record_tokens(response):
+    """
+    Adds the prompt and completion tokens of a chat model response to the running node.
+    """
+    usage = _current_node()
+    tokens = getattr(response, "usage_metadata", None)
+    if usage is None or not isinstance(tokens, dict):
+        return
+    usage["prompt_tokens"] += tokens.get("input_tokens", 0)
+    usage["completion_tokens"] += tokens.get("output_tokens", 0)
+
+
+def record_fetcher(source: str, fallback: bool):
+    usage = _current_node()
+    if usage is not None:
+        usage["fetcher"] = source
+        usage["fallback"] = fallback
+
+
+def run_recorded(name: str, fn: Callable, *args) -> Tuple[Any, dict]:
+    """
+    Calls fn as a single recorded node and returns its result with its usage.
+    """
+    with recording() as recorder:
+        with recorder.node(name):
+            result = fn(*args)
+    return result, recorder.summary()
+
+
+def shared_usage(usage: dict) -> dict:
+    """
+    Returns the usage of a caller that joined another caller's run: its tokens and
+    cost are accounted to the caller that started the run.
+    """
+    return {**usage, "prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "cost_usd": 0.0,
+            "shared": True, "nodes": []}
@@ -0,0 +1,7 @@
+"""
+Offline benchmark suite for the Research Agent API.
+
+Everything in here runs against deterministic local stand-ins for the LLM, the
+source fetchers and MongoDB so that performance changes can be measured without
+network access or API credits.
+"""
@@ -0,0 +1,249 @@
+"""
+Compares managing agents one at a time with the bulk repository paths, for batches
+of 100, 1k and 5k agents with a few conversations each:
+
+- create: one insert per agent against a single insert_many
+- delete: the old path that fetched every full document before deleting it, one
+  server-side find_one_and_delete per agent, and delete_many batches matched by ids
+  or by a name prefix filter
+
+Without --mongodb-uri the agents collection is an in-process mongomock collection
+that waits --round-trip-ms per round trip, so the numbers show what round trips and
+the documents read cost rather than what MongoDB does.
+
+Usage:
+    python -m benchmarks.bulk
+    python -m benchmarks.bulk --agents 100 1000 5000 --conversations 20 --round-trip-ms 1
+    python -m benchmarks.bulk --mongodb-uri mongodb://localhost:27017
+"""
+import argparse
+import asyncio
+import inspect
+import math
+import time
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+from unittest.mock import patch
+from uuid import uuid4
+
+import bson
+
+from app.data.entities.models import AgentInDB
+from app.data.repositories.agent_repository import agents_query, create_agent_documents, delete_agent_documents, \
+    delete_agent_entity
+from app.models.requests import AgentCreate
+from benchmarks.serialization import ANSWER
+
+NAME_PREFIX = "bulk-benchmark-"
+
+
+@dataclass
+class BulkResult:
+    operation: str
+    path: str
+    agents: int
+    seconds: float
+    round_trips: int
+    bytes_read: int
+
+    @property
+    def agents_per_second(self) -> float:
+        return self.agents / self.seconds if self.seconds else 0.0
+
+
+class MeteredCursor:
+    def __init__(self, collection: "MeteredCollection", pipeline: List[dict], batch_size: int):
+        self._collection = collection
+        self._pipeline = pipeline
+        self._batch_size = batch_size
+
+    async def to_list(self, length: Optional[int] = None) -> List[dict]:
+        cursor = self._collection.collection.aggregate(self._pipeline, batchSize=self._batch_size)
+        documents = await cursor.to_list(length=length) if hasattr(cursor, "to_list") else list(cursor)
+        # The first batch comes with the aggregate command, every further one with a getMore
+        await self._collection.round_trip(max(1, math.ceil(len(documents) / self._batch_size)))
+        self._collection.read(documents)
+        return documents
+
+
+class MeteredCollection:
+    """
+    Agents collection counting the round trips made and the BSON bytes of the documents
+    read, waiting `latency` seconds per round trip when it stands in for a remote server.
+    Wraps a motor collection or a synchronous mongomock one.
+    """
+
+    def __init__(self, collection, latency: float = 0.0):
+        self.collection = collection
+        self.latency = latency
+        self.round_trips = 0
+        self.bytes_read = 0
+
+    def reset(self):
+        self.round_trips = 0
+        self.bytes_read = 0
+
+    async def round_trip(self, count: int = 1):
+        self.round_trips += count
+        if self.latency:
+            await asyncio.sleep(self.latency * count)
+
+    def read(self, documents: List[Optional[dict]]):
+        self.bytes_read += sum(len(bson.encode(document)) for document in documents if document)
+
+    async def _call(self, method: str, *args, **kwargs):
+        await self.round_trip()
+        result = getattr(self.collection, method)(*args, **kwargs)
+        return await result if inspect.isawaitable(result) else result
+
+    async def insert_one(self, document: dict):
+        return await self._call("insert_one", document)
+
+    async def insert_many(self, documents: List[dict]):
+        return await self._call("insert_many", documents)
+
+    async def find_one(self, *args, **kwargs) -> Optional[dict]:
+        document = await self._call("find_one", *args, **kwargs)
+        self.read([document])
+        return document
+
+    async def find_one_and_delete(self, *args, **kwargs) -> Optional[dict]:
+        document = await self._call("find_one_and_delete", *args, **kwargs)
+        self.read([document])
+        return document
+
+    async def delete_one(self, *args, **kwargs):
+        return await self._call("delete_one", *args, **kwargs)
+
+    async def delete_many(self, *args, **kwargs):
+        return await self._call("delete_many", *args, **kwargs)
+
+    def aggregate(self, pipeline: List[dict], batchSize: int = 101) -> MeteredCursor:
+        return MeteredCursor(self, pipeline, batchSize)
+
+
+def make_agent_document(i: int, conversations: int) -> dict:
+    return {
+        "_id": f"{NAME_PREFIX}{i}", "name": f"{NAME_PREFIX}{i}", "summary": "", "summarized_count": 0,
+        "archived_count": 0, "version": conversations, "retention": None,
+        "messages": [{"_id": f"conversation-{i}-{j}", "query": f"How does insulin resistance develop, part {j}?",
+                      "agent_response": ANSWER, "source": "medical", "documents": [f"Insulin study {j}"]}
+                     for j in range(conversations)],
+    }
+
+
+async def _create_one_by_one(collection: MeteredCollection, agents_in: List[AgentCreate]):
+    # What POST /agents/ costs per agent: one insert each
+    for agent_in in agents_in:
+        await collection.insert_one({"_id": str(uuid4()), "name": agent_in.name, "summary": "", "summarized_count": 0,
+                                     "archived_count": 0, "version": 0, "retention": None, "messages": []})
+
+
+async def _delete_fetching_documents(collection: MeteredCollection, agent_ids: List[str]):
+    # The delete before the server-side path: the whole document is read to be deleted
+    for agent_id in agent_ids:
+        await collection.find_one({"_id": agent_id})
+        await collection.delete_one({"_id": agent_id})
+
+
+async def _delete_one_by_one(collection: MeteredCollection, agent_ids: List[str]):
+    for agent_id in agent_ids:
+        await delete_agent_entity(agent_id)
+
+
+async def _measure(collection: MeteredCollection, operation: str, path: str, agents: int,
+                   run: Callable) -> BulkResult:
+    collection.reset()
+    started = time.perf_counter()
+    await run()
+    return BulkResult(operation, path, agents, time.perf_counter() - started, collection.round_trips,
+                      collection.bytes_read)
+
+
+async def _clear(collection: MeteredCollection):
+    result = collection.collection.delete_many({"name": {"$regex": f"^{NAME_PREFIX}"}})
+    if inspect.isawaitable(result):
+        await result
+
+
+async def _seed(collection: MeteredCollection, agents: int, conversations: int) -> List[str]:
+    await _clear(collection)
+    documents = [make_agent_document(i, conversations) for i in range(agents)]
+    result = collection.collection.insert_many(documents)
+    if inspect.isawaitable(result):
+        await result
+    return [document["_id"] for document in documents]
+
+
+async def run_benchmark(sizes: List[int], conversations: int, latency: float, batch_size: int = 1000,
+                        mongodb_uri: Optional[str] = None) -> List[BulkResult]:
+    if mongodb_uri:
+        from motor.motor_asyncio import AsyncIOMotorClient
+
+        client = AsyncIOMotorClient(mongodb_uri)
+        collection = MeteredCollection(client["research_agent_benchmark"]["agents_bulk_benchmark"])
+    else:
+        import mongomock
+
+        client = None
+        collection = MeteredCollection(mongomock.MongoClient().db.agents, latency)
+
+    results = []
+    try:
+        with patch.object(AgentInDB, "get_pymongo_collection", lambda: collection):
+            for agents in sizes:
+                agents_in = [AgentCreate(name=f"{NAME_PREFIX}{i}") for i in range(agents)]
+                await _clear(collection)
+                results.append(await _measure(collection, "create", "one-by-one", agents,
+                                              lambda: _create_one_by_one(collection, agents_in)))
+                await _clear(collection)
+                results.append(await _measure(collection, "create", "insert_many", agents,
+                                              lambda: create_agent_documents(agents_in)))
+
+                deletes = [
+                    ("fetch+delete", lambda ids: _delete_fetching_documents(collection, ids)),
+                    ("one-by-one", lambda ids: _delete_one_by_one(collection, ids)),
+                    ("bulk ids", lambda ids: delete_agent_documents(agents_query(ids), batch_size)),
+                    ("bulk filter", lambda ids: delete_agent_documents(agents_query(name_prefix=NAME_PREFIX),
+                                                                       batch_size)),
+                ]
+                for path, delete in deletes:
+                    agent_ids = await _seed(collection, agents, conversations)
+                    results.append(await _measure(collection, "delete", path, agents,
+                                                  lambda: delete(agent_ids)))
+            await _clear(collection)
+    finally:
+        if client is not None:
+            client.close()
+    return results
+
+
+def format_results(results: List[BulkResult]) -> str:
+    lines = [f"{'agents':>7} {'operation':>9} {'path':>13} {'seconds':>9} {'agents/s':>10} "
+             f"{'round trips':>12} {'bytes read':>12} {'speedup':>8}"]
+    baselines = {}
+    for r in results:
+        baseline = baselines.setdefault((r.agents, r.operation), r.seconds)
+        speedup = baseline / r.seconds if r.seconds else 0.0
+        lines.append(f"{r.agents:>7} {r.operation:>9} {r.path:>13} {r.seconds:>9.3f} {r.agents_per_second:>10.0f} "
+                     f"{r.round_trips:>12} {r.bytes_read:>12} {speedup:>7.1f}x")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmark of bulk agent creation and deletion")
+    parser.add_argument("--agents", type=int, nargs="+", default=[100, 1000, 5000], help="Agents per batch")
+    parser.add_argument("--conversations", type=int, default=10, help="Conversations of every deleted agent")
+    parser.add_argument("--round-trip-ms", type=float, default=0.5,
+                        help="Simulated network round trip of the in-process collection")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Agents per delete_many")
+    parser.add_argument("--mongodb-uri", help="Use this MongoDB instead of the in-process collection")
+    args = parser.parse_args(argv)
+
+    results = asyncio.run(run_benchmark(args.agents, args.conversations, args.round_trip_ms / 1000,
+                                        args.batch_size, args.mongodb_uri))
+    print(format_results(results))
+
+
+if __name__ == "__main__":
+    main()
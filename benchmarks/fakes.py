@@ -0,0 +1,241 @@
+import os
+import random
+import threading
+import time
+import zlib
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+from unittest.mock import patch
+from uuid import uuid4
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from app.data.entities.models import TIMEZONE_OFFSET
+from app.fetchers import Fetcher, TOP_K_RESULTS
+from app.models.requests import AgentCreate
+from app.models.results import FetcherResult, QueryResult
+from app.workflows.research_type import ResearchType
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Deterministic chat model that answers the research graph prompts locally.
+
+    Every call sleeps for a fixed latency plus the time needed to "generate" its
+    output at the configured token rate, mimicking a remote chat completion.
+    """
+    latency: float = 0.05
+    tokens_per_second: float = 200.0
+    answer_tokens: int = 120
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-research-chat"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs) -> ChatResult:
+        system = "\n".join(str(m.content) for m in messages if m.type == "system")
+        user = "\n".join(str(m.content) for m in messages if m.type == "human")
+        content = self._respond(system, user)
+
+        input_tokens = len(system.split()) + len(user.split())
+        output_tokens = len(content.split())
+        time.sleep(self.latency + output_tokens / self.tokens_per_second)
+
+        message = AIMessage(content=content, usage_metadata={
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        })
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _respond(self, system: str, user: str) -> str:
+        if "classifier" in system:
+            domains = [domain.name for domain in ResearchType]
+            return domains[zlib.crc32(user.encode()) % len(domains)]
+        if "medical terms" in system:
+            return "insulin, glucose, diabetes"
+        if "standalone search query" in system:
+            return user.rsplit("Follow-up question: ", 1)[-1]
+        return " ".join(f"token{i} [1]" if i % 20 == 19 else f"token{i}" for i in range(self.answer_tokens))
+
+
+@dataclass
+class FetcherProfile:
+    """Latency distribution and empty-result rate of a fake fetcher."""
+    latency: float = 0.2
+    sigma: float = 0.5
+    empty_rate: float = 0.0
+
+
+class FakeFetcher(Fetcher):
+    """
+    Fetcher returning synthetic documents after a log-normally distributed delay.
+    """
+
+    def __init__(self, name: str, profile: FetcherProfile, seed: int = 0):
+        self.name = name
+        self.source = name
+        self.profile = profile
+        self.top_k = TOP_K_RESULTS
+        self._random = random.Random(f"{name}:{seed}")
+        self._lock = threading.Lock()
+
+    def search(self, query: str, terms: str = "") -> FetcherResult:
+        with self._lock:
+            delay = self.profile.latency * self._random.lognormvariate(0, self.profile.sigma)
+            empty = self._random.random() < self.profile.empty_rate
+        time.sleep(delay)
+        if empty:
+            return FetcherResult([], [])
+
+        results = [f"{self.name} snippet {i} for: {terms or query}" for i in range(self.top_k)]
+        documents = [f"{self.name}-doc-{zlib.crc32(query.encode()) % 10000}-{i}" for i in range(self.top_k)]
+        return FetcherResult(results, documents)
+
+
+@dataclass
+class StoredConversation:
+    id: str
+    query: str
+    agent_response: str
+    source: str
+    documents: List[str]
+    created_at: datetime = field(default_factory=lambda: datetime.now(TIMEZONE_OFFSET))
+
+
+@dataclass
+class StoredAgent:
+    id: str
+    name: str
+    messages: List[StoredConversation] = field(default_factory=list)
+    summary: str = ""
+    summarized_count: int = 0
+    archived_count: int = 0
+    retention: Optional[dict] = None
+    created_at: datetime = field(default_factory=lambda: datetime.now(TIMEZONE_OFFSET))
+    updated_at: datetime = field(default_factory=lambda: datetime.now(TIMEZONE_OFFSET))
+
+
+class InMemoryAgentStore:
+    """
+    In-memory replacement for the agent repository functions used by the research service.
+    """
+
+    def __init__(self):
+        self.agents: Dict[str, StoredAgent] = {}
+        self.usage: List[dict] = []
+
+    async def create_agent_entity(self, agent_in: AgentCreate) -> StoredAgent:
+        agent = StoredAgent(id=str(uuid4()), **agent_in.model_dump())
+        self.agents[agent.id] = agent
+        return agent
+
+    async def get_agent_entity(self, agent_id: str) -> StoredAgent:
+        agent = self.agents.get(agent_id)
+        if agent is None:
+            raise KeyError(f"Agent with id {agent_id} does not exist and cannot be retrieved")
+        return agent
+
+    async def get_context_document(self, agent_id: str) -> dict:
+        agent = await self.get_agent_entity(agent_id)
+        return {"_id": agent.id, "summary": agent.summary, "summarized_count": agent.summarized_count,
+                "messages": [{"query": m.query, "agent_response": m.agent_response}
+                             for m in agent.messages[agent.summarized_count:]]}
+
+    async def delete_agent_entity(self, agent_id: str):
+        await self.get_agent_entity(agent_id)
+        del self.agents[agent_id]
+
+    async def add_conversations(self, agent_id: str, query: str, query_result: QueryResult) -> str:
+        agent = await self.get_agent_entity(agent_id)
+        conversation = StoredConversation(
+            id=str(uuid4()),
+            query=query,
+            agent_response=query_result.agent_response,
+            source=query_result.domain,
+            documents=query_result.documents
+        )
+        agent.messages.append(conversation)
+        agent.updated_at = datetime.now(TIMEZONE_OFFSET)
+        return conversation.id
+
+    async def insert_usage_record(self, agent_id: str, usage: dict, kind: str = "query",
+                                  conversation_id: Optional[str] = None, domain: Optional[str] = None):
+        self.usage.append({"agent_id": agent_id, "kind": kind, "conversation_id": conversation_id,
+                           "domain": domain, "usage": usage})
+
+    async def update_summary(self, agent_id: str, summary: str, summarized_count: int, previous_count: int) -> bool:
+        agent = await self.get_agent_entity(agent_id)
+        if agent.summarized_count != previous_count:
+            return False
+        agent.summary = summary
+        agent.summarized_count = summarized_count
+        return True
+
+
+@dataclass
+class OfflineConfig:
+    """Configuration of the local stand-ins used while benchmarking."""
+    llm_latency: float = 0.05
+    tokens_per_second: float = 200.0
+    answer_tokens: int = 120
+    fetchers: Dict[str, FetcherProfile] = field(default_factory=lambda: {
+        "pubmed": FetcherProfile(),
+        "arxiv": FetcherProfile(),
+        "wikipedia": FetcherProfile(),
+        "duckduckgo": FetcherProfile(),
+    })
+    seed: int = 0
+    use_mongo: bool = False
+
+
+_FETCHER_BY_DOMAIN = {
+    ResearchType.MEDICAL: "pubmed",
+    ResearchType.ACADEMIC: "arxiv",
+    ResearchType.KNOWLEDGE: "wikipedia",
+    ResearchType.WEB: "duckduckgo",
+}
+
+
+@contextmanager
+def offline_stack(config: OfflineConfig) -> Iterator[Optional[InMemoryAgentStore]]:
+    """
+    Patches the research pipeline to use fake LLMs, fake fetchers and, unless
+    `use_mongo` is set, an in-memory agent store. Yields the store (or None).
+    """
+    fetchers = {name: FakeFetcher(name, profile, config.seed) for name, profile in config.fetchers.items()}
+
+    def fake_llm(*_, **__) -> FakeChatModel:
+        return FakeChatModel(latency=config.llm_latency,
+                             tokens_per_second=config.tokens_per_second,
+                             answer_tokens=config.answer_tokens)
+
+    def fake_retrieve_fetcher(domain: ResearchType) -> Fetcher:
+        return fetchers[_FETCHER_BY_DOMAIN.get(domain, "duckduckgo")]
+
+    with ExitStack() as stack:
+        stack.enter_context(patch("app.workflows.research_graph.get_openai_llm", fake_llm))
+        stack.enter_context(patch("app.workflows.research_graph._retrieve_fetcher", fake_retrieve_fetcher))
+        stack.enter_context(patch("app.workflows.research_graph.create_fetcher", lambda name, *_, **__: fetchers[name]))
+        # The fake LLM needs no connection, and priming the caches needs MongoDB
+        warmup_steps = "graph,fetchers,cache" if config.use_mongo else "graph,fetchers"
+        stack.enter_context(patch.dict(os.environ, {"WARMUP_STEPS": warmup_steps}))
+
+        store = None
+        if not config.use_mongo:
+            store = InMemoryAgentStore()
+
+            async def noop():
+                pass
+
+            stack.enter_context(patch("app.main.init_db", noop))
+            stack.enter_context(patch("app.main.close_db", noop))
+            for name in ("create_agent_entity", "get_agent_entity", "get_context_document", "delete_agent_entity",
+                         "add_conversations", "update_summary", "insert_usage_record"):
+                stack.enter_context(patch(f"app.services.research_service.{name}", getattr(store, name)))
+        yield store
@@ -0,0 +1,231 @@
+"""
+Concurrent load test of the agents API against offline stand-ins.
+
+Usage:
+    python -m benchmarks.load --requests 500 --concurrency 50 --output baseline.json
+    python -m benchmarks.load --requests 500 --concurrency 50 --baseline baseline.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import socket
+import time
+from dataclasses import dataclass, asdict, field
+from typing import List, Optional
+
+import httpx
+import uvicorn
+
+from benchmarks.fakes import FetcherProfile, OfflineConfig, offline_stack
+
+
+@dataclass
+class LoadConfig:
+    """Shape of the generated traffic."""
+    requests: int = 200
+    concurrency: int = 20
+    agents: int = 10
+    distinct_queries: int = 50
+    seed: int = 0
+
+
+@dataclass
+class BenchmarkReport:
+    """Throughput, latency and event-loop lag measured during a run."""
+    requests: int
+    errors: int
+    duration: float
+    rps: float
+    latency_p50: float
+    latency_p95: float
+    latency_p99: float
+    loop_lag_p50: float
+    loop_lag_p99: float
+    loop_lag_max: float
+    status_codes: dict = field(default_factory=dict)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """
+    Nearest-rank percentile of the values, 0.0 for an empty list.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class LoopLagMonitor:
+    """
+    Measures how late the event loop wakes up a task sleeping for a fixed interval.
+    """
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - expected))
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+
+async def run_benchmark(load: LoadConfig, offline: OfflineConfig) -> BenchmarkReport:
+    """
+    Serves the app from `app.main.create_app` with offline stand-ins on a local
+    port and drives concurrent query traffic against the agents API. Server and
+    clients share one event loop, so the measured loop lag is the server's.
+    """
+    from app.main import create_app
+
+    rng = random.Random(load.seed)
+    queries = [f"Benchmark question {i}: what is currently known about topic {i}?"
+               for i in range(load.distinct_queries)]
+    latencies: List[float] = []
+    status_codes: dict = {}
+
+    with offline_stack(offline):
+        app = create_app()
+        server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=_free_port(), log_level="warning"))
+        serving = asyncio.create_task(server.serve())
+        while not server.started:
+            if serving.done():
+                serving.result()
+            await asyncio.sleep(0.01)
+
+        base_url = f"http://127.0.0.1:{server.config.port}"
+        limits = httpx.Limits(max_connections=load.concurrency)
+        try:
+            async with httpx.AsyncClient(base_url=base_url, timeout=None, limits=limits) as client:
+                agent_ids = []
+                for i in range(load.agents):
+                    response = await client.post("/agents/", json={"name": f"benchmark-agent-{i}"})
+                    response.raise_for_status()
+                    agent_ids.append(response.json()["id"])
+
+                work: asyncio.Queue = asyncio.Queue()
+                for _ in range(load.requests):
+                    work.put_nowait((rng.choice(agent_ids), rng.choice(queries)))
+
+                async def worker():
+                    while not work.empty():
+                        agent_id, query = work.get_nowait()
+                        started = time.perf_counter()
+                        response = await client.post(f"/agents/{agent_id}/queries", json={"message": query})
+                        latencies.append(time.perf_counter() - started)
+                        status_codes[response.status_code] = status_codes.get(response.status_code, 0) + 1
+
+                monitor = LoopLagMonitor()
+                monitor.start()
+                started = time.perf_counter()
+                await asyncio.gather(*(worker() for _ in range(load.concurrency)))
+                duration = time.perf_counter() - started
+                await monitor.stop()
+        finally:
+            server.should_exit = True
+            await serving
+
+    errors = sum(count for code, count in status_codes.items() if code >= 400)
+    return BenchmarkReport(
+        requests=len(latencies),
+        errors=errors,
+        duration=duration,
+        rps=len(latencies) / duration if duration else 0.0,
+        latency_p50=percentile(latencies, 50),
+        latency_p95=percentile(latencies, 95),
+        latency_p99=percentile(latencies, 99),
+        loop_lag_p50=percentile(monitor.samples, 50),
+        loop_lag_p99=percentile(monitor.samples, 99),
+        loop_lag_max=max(monitor.samples, default=0.0),
+        status_codes={str(code): count for code, count in sorted(status_codes.items())},
+    )
+
+
+def format_report(report: BenchmarkReport, baseline: Optional[dict] = None) -> str:
+    """
+    Renders the report as a table, with the relative change against a baseline if given.
+    """
+    lines = [f"requests: {report.requests}  errors: {report.errors}  "
+             f"duration: {report.duration:.2f}s  status codes: {report.status_codes}"]
+    for name in ("rps", "latency_p50", "latency_p95", "latency_p99", "loop_lag_p50", "loop_lag_p99", "loop_lag_max"):
+        value = getattr(report, name)
+        line = f"{name:>14}: {value:10.4f}"
+        if baseline and baseline.get(name):
+            line += f"  (baseline {baseline[name]:.4f}, {(value - baseline[name]) / baseline[name] * 100:+.1f}%)"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Offline load test of the Research Agent API")
+    parser.add_argument("--requests", type=int, default=200, help="Total number of queries to send")
+    parser.add_argument("--concurrency", type=int, default=20, help="Number of concurrent clients")
+    parser.add_argument("--agents", type=int, default=10, help="Number of agents to spread queries over")
+    parser.add_argument("--distinct-queries", type=int, default=50, help="Size of the query pool")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Fixed latency of each LLM call in seconds")
+    parser.add_argument("--token-rate", type=float, default=200.0, help="LLM output tokens per second")
+    parser.add_argument("--answer-tokens", type=int, default=120, help="Tokens in each synthesized answer")
+    parser.add_argument("--fetcher-latency", type=float, default=0.2, help="Median fetcher latency in seconds")
+    parser.add_argument("--fetcher-sigma", type=float, default=0.5, help="Log-normal sigma of fetcher latency")
+    parser.add_argument("--empty-rate", type=float, default=0.0, help="Probability of a fetcher returning nothing")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mongodb-uri", help="Use this MongoDB instead of the in-memory agent store")
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    parser.add_argument("--baseline", help="Compare against a JSON report written by --output")
+    args = parser.parse_args(argv)
+
+    if args.mongodb_uri:
+        os.environ["MONGODB_URI"] = args.mongodb_uri
+        os.environ.setdefault("MONGODB_DB", "research_agent_benchmark")
+
+    profile = FetcherProfile(latency=args.fetcher_latency, sigma=args.fetcher_sigma, empty_rate=args.empty_rate)
+    offline = OfflineConfig(
+        llm_latency=args.llm_latency,
+        tokens_per_second=args.token_rate,
+        answer_tokens=args.answer_tokens,
+        fetchers={name: profile for name in ("pubmed", "arxiv", "wikipedia", "duckduckgo")},
+        seed=args.seed,
+        use_mongo=bool(args.mongodb_uri),
+    )
+    load = LoadConfig(requests=args.requests, concurrency=args.concurrency, agents=args.agents,
+                      distinct_queries=args.distinct_queries, seed=args.seed)
+
+    report = asyncio.run(run_benchmark(load, offline))
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print(format_report(report, baseline))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(asdict(report), f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Compares the cost of rendering GET /agents/{id} through the Beanie models and
+response_model validation against the raw-document fast path, for agents with
+10, 1k and 10k conversations.
+
+The legacy path builds the agent with model_construct, because Beanie documents
+cannot be validated without a database, so its numbers slightly understate the
+real cost of decoding documents through Beanie.
+
+Usage:
+    python -m benchmarks.serialization
+    python -m benchmarks.serialization --sizes 10 1000 10000 --iterations 20 --gzip
+"""
+import argparse
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+from unittest.mock import patch
+
+import httpx
+from fastapi import FastAPI
+from fastapi.middleware.gzip import GZipMiddleware
+
+from app.api import agents
+from app.data.entities.models import AgentInDB, ConversationInDB
+from app.models.response import AgentOut, agent_in_db_to_out, agent_document_to_out
+from app.models.results import AgentVersion
+from benchmarks.load import percentile
+
+ANSWER = ("Insulin resistance develops when muscle, fat and liver cells respond poorly to insulin [1]. "
+          "Lifestyle changes such as weight loss and exercise improve sensitivity [2]. ") * 6
+
+
+@dataclass
+class SerializationResult:
+    conversations: int
+    path: str
+    mean_ms: float
+    p50_ms: float
+    p95_ms: float
+    response_bytes: int
+
+
+def make_agent_document(conversations: int) -> dict:
+    """
+    Returns an agent shaped like the projected document read from MongoDB.
+    """
+    return {
+        "_id": "benchmark-agent",
+        "name": "Benchmark Agent",
+        "messages": [
+            {
+                "_id": f"conversation-{i}",
+                "query": f"How does insulin resistance develop, part {i}?",
+                "agent_response": ANSWER,
+                "source": "medical",
+                "documents": [f"Insulin sensitivity study {i}", f"Glucose tolerance trial {i}"],
+            }
+            for i in range(conversations)
+        ],
+    }
+
+
+def _legacy_agent(agent_document: dict) -> AgentInDB:
+    messages = [ConversationInDB.model_construct(id=m["_id"], query=m["query"], agent_response=m["agent_response"],
+                                                 source=m["source"], documents=m["documents"])
+                for m in agent_document["messages"]]
+    return AgentInDB.model_construct(id=agent_document["_id"], name=agent_document["name"], messages=messages)
+
+
+def legacy_app(agent_document: dict) -> FastAPI:
+    """
+    The response path before the fast path: Beanie models, AgentOut per agent and
+    ConversationsOut per message, then response_model validation and serialization.
+    """
+    app = FastAPI()
+
+    @app.get("/agents/{agent_id}", response_model=AgentOut)
+    async def get_agent(agent_id: str):
+        return agent_in_db_to_out(_legacy_agent(agent_document))
+
+    return app
+
+
+def fast_app(gzip: bool) -> FastAPI:
+    app = FastAPI()
+    if gzip:
+        app.add_middleware(GZipMiddleware, minimum_size=4096, compresslevel=5)
+    app.include_router(agents.router)
+    return app
+
+
+async def _measure(conversations: int, path: str, app: FastAPI, iterations: int,
+                   headers: dict) -> SerializationResult:
+    timings = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        response = await client.get("/agents/benchmark-agent", headers=headers)
+        response.raise_for_status()
+        for _ in range(iterations):
+            started = time.perf_counter()
+            await client.get("/agents/benchmark-agent", headers=headers)
+            timings.append(time.perf_counter() - started)
+    return SerializationResult(conversations, path, sum(timings) / len(timings) * 1000,
+                               percentile(timings, 50) * 1000, percentile(timings, 95) * 1000,
+                               response.num_bytes_downloaded)
+
+
+async def run_benchmark(sizes: List[int], iterations: int, gzip: bool = False) -> List[SerializationResult]:
+    results = []
+    for conversations in sizes:
+        agent_document = make_agent_document(conversations)
+
+        async def fake_get_agent_payload(agent_id: str) -> Tuple[dict, AgentVersion]:
+            return agent_document_to_out(agent_document), AgentVersion(0, None)
+
+        runs: List[tuple] = [("legacy", legacy_app(agent_document), {"accept-encoding": "identity"}),
+                             ("fast", fast_app(False), {"accept-encoding": "identity"})]
+        if gzip:
+            runs.append(("fast+gzip", fast_app(True), {"accept-encoding": "gzip"}))
+        with patch("app.services.research_service.get_agent_payload", fake_get_agent_payload):
+            for path, app, headers in runs:
+                results.append(await _measure(conversations, path, app, iterations, headers))
+    return results
+
+
+def format_results(results: List[SerializationResult]) -> str:
+    lines = [f"{'conversations':>13} {'path':>10} {'mean ms':>10} {'p50 ms':>10} {'p95 ms':>10} {'bytes':>12} {'speedup':>8}"]
+    legacy_means = {r.conversations: r.mean_ms for r in results if r.path == "legacy"}
+    for r in results:
+        speedup = legacy_means[r.conversations] / r.mean_ms if r.mean_ms else 0.0
+        lines.append(f"{r.conversations:>13} {r.path:>10} {r.mean_ms:>10.2f} {r.p50_ms:>10.2f} {r.p95_ms:>10.2f} "
+                     f"{r.response_bytes:>12} {speedup:>7.1f}x")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmark of the agent response serialization paths")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 10000], help="Conversations per agent")
+    parser.add_argument("--iterations", type=int, default=20, help="Requests per size and path")
+    parser.add_argument("--gzip", action="store_true", help="Also measure the fast path with gzip compression")
+    args = parser.parse_args(argv)
+
+    print(format_results(asyncio.run(run_benchmark(args.sizes, args.iterations, args.gzip))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Cold-start benchmark: import time per module and time-to-first-request of app.main:app.
+
+Each run starts a fresh interpreter, so results include everything a new uvicorn
+worker pays before it can serve traffic. Without --mongodb-uri the server runs
+with the in-memory agent store from benchmarks.fakes.
+
+Usage:
+    python -m benchmarks.startup --runs 5 --output startup.json
+    python -m benchmarks.startup --runs 5 --baseline startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from benchmarks.load import _free_port
+
+
+@dataclass
+class StartupReport:
+    """Median cold-start timings over the runs, in seconds."""
+    runs: int
+    import_total: float
+    time_to_first_request: float
+    slowest_imports: List[Tuple[str, float]] = field(default_factory=list)
+
+
+def parse_importtime(output: str) -> Dict[str, float]:
+    """
+    Returns the cumulative import time in seconds of each module from `-X importtime` output.
+    """
+    timings = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        timings[name] = int(cumulative) / 1_000_000
+    return timings
+
+
+def measure_imports(module: str = "app.main") -> Dict[str, float]:
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                               capture_output=True, text=True, check=True)
+    return parse_importtime(completed.stderr)
+
+
+def measure_first_request(path: str = "/status/breakers", mongodb_uri: Optional[str] = None,
+                          timeout: float = 60.0) -> float:
+    """
+    Starts a server process and returns the seconds until it first answers the path with 200.
+    """
+    port = _free_port()
+    env = dict(os.environ)
+    if mongodb_uri:
+        env.update(MONGODB_URI=mongodb_uri, MONGODB_DB=env.get("MONGODB_DB", "research_agent_benchmark"))
+        command = [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"]
+    else:
+        command = [sys.executable, "-m", "benchmarks.startup", "serve", "--port", str(port)]
+
+    started = time.perf_counter()
+    server = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - started < timeout:
+            if server.poll() is not None:
+                raise RuntimeError(f"Server exited with code {server.returncode} before serving a request")
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}{path}", timeout=1.0).status_code == 200:
+                    return time.perf_counter() - started
+            except httpx.TransportError:
+                pass
+            time.sleep(0.01)
+        raise TimeoutError(f"Server did not answer {path} within {timeout}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def run_benchmark(runs: int = 5, top: int = 15, mongodb_uri: Optional[str] = None) -> StartupReport:
+    imports = [measure_imports() for _ in range(runs)]
+    first_requests = [measure_first_request(mongodb_uri=mongodb_uri) for _ in range(runs)]
+
+    medians = {name: statistics.median(run.get(name, 0.0) for run in imports) for name in imports[0]}
+    slowest = sorted(((name, value) for name, value in medians.items() if name != "app.main"),
+                     key=lambda item: item[1], reverse=True)[:top]
+    return StartupReport(runs=runs, import_total=medians.get("app.main", 0.0),
+                         time_to_first_request=statistics.median(first_requests), slowest_imports=slowest)
+
+
+def format_report(report: StartupReport, baseline: Optional[dict] = None) -> str:
+    lines = []
+    for name in ("import_total", "time_to_first_request"):
+        value = getattr(report, name)
+        line = f"{name:>22}: {value:8.3f}s"
+        if baseline and baseline.get(name):
+            line += f"  (baseline {baseline[name]:.3f}s, {(value - baseline[name]) / baseline[name] * 100:+.1f}%)"
+        lines.append(line)
+    lines.append(f"slowest imports (cumulative, median of {report.runs} runs):")
+    lines.extend(f"  {value:8.3f}s  {name}" for name, value in report.slowest_imports)
+    return "\n".join(lines)
+
+
+def serve(port: int):
+    """
+    Serves app.main:app with the offline stand-ins, for time-to-first-request runs without MongoDB.
+    """
+    import uvicorn
+
+    from benchmarks.fakes import OfflineConfig, offline_stack
+
+    with offline_stack(OfflineConfig()):
+        from app.main import create_app
+
+        uvicorn.run(create_app(), host="127.0.0.1", port=port, log_level="warning")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Cold-start benchmark of the Research Agent API")
+    commands = parser.add_subparsers(dest="command")
+    serve_parser = commands.add_parser("serve", help="Serve the app offline (used by the benchmark itself)")
+    serve_parser.add_argument("--port", type=int, required=True)
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to start per measurement")
+    parser.add_argument("--top", type=int, default=15, help="Number of slowest imports to list")
+    parser.add_argument("--mongodb-uri", help="Start the real app against this MongoDB instead of offline")
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    parser.add_argument("--baseline", help="Compare against a JSON report written by --output")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        serve(args.port)
+        return
+
+    report = run_benchmark(args.runs, args.top, args.mongodb_uri)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print(format_report(report, baseline))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(asdict(report), f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,14 @@
+import pytest
+
+from app.utils.cache import clear_caches
+from app.workflows.routing import get_router
+
+
+@pytest.fixture(autouse=True)
+def isolate_fetcher_state():
+    """Keeps cached results and routing stats from leaking between tests."""
+    clear_caches()
+    get_router().reset()
+    yield
+    clear_caches()
+    get_router().reset()
@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+
+from app.services.admission import PRIORITY_BATCH, PRIORITY_INTERACTIVE, AdmissionController, \
+    AdmissionRejected, LanePolicy
+
+
+def _controller(max_in_flight: int = 1, queue_limit: int = 2, max_wait: float = 5.0) -> AdmissionController:
+    return AdmissionController(max_in_flight, {PRIORITY_INTERACTIVE: LanePolicy(queue_limit, max_wait),
+                                               PRIORITY_BATCH: LanePolicy(queue_limit, max_wait)})
+
+
+@pytest.mark.asyncio
+async def test_slots_are_handed_to_interactive_waiters_first():
+    controller = _controller()
+    order = []
+    release = asyncio.Event()
+
+    async def query(name: str, lane: str):
+        async with controller.slot(lane):
+            order.append(name)
+            await release.wait()
+
+    first = asyncio.create_task(query("first", PRIORITY_INTERACTIVE))
+    await asyncio.sleep(0)
+    batch = asyncio.create_task(query("batch", PRIORITY_BATCH))
+    interactive = asyncio.create_task(query("interactive", PRIORITY_INTERACTIVE))
+    await asyncio.sleep(0)
+    assert controller.stats()["queued"] == 2
+
+    release.set()
+    await asyncio.gather(first, batch, interactive)
+
+    assert order == ["first", "interactive", "batch"]
+    assert controller.in_flight == 0
+    assert controller.stats()["lanes"][PRIORITY_BATCH]["admitted"] == 1
+
+
+@pytest.mark.asyncio
+async def test_full_lane_is_rejected_with_retry_after():
+    controller = _controller(queue_limit=0)
+    await controller.acquire(PRIORITY_INTERACTIVE)
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        await controller.acquire(PRIORITY_INTERACTIVE)
+
+    assert rejected.value.retry_after >= 1
+    assert controller.stats()["lanes"][PRIORITY_INTERACTIVE]["rejected"] == 1
+
+
+@pytest.mark.asyncio
+async def test_wait_beyond_lane_limit_is_rejected():
+    controller = _controller(max_wait=0.01)
+    await controller.acquire(PRIORITY_INTERACTIVE)
+
+    with pytest.raises(AdmissionRejected):
+        await controller.acquire(PRIORITY_BATCH)
+
+    assert controller.stats()["lanes"][PRIORITY_BATCH]["timed_out"] == 1
+    assert controller.stats()["queued"] == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_leaves_the_queue():
+    controller = _controller()
+    await controller.acquire(PRIORITY_INTERACTIVE)
+    waiter = asyncio.create_task(controller.acquire(PRIORITY_INTERACTIVE))
+    await asyncio.sleep(0)
+
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    controller.release()
+
+    assert controller.stats()["queued"] == 0
+    assert controller.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_retry_after_spreads_queued_work_over_slots():
+    controller = _controller(max_in_flight=2)
+    await controller.acquire(PRIORITY_INTERACTIVE)
+    controller.release(4.0)
+    assert controller.retry_after() == 2
+
+    await controller.acquire(PRIORITY_INTERACTIVE)
+    await controller.acquire(PRIORITY_INTERACTIVE)
+    waiter = asyncio.create_task(controller.acquire(PRIORITY_BATCH))
+    await asyncio.sleep(0)
+    assert controller.retry_after() == 4
+
+    controller.release(4.0)
+    await waiter
+
+
+@pytest.mark.asyncio
+async def test_zero_max_in_flight_disables_admission_control():
+    controller = _controller(max_in_flight=0, queue_limit=0)
+
+    async with controller.slot(PRIORITY_INTERACTIVE):
+        async with controller.slot(PRIORITY_INTERACTIVE):
+            pass
+
+    assert controller.stats()["lanes"][PRIORITY_INTERACTIVE]["rejected"] == 0
+
+
+@pytest.mark.asyncio
+async def test_unknown_lane_raises_value_error():
+    with pytest.raises(ValueError):
+        await _controller().acquire("bulk")
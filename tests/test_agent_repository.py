@@ -1,7 +1,10 @@
 import pytest
-from unittest.mock import AsyncMock, patch
+from datetime import datetime
+from unittest.mock import AsyncMock, Mock, patch
 
-from app.data.repositories.agent_repository import create_agent_entity, get_agent_entity, delete_agent_entity
+from app.data.repositories.agent_repository import AGENT_OUT_PROJECTION, create_agent_entity, get_agent_entity, \
+    delete_agent_entity, get_agent_document, get_popular_queries, remove_archived_messages, agents_query, \
+    create_agent_documents, delete_agent_documents, get_context_document
 from app.models.requests import AgentCreate
 
 @pytest.mark.asyncio
@@ -64,18 +67,197 @@ async def test_get_agent_entity_not_found():
 
 @pytest.mark.asyncio
 async def test_delete_agent_entity_success():
-    """Test successful agent deletion."""
+    """Test that an agent is deleted on the server without reading its messages."""
     agent_id = "test-agent-123"
-    
-    mock_agent = AsyncMock()
-    mock_agent.id = agent_id
-    mock_agent.delete = AsyncMock()
-    
-    with patch('app.data.repositories.agent_repository.AgentInDB') as mock_agent_class:
-        mock_agent_class.find_one = AsyncMock(return_value=mock_agent)
-        
+    archive = AsyncMock()
+
+    with patch('app.data.repositories.agent_repository.AgentInDB') as mock_agent_class, \
+            patch('app.data.repositories.agent_repository.get_archive', return_value=archive):
+        collection = mock_agent_class.get_pymongo_collection.return_value
+        collection.find_one_and_delete = AsyncMock(return_value={"_id": agent_id, "archived_count": 0})
+
         await delete_agent_entity(agent_id)
-        
-        mock_agent_class.find_one.assert_called_once_with(mock_agent_class.id == agent_id)
-        
-        mock_agent.delete.assert_called_once()
+
+        collection.find_one_and_delete.assert_awaited_once_with({"_id": agent_id},
+                                                                projection={"archived_count": 1})
+        archive.delete.assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_delete_agent_entity_deletes_its_archive():
+    """Test that deleting an agent with archived conversations deletes the archive too."""
+    archive = AsyncMock()
+
+    with patch('app.data.repositories.agent_repository.AgentInDB') as mock_agent_class, \
+            patch('app.data.repositories.agent_repository.get_archive', return_value=archive):
+        collection = mock_agent_class.get_pymongo_collection.return_value
+        collection.find_one_and_delete = AsyncMock(return_value={"_id": "test-agent-123", "archived_count": 12})
+
+        await delete_agent_entity("test-agent-123")
+
+        archive.delete.assert_awaited_once_with("test-agent-123")
+
+@pytest.mark.asyncio
+async def test_delete_agent_entity_not_found():
+    """Test agent deletion when agent does not exist."""
+    with patch('app.data.repositories.agent_repository.AgentInDB') as mock_agent_class:
+        mock_agent_class.get_pymongo_collection.return_value.find_one_and_delete = AsyncMock(return_value=None)
+
+        with pytest.raises(KeyError):
+            await delete_agent_entity("missing")
+
+@pytest.mark.asyncio
+async def test_create_agent_documents_inserts_all_agents_at_once():
+    """Test that bulk creation builds raw documents and inserts them with one insert_many."""
+    agents_in = [AgentCreate(name=f"Agent {i}") for i in range(3)]
+
+    with patch('app.data.repositories.agent_repository.AgentInDB') as mock_agent_class:
+        collection = mock_agent_class.get_pymongo_collection.return_value
+        collection.insert_many = AsyncMock()
+
+        agent_documents = await create_agent_documents(agents_in)
+
+        collection.insert_many.assert_awaited_once_with(agent_documents)
+        assert [agent_document["name"] for agent_document in agent_documents] == ["Agent 0", "Agent 1", "Agent 2"]
+        assert len({agent_document["_id"] for agent_document in agent_documents}) == 3
+        assert agent_documents[0]["messages"] == [] and agent_documents[0]["version"] == 0
+
+def test_agents_query_needs_a_criterion():
+    """Test that the bulk delete query combines its criteria and never matches every agent."""
+    before = datetime(2026, 1, 1)
+
+    assert agents_query(["a1", "a2"]) == {"_id": {"$in": ["a1", "a2"]}}
+    assert agents_query(name_prefix="load-test.", created_before=before) == {
+        "name": {"$regex": "^load\\-test\\."}, "created_at": {"$lt": before}}
+    with pytest.raises(ValueError):
+        agents_query()
+
+@pytest.mark.asyncio
+async def test_delete_agent_documents_deletes_in_batches_without_messages():
+    """Test that matched agents are deleted in batches, counting conversations on the server."""
+    matched = [{"_id": f"a{i}", "archived_count": 10 if i == 3 else 0, "message_count": 2} for i in range(5)]
+    archive = AsyncMock()
+
+    with patch('app.data.repositories.agent_repository.AgentInDB') as mock_agent_class, \
+            patch('app.data.repositories.agent_repository.get_archive', return_value=archive):
+        collection = mock_agent_class.get_pymongo_collection.return_value
+        collection.aggregate.return_value.to_list = AsyncMock(return_value=matched)
+        collection.delete_many = AsyncMock(side_effect=[Mock(deleted_count=2), Mock(deleted_count=2),
+                                                        Mock(deleted_count=1)])
+
+        deleted = await delete_agent_documents({"name": {"$regex": "^load"}}, batch_size=2)
+
+        pipeline = collection.aggregate.call_args[0][0]
+        assert pipeline[0] == {"$match": {"name": {"$regex": "^load"}}}
+        assert "messages" not in pipeline[1]["$project"]
+        assert [call.args[0] for call in collection.delete_many.await_args_list] == [
+            {"name": {"$regex": "^load"}, "_id": {"$in": ["a0", "a1"]}},
+            {"name": {"$regex": "^load"}, "_id": {"$in": ["a2", "a3"]}},
+            {"name": {"$regex": "^load"}, "_id": {"$in": ["a4"]}}]
+        collection.find.assert_not_called()
+        archive.delete_many.assert_awaited_once_with(["a3"])
+        assert deleted == {"agent_ids": ["a0", "a1", "a2", "a3", "a4"], "agents": 5, "conversations": 20}
+
+@pytest.mark.asyncio
+async def test_delete_agent_documents_keeps_agents_that_stopped_matching():
+    """Test that an agent updated between the read and the delete is neither counted nor cascaded to."""
+    cutoff = datetime(2026, 1, 1)
+    matched = [{"_id": "a0", "archived_count": 4, "message_count": 2},
+               {"_id": "a1", "archived_count": 6, "message_count": 3}]
+    archive = AsyncMock()
+
+    with patch('app.data.repositories.agent_repository.AgentInDB') as mock_agent_class, \
+            patch('app.data.repositories.agent_repository.get_archive', return_value=archive):
+        collection = mock_agent_class.get_pymongo_collection.return_value
+        collection.aggregate.return_value.to_list = AsyncMock(return_value=matched)
+        collection.delete_many = AsyncMock(return_value=Mock(deleted_count=1))
+        collection.find.return_value.to_list = AsyncMock(return_value=[{"_id": "a1"}])
+
+        deleted = await delete_agent_documents({"updated_at": {"$lt": cutoff}})
+
+        collection.delete_many.assert_awaited_once_with({"updated_at": {"$lt": cutoff}, "_id": {"$in": ["a0", "a1"]}})
+        archive.delete_many.assert_awaited_once_with(["a0"])
+        assert deleted == {"agent_ids": ["a0"], "agents": 1, "conversations": 6}
+
+@pytest.mark.asyncio
+async def test_get_agent_document_reads_projected_raw_document():
+    """Test that the fast path reads a projected raw document."""
+    agent_document = {"_id": "test-agent-123", "name": "Test Agent", "messages": []}
+
+    with patch('app.data.repositories.agent_repository.AgentInDB') as mock_agent_class:
+        collection = mock_agent_class.get_pymongo_collection.return_value
+        collection.find_one = AsyncMock(return_value=agent_document)
+
+        result = await get_agent_document("test-agent-123")
+
+        collection.find_one.assert_called_once_with({"_id": "test-agent-123"}, AGENT_OUT_PROJECTION)
+        assert result == agent_document
+
+@pytest.mark.asyncio
+async def test_get_agent_document_not_found():
+    """Test that the fast path raises KeyError for a missing agent."""
+    with patch('app.data.repositories.agent_repository.AgentInDB') as mock_agent_class:
+        mock_agent_class.get_pymongo_collection.return_value.find_one = AsyncMock(return_value=None)
+
+        with pytest.raises(KeyError):
+            await get_agent_document("missing")
+
+@pytest.mark.asyncio
+async def test_get_context_document_reads_only_unsummarized_turns():
+    """Test that the conversation context is read without the summarized messages."""
+    context = {"_id": "test-agent-123", "summary": "Talked about insulin.", "summarized_count": 4,
+               "messages": [{"query": "And glucagon?", "agent_response": "Raises blood sugar."}]}
+
+    with patch('app.data.repositories.agent_repository.AgentInDB') as mock_agent_class:
+        collection = mock_agent_class.get_pymongo_collection.return_value
+        collection.aggregate.return_value.to_list = AsyncMock(return_value=[context])
+
+        result = await get_context_document("test-agent-123")
+
+        pipeline = collection.aggregate.call_args[0][0]
+        assert pipeline[0] == {"$match": {"_id": "test-agent-123"}}
+        turns = pipeline[1]["$project"]["messages"]["$map"]
+        assert turns["input"]["$slice"][1] == {"$ifNull": ["$summarized_count", 0]}
+        assert set(turns["in"]) == {"query", "agent_response"}
+        assert result == context
+
+@pytest.mark.asyncio
+async def test_get_context_document_not_found():
+    """Test that reading the context of a missing agent raises KeyError."""
+    with patch('app.data.repositories.agent_repository.AgentInDB') as mock_agent_class:
+        mock_agent_class.get_pymongo_collection.return_value.aggregate.return_value.to_list = \
+            AsyncMock(return_value=[])
+
+        with pytest.raises(KeyError):
+            await get_context_document("missing")
+
+@pytest.mark.asyncio
+async def test_get_popular_queries_aggregates_recent_messages():
+    """Test that popular queries are counted from recent messages only."""
+    since = datetime(2025, 1, 1)
+    popular = [{"query": "what is crispr?", "source": "knowledge", "count": 3}]
+
+    with patch('app.data.repositories.agent_repository.AgentInDB') as mock_agent_class:
+        collection = mock_agent_class.get_pymongo_collection.return_value
+        collection.aggregate.return_value.to_list = AsyncMock(return_value=popular)
+
+        result = await get_popular_queries(since, 5)
+
+        pipeline = collection.aggregate.call_args[0][0]
+        assert {"$match": {"messages.created_at": {"$gte": since}}} in pipeline
+        assert {"$limit": 5} in pipeline
+        assert result == popular
+
+@pytest.mark.asyncio
+async def test_remove_archived_messages_is_guarded_by_the_counters():
+    """Test that archived messages are only pulled if no other update moved the counters."""
+    with patch('app.data.repositories.agent_repository.AgentInDB') as mock_agent_class:
+        collection = mock_agent_class.get_pymongo_collection.return_value
+        collection.update_one = AsyncMock(return_value=Mock(modified_count=0))
+
+        removed = await remove_archived_messages("test-agent-123", ["c1", "c2"], 5, 10)
+
+        query, update = collection.update_one.call_args[0]
+        assert query == {"_id": "test-agent-123", "summarized_count": 5, "archived_count": 10,
+                         "messages.0._id": "c1"}
+        assert update["$inc"] == {"summarized_count": -2, "archived_count": 2, "version": 1}
+        assert removed is False
@@ -0,0 +1,120 @@
+from datetime import datetime
+
+import orjson
+import pytest
+
+from app.data.repositories.archive_repository import FileArchive
+from app.services import agent_transfer
+from app.services.agent_transfer import export_agent, import_agent
+
+
+class FakeAgents:
+    """Raw agent documents standing in for the agents collection."""
+
+    def __init__(self):
+        self.documents = {}
+
+    async def get_agent_header(self, agent_id: str) -> dict:
+        if agent_id not in self.documents:
+            raise KeyError(f"Agent with id {agent_id} does not exist and cannot be retrieved")
+        return {key: value for key, value in self.documents[agent_id].items() if key != "messages"}
+
+    async def iter_messages(self, agent_id: str, batch_size: int = 500):
+        for message in self.documents[agent_id]["messages"]:
+            yield message
+
+    async def insert_agent_document(self, agent_document: dict):
+        self.documents[agent_document["_id"]] = agent_document
+
+    async def push_messages(self, agent_id: str, messages: list, archived: int = 0):
+        self.documents[agent_id]["messages"].extend(messages)
+        self.documents[agent_id]["archived_count"] += archived
+
+    async def delete_agent_document(self, agent_id: str):
+        self.documents.pop(agent_id, None)
+
+
+@pytest.fixture
+def agents(monkeypatch, tmp_path):
+    fake = FakeAgents()
+    archive = FileArchive(str(tmp_path))
+    for name in ("get_agent_header", "iter_messages", "insert_agent_document", "push_messages",
+                 "delete_agent_document"):
+        monkeypatch.setattr(agent_transfer, name, getattr(fake, name))
+    monkeypatch.setattr(agent_transfer, "get_archive", lambda: archive)
+    fake.archive = archive
+    return fake
+
+
+def _message(i: int) -> dict:
+    return {"_id": f"c{i}", "query": f"Q{i}", "agent_response": f"R{i}", "source": "web", "documents": [f"d{i}"],
+            "created_at": datetime(2026, 1, 1, 12, i)}
+
+
+async def _collect(lines) -> bytes:
+    return b"".join([line async for line in lines])
+
+
+async def _body(data: bytes, chunk_size: int):
+    for start in range(0, len(data), chunk_size):
+        yield data[start:start + chunk_size]
+
+
+@pytest.mark.asyncio
+async def test_export_streams_archived_then_hot_conversations(agents):
+    await agents.archive.put("agent-1", 0, [_message(0), _message(1)])
+    agents.documents["agent-1"] = {"_id": "agent-1", "name": "Researcher", "summary": "Earlier talk",
+                                   "summarized_count": 1, "archived_count": 2, "retention": None,
+                                   "messages": [_message(2), _message(3)]}
+
+    lines = (await _collect(await export_agent("agent-1"))).splitlines()
+
+    header = orjson.loads(lines[0])
+    assert header["type"] == "agent"
+    assert header["summarized_count"] == 3
+    assert [orjson.loads(line)["id"] for line in lines[1:]] == ["c0", "c1", "c2", "c3"]
+
+
+@pytest.mark.asyncio
+async def test_export_of_missing_agent_raises_key_error(agents):
+    with pytest.raises(KeyError):
+        await export_agent("missing")
+
+
+@pytest.mark.asyncio
+async def test_import_round_trips_an_export_in_batches(agents):
+    agents.documents["agent-1"] = {"_id": "agent-1", "name": "Researcher", "summary": "Earlier talk",
+                                   "summarized_count": 3, "archived_count": 0, "retention": {"max_count": 5},
+                                   "messages": [_message(i) for i in range(5)]}
+    exported = await _collect(await export_agent("agent-1"))
+
+    result = await import_agent(_body(exported, chunk_size=7), batch_size=2)
+
+    imported = agents.documents[result["agent_id"]]
+    assert result == {"agent_id": imported["_id"], "imported": 5, "archived": 3}
+    assert imported["name"] == "Researcher"
+    assert imported["retention"]["max_count"] == 5
+    assert [message["_id"] for message in imported["messages"]] == ["c3", "c4"]
+    assert imported["archived_count"] == 3
+    assert imported["summarized_count"] == 0
+    total, archived = await agents.archive.read(result["agent_id"], 0, 10)
+    assert [message["_id"] for message in archived] == ["c0", "c1", "c2"]
+
+
+@pytest.mark.asyncio
+async def test_malformed_import_is_rolled_back(agents):
+    body = b'{"type": "agent", "name": "Researcher", "summarized_count": 1}\n' \
+           b'{"type": "conversation", "query": "Q", "agent_response": "R", "source": "web"}\n' \
+           b'{"type": "conversation", "query": "Q"}\n'
+
+    with pytest.raises(ValueError) as error:
+        await import_agent(_body(body, chunk_size=1024), batch_size=1)
+
+    assert "Line 3" in str(error.value)
+    assert agents.documents == {}
+
+
+@pytest.mark.asyncio
+async def test_import_without_agent_line_is_rejected(agents):
+    with pytest.raises(ValueError):
+        await import_agent(_body(b"\n\n", chunk_size=1024))
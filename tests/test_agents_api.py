@@ -1,8 +1,11 @@
+from datetime import datetime
+
 import pytest
 from fastapi import FastAPI
 from fastapi.testclient import TestClient
 
 from app.api.agents import router as agents_router
+from app.models.results import AgentVersion
 
 
 def create_test_app() -> TestClient:
@@ -45,24 +48,34 @@ def test_create_agent_validation_error_returns_400(client, monkeypatch):
 
 
 def test_get_agent_success(client, monkeypatch):
-    from app.models.response import AgentOut
+    from app.models.response import agent_document_to_out
 
-    async def fake_get_agent(agent_id: str):
-        return AgentOut(id=agent_id, name="A1")
+    async def fake_get_agent_payload(agent_id: str):
+        return agent_document_to_out({
+            "_id": agent_id,
+            "name": "A1",
+            "messages": [{"_id": "c1", "query": "Q", "agent_response": "R", "source": "web", "documents": ["d1"]}]
+        }), AgentVersion(3, datetime(2026, 3, 1, 12, 30, 15))
 
-    monkeypatch.setattr("app.services.research_service.get_agent", fake_get_agent)
+    monkeypatch.setattr("app.services.research_service.get_agent_payload", fake_get_agent_payload)
 
     response = client.get("/agents/xyz")
 
     assert response.status_code == 200
-    assert response.json() == {"id": "xyz", "name": "A1", "messages": []}
+    assert response.json() == {
+        "id": "xyz",
+        "name": "A1",
+        "messages": [{"id": "c1", "query": "Q", "agent_response": "R", "domain": "web", "documents": ["d1"]}]
+    }
+    assert response.headers["etag"] == 'W/"v3"'
+    assert response.headers["last-modified"] == "Sun, 01 Mar 2026 12:30:15 GMT"
 
 
 def test_get_agent_not_found_returns_404(client, monkeypatch):
-    async def fake_get_agent(agent_id: str):
+    async def fake_get_agent_payload(agent_id: str):
         raise KeyError('agent not found')
 
-    monkeypatch.setattr("app.services.research_service.get_agent", fake_get_agent)
+    monkeypatch.setattr("app.services.research_service.get_agent_payload", fake_get_agent_payload)
 
     response = client.get("/agents/missing")
 
@@ -94,10 +107,45 @@ def test_delete_agent_not_found_returns_404(client, monkeypatch):
     assert response.json()["detail"] == "agent not found"
 
 
+def test_create_agents_in_bulk_returns_201(client, monkeypatch):
+    async def fake_create_agents(agents_in):
+        return [{"id": f"id-{i}", "name": agent_in.name, "messages": []} for i, agent_in in enumerate(agents_in)]
+
+    monkeypatch.setattr("app.services.research_service.create_agents", fake_create_agents)
+
+    response = client.post("/agents/bulk", json={"agents": [{"name": "A1"}, {"name": "A2"}]})
+    empty = client.post("/agents/bulk", json={"agents": []})
+
+    assert response.status_code == 201
+    assert response.json() == {"created": 2, "agents": [{"id": "id-0", "name": "A1", "messages": []},
+                                                        {"id": "id-1", "name": "A2", "messages": []}]}
+    assert empty.status_code == 422
+
+
+def test_delete_agents_in_bulk_returns_counts(client, monkeypatch):
+    requests = []
+
+    async def fake_delete_agents(agent_delete):
+        requests.append(agent_delete)
+        if agent_delete.ids is None and agent_delete.name_prefix is None:
+            raise ValueError("Deleting agents needs ids or at least one filter")
+        return {"agents": 2, "conversations": 5, "checkpoints": 1, "summary_jobs": 0}
+
+    monkeypatch.setattr("app.services.research_service.delete_agents", fake_delete_agents)
+
+    response = client.post("/agents/bulk/delete", json={"ids": ["a1", "a2"]})
+    unfiltered = client.post("/agents/bulk/delete", json={})
+
+    assert response.status_code == 200
+    assert response.json() == {"agents": 2, "conversations": 5, "checkpoints": 1, "summary_jobs": 0}
+    assert requests[0].ids == ["a1", "a2"]
+    assert unfiltered.status_code == 400
+
+
 def test_send_queries_success(client, monkeypatch):
     from app.models.results import QueryResult
     
-    async def fake_send_queries(agent_id: str, message: str):
+    async def fake_send_queries(agent_id: str, message: str, retrieval=None, request_id=None, priority="interactive"):
         return QueryResult(
             agent_response="Research response",
             domain="arxiv",
@@ -117,8 +165,39 @@ def test_send_queries_success(client, monkeypatch):
     assert response_data["documents"] == ["doc1.pdf", "doc2.pdf"]
 
 
+def test_send_queries_passes_retrieval_options(client, monkeypatch):
+    from app.models.results import QueryResult
+    from app.workflows.research_type import ResearchType
+    received = []
+
+    async def fake_send_queries(agent_id: str, message: str, retrieval=None, request_id=None, priority="interactive"):
+        received.append(retrieval)
+        return QueryResult(agent_response="Short answer", domain="web", documents=[])
+
+    monkeypatch.setattr("app.services.research_service.send_queries", fake_send_queries)
+
+    payload = {"message": "What is CRISPR?", "profile": "fast", "max_chars": 300, "sources": ["knowledge", "web"]}
+    response = client.post("/agents/abc123/queries", json=payload)
+
+    assert response.status_code == 201
+    assert received[0].top_k == 2
+    assert received[0].max_chars == 300
+    assert received[0].sources == (ResearchType.KNOWLEDGE, ResearchType.WEB)
+    assert received[0].profile == "fast"
+
+
+def test_send_queries_above_retrieval_cap_returns_400(client, monkeypatch):
+    monkeypatch.setenv("RETRIEVAL_MAX_TOP_K", "10")
+
+    payload = {"message": "What is CRISPR?", "top_k": 50}
+    response = client.post("/agents/abc123/queries", json=payload)
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "top_k must be between 1 and 10"
+
+
 def test_send_queries_validation_error_returns_400(client, monkeypatch):
-    async def fake_send_queries(agent_id: str, message: str):
+    async def fake_send_queries(agent_id: str, message: str, retrieval=None, request_id=None, priority="interactive"):
         raise ValueError("Invalid query message")
 
     monkeypatch.setattr("app.services.research_service.send_queries", fake_send_queries)
@@ -130,3 +209,182 @@ def test_send_queries_validation_error_returns_400(client, monkeypatch):
     assert response.json()["detail"] == "Invalid query message"
 
 
+
+
+def test_send_queries_passes_request_id(client, monkeypatch):
+    from app.models.results import QueryResult
+    received = []
+
+    async def fake_send_queries(agent_id: str, message: str, retrieval=None, request_id=None, priority="interactive"):
+        received.append(request_id)
+        return QueryResult(agent_response="Answer", domain="web", documents=[])
+
+    monkeypatch.setattr("app.services.research_service.send_queries", fake_send_queries)
+
+    response = client.post("/agents/abc123/queries", json={"message": "What is CRISPR?", "request_id": "req-7"})
+
+    assert response.status_code == 201
+    assert received == ["req-7"]
+
+
+def test_send_queries_over_admission_limit_returns_429(client, monkeypatch):
+    from app.services.admission import AdmissionRejected
+
+    async def fake_send_queries(agent_id: str, message: str, retrieval=None, request_id=None, priority="interactive"):
+        raise AdmissionRejected("Too many research queries in progress: the batch queue is full", 7)
+
+    monkeypatch.setattr("app.services.research_service.send_queries", fake_send_queries)
+
+    response = client.post("/agents/abc123/queries", json={"message": "What is CRISPR?", "priority": "batch"})
+
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "7"
+
+
+def test_get_archived_conversations(client, monkeypatch):
+    async def fake_get_archived_conversations(agent_id: str, offset: int, limit: int):
+        return {"agent_id": agent_id, "total": 1, "offset": offset,
+                "messages": [{"id": "c1", "query": "Q", "agent_response": "R", "domain": "web", "documents": []}]}
+
+    monkeypatch.setattr("app.services.research_service.get_archived_conversations", fake_get_archived_conversations)
+
+    response = client.get("/agents/abc123/archive?offset=0&limit=10")
+
+    assert response.status_code == 200
+    assert response.json()["total"] == 1
+    assert response.json()["messages"][0]["id"] == "c1"
+
+
+def test_set_retention_of_missing_agent_returns_404(client, monkeypatch):
+    async def fake_set_retention(agent_id: str, retention):
+        raise KeyError(f"Agent with id {agent_id} does not exist and cannot be retrieved")
+
+    monkeypatch.setattr("app.services.research_service.set_retention", fake_set_retention)
+
+    response = client.put("/agents/missing/retention", json={"max_count": 50})
+
+    assert response.status_code == 404
+
+
+def test_export_of_missing_agent_returns_404(client, monkeypatch):
+    async def fake_export_agent(agent_id: str):
+        raise KeyError(f"Agent with id {agent_id} does not exist and cannot be retrieved")
+
+    monkeypatch.setattr("app.services.agent_transfer.export_agent", fake_export_agent)
+
+    response = client.get("/agents/missing/export")
+
+    assert response.status_code == 404
+
+
+def test_export_streams_ndjson(client, monkeypatch):
+    async def fake_export_agent(agent_id: str):
+        async def lines():
+            yield b'{"type":"agent","id":"abc123","name":"Researcher"}\n'
+            yield b'{"type":"conversation","id":"c1"}\n'
+        return lines()
+
+    monkeypatch.setattr("app.services.agent_transfer.export_agent", fake_export_agent)
+
+    response = client.get("/agents/abc123/export")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert len(response.text.splitlines()) == 2
+
+
+def test_import_without_agent_line_returns_400(client):
+    response = client.post("/agents/import", content=b'{"type": "conversation", "query": "Q"}\n')
+
+    assert response.status_code == 400
+    assert response.json()["detail"].startswith("Line 1 is not a valid AgentImportHeader")
+
+
+def test_usage_of_missing_agent_returns_404(client, monkeypatch):
+    async def fake_get_agent_usage(agent_id: str, since, until, bucket):
+        raise KeyError(f"Agent with id {agent_id} does not exist and cannot be retrieved")
+
+    monkeypatch.setattr("app.services.research_service.get_agent_usage", fake_get_agent_usage)
+
+    response = client.get("/agents/missing/usage")
+
+    assert response.status_code == 404
+
+
+def test_usage_passes_window_and_rejects_an_empty_one(client, monkeypatch):
+    calls = []
+
+    async def fake_get_agent_usage(agent_id: str, since, until, bucket):
+        calls.append((since, until, bucket))
+        if since and until and since >= until:
+            raise ValueError("The usage report window must start before it ends")
+        return {"agent_id": agent_id, "bucket": bucket, "totals": {"queries": 2}}
+
+    monkeypatch.setattr("app.services.research_service.get_agent_usage", fake_get_agent_usage)
+
+    response = client.get("/agents/abc123/usage?since=2026-03-01T00:00:00Z&bucket=hour")
+    empty = client.get("/agents/abc123/usage?since=2026-03-02T00:00:00Z&until=2026-03-01T00:00:00Z")
+    unknown_bucket = client.get("/agents/abc123/usage?bucket=week")
+
+    assert response.status_code == 200
+    assert response.json()["totals"] == {"queries": 2}
+    assert calls[0][0].day == 1 and calls[0][1] is None and calls[0][2] == "hour"
+    assert empty.status_code == 400
+    assert unknown_bucket.status_code == 422
+
+
+@pytest.fixture()
+def versioned_agent(monkeypatch):
+    """Serves agent xyz at version 3; counts the full reads."""
+    reads = []
+
+    async def fake_get_agent_version(agent_id: str):
+        if agent_id != "xyz":
+            raise KeyError(f"Agent with id {agent_id} does not exist and cannot be retrieved")
+        return AgentVersion(3, datetime(2026, 3, 1, 12, 30, 15, 500000))
+
+    async def fake_get_agent_payload(agent_id: str):
+        reads.append(agent_id)
+        return {"id": agent_id, "name": "A1", "messages": []}, await fake_get_agent_version(agent_id)
+
+    monkeypatch.setattr("app.services.research_service.get_agent_version", fake_get_agent_version)
+    monkeypatch.setattr("app.services.research_service.get_agent_payload", fake_get_agent_payload)
+    return reads
+
+
+def test_get_agent_with_matching_etag_returns_304_without_reading_messages(client, versioned_agent):
+    response = client.get("/agents/xyz", headers={"If-None-Match": '"v2", W/"v3"'})
+    wildcard = client.get("/agents/xyz", headers={"If-None-Match": "*"})
+
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == 'W/"v3"'
+    assert wildcard.status_code == 304
+    assert versioned_agent == []
+
+
+def test_get_agent_with_stale_validators_returns_200(client, versioned_agent):
+    stale_etag = client.get("/agents/xyz", headers={"If-None-Match": 'W/"v2"'})
+    # If-None-Match takes precedence over a still matching If-Modified-Since
+    both = client.get("/agents/xyz", headers={"If-None-Match": 'W/"v2"',
+                                              "If-Modified-Since": "Sun, 01 Mar 2026 13:00:00 GMT"})
+    older = client.get("/agents/xyz", headers={"If-Modified-Since": "Sun, 01 Mar 2026 12:30:14 GMT"})
+    invalid = client.get("/agents/xyz", headers={"If-Modified-Since": "yesterday"})
+
+    assert [r.status_code for r in (stale_etag, both, older, invalid)] == [200, 200, 200, 200]
+    assert stale_etag.json()["name"] == "A1"
+    assert len(versioned_agent) == 4
+
+
+def test_get_agent_modified_since_is_compared_to_the_second(client, versioned_agent):
+    response = client.get("/agents/xyz", headers={"If-Modified-Since": "Sun, 01 Mar 2026 12:30:15 GMT"})
+
+    assert response.status_code == 304
+    assert response.headers["last-modified"] == "Sun, 01 Mar 2026 12:30:15 GMT"
+    assert versioned_agent == []
+
+
+def test_conditional_get_of_missing_agent_returns_404(client, versioned_agent):
+    response = client.get("/agents/missing", headers={"If-None-Match": 'W/"v3"'})
+
+    assert response.status_code == 404
@@ -0,0 +1,82 @@
+import pytest
+from unittest.mock import Mock
+
+from app.fetchers.arxiv_index import ArxivIndex, HybridArxivFetcher, LocalArxivFetcher
+from app.fetchers.text_search import to_match_expression
+from app.models.results import FetcherResult
+from app.workflows.research_graph import _retrieve_fetcher
+from app.workflows.research_type import ResearchType
+
+PAPERS = [
+    {"id": "1706.03762", "title": "Attention Is All You Need", "authors": "Ashish Vaswani, Noam Shazeer",
+     "categories": "cs.CL cs.LG", "update_date": "2023-08-02",
+     "abstract": "  We propose the Transformer,\n a network architecture based solely on attention mechanisms."},
+    {"id": "1512.03385", "title": "Deep Residual Learning for Image Recognition", "authors": "Kaiming He",
+     "categories": "cs.CV", "update_date": "2015-12-10",
+     "abstract": "We present a residual learning framework to ease the training of deep networks."},
+    {"id": "1810.04805", "title": "BERT: Pre-training of Deep Bidirectional Transformers",
+     "authors": "Jacob Devlin", "categories": "cs.CL", "update_date": "2019-05-24",
+     "abstract": "We introduce BERT, which uses attention to pre-train deep bidirectional representations."},
+]
+
+
+@pytest.fixture()
+def index(tmp_path):
+    index = ArxivIndex(str(tmp_path / "arxiv.sqlite"))
+    index.ingest(PAPERS)
+    return index
+
+
+def test_to_match_expression_drops_stopwords():
+    assert to_match_expression("What is the attention mechanism?") == '"attention" OR "mechanism"'
+    assert to_match_expression("what is the") == ""
+
+
+def test_search_ranks_title_matches_first(index):
+    papers = index.search("attention mechanisms")
+
+    assert [paper.arxiv_id for paper in papers] == ["1706.03762", "1810.04805"]
+    assert papers[0].abstract == "We propose the Transformer, a network architecture based solely on attention mechanisms."
+    assert papers[0].score >= papers[1].score > 0
+
+
+def test_ingest_is_incremental(index):
+    changed = dict(PAPERS[1], title="Deep Residual Learning", update_date="2016-01-01")
+    new = {"id": "2005.14165", "title": "Language Models are Few-Shot Learners", "authors": "Tom Brown",
+           "categories": "cs.CL", "update_date": "2020-07-22", "abstract": "GPT-3 shows few-shot learning."}
+
+    inserted, updated = index.ingest([PAPERS[0], changed, new])
+
+    assert (inserted, updated) == (1, 1)
+    assert index.count() == 4
+    assert index.search("residual")[0].title == "Deep Residual Learning"
+    assert index.search("image recognition") == []
+
+
+def test_local_fetcher_returns_fetcher_result(index):
+    result = LocalArxivFetcher(index).search("residual learning for image recognition")
+
+    assert result.documents == ["Deep Residual Learning for Image Recognition"]
+    assert result.raw_sources == [PAPERS[1]["abstract"]]
+
+
+def test_hybrid_fetcher_uses_live_api_only_without_local_hits(index):
+    live = Mock()
+    live.configure.return_value = live
+    live.search.return_value = FetcherResult(["Live abstract"], ["Live paper"])
+    fetcher = HybridArxivFetcher(live_fetcher=lambda: live, index=index).configure(top_k=3, max_chars=500)
+
+    local_result = fetcher.search("attention")
+    live_result = fetcher.search("quantum chromodynamics")
+
+    assert local_result.documents[0] == "Attention Is All You Need"
+    assert live_result.documents == ["Live paper"]
+    live.search.assert_called_once_with("quantum chromodynamics", "")
+    live.configure.assert_called_once_with(3, 500)
+
+
+def test_retrieve_fetcher_academic_uses_configured_index_mode(index, monkeypatch):
+    monkeypatch.setenv("ARXIV_INDEX_PATH", index.path)
+    monkeypatch.setenv("ARXIV_INDEX_MODE", "local")
+
+    assert isinstance(_retrieve_fetcher(ResearchType.ACADEMIC), LocalArxivFetcher)
@@ -0,0 +1,145 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import Mock
+
+import arxiv
+import fitz
+import pytest
+
+from app.fetchers.arxiv import ArxivFetcher
+from app.fetchers.arxiv_pdf import ArxivPdfExtractor, PdfLimits, PdfTextCache, PdfTooLarge, extract_pages, \
+    get_pdf_executor, relevant_text
+
+PAGES = [
+    "Attention Is All You Need. Abstract and introduction to sequence models.",
+    "Background on convolutional networks and recurrent networks.",
+    "Scaled dot-product attention and multi-head attention mechanisms.",
+    "Training data, batching and hardware.",
+]
+
+
+@pytest.fixture(scope="module")
+def paper_pdf() -> bytes:
+    document = fitz.open()
+    for text in PAGES:
+        document.new_page().insert_text((72, 72), text, fontsize=9)
+    pdf = document.tobytes()
+    document.close()
+    return pdf
+
+
+class CountingLimiter:
+    def __init__(self):
+        self.acquired = 0
+
+    def acquire(self, cost: float = 1) -> float:
+        self.acquired += cost
+        return 0.0
+
+
+@pytest.fixture
+def arxiv_limiter(monkeypatch) -> CountingLimiter:
+    limiter = CountingLimiter()
+    monkeypatch.setattr("app.fetchers.rate_limit.get_limiter", lambda source, limit: limiter)
+    return limiter
+
+
+def _result(paper_id: str, title: str, summary: str) -> arxiv.Result:
+    return arxiv.Result(f"http://arxiv.org/abs/{paper_id}", title=title, summary=summary,
+                        links=[arxiv.Result.Link(f"http://arxiv.org/pdf/{paper_id}", title="pdf")])
+
+
+def test_extract_pages_stops_at_page_limit(paper_pdf):
+    pages = extract_pages(paper_pdf, max_pages=3)
+
+    assert pages == PAGES[:3]
+
+
+def test_extract_pages_in_process_pool(paper_pdf):
+    assert get_pdf_executor().submit(extract_pages, paper_pdf, 2).result(timeout=60) == PAGES[:2]
+
+
+def test_relevant_text_keeps_best_pages_in_document_order():
+    text = relevant_text(PAGES, "multi-head attention", max_chars=len(PAGES[0]) + len(PAGES[2]))
+
+    assert text == f"{PAGES[0]}\n\n{PAGES[2]}"
+    assert relevant_text(PAGES, "quantum chromodynamics", max_chars=1000) == ""
+
+
+def test_extractor_parses_each_version_once(tmp_path, paper_pdf):
+    download = Mock(return_value=paper_pdf)
+    extractor = ArxivPdfExtractor(PdfTextCache(str(tmp_path)), PdfLimits(max_pages=2),
+                                  executor=ThreadPoolExecutor(1), download=download)
+
+    first = extractor.pages([("1706.03762v7", "http://arxiv.org/pdf/1706.03762v7")])
+    again = extractor.pages([("1706.03762v7", "http://arxiv.org/pdf/1706.03762v7")])
+    extractor.pages([("1706.03762v8", "http://arxiv.org/pdf/1706.03762v8")])
+
+    assert first == again == {"1706.03762v7": PAGES[:2]}
+    assert download.call_count == 2
+
+
+def test_extractor_skips_documents_over_byte_limit(tmp_path):
+    download = Mock(side_effect=PdfTooLarge("too large"))
+    extractor = ArxivPdfExtractor(PdfTextCache(str(tmp_path)), executor=ThreadPoolExecutor(1), download=download)
+
+    assert extractor.pages([("hep-th/9901001v1", "http://arxiv.org/pdf/hep-th/9901001v1")]) == {}
+
+
+def test_fetcher_returns_abstracts_by_default():
+    fetcher = ArxivFetcher(deep=False, extractor=Mock())
+    fetcher.client = Mock()
+    fetcher.client.results.return_value = [_result("1706.03762v7", "Attention Is All You Need", "The Transformer.")]
+
+    result = fetcher.search("attention")
+
+    assert result.raw_sources == ["The Transformer."]
+    assert result.documents == ["Attention Is All You Need"]
+    fetcher.extractor.pages.assert_not_called()
+
+
+def test_fetcher_deep_mode_returns_relevant_pages(tmp_path, paper_pdf, arxiv_limiter):
+    extractor = ArxivPdfExtractor(PdfTextCache(str(tmp_path)), executor=ThreadPoolExecutor(1),
+                                  download=Mock(return_value=paper_pdf))
+    fetcher = ArxivFetcher(deep=True, extractor=extractor)
+    fetcher.client = Mock()
+    fetcher.client.results.return_value = [
+        _result("1706.03762v7", "Attention Is All You Need", "The Transformer."),
+        _result("2401.00001v1", "Unreadable", "Only the abstract."),
+    ]
+    extractor.download.side_effect = [paper_pdf, PdfTooLarge("too large")]
+
+    result = fetcher.search("multi-head attention")
+
+    assert result.raw_sources[0].startswith(PAGES[0])
+    assert PAGES[2] in result.raw_sources[0]
+    assert PAGES[1] not in result.raw_sources[0]
+    assert result.raw_sources[1] == "Only the abstract."
+    # One request for the search and one per PDF download
+    assert arxiv_limiter.acquired == 3
+
+
+def test_fetcher_deep_mode_returns_abstracts_of_papers_missing_the_deadline(tmp_path, paper_pdf, arxiv_limiter):
+    release = threading.Event()
+
+    def download(url: str, max_bytes: int) -> bytes:
+        if "2401.00001v1" in url:
+            release.wait(5)
+        return paper_pdf
+
+    extractor = ArxivPdfExtractor(PdfTextCache(str(tmp_path)), executor=ThreadPoolExecutor(2), download=download,
+                                  deadline=0.5)
+    fetcher = ArxivFetcher(deep=True, extractor=extractor)
+    fetcher.client = Mock()
+    fetcher.client.results.return_value = [
+        _result("2401.00001v1", "Slow paper", "Abstract of the slow paper."),
+        _result("1706.03762v7", "Attention Is All You Need", "The Transformer."),
+    ]
+
+    try:
+        result = fetcher.search("multi-head attention")
+    finally:
+        release.set()
+
+    assert result.raw_sources[0] == "Abstract of the slow paper."
+    assert PAGES[2] in result.raw_sources[1]
@@ -0,0 +1,73 @@
+import pytest
+
+from benchmarks import bulk, serialization, startup
+from benchmarks.fakes import FakeChatModel, FakeFetcher, FetcherProfile, OfflineConfig
+from benchmarks.load import LoadConfig, percentile, run_benchmark
+from app.workflows.research_type import ResearchType
+
+
+def test_percentile_nearest_rank():
+    values = [float(i) for i in range(1, 101)]
+
+    assert percentile(values, 50) == 50.0
+    assert percentile(values, 99) == 99.0
+    assert percentile([], 95) == 0.0
+
+
+def test_fake_chat_model_classifies_into_known_domain():
+    llm = FakeChatModel(latency=0.0)
+
+    response = llm.invoke([("system", "You are a classifier"), ("user", "Query: what is insulin?")])
+
+    assert response.content in ResearchType.__members__
+    assert response.usage_metadata["output_tokens"] == 1
+
+
+def test_fake_fetcher_empty_rate():
+    always_empty = FakeFetcher("pubmed", FetcherProfile(latency=0.0, empty_rate=1.0))
+    never_empty = FakeFetcher("pubmed", FetcherProfile(latency=0.0, empty_rate=0.0))
+
+    assert always_empty.search("query").raw_sources == []
+    assert len(never_empty.search("query").raw_sources) == never_empty.top_k
+
+
+@pytest.mark.asyncio
+async def test_run_benchmark_offline():
+    fast = FetcherProfile(latency=0.0, sigma=0.0)
+    offline = OfflineConfig(llm_latency=0.0, answer_tokens=5,
+                            fetchers={name: fast for name in ("pubmed", "arxiv", "wikipedia", "duckduckgo")})
+
+    report = await run_benchmark(LoadConfig(requests=6, concurrency=3, agents=2, distinct_queries=3), offline)
+
+    assert report.requests == 6
+    assert report.errors == 0
+    assert report.status_codes == {"201": 6}
+    assert report.rps > 0
+
+
+@pytest.mark.asyncio
+async def test_serialization_paths_render_the_same_agent():
+    results = await serialization.run_benchmark([3], iterations=2, gzip=True)
+
+    assert [result.path for result in results] == ["legacy", "fast", "fast+gzip"]
+    assert results[0].response_bytes == results[1].response_bytes
+
+
+def test_parse_importtime_reads_cumulative_seconds():
+    output = ("import time: self [us] | cumulative | imported package\n"
+              "import time:       120 |        120 |   app.fetchers.registry\n"
+              "import time:      1500 |    2500000 | app.main\n")
+
+    assert startup.parse_importtime(output) == {"app.fetchers.registry": 0.00012, "app.main": 2.5}
+
+
+@pytest.mark.asyncio
+async def test_bulk_paths_need_a_round_trip_per_batch():
+    results = await bulk.run_benchmark([30], conversations=2, latency=0.0, batch_size=20)
+
+    by_path = {(result.operation, result.path): result for result in results}
+    assert by_path["create", "one-by-one"].round_trips == 30
+    assert by_path["create", "insert_many"].round_trips == 1
+    assert by_path["delete", "fetch+delete"].round_trips == 60
+    assert by_path["delete", "bulk ids"].round_trips == 4 and by_path["delete", "bulk filter"].round_trips == 4
+    assert by_path["delete", "bulk ids"].bytes_read < by_path["delete", "fetch+delete"].bytes_read / 10
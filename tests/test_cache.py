@@ -0,0 +1,142 @@
+import mongomock
+import pytest
+
+from app.models.results import FetcherResult, QueryResult
+from app.utils import cache as cache_module
+from app.utils.cache import CacheBackend, MongoCacheBackend, SQLiteCacheBackend, TieredCache, TTLCache, decode_value, \
+    encode_value, get_l2_backend
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_get_returns_stored_value_until_it_expires():
+    clock = FakeClock()
+    cache = TTLCache(maxsize=10, ttl=60, clock=clock)
+    cache.put("key", "value")
+
+    clock.now = 59
+    assert cache.get("key") == "value"
+
+    clock.now = 60
+    assert cache.get("key") is None
+    assert len(cache) == 0
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_put_evicts_least_recently_used_entry():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+
+def test_zero_maxsize_disables_cache():
+    cache = TTLCache(maxsize=0, ttl=60)
+    cache.put("key", "value")
+
+    assert cache.get("key") is None
+
+
+def test_encode_value_round_trips_results_and_compresses_large_values():
+    fetcher_result = FetcherResult(raw_sources=["Source"], documents=["word " * 500])
+    query_result = QueryResult(agent_response="Answer", domain="web", documents=["doc"])
+
+    encoded = encode_value(fetcher_result)
+    assert len(encoded) < 500
+    assert decode_value(encoded) == fetcher_result
+    assert decode_value(encode_value(query_result)) == query_result
+    assert decode_value(encode_value("KNOWLEDGE")) == "KNOWLEDGE"
+
+
+def test_sqlite_backend_shares_entries_between_workers(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    result = FetcherResult(raw_sources=["Source"], documents=["doc"])
+    first = TieredCache("fetcher", TTLCache(maxsize=10, ttl=60), lambda: SQLiteCacheBackend(path))
+    backend = SQLiteCacheBackend(path)
+    second = TieredCache("fetcher", TTLCache(maxsize=10, ttl=60), lambda: backend)
+
+    first.put(("wikipedia", "crispr"), result)
+
+    assert second.get(("wikipedia", "crispr")) == result
+    assert second.get(("wikipedia", "crispr")) == result
+    stats = second.stats()
+    assert stats["l1"]["hits"] == 1
+    assert stats["l2"]["hits"] == 1
+    assert stats["l2"]["backend"] == "sqlite"
+    assert stats["hit_rate"] == 1.0
+
+
+def test_sqlite_backend_expires_entries(tmp_path):
+    clock = FakeClock()
+    backend = SQLiteCacheBackend(str(tmp_path / "cache.sqlite3"), clock=clock)
+    backend.put("fetcher:key", b"value", ttl=60)
+
+    clock.now = 59
+    assert backend.get("fetcher:key") == b"value"
+    clock.now = 60
+    assert backend.get("fetcher:key") is None
+
+
+def test_mongo_backend_stores_entries_with_ttl_index():
+    backend = MongoCacheBackend(mongomock.MongoClient().db.cache_entries)
+    backend.setup()
+    cache = TieredCache("query", TTLCache(maxsize=10, ttl=60), lambda: backend)
+    result = QueryResult(agent_response="Answer", domain="web", documents=[])
+
+    cache.put("key", result)
+    cache.clear()
+
+    assert cache.get("key") == result
+    assert backend.collection.find_one()["_id"].startswith("query:")
+    assert any(index.get("expireAfterSeconds") == 0 for index in backend.collection.index_information().values())
+
+
+def test_failing_l2_counts_errors_and_misses():
+    backend = MongoCacheBackend(None)
+    cache = TieredCache("fetcher", TTLCache(maxsize=10, ttl=60), lambda: backend)
+
+    cache.put("key", "value")
+    cache.clear()
+
+    assert cache.get("key") is None
+    assert cache.stats()["l2"]["errors"] == 2
+
+
+def test_get_l2_backend_modes(monkeypatch, tmp_path):
+    monkeypatch.setattr(cache_module, "_l2_backend", None)
+    monkeypatch.setenv("CACHE_BACKEND", "none")
+    assert get_l2_backend() is None
+
+    monkeypatch.setenv("CACHE_BACKEND", "mongo")
+    monkeypatch.setattr("app.core.db._client", None)
+    assert get_l2_backend() is None
+
+    monkeypatch.setenv("CACHE_BACKEND", "sqlite")
+    monkeypatch.setenv("CACHE_SQLITE_PATH", str(tmp_path / "cache.sqlite3"))
+    assert isinstance(get_l2_backend(), SQLiteCacheBackend)
+
+    monkeypatch.setattr(cache_module, "_l2_backend", None)
+    monkeypatch.setenv("CACHE_BACKEND", "redis")
+    with pytest.raises(ValueError):
+        get_l2_backend()
+
+
+def test_cache_backend_without_every_method_cannot_be_created():
+    class ReadOnlyBackend(CacheBackend):
+        def get(self, key: str):
+            return None
+
+    with pytest.raises(TypeError):
+        ReadOnlyBackend()
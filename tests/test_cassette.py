@@ -0,0 +1,78 @@
+import pytest
+from unittest.mock import Mock
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from app.models.results import FetcherResult
+from app.utils.cassette import (
+    CASSETTE_RECORD,
+    CASSETTE_REPLAY,
+    CassetteChatModel,
+    CassetteFetcher,
+    CassetteStore,
+    use_cassette_fetcher,
+)
+from app.utils.llm import get_openai_llm
+
+
+def test_store_key_is_content_addressed():
+    first = CassetteStore.key({"kind": "fetcher", "query": "q", "terms": ""})
+    reordered = CassetteStore.key({"terms": "", "query": "q", "kind": "fetcher"})
+    different = CassetteStore.key({"kind": "fetcher", "query": "other", "terms": ""})
+
+    assert first == reordered
+    assert first != different
+
+
+def test_fetcher_record_then_replay(tmp_path):
+    store = CassetteStore(str(tmp_path))
+    inner = Mock(top_k=5, max_chars=5000)
+    inner.search.return_value = FetcherResult(raw_sources=["Source 1"], documents=["doc1.pdf"])
+
+    recorded = CassetteFetcher(inner, CASSETTE_RECORD, store).search("Test query", "terms")
+    replayed = CassetteFetcher(Mock(top_k=5, max_chars=5000), CASSETTE_REPLAY, store).search("Test query", "terms")
+
+    assert recorded == replayed == FetcherResult(raw_sources=["Source 1"], documents=["doc1.pdf"])
+    inner.search.assert_called_once_with("Test query", "terms")
+    with pytest.raises(KeyError):
+        CassetteFetcher(Mock(top_k=2, max_chars=800), CASSETTE_REPLAY, store).search("Test query", "terms")
+
+
+def test_fetcher_replay_miss_raises_key_error(tmp_path):
+    fetcher = CassetteFetcher(Mock(top_k=5, max_chars=5000), CASSETTE_REPLAY, CassetteStore(str(tmp_path)))
+
+    with pytest.raises(KeyError):
+        fetcher.search("Never recorded")
+
+
+def test_llm_record_then_replay_without_inner_model(tmp_path):
+    store = CassetteStore(str(tmp_path))
+    params = {"model": "gpt-4o-mini", "temperature": 0.2}
+    messages = [("system", "You are a classifier"), ("user", "Query: insulin")]
+
+    recording = CassetteChatModel(params=params, mode=CASSETTE_RECORD, store=store,
+                                  inner=FakeListChatModel(responses=["MEDICAL"]))
+    replaying = CassetteChatModel(params=params, mode=CASSETTE_REPLAY, store=store)
+
+    assert recording.invoke(messages).content == "MEDICAL"
+    assert replaying.invoke(messages).content == "MEDICAL"
+
+
+def test_cassette_off_leaves_llm_and_fetcher_unwrapped(monkeypatch):
+    monkeypatch.delenv("RESEARCH_CASSETTE_MODE", raising=False)
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    fetcher = Mock()
+
+    assert use_cassette_fetcher(fetcher) is fetcher
+    assert not isinstance(get_openai_llm(), CassetteChatModel)
+
+
+def test_replay_mode_wraps_llm_without_api_key(monkeypatch, tmp_path):
+    monkeypatch.setenv("RESEARCH_CASSETTE_MODE", "replay")
+    monkeypatch.setenv("RESEARCH_CASSETTE_DIR", str(tmp_path))
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+
+    llm = get_openai_llm()
+
+    assert isinstance(llm, CassetteChatModel)
+    assert llm.inner is None
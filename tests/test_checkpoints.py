@@ -0,0 +1,162 @@
+import mongomock
+import pytest
+from langgraph.checkpoint.base import empty_checkpoint
+
+from app.models.results import QueryResult
+from app.workflows import research_graph
+from app.workflows.checkpoints import MongoCheckpointSaver, checkpoint_serializer, delete_agent_checkpoints, \
+    get_checkpointer
+from app.workflows.research_graph import get_research_graph, process_query
+from app.workflows.research_type import ResearchType
+from app.workflows.retrieval import resolve_retrieval_options
+
+
+@pytest.fixture
+def saver():
+    saver = MongoCheckpointSaver(mongomock.MongoClient().db, ttl=60)
+    saver.setup()
+    return saver
+
+
+@pytest.fixture
+def graph_nodes(monkeypatch, saver):
+    """
+    Compiles the research graph with the Mongo saver and counting nodes; the
+    synthesis node fails while `fail_synthesis` is set.
+    """
+    calls = {"classify": 0, "retrieve": 0, "synthesize": 0, "fail_synthesis": True}
+
+    def classify(state):
+        calls["classify"] += 1
+        state["domain"] = ResearchType.KNOWLEDGE
+        return state
+
+    def retrieve(state):
+        calls["retrieve"] += 1
+        state["sources"], state["documents"] = ["Source"], ["doc"]
+        return state
+
+    def synthesize(state):
+        calls["synthesize"] += 1
+        if calls["fail_synthesis"]:
+            raise RuntimeError("LLM unavailable")
+        state["answer"] = f"Answer to {state['query']}"
+        return state
+
+    monkeypatch.setattr(research_graph, "_classify_domain", classify)
+    monkeypatch.setattr(research_graph, "_retrieve_sources", retrieve)
+    monkeypatch.setattr(research_graph, "_synthesize_answer", synthesize)
+    monkeypatch.setattr(research_graph, "get_checkpointer", lambda: saver)
+    get_research_graph.cache_clear()
+    yield calls
+    get_research_graph.cache_clear()
+
+
+def test_put_and_get_tuple_round_trip(saver):
+    checkpoint = empty_checkpoint()
+    checkpoint["channel_values"] = {"domain": ResearchType.MEDICAL, "retrieval": resolve_retrieval_options("fast")}
+    checkpoint["channel_versions"] = {"domain": "1", "retrieval": "1"}
+
+    config = saver.put({"configurable": {"thread_id": "t1", "checkpoint_ns": ""}}, checkpoint, {"step": 1},
+                       {"domain": "1", "retrieval": "1"})
+    saver.put_writes(config, [("answer", "partial")], task_id="task-1")
+
+    stored = saver.get_tuple({"configurable": {"thread_id": "t1"}})
+    assert stored.config == config
+    assert stored.checkpoint["channel_values"]["domain"] == ResearchType.MEDICAL
+    assert stored.checkpoint["channel_values"]["retrieval"].profile == "fast"
+    assert stored.metadata["step"] == 1
+    assert stored.pending_writes == [("task-1", "answer", "partial")]
+    assert [item.config for item in saver.list({"configurable": {"thread_id": "t1"}})] == [config]
+
+
+def test_setup_creates_ttl_indexes(saver):
+    for collection in (saver.checkpoints, saver.blobs, saver.writes):
+        ttl_indexes = [index for index in collection.index_information().values() if "expireAfterSeconds" in index]
+        assert ttl_indexes[0]["expireAfterSeconds"] == 60
+
+
+def test_delete_thread_removes_its_checkpoints(saver):
+    checkpoint = empty_checkpoint()
+    checkpoint["channel_values"], checkpoint["channel_versions"] = {"query": "q"}, {"query": "1"}
+    saver.put({"configurable": {"thread_id": "t1"}}, checkpoint, {}, {"query": "1"})
+    saver.put({"configurable": {"thread_id": "t2"}}, checkpoint, {}, {"query": "1"})
+
+    saver.delete_thread("t1")
+
+    assert saver.get_tuple({"configurable": {"thread_id": "t1"}}) is None
+    assert saver.get_tuple({"configurable": {"thread_id": "t2"}}) is not None
+
+
+@pytest.mark.parametrize("in_memory", [False, True])
+def test_delete_agent_checkpoints_removes_the_runs_of_the_agents(saver, in_memory):
+    from langgraph.checkpoint.memory import InMemorySaver
+
+    saver = InMemorySaver(serde=checkpoint_serializer()) if in_memory else saver
+    checkpoint = empty_checkpoint()
+    checkpoint["channel_values"], checkpoint["channel_versions"] = {"query": "q"}, {"query": "1"}
+    for thread_id in ("agent-1:r1", "agent-1:r2", "agent-10:r1", "agent-2:r1"):
+        saver.put({"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}, checkpoint, {}, {"query": "1"})
+
+    deleted = delete_agent_checkpoints(saver, ["agent-1", "agent-2"])
+
+    assert deleted == 3
+    assert saver.get_tuple({"configurable": {"thread_id": "agent-1:r2"}}) is None
+    assert saver.get_tuple({"configurable": {"thread_id": "agent-10:r1"}}) is not None
+    assert delete_agent_checkpoints(None, ["agent-10"]) == 0
+
+
+def test_retry_resumes_from_last_completed_node(graph_nodes):
+    with pytest.raises(RuntimeError):
+        process_query("What is CRISPR?", thread_id="agent:req-1")
+
+    graph_nodes["fail_synthesis"] = False
+    result = process_query("What is CRISPR?", thread_id="agent:req-1")
+
+    assert result == QueryResult(agent_response="Answer to What is CRISPR?", domain="knowledge", documents=["doc"])
+    assert graph_nodes["classify"] == 1
+    assert graph_nodes["retrieve"] == 1
+    assert graph_nodes["synthesize"] == 2
+
+
+def test_finished_run_is_not_run_again(graph_nodes):
+    graph_nodes["fail_synthesis"] = False
+    first = process_query("What is CRISPR?", thread_id="agent:req-1")
+    second = process_query("What is CRISPR?", thread_id="agent:req-1")
+
+    assert second == first
+    assert graph_nodes["synthesize"] == 1
+
+
+def test_thread_id_of_another_query_is_rejected(graph_nodes):
+    graph_nodes["fail_synthesis"] = False
+    process_query("What is CRISPR?", thread_id="agent:req-1")
+
+    with pytest.raises(ValueError):
+        process_query("What is mRNA?", thread_id="agent:req-1")
+
+
+def test_runs_without_thread_id_are_not_checkpointed(graph_nodes, saver):
+    graph_nodes["fail_synthesis"] = False
+    process_query("What is CRISPR?")
+
+    assert saver.checkpoints.count_documents({}) == 0
+
+
+def test_get_checkpointer_modes(monkeypatch):
+    monkeypatch.setenv("GRAPH_CHECKPOINTER", "off")
+    assert get_checkpointer() is None
+
+    monkeypatch.setenv("GRAPH_CHECKPOINTER", "memory")
+    assert get_checkpointer() is not None
+
+    monkeypatch.setenv("GRAPH_CHECKPOINTER", "redis")
+    with pytest.raises(ValueError):
+        get_checkpointer()
+
+
+def test_get_checkpointer_without_database(monkeypatch):
+    monkeypatch.setenv("GRAPH_CHECKPOINTER", "mongo")
+    monkeypatch.setattr("app.core.db._client", None)
+
+    assert get_checkpointer() is None
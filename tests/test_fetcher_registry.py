@@ -0,0 +1,27 @@
+import subprocess
+import sys
+
+import pytest
+
+from app.fetchers.duckduckgo import DuckDuckGoFetcher
+from app.fetchers.registry import FETCHERS, get_fetcher_class
+
+
+def test_app_import_does_not_load_fetcher_implementations():
+    code = ("import sys, app.main; "
+            "print(sorted(name for name in ('app.fetchers.pubmed', 'app.fetchers.arxiv', 'app.fetchers.wikipedia', "
+            "'app.fetchers.duckduckgo', 'langchain_openai') if name in sys.modules))")
+
+    completed = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+
+    assert completed.stdout.strip() == "[]"
+
+
+def test_get_fetcher_class_imports_on_first_use():
+    assert get_fetcher_class("duckduckgo") is DuckDuckGoFetcher
+    assert all(get_fetcher_class(name).source for name in FETCHERS)
+
+
+def test_get_fetcher_class_unknown_name():
+    with pytest.raises(KeyError):
+        get_fetcher_class("altavista")
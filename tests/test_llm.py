@@ -0,0 +1,97 @@
+from typing import List, Optional
+from unittest.mock import patch
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from app.utils.llm import LLMConfig, get_openai_llm, llm_config
+from app.workflows.research_graph import _classify_domain, _synthesize_answer
+from app.workflows.research_state import ResearchState
+from app.workflows.research_type import ResearchType
+from app.workflows.retrieval import resolve_retrieval_options
+
+
+class RecordingChatModel(BaseChatModel):
+    """Chat model answering with a fixed reply, or failing, and recording its prompts."""
+    reply: str = "ACADEMIC"
+    fail: bool = False
+    prompts: List[List[BaseMessage]] = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "recording"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs) -> ChatResult:
+        self.prompts.append(messages)
+        if self.fail:
+            raise TimeoutError("Request timed out")
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.reply))])
+
+
+def test_llm_config_caps_short_nodes_and_reads_overrides(monkeypatch):
+    assert llm_config("classify").max_tokens == 5
+    assert llm_config("synthesize").max_tokens is None
+
+    monkeypatch.setenv("LLM_SYNTHESIZE_MODEL", "gpt-4o")
+    monkeypatch.setenv("LLM_SYNTHESIZE_MAX_TOKENS", "800")
+    monkeypatch.setenv("LLM_CLASSIFY_TIMEOUT", "")
+    monkeypatch.setenv("LLM_FALLBACK_MODEL", "")
+
+    assert llm_config("synthesize") == LLMConfig(model="gpt-4o", max_tokens=800, timeout=60.0, fallback_model="")
+    assert llm_config("classify").timeout is None
+    assert llm_config("classify").fallback_model == ""
+
+
+def test_node_falls_back_to_alternate_model_on_timeout():
+    models = {"gpt-4o-mini": RecordingChatModel(fail=True, prompts=[]),
+              "gpt-4.1-mini": RecordingChatModel(reply="MEDICAL", prompts=[])}
+    calls = []
+
+    def fake_get_openai_llm(model, temperature, max_tokens, timeout, max_retries=None):
+        calls.append((model, temperature, max_tokens, timeout, max_retries))
+        return models[model]
+
+    with patch("app.workflows.research_graph.get_openai_llm", fake_get_openai_llm):
+        state = _classify_domain(ResearchState(query="What causes migraines?"))
+
+    assert state["domain"] == ResearchType.MEDICAL
+    # The primary model is not retried by the client, the fallback keeps the client default
+    assert calls == [("gpt-4o-mini", 0.0, 5, 10.0, 0), ("gpt-4.1-mini", 0.0, 5, 10.0, None)]
+    assert len(models["gpt-4o-mini"].prompts) == 1
+
+
+def test_prompts_keep_static_prefix_first(monkeypatch):
+    monkeypatch.setenv("LLM_FALLBACK_MODEL", "")
+    model = RecordingChatModel(reply="An answer [1].", prompts=[])
+
+    with patch("app.workflows.research_graph.get_openai_llm", lambda *_: model):
+        for query in ("What is a transformer?", "What is attention?"):
+            _synthesize_answer(ResearchState(query=query, sources=["Source text"], history="User: hi",
+                                             retrieval=resolve_retrieval_options(profile="fast")))
+
+    first, second = model.prompts
+    assert first[0].content == second[0].content
+    assert first[1].content.startswith("Conversation so far:\nUser: hi\n\nSources:\n[1] Source text")
+    assert "Query: What is a transformer?\n\nInstructions:" in first[1].content
+
+
+def test_primary_model_keeps_client_retries_without_fallback(monkeypatch):
+    monkeypatch.setenv("LLM_FALLBACK_MODEL", "")
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    calls = []
+
+    def fake_get_openai_llm(model, temperature, max_tokens, timeout, max_retries=None):
+        calls.append(max_retries)
+        return RecordingChatModel(reply="WEB", prompts=[])
+
+    with patch("app.workflows.research_graph.get_openai_llm", fake_get_openai_llm):
+        _classify_domain(ResearchState(query="Cheap flights to Lisbon"))
+
+    assert calls == [None]
+    assert get_openai_llm("gpt-4o-mini", timeout=10.0, max_retries=0).root_client.max_retries == 0
+
+    monkeypatch.setenv("LLM_FALLBACK_MODEL", "gpt-4.1-mini")
+    monkeypatch.setenv("LLM_CLASSIFY_PRIMARY_RETRIES", "1")
+    assert llm_config("classify").primary_retries == 1
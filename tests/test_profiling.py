@@ -0,0 +1,170 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.agents import router as agents_router
+from app.api.status import router as status_router
+from app.models.results import QueryResult
+from app.utils import profiling
+from app.utils.profiling import ProfileStore, RequestProfile, check_admin_token, get_profile_store
+
+
+@pytest.fixture(autouse=True)
+def profile_store(monkeypatch):
+    store = ProfileStore(size=2)
+    monkeypatch.setattr(profiling, "_store", store)
+    return store
+
+
+def busy_wait(seconds: float):
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        pass
+
+
+def blocking_step():
+    time.sleep(0.05)
+
+
+async def persist():
+    await asyncio.sleep(0.05)
+
+
+@pytest.mark.asyncio
+async def test_profile_samples_worker_threads_and_awaits(profile_store):
+    async with RequestProfile("test", interval=0.002, agent_id="agent-1") as profile:
+        await profiling.to_thread(blocking_step)
+        await persist()
+
+    stacks = profile.collapsed().splitlines()
+    assert profile_store.list()[0]["id"] == profile.id
+    assert profile.summary()["agent_id"] == "agent-1" and profile.samples > 0
+    assert any(line.startswith("[thread] blocking_step;") for line in stacks)
+    assert any("persist (" in line and "[awaiting future]" in line for line in stacks)
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in stacks)
+
+
+@pytest.mark.asyncio
+async def test_profile_keeps_failed_requests():
+    with pytest.raises(ValueError):
+        async with RequestProfile("test", interval=0.002) as profile:
+            await profiling.to_thread(busy_wait, 0.01)
+            raise ValueError("Query message must be a non-empty string")
+
+    assert get_profile_store().get(profile.id).error == "ValueError: Query message must be a non-empty string"
+
+
+@pytest.mark.asyncio
+async def test_unprofiled_requests_start_no_sampler(monkeypatch):
+    def fail(*_):
+        raise AssertionError("run_tracked must not be called without a profile")
+
+    monkeypatch.setattr(RequestProfile, "run_tracked", fail)
+
+    assert await profiling.to_thread(sum, [1, 2]) == 3
+    assert profiling.active_profile() is None
+    assert not any(thread.name.startswith("profiler-") for thread in threading.enumerate())
+
+
+@pytest.mark.asyncio
+async def test_ring_buffer_keeps_the_most_recent_profiles(profile_store):
+    ids = []
+    for _ in range(3):
+        async with RequestProfile("test", interval=0.01) as profile:
+            ids.append(profile.id)
+
+    assert [summary["id"] for summary in profile_store.list()] == ids[:0:-1]
+    with pytest.raises(KeyError):
+        profile_store.get(ids[0])
+
+
+def test_admin_token_is_required(monkeypatch):
+    monkeypatch.delenv("PROFILING_TOKEN", raising=False)
+    with pytest.raises(PermissionError):
+        check_admin_token("secret")
+
+    monkeypatch.setenv("PROFILING_TOKEN", "secret")
+    with pytest.raises(PermissionError):
+        check_admin_token("wrong")
+    check_admin_token("secret")
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setenv("PROFILING_TOKEN", "secret")
+
+    async def fake_send_queries(agent_id, message, retrieval, request_id=None, priority="interactive"):
+        await profiling.to_thread(blocking_step)
+        return QueryResult(agent_response="Answer", domain="web", documents=[])
+
+    monkeypatch.setattr("app.services.research_service.send_queries", fake_send_queries)
+    app = FastAPI()
+    app.include_router(agents_router)
+    app.include_router(status_router)
+    return TestClient(app)
+
+
+def test_profiled_query_is_served_as_collapsed_stacks(client):
+    response = client.post("/agents/abc123/queries?profiling=true", json={"message": "Why?"},
+                           headers={"X-Admin-Token": "secret"})
+    profile_id = response.headers["X-Profile-Id"]
+
+    listed = client.get("/status/profiles", headers={"X-Admin-Token": "secret"})
+    collapsed = client.get(f"/status/profiles/{profile_id}", headers={"X-Admin-Token": "secret"})
+    as_json = client.get(f"/status/profiles/{profile_id}?format=json", headers={"X-Admin-Token": "secret"})
+
+    assert response.status_code == 201
+    assert listed.json()[0]["id"] == profile_id and listed.json()[0]["query"] == "Why?"
+    assert collapsed.headers["content-type"].startswith("text/plain")
+    assert "[thread] blocking_step;" in collapsed.text
+    assert as_json.json()["samples"] == sum(stack["count"] for stack in as_json.json()["stacks"])
+
+
+def test_profiling_needs_the_admin_token(client):
+    header_profiled = client.post("/agents/abc123/queries", json={"message": "Why?"}, headers={"X-Profile": "1"})
+    unprofiled = client.post("/agents/abc123/queries", json={"message": "Why?"})
+    listed = client.get("/status/profiles", headers={"X-Admin-Token": "wrong"})
+    missing = client.get("/status/profiles/unknown", headers={"X-Admin-Token": "secret"})
+
+    assert header_profiled.status_code == 403
+    assert unprofiled.status_code == 201 and "X-Profile-Id" not in unprofiled.headers
+    assert listed.status_code == 403
+    assert missing.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_profiled_query_runs_its_own_pipeline(monkeypatch):
+    from app.services import research_service
+    from app.utils.single_flight import SingleFlight
+
+    runs = []
+
+    async def mock_get_context_document(agent_id: str):
+        return {"_id": agent_id, "summary": "", "summarized_count": 0, "messages": []}
+
+    def mock_process_query(query: str, history: str = "", retrieval=None, thread_id=None):
+        runs.append(threading.get_ident())
+        time.sleep(0.05)
+        return QueryResult(agent_response="Answer", domain="web", documents=[])
+
+    async def mock_add_conversations(agent_id: str, query: str, query_result: QueryResult):
+        return "conversation-id"
+
+    monkeypatch.setattr(research_service, "get_context_document", mock_get_context_document)
+    monkeypatch.setattr(research_service, "process_query", mock_process_query)
+    monkeypatch.setattr(research_service, "add_conversations", mock_add_conversations)
+    monkeypatch.setattr(research_service, "_query_flights", SingleFlight())
+
+    async def profiled():
+        async with RequestProfile("test", interval=0.005) as profile:
+            await research_service.send_queries("agent-2", "What is ML?")
+        return profile
+
+    _, profile = await asyncio.gather(research_service.send_queries("agent-1", "What is ML?"), profiled())
+
+    assert len(runs) == 2
+    assert any(stack.startswith("[thread] ") and "mock_process_query" in stack for stack in profile.stacks)
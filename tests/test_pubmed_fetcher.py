@@ -0,0 +1,101 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from app.fetchers.pubmed import PUBMED_KEYED_RATE_LIMIT, PubMedFetcher, parse_efetch
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "pubmed")
+
+
+def _fixture(name: str) -> bytes:
+    with open(os.path.join(FIXTURES, name), "rb") as f:
+        return f.read()
+
+
+class EUtilitiesStandIn(BaseHTTPRequestHandler):
+    """Serves recorded E-utilities responses and records the requests it received."""
+    requests = []
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        self.requests.append((url.path, params))
+
+        if url.path.endswith("/esearch.fcgi"):
+            body = _fixture("esearch_empty.json" if params["term"] == "qwertyuiop" else "esearch.json")
+            content_type = "application/json"
+        elif url.path.endswith("/efetch.fcgi"):
+            body = _fixture("efetch.xml")
+            content_type = "text/xml"
+        else:
+            self.send_response(404)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture()
+def eutils(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), EUtilitiesStandIn)
+    threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+    EUtilitiesStandIn.requests = []
+    monkeypatch.setenv("PUBMED_EUTILS_URL", f"http://127.0.0.1:{server.server_port}/entrez/eutils")
+    monkeypatch.setenv("PUBMED_API_KEY", "test-key")
+    monkeypatch.delenv("PUBMED_EMAIL", raising=False)
+    yield EUtilitiesStandIn.requests
+    server.shutdown()
+    server.server_close()
+
+
+def test_parse_efetch_extracts_used_fields():
+    articles = parse_efetch(_fixture("efetch.xml"))
+
+    assert [article.pmid for article in articles] == ["38011001", "38011002", "38011003"]
+    assert articles[0].title == "Insulin sensitivity and glucose tolerance in adults with type 2 diabetes."
+    assert articles[0].abstract == ("BACKGROUND: Insulin resistance precedes type 2 diabetes. "
+                                    "RESULTS: Glucose tolerance improved with early insulin therapy.")
+    assert articles[0].year == "2024"
+    assert articles[1].year == "2023"
+    assert articles[2].abstract == ""
+
+
+def test_search_uses_history_and_one_batched_efetch(eutils):
+    fetcher = PubMedFetcher()
+
+    result = fetcher.search("What helps insulin resistance?", "insulin, glucose")
+
+    assert result.documents == [
+        "Insulin sensitivity and glucose tolerance in adults with type 2 diabetes.",
+        "Continuous glucose monitoring in insulin-treated patients.",
+    ]
+    assert result.raw_sources[1] == "Continuous glucose monitoring reduced hypoglycaemia in insulin-treated patients."
+
+    assert [path.rsplit("/", 1)[-1] for path, _ in eutils] == ["esearch.fcgi", "efetch.fcgi"]
+    esearch_params, efetch_params = eutils[0][1], eutils[1][1]
+    assert esearch_params["term"] == "insulin, glucose"
+    assert esearch_params["usehistory"] == "y"
+    assert esearch_params["api_key"] == "test-key"
+    assert efetch_params["WebEnv"] == "MCID_6650f1a2c2a1d0b5e0a1b2c3"
+    assert efetch_params["query_key"] == "1"
+
+
+def test_search_without_hits_skips_efetch(eutils):
+    result = PubMedFetcher().search("nonsense", "qwertyuiop")
+
+    assert result.raw_sources == []
+    assert len(eutils) == 1
+
+
+def test_api_key_selects_keyed_rate_tier(eutils):
+    assert PubMedFetcher().rate_limit == PUBMED_KEYED_RATE_LIMIT
@@ -0,0 +1,119 @@
+import pytest
+
+from app.fetchers import Fetcher
+from app.fetchers.arxiv import ArxivFetcher
+from app.fetchers.duckduckgo import DuckDuckGoFetcher
+from app.fetchers.pubmed import PUBMED_KEYED_RATE_LIMIT, PUBMED_RATE_LIMIT, PubMedFetcher
+from app.fetchers.wikipedia import WikipediaFetcher
+from app.fetchers.rate_limit import RateLimit, RateLimitExceeded, TokenBucket, get_limiter, rate_limited
+from app.models.results import FetcherResult
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def test_token_bucket_allows_burst_then_queues():
+    clock = FakeClock()
+    bucket = TokenBucket("pubmed", RateLimit(rate=2, burst=2, max_wait=10.0), clock=clock, sleep=clock.sleep)
+
+    waits = [bucket.acquire() for _ in range(4)]
+
+    assert waits == [0.0, 0.0, 0.5, 0.5]
+
+
+def test_token_bucket_reserves_in_arrival_order():
+    clock = FakeClock()
+    bucket = TokenBucket("arxiv", RateLimit(rate=1, burst=1, max_wait=10.0), clock=clock, sleep=lambda _: None)
+
+    waits = [bucket.acquire() for _ in range(3)]
+
+    assert waits == [0.0, 1.0, 2.0]
+
+
+def test_token_bucket_refills_over_time():
+    clock = FakeClock()
+    bucket = TokenBucket("wikipedia", RateLimit(rate=1, burst=1, max_wait=10.0), clock=clock, sleep=clock.sleep)
+
+    bucket.acquire()
+    clock.now += 5
+
+    assert bucket.acquire() == 0.0
+
+
+def test_token_bucket_raises_beyond_max_wait():
+    clock = FakeClock()
+    bucket = TokenBucket("duckduckgo", RateLimit(rate=1, burst=1, max_wait=1.5), clock=clock, sleep=lambda _: None)
+
+    bucket.acquire()
+    bucket.acquire()
+
+    with pytest.raises(RateLimitExceeded):
+        bucket.acquire()
+
+
+def test_token_bucket_charges_request_cost():
+    clock = FakeClock()
+    bucket = TokenBucket("pubmed", RateLimit(rate=3, burst=3, max_wait=10.0), clock=clock, sleep=lambda _: None)
+
+    assert bucket.acquire(2) == 0.0
+    assert bucket.acquire(2) == pytest.approx(1 / 3)
+
+
+def test_token_bucket_rejects_cost_above_burst():
+    bucket = TokenBucket("pubmed", RateLimit(rate=3, burst=3, max_wait=10.0), sleep=lambda _: None)
+
+    with pytest.raises(ValueError):
+        bucket.acquire(6)
+
+
+@pytest.mark.parametrize("fetcher_class, limits", [
+    (PubMedFetcher, [PUBMED_RATE_LIMIT, PUBMED_KEYED_RATE_LIMIT]),
+    (ArxivFetcher, [ArxivFetcher.rate_limit]),
+    (WikipediaFetcher, [WikipediaFetcher.rate_limit]),
+    (DuckDuckGoFetcher, [DuckDuckGoFetcher.rate_limit]),
+])
+def test_search_cost_fits_the_burst_of_every_source(fetcher_class, limits):
+    # An idle worker must never queue for a single search
+    assert all(fetcher_class.requests_per_search <= limit.burst for limit in limits)
+
+
+def test_get_limiter_is_shared_per_source():
+    limit = RateLimit(rate=1)
+
+    assert get_limiter("test-shared", limit) is get_limiter("test-shared", limit)
+    assert get_limiter("test-shared", limit) is not get_limiter("test-other", limit)
+
+
+def test_rate_limited_search_acquires_source_limiter(monkeypatch):
+    acquired = []
+
+    class FakeLimiter:
+        def acquire(self, cost):
+            acquired.append(cost)
+            return 0.0
+
+    class LimitedFetcher(Fetcher):
+        source = "limited"
+        rate_limit = RateLimit(rate=1)
+        requests_per_search = 3
+
+        @rate_limited
+        def search(self, query: str, terms: str = "") -> FetcherResult:
+            return FetcherResult([query], ["doc"])
+
+    monkeypatch.setattr("app.fetchers.rate_limit.get_limiter", lambda source, limit: FakeLimiter())
+
+    result = LimitedFetcher().search("Test query")
+
+    assert result.raw_sources == ["Test query"]
+    assert acquired == [3]
@@ -5,16 +5,26 @@ from app.workflows.research_graph import (
     _retrieve_fetcher,
     _retrieve_sources,
     _build_research_graph,
+    get_research_graph,
     process_query,
+    search_sources,
     _route_after_classify,
-    _identify_medical_terms
+    _classify_domain,
+    _identify_medical_terms,
+    _rewrite_query,
+    _route_entry,
+    _invoke_chain
 )
 from app.workflows.research_type import ResearchType
 from app.workflows.research_state import ResearchState
+from app.workflows.retrieval import DEFAULT_RETRIEVAL
 from app.models.results import QueryResult, FetcherResult
+from app.utils.cache import TTLCache, TieredCache
+from app.utils import resilience
+from app.utils.resilience import CLOSED, CircuitOpenError
 
 class TestRetrieveFetcher:
-    @patch('app.workflows.research_graph.PubMedFetcher')
+    @patch('app.workflows.research_graph.create_fetcher')
     def test_retrieve_fetcher_medical(self, mock_pubmed_fetcher):
         mock_fetcher = Mock()
         mock_pubmed_fetcher.return_value = mock_fetcher
@@ -22,9 +32,9 @@ class TestRetrieveFetcher:
         result = _retrieve_fetcher(ResearchType.MEDICAL)
         
         assert result == mock_fetcher
-        mock_pubmed_fetcher.assert_called_once()
+        mock_pubmed_fetcher.assert_called_once_with("pubmed")
 
-    @patch('app.workflows.research_graph.WikipediaFetcher')
+    @patch('app.workflows.research_graph.create_fetcher')
     def test_retrieve_fetcher_knowledge(self, mock_wikipedia_fetcher):
         mock_fetcher = Mock()
         mock_wikipedia_fetcher.return_value = mock_fetcher
@@ -32,9 +42,9 @@ class TestRetrieveFetcher:
         result = _retrieve_fetcher(ResearchType.KNOWLEDGE)
         
         assert result == mock_fetcher
-        mock_wikipedia_fetcher.assert_called_once()
+        mock_wikipedia_fetcher.assert_called_once_with("wikipedia")
 
-    @patch('app.workflows.research_graph.ArxivFetcher')
+    @patch('app.workflows.research_graph.create_fetcher')
     def test_retrieve_fetcher_academic(self, mock_arxiv_fetcher):
         mock_fetcher = Mock()
         mock_arxiv_fetcher.return_value = mock_fetcher
@@ -42,9 +52,9 @@ class TestRetrieveFetcher:
         result = _retrieve_fetcher(ResearchType.ACADEMIC)
         
         assert result == mock_fetcher
-        mock_arxiv_fetcher.assert_called_once()
+        mock_arxiv_fetcher.assert_called_once_with("arxiv")
 
-    @patch('app.workflows.research_graph.DuckDuckGoFetcher')
+    @patch('app.workflows.research_graph.create_fetcher')
     def test_retrieve_fetcher_web(self, mock_duckduckgo_fetcher):
         mock_fetcher = Mock()
         mock_duckduckgo_fetcher.return_value = mock_fetcher
@@ -52,7 +62,7 @@ class TestRetrieveFetcher:
         result = _retrieve_fetcher(ResearchType.WEB)
         
         assert result == mock_fetcher
-        mock_duckduckgo_fetcher.assert_called_once()
+        mock_duckduckgo_fetcher.assert_called_once_with("duckduckgo")
 
 
 class TestRetrieveSources:
@@ -102,7 +112,7 @@ class TestRetrieveSources:
         assert result["documents"] == []
         mock_fetcher.search.assert_called_once_with("Test query", "")
 
-    @patch('app.workflows.research_graph.DuckDuckGoFetcher')
+    @patch('app.workflows.research_graph.create_fetcher')
     @patch('app.workflows.research_graph._retrieve_fetcher')
     def test_retrieve_sources_medical_fallback(self, mock_retrieve_fetcher, mock_duckduckgo_fetcher):
         """Test that medical domain falls back to DuckDuckGo when PubMed returns empty results"""
@@ -135,9 +145,36 @@ class TestRetrieveSources:
         mock_retrieve_fetcher.assert_called_once_with(ResearchType.MEDICAL)
         mock_pubmed_fetcher.search.assert_called_once_with("Test medical query", "diabetes, insulin")
         
-        mock_duckduckgo_fetcher.assert_called_once()
+        mock_duckduckgo_fetcher.assert_called_once_with("duckduckgo")
         mock_web_fetcher.search.assert_called_once_with("Test medical query", "diabetes, insulin")
 
+    @patch('app.workflows.research_graph.create_fetcher')
+    @patch('app.workflows.research_graph._retrieve_fetcher')
+    def test_retrieve_sources_fetcher_error_falls_back(self, mock_retrieve_fetcher, mock_duckduckgo_fetcher):
+        """Test that a failing or circuit-broken fetcher falls back to DuckDuckGo instead of failing the query"""
+        mock_arxiv_fetcher = Mock()
+        mock_arxiv_fetcher.search.side_effect = CircuitOpenError("Circuit breaker for arxiv is open")
+        mock_retrieve_fetcher.return_value = mock_arxiv_fetcher
+
+        mock_web_fetcher = Mock()
+        mock_web_fetcher.search.return_value = FetcherResult(
+            raw_sources=["Web source 1"],
+            documents=["web_doc1.pdf"]
+        )
+        mock_duckduckgo_fetcher.return_value = mock_web_fetcher
+
+        state = ResearchState(
+            query="Test academic query",
+            domain=ResearchType.ACADEMIC,
+            sources=[]
+        )
+
+        result = _retrieve_sources(state)
+
+        assert result["sources"] == ["Web source 1"]
+        assert result["documents"] == ["web_doc1.pdf"]
+        assert result["domain"] == ResearchType.WEB
+
     @patch('app.workflows.research_graph._retrieve_fetcher')
     def test_retrieve_sources_medical_no_fallback_needed(self, mock_retrieve_fetcher):
         """Test that medical domain doesn't fallback when PubMed returns results"""
@@ -162,8 +199,43 @@ class TestRetrieveSources:
         assert result["documents"] == ["medical_doc1.pdf", "medical_doc2.pdf"]
         mock_fetcher.search.assert_called_once_with("Test medical query", "diabetes, insulin")
 
+class TestSearchSources:
+    @patch('app.workflows.research_graph.get_fetcher_cache')
+    def test_search_sources_caches_results_by_normalized_query(self, mock_get_cache):
+        mock_get_cache.return_value = TTLCache(maxsize=10, ttl=60)
+        mock_fetcher = Mock()
+        mock_fetcher.source = "arxiv"
+        mock_fetcher.search.return_value = FetcherResult(raw_sources=["Source 1"], documents=["doc1.pdf"])
+
+        first = search_sources(mock_fetcher, "Graph Neural Networks")
+        second = search_sources(mock_fetcher, "  graph neural   networks ")
+
+        assert first == second
+        mock_fetcher.search.assert_called_once_with("Graph Neural Networks", "")
+
+    @patch('app.workflows.research_graph.get_fetcher_cache')
+    def test_search_sources_does_not_cache_empty_results(self, mock_get_cache):
+        mock_get_cache.return_value = TTLCache(maxsize=10, ttl=60)
+        mock_fetcher = Mock()
+        mock_fetcher.source = "pubmed"
+        mock_fetcher.search.return_value = FetcherResult(raw_sources=[], documents=[])
+
+        search_sources(mock_fetcher, "Test query", "diabetes")
+        search_sources(mock_fetcher, "Test query", "diabetes")
+
+        assert mock_fetcher.search.call_count == 2
+
 class TestProcessQuery:
     @patch('app.workflows.research_graph._build_research_graph')
+    def test_get_research_graph_compiles_once(self, mock_build_graph):
+        get_research_graph.cache_clear()
+        try:
+            assert get_research_graph() is get_research_graph()
+            mock_build_graph.assert_called_once()
+        finally:
+            get_research_graph.cache_clear()
+
+    @patch('app.workflows.research_graph.get_research_graph')
     def test_process_query_success(self, mock_build_graph):
         mock_graph = Mock()
         mock_final_state = {
@@ -185,9 +257,10 @@ class TestProcessQuery:
         assert result.domain == "academic"
         assert result.documents == ["doc1.pdf", "doc2.pdf"]
         mock_build_graph.assert_called_once()
-        mock_graph.invoke.assert_called_once_with({"query": query, "domain": ResearchType.WEB})
+        mock_graph.invoke.assert_called_once_with({"query": query, "domain": ResearchType.WEB, "history": "",
+                                                   "retrieval": DEFAULT_RETRIEVAL})
 
-    @patch('app.workflows.research_graph._build_research_graph')
+    @patch('app.workflows.research_graph.get_research_graph')
     def test_process_query_medical_with_terms(self, mock_build_graph):
         mock_graph = Mock()
         mock_final_state = {
@@ -209,7 +282,8 @@ class TestProcessQuery:
         assert result.agent_response == "Diabetes symptoms include increased thirst, frequent urination..."
         assert result.domain == "medical"
         assert result.documents == ["medical_doc1.pdf", "medical_doc2.pdf"]
-        mock_graph.invoke.assert_called_once_with({"query": query, "domain": ResearchType.WEB})
+        mock_graph.invoke.assert_called_once_with({"query": query, "domain": ResearchType.WEB, "history": "",
+                                                   "retrieval": DEFAULT_RETRIEVAL})
 
 class TestResearchGraphIntegration:
     def test_research_graph_workflow_structure(self):
@@ -333,28 +407,28 @@ class TestResearchGraphIntegration:
         assert ResearchType.WEB.name == "WEB"
 
     def test_fetcher_retrieval_logic(self):
-        with patch('app.workflows.research_graph.PubMedFetcher') as mock_pubmed:
+        with patch('app.workflows.research_graph.create_fetcher') as mock_pubmed:
             mock_pubmed.return_value = Mock()
             result = _retrieve_fetcher(ResearchType.MEDICAL)
-            mock_pubmed.assert_called_once()
+            mock_pubmed.assert_called_once_with("pubmed")
             assert result is not None
 
-        with patch('app.workflows.research_graph.WikipediaFetcher') as mock_wikipedia:
+        with patch('app.workflows.research_graph.create_fetcher') as mock_wikipedia:
             mock_wikipedia.return_value = Mock()
             result = _retrieve_fetcher(ResearchType.KNOWLEDGE)
-            mock_wikipedia.assert_called_once()
+            mock_wikipedia.assert_called_once_with("wikipedia")
             assert result is not None
 
-        with patch('app.workflows.research_graph.ArxivFetcher') as mock_arxiv:
+        with patch('app.workflows.research_graph.create_fetcher') as mock_arxiv:
             mock_arxiv.return_value = Mock()
             result = _retrieve_fetcher(ResearchType.ACADEMIC)
-            mock_arxiv.assert_called_once()
+            mock_arxiv.assert_called_once_with("arxiv")
             assert result is not None
 
-        with patch('app.workflows.research_graph.DuckDuckGoFetcher') as mock_duckduckgo:
+        with patch('app.workflows.research_graph.create_fetcher') as mock_duckduckgo:
             mock_duckduckgo.return_value = Mock()
             result = _retrieve_fetcher(ResearchType.WEB)
-            mock_duckduckgo.assert_called_once()
+            mock_duckduckgo.assert_called_once_with("duckduckgo")
             assert result is not None
 
 class TestRouteAfterClassify:
@@ -414,3 +488,96 @@ class TestIdentifyMedicalTerms:
             assert "domain" in result
         except Exception as e:
             assert "OpenAI" in str(e) or "API" in str(e) or "key" in str(e).lower()
+
+
+class TestFollowUpQueries:
+    def test_only_queries_with_history_are_rewritten(self):
+        assert _route_entry(ResearchState(query="What is insulin?", history="")) == "classify"
+        assert _route_entry(ResearchState(query="What does it regulate?", history="User: What is insulin?")) == \
+            "rewrite"
+
+    @patch('app.workflows.research_graph._invoke_chain')
+    @patch('app.workflows.research_graph._node_llm')
+    def test_follow_up_is_classified_and_cached_as_standalone_query(self, mock_node_llm, mock_invoke_chain):
+        mock_invoke_chain.side_effect = [Mock(content="What does insulin regulate?"), Mock(content="medical")]
+        history = "User: What is insulin?\nAssistant: A hormone."
+
+        state = _classify_domain(_rewrite_query(ResearchState(query="What does it regulate?", history=history)))
+
+        assert state["search_query"] == "What does insulin regulate?"
+        assert mock_invoke_chain.call_args_list[0].args[2] == {"history": history, "query": "What does it regulate?"}
+        assert mock_invoke_chain.call_args_list[1].args[2] == {"query": "What does insulin regulate?"}
+        # The same question asked standalone hits the classification of the rewritten follow-up
+        assert _classify_domain(ResearchState(query="what does insulin regulate?"))["domain"] == ResearchType.MEDICAL
+        assert mock_invoke_chain.call_count == 2
+
+    @patch('app.workflows.research_graph.search_sources')
+    @patch('app.workflows.research_graph._route')
+    def test_retrieval_searches_the_standalone_query(self, mock_route, mock_search_sources):
+        fetcher = Mock()
+        mock_route.return_value = [(ResearchType.MEDICAL, fetcher)]
+        mock_search_sources.return_value = FetcherResult(["Source"], ["Document"])
+
+        _retrieve_sources(ResearchState(query="What does it regulate?", search_query="What does insulin regulate?",
+                                        domain=ResearchType.MEDICAL, terms="insulin"))
+
+        mock_search_sources.assert_called_once_with(fetcher, "What does insulin regulate?", "insulin")
+
+
+class TestLLMBreakers:
+    def test_slow_llm_calls_do_not_open_the_breaker(self, monkeypatch):
+        clock = [0.0]
+
+        def slow_invoke(inputs):
+            # Every synthesis takes 30s, well within its 60s timeout
+            clock[0] += 30.0
+            return Mock(content="Answer")
+
+        monkeypatch.setattr(resilience, "_breakers", {})
+        monkeypatch.setattr(resilience.time, "perf_counter", lambda: clock[0])
+        chain = Mock(invoke=slow_invoke)
+
+        for _ in range(10):
+            assert _invoke_chain("synthesize", chain, {"query": "What is CRISPR?"}).content == "Answer"
+
+        assert resilience.get_breaker("openai:synthesize").state == CLOSED
+        assert set(resilience.breaker_snapshots()) == {"openai:synthesize"}
+
+    def test_failing_node_does_not_open_the_breaker_of_other_nodes(self, monkeypatch):
+        monkeypatch.setattr(resilience, "_breakers", {})
+        failing = Mock(invoke=Mock(side_effect=ValueError("bad request")))
+
+        for _ in range(5):
+            with pytest.raises(ValueError):
+                _invoke_chain("synthesize", failing, {})
+
+        with pytest.raises(CircuitOpenError):
+            _invoke_chain("synthesize", failing, {})
+        assert _invoke_chain("classify", Mock(invoke=lambda inputs: Mock(content="WEB")), {}).content == "WEB"
+
+
+class TestResultCaches:
+    @patch('app.workflows.research_graph._invoke_chain')
+    @patch('app.workflows.research_graph._node_llm')
+    def test_classification_is_cached_per_normalized_query(self, mock_node_llm, mock_invoke_chain):
+        mock_invoke_chain.return_value = Mock(content="academic")
+
+        first = _classify_domain(ResearchState(query="What is CRISPR?"))
+        second = _classify_domain(ResearchState(query="  what is crispr? "))
+
+        assert first["domain"] == second["domain"] == ResearchType.ACADEMIC
+        mock_invoke_chain.assert_called_once()
+
+    @patch('app.workflows.research_graph.get_research_graph')
+    @patch('app.workflows.research_graph.get_cache')
+    def test_process_query_returns_cached_query_result(self, mock_get_cache, mock_get_graph):
+        mock_get_cache.return_value = TieredCache("query", TTLCache(maxsize=10, ttl=60))
+        mock_get_graph.return_value.invoke.return_value = {"answer": "Answer", "domain": ResearchType.WEB,
+                                                           "documents": []}
+
+        first = process_query("What is CRISPR?")
+        second = process_query("What is CRISPR?")
+        with_history = process_query("What is CRISPR?", history="User: hi")
+
+        assert first == second == with_history
+        assert mock_get_graph.return_value.invoke.call_count == 2
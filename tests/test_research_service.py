@@ -1,3 +1,5 @@
+import asyncio
+import time
 from uuid import UUID
 
 import pytest
@@ -5,6 +7,32 @@ import pytest
 from app.models.requests import AgentCreate
 from app.models.results import QueryResult
 from app.services import research_service
+from app.utils.single_flight import SingleFlight
+from app.workflows.retrieval import resolve_retrieval_options
+
+
+class FakeConversation:
+    def __init__(self, query: str, agent_response: str):
+        self.query = query
+        self.agent_response = agent_response
+
+
+class FakeAgentWithHistory:
+    def __init__(self, id: str, messages=None, summary: str = "", summarized_count: int = 0):
+        self.id = id
+        self.messages = messages or []
+        self.summary = summary
+        self.summarized_count = summarized_count
+
+
+def context_document(agent: FakeAgentWithHistory) -> dict:
+    return {"_id": agent.id, "summary": agent.summary, "summarized_count": agent.summarized_count,
+            "messages": [{"query": m.query, "agent_response": m.agent_response}
+                         for m in agent.messages[agent.summarized_count:]]}
+
+
+async def mock_context_without_history(agent_id: str):
+    return context_document(FakeAgentWithHistory(id=agent_id))
 
 @pytest.mark.asyncio
 async def test_create_agent_success(monkeypatch):
@@ -91,6 +119,42 @@ async def test_delete_agent_missing_raises_key_error(monkeypatch):
     assert "does not exist and cannot be deleted" in str(exc.value)
 
 
+@pytest.mark.asyncio
+async def test_delete_agents_cascades_to_checkpoints_and_summary_jobs(monkeypatch):
+    from types import SimpleNamespace
+
+    from app.models.requests import AgentBulkDelete
+
+    checkpointer = object()
+    cascaded = []
+
+    async def mock_delete_agent_documents(query: dict, batch_size: int = 1000):
+        return {"agent_ids": ["agent-1", "agent-2"], "agents": 2, "conversations": 7}
+
+    def mock_delete_agent_checkpoints(saver, agent_ids):
+        cascaded.append((saver, agent_ids))
+        return 4
+
+    async def pending_summary():
+        await asyncio.sleep(10)
+
+    summary = asyncio.create_task(pending_summary())
+    monkeypatch.setattr(research_service, "delete_agent_documents", mock_delete_agent_documents)
+    monkeypatch.setattr(research_service, "delete_agent_checkpoints", mock_delete_agent_checkpoints)
+    monkeypatch.setattr(research_service, "get_research_graph", lambda: SimpleNamespace(checkpointer=checkpointer))
+    monkeypatch.setitem(research_service._summarizing, "agent-2", summary)
+
+    deleted = await research_service.delete_agents(AgentBulkDelete(name_prefix="load-test-"))
+    with pytest.raises(asyncio.CancelledError):
+        await summary
+
+    assert deleted == {"agents": 2, "conversations": 7, "checkpoints": 4, "summary_jobs": 1}
+    assert cascaded == [(checkpointer, ["agent-1", "agent-2"])]
+    assert "agent-2" not in research_service._summarizing
+    with pytest.raises(ValueError):
+        await research_service.delete_agents(AgentBulkDelete())
+
+
 @pytest.mark.asyncio
 async def test_send_queries_success(monkeypatch):
     agent_id = "agent-id-123"
@@ -102,13 +166,14 @@ async def test_send_queries_success(monkeypatch):
     async def mock_add_conversations(agent_id: str, query: str, query_result: QueryResult):
         pass  # Mock function that does nothing
     
-    def mock_process_query(query: str):
+    def mock_process_query(query: str, history: str = "", retrieval=None, thread_id=None):
         return QueryResult(
             agent_response=expected_answer,
             domain=expected_domain,
             documents=expected_documents
         )
     
+    monkeypatch.setattr(research_service, "get_context_document", mock_context_without_history)
     monkeypatch.setattr(research_service, "add_conversations", mock_add_conversations)
     monkeypatch.setattr(research_service, "process_query", mock_process_query)
     
@@ -124,40 +189,220 @@ async def test_send_queries_success(monkeypatch):
 async def test_send_queries_agent_not_found_raises_value_error(monkeypatch):
     agent_id = "missing-agent"
     query = "What is machine learning?"
+    pipeline_runs = []
     
-    def mock_process_query(query: str):
+    def mock_process_query(query: str, history: str = "", retrieval=None, thread_id=None):
+        pipeline_runs.append(query)
         return QueryResult(
             agent_response="Test response",
             domain="test",
             documents=["doc1.pdf"]
         )
     
-    async def mock_add_conversations(agent_id: str, query: str, query_result: QueryResult):
+    async def mock_get_context_document(agent_id: str):
         raise KeyError(f"Agent with id {agent_id} does not exist and cannot be retrieved")
     
     monkeypatch.setattr(research_service, "process_query", mock_process_query)
-    monkeypatch.setattr(research_service, "add_conversations", mock_add_conversations)
+    monkeypatch.setattr(research_service, "get_context_document", mock_get_context_document)
     
     with pytest.raises(KeyError) as exc:
         await research_service.send_queries(agent_id, query)
     
     assert f"Agent with id {agent_id} does not exist and cannot be retrieved" in str(exc.value)
+    assert pipeline_runs == []
 
 
 @pytest.mark.asyncio
 async def test_send_queries_empty_query_raises_value_error(monkeypatch):
     agent_id = "agent-id-123"
     
-    class FakeAgent:
-        def __init__(self, id: str):
-            self.id = id
-    
-    async def mock_get_agent_entity(agent_id: str):
-        return FakeAgent(id=agent_id)
-    
-    monkeypatch.setattr(research_service, "get_agent_entity", mock_get_agent_entity)
+    monkeypatch.setattr(research_service, "get_context_document", mock_context_without_history)
     
     with pytest.raises(ValueError) as exc:
         await research_service.send_queries(agent_id, "")
     
     assert "Query message must be a non-empty string" in str(exc.value)
+
+
+@pytest.mark.asyncio
+async def test_send_queries_coalesces_identical_in_flight_queries(monkeypatch):
+    pipeline_runs = []
+    saved = []
+
+    def mock_process_query(query: str, history: str = "", retrieval=None, thread_id=None):
+        pipeline_runs.append(query)
+        time.sleep(0.05)
+        return QueryResult(agent_response="Shared answer", domain="web", documents=["doc1.pdf"])
+
+    async def mock_add_conversations(agent_id: str, query: str, query_result: QueryResult):
+        saved.append((agent_id, query, query_result.agent_response))
+
+    monkeypatch.setattr(research_service, "get_context_document", mock_context_without_history)
+    monkeypatch.setattr(research_service, "process_query", mock_process_query)
+    monkeypatch.setattr(research_service, "add_conversations", mock_add_conversations)
+    monkeypatch.setattr(research_service, "_query_flights", SingleFlight(max_followers=10))
+
+    results = await asyncio.gather(
+        research_service.send_queries("agent-1", "What is   Machine Learning?"),
+        research_service.send_queries("agent-2", "what is machine learning?"),
+        research_service.send_queries("agent-3", "What is machine learning?"),
+    )
+
+    assert len(pipeline_runs) == 1
+    assert all(result.agent_response == "Shared answer" for result in results)
+    assert sorted(agent_id for agent_id, _, _ in saved) == ["agent-1", "agent-2", "agent-3"]
+    assert research_service.query_flight_stats()["coalesced"] == 2
+
+
+@pytest.mark.asyncio
+async def test_single_flight_caps_followers():
+    flights = SingleFlight(max_followers=1)
+    runs = []
+
+    async def work():
+        runs.append(1)
+        await asyncio.sleep(0.01)
+        return len(runs)
+
+    await asyncio.gather(*(flights.do("same-key", work) for _ in range(3)))
+
+    assert len(runs) == 2
+    assert flights.stats() == {"in_flight": 0, "leaders": 1, "coalesced": 1, "overflowed": 1, "max_followers": 1}
+
+
+@pytest.mark.asyncio
+async def test_single_flight_cancelled_leader_does_not_cancel_followers():
+    flights = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.02)
+        return "done"
+
+    leader = asyncio.ensure_future(flights.do("key", work))
+    await asyncio.sleep(0)
+    follower = asyncio.ensure_future(flights.do("key", work))
+    await asyncio.sleep(0)
+    leader.cancel()
+
+    assert await follower == "done"
+
+
+@pytest.mark.asyncio
+async def test_send_queries_passes_history_and_folds_old_turns(monkeypatch):
+    turns = [FakeConversation(f"Question {i}", f"Answer {i}") for i in range(4)]
+    agent = FakeAgentWithHistory("agent-1", messages=turns, summary="Talked about question 0.", summarized_count=1)
+    histories = []
+    summarized = []
+    stored = []
+
+    async def mock_get_agent_entity(agent_id: str):
+        return agent
+
+    async def mock_get_context_document(agent_id: str):
+        return context_document(agent)
+
+    def mock_process_query(query: str, history: str = "", retrieval=None, thread_id=None):
+        histories.append(history)
+        return QueryResult(agent_response="Answer 4", domain="web", documents=[])
+
+    async def mock_add_conversations(agent_id: str, query: str, query_result: QueryResult):
+        agent.messages.append(FakeConversation(query, query_result.agent_response))
+
+    def mock_summarize_history(summary, new_turns):
+        summarized.append((summary, new_turns))
+        return "Talked about questions 0 and 1."
+
+    async def mock_update_summary(agent_id, summary, summarized_count, previous_count):
+        stored.append((summary, summarized_count, previous_count))
+        return True
+
+    monkeypatch.setattr(research_service, "HISTORY_TURNS", 3)
+    monkeypatch.setattr(research_service, "get_agent_entity", mock_get_agent_entity)
+    monkeypatch.setattr(research_service, "get_context_document", mock_get_context_document)
+    monkeypatch.setattr(research_service, "process_query", mock_process_query)
+    monkeypatch.setattr(research_service, "add_conversations", mock_add_conversations)
+    monkeypatch.setattr(research_service, "summarize_history", mock_summarize_history)
+    monkeypatch.setattr(research_service, "update_summary", mock_update_summary)
+
+    await research_service.send_queries("agent-1", "And question 4?")
+    await asyncio.gather(*research_service._summary_tasks)
+
+    assert histories[0].startswith("Summary of earlier conversation: Talked about question 0.")
+    assert "User: Question 1\nAssistant: Answer 1" in histories[0]
+    assert "Question 0" not in histories[0]
+    assert summarized == [("Talked about question 0.", [("Question 1", "Answer 1")])]
+    assert stored == [("Talked about questions 0 and 1.", 2, 1)]
+
+
+@pytest.mark.asyncio
+async def test_single_flight_key_separates_agents_with_different_history(monkeypatch):
+    histories = {"agent-1": FakeAgentWithHistory("agent-1"),
+                 "agent-2": FakeAgentWithHistory("agent-2", messages=[FakeConversation("What is insulin?", "A hormone.")])}
+    pipeline_runs = []
+
+    async def mock_get_context_document(agent_id: str):
+        return context_document(histories[agent_id])
+
+    def mock_process_query(query: str, history: str = "", retrieval=None, thread_id=None):
+        pipeline_runs.append(history)
+        time.sleep(0.05)
+        return QueryResult(agent_response="Answer", domain="web", documents=[])
+
+    async def mock_add_conversations(agent_id: str, query: str, query_result: QueryResult):
+        pass
+
+    monkeypatch.setattr(research_service, "get_context_document", mock_get_context_document)
+    monkeypatch.setattr(research_service, "process_query", mock_process_query)
+    monkeypatch.setattr(research_service, "add_conversations", mock_add_conversations)
+    monkeypatch.setattr(research_service, "_query_flights", SingleFlight())
+
+    await asyncio.gather(research_service.send_queries("agent-1", "What does it regulate?"),
+                         research_service.send_queries("agent-2", "What does it regulate?"))
+
+    assert sorted(pipeline_runs) == ["", "User: What is insulin?\nAssistant: A hormone."]
+
+
+@pytest.mark.asyncio
+async def test_single_flight_key_separates_retrieval_options(monkeypatch):
+    pipeline_runs = []
+
+    def mock_process_query(query: str, history: str = "", retrieval=None, thread_id=None):
+        pipeline_runs.append(retrieval)
+        time.sleep(0.05)
+        return QueryResult(agent_response="Answer", domain="web", documents=[])
+
+    async def mock_add_conversations(agent_id: str, query: str, query_result: QueryResult):
+        pass
+
+    monkeypatch.setattr(research_service, "get_context_document", mock_context_without_history)
+    monkeypatch.setattr(research_service, "process_query", mock_process_query)
+    monkeypatch.setattr(research_service, "add_conversations", mock_add_conversations)
+    monkeypatch.setattr(research_service, "_query_flights", SingleFlight())
+
+    fast = resolve_retrieval_options(profile="fast")
+    await asyncio.gather(research_service.send_queries("agent-1", "What is CRISPR?"),
+                         research_service.send_queries("agent-2", "What is CRISPR?", fast),
+                         research_service.send_queries("agent-3", "What is CRISPR?", fast))
+
+    assert sorted(run.profile for run in pipeline_runs) == ["", "fast"]
+
+
+@pytest.mark.asyncio
+async def test_send_queries_derives_thread_id_from_request_id(monkeypatch):
+    thread_ids = []
+
+    def mock_process_query(query: str, history: str = "", retrieval=None, thread_id=None):
+        thread_ids.append(thread_id)
+        return QueryResult(agent_response="Answer", domain="web", documents=[])
+
+    async def mock_add_conversations(agent_id: str, query: str, query_result: QueryResult):
+        pass
+
+    monkeypatch.setattr(research_service, "get_context_document", mock_context_without_history)
+    monkeypatch.setattr(research_service, "process_query", mock_process_query)
+    monkeypatch.setattr(research_service, "add_conversations", mock_add_conversations)
+
+    await research_service.send_queries("agent-1", "What is CRISPR?", request_id="req-7")
+    await research_service.send_queries("agent-1", "What is CRISPR?")
+
+    assert thread_ids == ["agent-1:req-7", None]
@@ -0,0 +1,142 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.status import router as status_router
+from app.utils.resilience import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    BreakerPolicy,
+    CircuitBreaker,
+    CircuitOpenError,
+    RetryPolicy,
+    get_breaker,
+    resilient_call,
+    retry_with_backoff,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _breaker(clock, **overrides) -> CircuitBreaker:
+    policy = BreakerPolicy(**{"window": 4, "min_calls": 4, "open_duration": 10.0, "half_open_probes": 1, **overrides})
+    return CircuitBreaker("pubmed", policy, clock=clock)
+
+
+def test_breaker_opens_on_failure_rate():
+    breaker = _breaker(FakeClock())
+
+    for failed in (False, True, False, True):
+        breaker.record(failed=failed, duration=0.1)
+
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_breaker_opens_on_slow_calls():
+    breaker = _breaker(FakeClock(), slow_call_duration=1.0)
+
+    for _ in range(4):
+        breaker.record(failed=False, duration=2.0)
+
+    assert breaker.state == OPEN
+
+
+def test_breaker_half_open_probe_closes_on_success():
+    clock = FakeClock()
+    breaker = _breaker(clock)
+    for _ in range(4):
+        breaker.record(failed=True, duration=0.1)
+
+    clock.now += 10.0
+    assert breaker.state == HALF_OPEN
+
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()  # only one probe in flight
+
+    breaker.record(failed=False, duration=0.1)
+    assert breaker.state == CLOSED
+
+
+def test_breaker_half_open_probe_reopens_on_failure():
+    clock = FakeClock()
+    breaker = _breaker(clock)
+    for _ in range(4):
+        breaker.record(failed=True, duration=0.1)
+    clock.now += 10.0
+
+    breaker.before_call()
+    breaker.record(failed=True, duration=0.1)
+
+    assert breaker.state == OPEN
+    assert breaker.snapshot()["retry_in"] == 10.0
+
+
+def test_retry_with_backoff_retries_transient_errors():
+    calls = []
+    sleeps = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise ConnectionError("connection reset")
+        return "ok"
+
+    result = retry_with_backoff(flaky, RetryPolicy(attempts=3, base_delay=0.1, max_delay=1.0), sleep=sleeps.append)
+
+    assert result == "ok"
+    assert len(calls) == 3
+    assert len(sleeps) == 2
+    assert all(0 <= delay <= 0.2 for delay in sleeps)
+
+
+def test_retry_with_backoff_does_not_retry_other_errors():
+    calls = []
+
+    def broken():
+        calls.append(1)
+        raise ValueError("bad response")
+
+    with pytest.raises(ValueError):
+        retry_with_backoff(broken, RetryPolicy(attempts=3), sleep=lambda _: None)
+
+    assert len(calls) == 1
+
+
+def test_resilient_call_fails_fast_while_open():
+    policy = BreakerPolicy(window=2, min_calls=2, open_duration=60.0)
+    calls = []
+
+    def failing():
+        calls.append(1)
+        raise ValueError("upstream error")
+
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            resilient_call("test-fail-fast", failing, breaker_policy=policy, retry_policy=RetryPolicy(attempts=1))
+
+    with pytest.raises(CircuitOpenError):
+        resilient_call("test-fail-fast", failing, breaker_policy=policy, retry_policy=RetryPolicy(attempts=1))
+
+    assert len(calls) == 2
+
+
+def test_status_breakers_endpoint():
+    get_breaker("test-status").record(failed=False, duration=0.1)
+    app = FastAPI()
+    app.include_router(status_router)
+
+    response = TestClient(app).get("/status/breakers")
+
+    assert response.status_code == 200
+    assert response.json()["test-status"]["state"] == CLOSED
+    assert response.json()["test-status"]["total_calls"] == 1
@@ -0,0 +1,215 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import mongomock
+import pytest
+
+from app.data.entities.models import AgentInDB, RetentionPolicy
+from app.data.repositories.archive_repository import ARCHIVE_COLLECTION, FileArchive, MongoArchive
+from app.services import retention
+from app.services.retention import compact_agent, effective_retention, messages_to_archive
+
+NOW = datetime(2026, 1, 31, tzinfo=timezone.utc)
+
+
+def _messages(count: int, days_old: int = 0) -> list:
+    # pymongo returns naive UTC datetimes
+    created_at = (NOW - timedelta(days=days_old)).replace(tzinfo=None)
+    return [{"_id": f"c{i}", "query": f"Q{i}", "agent_response": f"R{i}", "source": "web", "documents": [],
+             "created_at": created_at} for i in range(count)]
+
+
+class AsyncCollection:
+    """Awaitable facade over a synchronous mongomock collection."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def __getattr__(self, name):
+        method = getattr(self.collection, name)
+
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+        return call
+
+
+def test_max_count_archives_oldest_summarized_messages():
+    policy = RetentionPolicy(max_age_days=0, max_count=3)
+
+    assert messages_to_archive(_messages(10), 9, policy, NOW) == 7
+    assert messages_to_archive(_messages(10), 4, policy, NOW) == 4
+    assert messages_to_archive(_messages(2), 2, policy, NOW) == 0
+
+
+def test_max_age_archives_leading_expired_messages():
+    messages = _messages(3, days_old=40) + _messages(2, days_old=1)
+    policy = RetentionPolicy(max_age_days=30, max_count=0)
+
+    assert messages_to_archive(messages, 5, policy, NOW) == 3
+
+
+def test_agent_policy_overrides_global_limits(monkeypatch):
+    monkeypatch.setenv("CONVERSATION_MAX_AGE_DAYS", "30")
+    monkeypatch.setenv("CONVERSATION_MAX_COUNT", "100")
+
+    policy = effective_retention({"max_age_days": None, "max_count": 10})
+
+    assert policy == RetentionPolicy(max_age_days=30, max_count=10)
+
+
+@pytest.mark.asyncio
+async def test_file_archive_reads_pages_across_chunks(tmp_path):
+    archive = FileArchive(str(tmp_path))
+    messages = _messages(5)
+    await archive.put("agent-1", 0, messages[:3])
+    await archive.put("agent-1", 3, messages[3:])
+    # A retried chunk at the same offset replaces the leftover of the failed attempt
+    await archive.discard("agent-1", 3, await archive.put("agent-1", 3, messages[3:]))
+
+    total, page = await archive.read("agent-1", 2, 2)
+
+    assert total == 5
+    assert [message["_id"] for message in page] == ["c2", "c3"]
+
+    await archive.delete("agent-1")
+    assert await archive.read("agent-1", 0, 10) == (0, [])
+
+
+async def _release_compaction_lease(agent_id: str, until: datetime):
+    pass
+
+
+@pytest.mark.asyncio
+async def test_mongo_archive_setup_indexes_chunks_by_agent_and_offset(monkeypatch):
+    chunks = mongomock.MongoClient().db[ARCHIVE_COLLECTION]
+    monkeypatch.setattr(AgentInDB, "get_pymongo_collection",
+                        lambda: SimpleNamespace(database={ARCHIVE_COLLECTION: AsyncCollection(chunks)}))
+
+    await MongoArchive().setup()
+
+    assert [("agent_id", 1), ("offset", 1)] in [index["key"] for index in chunks.index_information().values()]
+
+
+@pytest.mark.asyncio
+async def test_compact_agent_archives_and_removes_messages(monkeypatch, tmp_path):
+    archive = FileArchive(str(tmp_path))
+    removed = []
+
+    async def lease_retention_document(agent_id: str, now: datetime, until: datetime):
+        return {"messages": _messages(6), "summarized_count": 4, "archived_count": 10,
+                "retention": {"max_age_days": None, "max_count": 2}}
+
+    async def remove_archived_messages(agent_id, message_ids, summarized_count, archived_count):
+        removed.append((message_ids, summarized_count, archived_count))
+        return True
+
+    monkeypatch.setattr(retention, "lease_retention_document", lease_retention_document)
+    monkeypatch.setattr(retention, "release_compaction_lease", _release_compaction_lease)
+    monkeypatch.setattr(retention, "remove_archived_messages", remove_archived_messages)
+    monkeypatch.setattr(retention, "get_archive", lambda: archive)
+
+    assert await compact_agent("agent-1", NOW) == 4
+    assert removed == [(["c0", "c1", "c2", "c3"], 4, 10)]
+    total, page = await archive.read("agent-1", 0, 10)
+    assert total == 4
+    assert page[0]["query"] == "Q0"
+
+
+@pytest.mark.asyncio
+async def test_compact_agent_drops_chunk_when_agent_changed_meanwhile(monkeypatch, tmp_path):
+    archive = FileArchive(str(tmp_path))
+
+    async def lease_retention_document(agent_id: str, now: datetime, until: datetime):
+        return {"messages": _messages(6), "summarized_count": 4, "archived_count": 0,
+                "retention": {"max_count": 2}}
+
+    async def remove_archived_messages(agent_id, message_ids, summarized_count, archived_count):
+        return False
+
+    monkeypatch.setattr(retention, "lease_retention_document", lease_retention_document)
+    monkeypatch.setattr(retention, "release_compaction_lease", _release_compaction_lease)
+    monkeypatch.setattr(retention, "remove_archived_messages", remove_archived_messages)
+    monkeypatch.setattr(retention, "get_archive", lambda: archive)
+
+    assert await compact_agent("agent-1", NOW) == 0
+    assert await archive.read("agent-1", 0, 10) == (0, [])
+
+
+class PausingArchive(FileArchive):
+    """File archive pausing the first compaction right after it wrote its chunk."""
+
+    def __init__(self, directory: str):
+        super().__init__(directory)
+        self.paused = asyncio.Event()
+        self.resume = asyncio.Event()
+
+    async def put(self, agent_id: str, offset: int, messages: list) -> str:
+        chunk_id = await super().put(agent_id, offset, messages)
+        if not self.paused.is_set():
+            self.paused.set()
+            await self.resume.wait()
+        return chunk_id
+
+
+@pytest.fixture
+def compacted_agent(monkeypatch, tmp_path):
+    agents = mongomock.MongoClient().db.agents
+    agents.insert_one({"_id": "agent-1", "messages": _messages(6), "summarized_count": 4, "archived_count": 0,
+                       "version": 0, "retention": {"max_age_days": None, "max_count": 2}})
+    archive = PausingArchive(str(tmp_path))
+    monkeypatch.setattr(AgentInDB, "get_pymongo_collection", lambda: AsyncCollection(agents))
+    monkeypatch.setattr(retention, "get_archive", lambda: archive)
+    return agents, archive
+
+
+async def _interleave(archive: PausingArchive) -> tuple:
+    first = asyncio.create_task(compact_agent("agent-1", NOW))
+    await archive.paused.wait()
+    second = await compact_agent("agent-1", NOW)
+    archive.resume.set()
+    return await first, second
+
+
+async def _assert_archived_once(agents, archive: PausingArchive):
+    total, page = await archive.read("agent-1", 0, 10)
+    assert total == 4
+    assert [message["_id"] for message in page] == ["c0", "c1", "c2", "c3"]
+    agent_document = agents.find_one({"_id": "agent-1"})
+    assert [message["_id"] for message in agent_document["messages"]] == ["c4", "c5"]
+    assert (agent_document["summarized_count"], agent_document["archived_count"]) == (0, 4)
+    assert "compacting_until" not in agent_document
+
+
+@pytest.mark.asyncio
+async def test_concurrent_compaction_waits_for_the_lease(compacted_agent):
+    agents, archive = compacted_agent
+
+    assert await _interleave(archive) == (4, 0)
+    await _assert_archived_once(agents, archive)
+
+
+@pytest.mark.asyncio
+async def test_compaction_losing_a_race_keeps_the_winners_chunk(monkeypatch, compacted_agent):
+    agents, archive = compacted_agent
+    # A lease already expired when taken lets the second compaction archive the same offset first
+    monkeypatch.setenv("CONVERSATION_COMPACTION_LEASE", "-1")
+
+    assert await _interleave(archive) == (0, 4)
+    await _assert_archived_once(agents, archive)
+
+
+@pytest.mark.asyncio
+async def test_compact_all_only_visits_agents_with_own_policy_without_global_limits(monkeypatch):
+    queried = []
+
+    async def get_compactable_agent_ids(with_retention_only: bool = False):
+        queried.append(with_retention_only)
+        return []
+
+    monkeypatch.setenv("CONVERSATION_MAX_AGE_DAYS", "0")
+    monkeypatch.setenv("CONVERSATION_MAX_COUNT", "0")
+    monkeypatch.setattr(retention, "get_compactable_agent_ids", get_compactable_agent_ids)
+
+    assert await retention.compact_all(NOW) == (0, 0)
+    assert queried == [True]
@@ -0,0 +1,79 @@
+from unittest.mock import Mock, patch
+
+import pytest
+
+from app.fetchers import MAX_CHARACTERS, TOP_K_RESULTS
+from app.models.results import FetcherResult
+from app.workflows.research_graph import _retrieve_sources
+from app.workflows.research_state import ResearchState
+from app.workflows.research_type import ResearchType
+from app.workflows.retrieval import RetrievalOptions, resolve_retrieval_options
+
+
+def test_resolve_defaults_match_queries_without_options():
+    assert resolve_retrieval_options() == RetrievalOptions(TOP_K_RESULTS, MAX_CHARACTERS)
+
+
+def test_resolve_profile_with_overrides():
+    options = resolve_retrieval_options(profile="thorough", max_chars=2000, sources=["web", "academic", "web"])
+
+    assert options.top_k == 8
+    assert options.max_chars == 2000
+    assert options.sources == (ResearchType.WEB, ResearchType.ACADEMIC)
+    assert options.key() == "8:2000:web,academic:thorough"
+
+
+def test_resolve_rejects_values_above_caps(monkeypatch):
+    monkeypatch.setenv("RETRIEVAL_MAX_CHARS", "1000")
+
+    with pytest.raises(ValueError):
+        resolve_retrieval_options(max_chars=1001)
+    with pytest.raises(ValueError):
+        resolve_retrieval_options(profile="thorough")
+    with pytest.raises(ValueError):
+        resolve_retrieval_options(sources=["usenet"])
+
+
+@patch('app.workflows.research_graph.create_fetcher')
+@patch('app.workflows.research_graph._retrieve_fetcher')
+def test_retrieve_sources_configures_fetchers_and_keeps_to_requested_sources(mock_retrieve_fetcher,
+                                                                            mock_create_fetcher):
+    wikipedia = Mock()
+    wikipedia.source = "wikipedia"
+    wikipedia.search.return_value = FetcherResult(["Wikipedia source"], ["Wikipedia page"])
+    mock_retrieve_fetcher.return_value = wikipedia
+
+    options = resolve_retrieval_options(profile="fast", sources=["knowledge"])
+    result = _retrieve_sources(ResearchState(query="What is a transformer?", domain=ResearchType.ACADEMIC,
+                                             retrieval=options))
+
+    assert result["sources"] == ["Wikipedia source"]
+    assert result["domain"] == ResearchType.KNOWLEDGE
+    mock_retrieve_fetcher.assert_called_once_with(ResearchType.KNOWLEDGE)
+    mock_create_fetcher.assert_not_called()
+    wikipedia.configure.assert_called_once_with(2, 800)
+
+
+@patch('app.workflows.research_graph._retrieve_fetcher')
+def test_fetcher_cache_is_keyed_on_retrieval_options(mock_retrieve_fetcher):
+    class CountingFetcher:
+        source = "counting"
+        top_k, max_chars = TOP_K_RESULTS, MAX_CHARACTERS
+        searches = 0
+
+        def configure(self, top_k, max_chars):
+            self.top_k, self.max_chars = top_k, max_chars
+            return self
+
+        def search(self, query, terms=""):
+            CountingFetcher.searches += 1
+            return FetcherResult(["snippet"] * self.top_k, ["document"] * self.top_k)
+
+    mock_retrieve_fetcher.side_effect = lambda domain: CountingFetcher()
+
+    for options in (resolve_retrieval_options(), resolve_retrieval_options(profile="fast"),
+                    resolve_retrieval_options(profile="fast")):
+        result = _retrieve_sources(ResearchState(query="What is DNS?", domain=ResearchType.WEB, retrieval=options))
+
+    assert len(result["sources"]) == 2
+    assert CountingFetcher.searches == 2
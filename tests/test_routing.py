@@ -0,0 +1,128 @@
+from unittest.mock import Mock, patch
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.status import router as status_router
+from app.models.results import FetcherResult
+from app.workflows.research_graph import _retrieve_sources
+from app.workflows.research_state import ResearchState
+from app.workflows.research_type import ResearchType
+from app.workflows.routing import FetcherRouter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _fetcher(source: str, result: FetcherResult) -> Mock:
+    fetcher = Mock()
+    fetcher.source = source
+    fetcher.search.return_value = result
+    return fetcher
+
+
+def test_record_keeps_moving_averages():
+    router = FetcherRouter(half_life=0, alpha=0.5)
+    router.record("pubmed", 2.0)
+    router.record("pubmed", 4.0, empty=True)
+    router.record("pubmed", 4.0, error=True)
+
+    stats = router.expected("pubmed")
+    assert stats.calls == 3
+    assert stats.latency == 3.5
+    assert stats.empty_rate == 0.25
+    assert stats.error_rate == 0.5
+
+
+def test_order_prefers_relevant_sources_without_stats():
+    router = FetcherRouter()
+
+    ranked = router.order([("pubmed", 1.0), ("duckduckgo", 0.6)], budget=8)
+
+    assert [source for source, _ in ranked] == ["pubmed", "duckduckgo"]
+
+
+def test_order_demotes_slow_and_empty_sources_until_stats_decay():
+    clock = FakeClock()
+    router = FetcherRouter(half_life=60, clock=clock)
+    for _ in range(10):
+        router.record("pubmed", 6.0, empty=True)
+        router.record("duckduckgo", 1.0)
+
+    assert [source for source, _ in router.order([("pubmed", 1.0), ("duckduckgo", 0.6)], budget=8)] == \
+        ["duckduckgo", "pubmed"]
+
+    clock.now = 600
+    assert [source for source, _ in router.order([("pubmed", 1.0), ("duckduckgo", 0.6)], budget=8)] == \
+        ["pubmed", "duckduckgo"]
+
+
+def test_order_puts_sources_over_latency_budget_last():
+    router = FetcherRouter(half_life=0)
+    router.record("arxiv", 12.0)
+    router.record("wikipedia", 0.5, empty=True)
+
+    ranked = router.order([("arxiv", 1.0), ("wikipedia", 0.5)], budget=8)
+
+    assert [source for source, _ in ranked] == ["wikipedia", "arxiv"]
+
+
+@patch('app.workflows.research_graph.get_router')
+@patch('app.workflows.research_graph.create_fetcher')
+@patch('app.workflows.research_graph._retrieve_fetcher')
+def test_retrieve_sources_routes_around_degraded_fetcher(mock_retrieve_fetcher, mock_create_fetcher,
+                                                         mock_get_router):
+    router = FetcherRouter(half_life=0)
+    for _ in range(5):
+        router.record("pubmed-routing", 6.0, empty=True)
+    mock_get_router.return_value = router
+    pubmed = _fetcher("pubmed-routing", FetcherResult(["Medical source"], ["medical.pdf"]))
+    web = _fetcher("duckduckgo-routing", FetcherResult(["Web source"], ["web.html"]))
+    mock_retrieve_fetcher.return_value = pubmed
+    mock_create_fetcher.return_value = web
+
+    result = _retrieve_sources(ResearchState(query="Routing query", domain=ResearchType.MEDICAL, terms="insulin"))
+
+    assert result["sources"] == ["Web source"]
+    assert result["domain"] == ResearchType.WEB
+    pubmed.search.assert_not_called()
+    assert router.expected("duckduckgo-routing").calls == 1
+
+
+@patch('app.workflows.research_graph.get_router')
+@patch('app.workflows.research_graph.create_fetcher')
+@patch('app.workflows.research_graph._retrieve_fetcher')
+def test_retrieve_sources_static_routing_keeps_domain_fetcher_first(mock_retrieve_fetcher, mock_create_fetcher,
+                                                                    mock_get_router, monkeypatch):
+    monkeypatch.setenv("FETCHER_ROUTING", "static")
+    router = FetcherRouter(half_life=0)
+    for _ in range(5):
+        router.record("pubmed-static", 6.0, empty=True)
+    mock_get_router.return_value = router
+    pubmed = _fetcher("pubmed-static", FetcherResult(["Medical source"], ["medical.pdf"]))
+    mock_retrieve_fetcher.return_value = pubmed
+    mock_create_fetcher.return_value = _fetcher("duckduckgo-static", FetcherResult([], []))
+
+    result = _retrieve_sources(ResearchState(query="Static query", domain=ResearchType.MEDICAL, terms="insulin"))
+
+    assert result["sources"] == ["Medical source"]
+    assert result["domain"] == ResearchType.MEDICAL
+
+
+def test_routing_endpoint_reports_mode_and_stats(monkeypatch):
+    router = FetcherRouter()
+    router.record("pubmed", 1.5)
+    monkeypatch.setattr("app.workflows.routing._router", router)
+    app = FastAPI()
+    app.include_router(status_router)
+
+    response = TestClient(app).get("/status/routing")
+
+    assert response.status_code == 200
+    assert response.json()["mode"] == "adaptive"
+    assert response.json()["fetchers"]["pubmed"]["raw"]["latency"] == 1.5
@@ -0,0 +1,217 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from typing import List, Optional
+
+import mongomock
+import pytest
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from app.data.repositories.usage_repository import usage_report_from_facets, usage_report_pipeline
+from app.models.results import FetcherResult, QueryResult
+from app.services import research_service
+from app.utils import cache
+from app.utils.cache import QUERY_NAMESPACE, TieredCache, TTLCache
+from app.utils.llm import llm_cost
+from app.utils.single_flight import SingleFlight
+from app.workflows import research_graph
+from app.workflows.research_graph import process_query
+from app.workflows.research_type import ResearchType
+
+
+class MeteredChatModel(BaseChatModel):
+    """Chat model answering with a fixed reply and token counts, or failing."""
+    reply: str = "WEB"
+    fail: bool = False
+
+    @property
+    def _llm_type(self) -> str:
+        return "metered"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs) -> ChatResult:
+        if self.fail:
+            raise TimeoutError("Request timed out")
+        message = AIMessage(content=self.reply,
+                            usage_metadata={"input_tokens": 100, "output_tokens": 10, "total_tokens": 110})
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+@pytest.fixture
+def offline_graph(monkeypatch):
+    """
+    Runs the research graph on local models and fetchers. The first fetcher of the
+    route finds nothing while `empty_primary` is set; the synthesis model fails
+    while `fail_synthesis` is set, so its fallback answers.
+    """
+    options = {"empty_primary": False, "fail_synthesis": False}
+
+    def fake_get_openai_llm(model, temperature, max_tokens=None, timeout=None, max_retries=None):
+        if max_tokens == 5:
+            return MeteredChatModel(reply="WEB")
+        return MeteredChatModel(reply="An answer [1].", fail=options["fail_synthesis"] and model == "gpt-4o-mini")
+
+    def fake_search_sources(fetcher, query, terms=""):
+        if fetcher.source == "wikipedia" and options["empty_primary"]:
+            return FetcherResult([], [])
+        return FetcherResult(["Source"], ["doc"])
+
+    monkeypatch.delenv("LLM_FALLBACK_MODEL", raising=False)
+    monkeypatch.setattr(research_graph, "get_openai_llm", fake_get_openai_llm)
+    monkeypatch.setattr(research_graph, "search_sources", fake_search_sources)
+    monkeypatch.setattr(research_graph, "_route", lambda domain, retrieval: [
+        (ResearchType.KNOWLEDGE, SimpleNamespace(source="wikipedia")),
+        (ResearchType.WEB, SimpleNamespace(source="duckduckgo")),
+    ])
+    return options
+
+
+def test_query_records_tokens_models_and_timings_per_node(offline_graph):
+    result = process_query("Who wrote Hamlet?")
+
+    usage = result.usage
+    assert [node["node"] for node in usage["nodes"]] == ["classify", "retrieve", "synthesize"]
+    classify, retrieve, synthesize = usage["nodes"]
+    assert classify["model"] == "gpt-4o-mini" and classify["prompt_tokens"] == 100
+    assert retrieve["model"] is None and retrieve["fetcher"] == "wikipedia" and not retrieve["fallback"]
+    assert synthesize["completion_tokens"] == 10 and not synthesize["fallback"]
+    assert usage["prompt_tokens"] == 200 and usage["total_tokens"] == 220
+    assert usage["cost_usd"] == pytest.approx(2 * llm_cost("gpt-4o-mini", 100, 10))
+    assert usage["wall_ms"] >= sum(node["wall_ms"] for node in usage["nodes"])
+    assert usage["fetcher"] == "wikipedia" and not usage["fallback"] and not usage["cached"]
+
+
+def test_query_records_fallback_model_and_fetcher(offline_graph):
+    offline_graph["empty_primary"] = True
+    offline_graph["fail_synthesis"] = True
+
+    usage = process_query("Who wrote Hamlet?").usage
+
+    _, retrieve, synthesize = usage["nodes"]
+    assert retrieve["fetcher"] == "duckduckgo" and retrieve["fallback"]
+    assert synthesize["model"] == "gpt-4.1-mini" and synthesize["fallback"]
+    assert usage["fetcher"] == "duckduckgo" and usage["fallback"]
+    assert usage["cost_usd"] == pytest.approx(llm_cost("gpt-4o-mini", 100, 10) + llm_cost("gpt-4.1-mini", 100, 10))
+
+
+def test_cached_answer_records_no_tokens(offline_graph, monkeypatch):
+    monkeypatch.setitem(cache._caches, QUERY_NAMESPACE,
+                        TieredCache(QUERY_NAMESPACE, TTLCache(maxsize=16, ttl=60), lambda: None))
+    first = process_query("Who wrote Hamlet?")
+    second = process_query("who wrote  hamlet?")
+
+    assert second == first
+    assert second.usage["cached"] and second.usage["total_tokens"] == 0 and second.usage["nodes"] == []
+
+
+def test_llm_prices_can_be_overridden(monkeypatch):
+    monkeypatch.setenv("LLM_PRICES", '{"my-model": [1.0, 2.0]}')
+
+    assert llm_cost("my-model", 1_000_000, 500_000) == pytest.approx(2.0)
+    assert llm_cost("unknown-model", 1000, 1000) == 0.0
+
+
+@pytest.mark.asyncio
+async def test_shared_run_is_accounted_to_the_agent_that_started_it(monkeypatch):
+    records = []
+
+    async def mock_get_context_document(agent_id: str):
+        return {"_id": agent_id, "summary": "", "summarized_count": 0, "messages": []}
+
+    def mock_process_query(query: str, history: str = "", retrieval=None, thread_id=None):
+        time.sleep(0.05)
+        return QueryResult(agent_response="Shared answer", domain="web", documents=[],
+                           usage={"prompt_tokens": 100, "completion_tokens": 10, "total_tokens": 110,
+                                  "cost_usd": 0.1, "wall_ms": 50.0, "fetcher": "duckduckgo", "fallback": False,
+                                  "cached": False, "shared": False, "nodes": [{"node": "synthesize"}]})
+
+    async def mock_add_conversations(agent_id: str, query: str, query_result: QueryResult):
+        return f"conversation-of-{agent_id}"
+
+    async def mock_insert_usage_record(agent_id, usage, kind, conversation_id=None, domain=None):
+        records.append((agent_id, usage, kind, conversation_id))
+
+    monkeypatch.setattr(research_service, "get_context_document", mock_get_context_document)
+    monkeypatch.setattr(research_service, "process_query", mock_process_query)
+    monkeypatch.setattr(research_service, "add_conversations", mock_add_conversations)
+    monkeypatch.setattr(research_service, "insert_usage_record", mock_insert_usage_record)
+    monkeypatch.setattr(research_service, "_query_flights", SingleFlight())
+
+    await asyncio.gather(research_service.send_queries("agent-1", "What is ML?"),
+                         research_service.send_queries("agent-2", "What is ML?"))
+
+    by_agent = {agent_id: (usage, kind, conversation_id) for agent_id, usage, kind, conversation_id in records}
+    assert by_agent["agent-1"][0]["total_tokens"] == 110 and not by_agent["agent-1"][0]["shared"]
+    assert by_agent["agent-2"][0]["total_tokens"] == 0 and by_agent["agent-2"][0]["shared"]
+    assert by_agent["agent-2"][1:] == ("query", "conversation-of-agent-2")
+
+
+def _record(agent_id: str, created_at: datetime, kind: str = "query", tokens: int = 100, cached: bool = False,
+            fallback: bool = False) -> dict:
+    return {"agent_id": agent_id, "kind": kind, "created_at": created_at, "usage": {
+        "prompt_tokens": tokens, "completion_tokens": tokens // 10, "total_tokens": tokens + tokens // 10,
+        "cost_usd": tokens / 1000, "wall_ms": 20.0, "fetcher": None if cached or kind != "query" else "pubmed",
+        "fallback": fallback, "cached": cached, "shared": False,
+        "nodes": [] if cached else [{"node": "synthesize", "model": "gpt-4o-mini", "prompt_tokens": tokens,
+                                     "completion_tokens": tokens // 10, "cost_usd": tokens / 1000,
+                                     "wall_ms": 20.0, "fallback": fallback}],
+    }}
+
+
+def _report(collection, *args, **kwargs) -> dict:
+    return usage_report_from_facets(list(collection.aggregate(usage_report_pipeline(*args, **kwargs)))[0])
+
+
+def test_usage_report_aggregates_an_agent_over_a_window():
+    collection = mongomock.MongoClient().db.usage_records
+    day = datetime(2026, 3, 1, 10)
+    collection.insert_many([
+        _record("agent-1", day),
+        _record("agent-1", day + timedelta(hours=1), fallback=True),
+        _record("agent-1", day + timedelta(days=1), tokens=0, cached=True),
+        _record("agent-1", day + timedelta(days=1), kind="summary", tokens=50),
+        _record("agent-1", day + timedelta(days=40)),
+        _record("agent-2", day),
+    ])
+
+    report = _report(collection, day, day + timedelta(days=7), agent_id="agent-1")
+
+    assert report["totals"] == {"queries": 3, "summaries": 1, "cached": 1, "shared": 0, "fallbacks": 1,
+                                "prompt_tokens": 250, "completion_tokens": 25, "total_tokens": 275,
+                                "cost_usd": 0.25, "wall_ms_avg": 20.0}
+    assert report["nodes"] == [{"node": "synthesize", "model": "gpt-4o-mini", "calls": 3, "fallbacks": 1,
+                                "prompt_tokens": 250, "completion_tokens": 25, "cost_usd": 0.25, "wall_ms_avg": 20.0}]
+    assert report["fetchers"] == [{"fetcher": "pubmed", "queries": 2, "fallbacks": 1}]
+    assert [(bucket["start"], bucket["queries"]) for bucket in report["buckets"]] == \
+        [("2026-03-01", 2), ("2026-03-02", 1)]
+    assert "agents" not in report
+
+
+def test_global_usage_report_ranks_agents_and_handles_empty_windows():
+    collection = mongomock.MongoClient().db.usage_records
+    day = datetime(2026, 3, 1, 10)
+    collection.insert_many([_record("agent-1", day), _record("agent-2", day, tokens=300),
+                            _record("agent-2", day + timedelta(hours=1))])
+
+    report = _report(collection, day, day + timedelta(days=1), bucket="hour", top_agents=1)
+    empty = _report(collection, day - timedelta(days=2), day - timedelta(days=1))
+
+    assert report["agents"] == [{"agent_id": "agent-2", "queries": 2, "prompt_tokens": 400, "completion_tokens": 40,
+                                 "cost_usd": 0.4, "total_tokens": 440}]
+    assert [bucket["start"] for bucket in report["buckets"]] == ["2026-03-01T10:00:00Z", "2026-03-01T11:00:00Z"]
+    assert empty["totals"]["queries"] == 0 and empty["nodes"] == [] and empty["agents"] == []
+
+
+def test_usage_window_defaults_and_validation(monkeypatch):
+    monkeypatch.setenv("USAGE_REPORT_DAYS", "7")
+    until = datetime(2026, 3, 8)
+
+    assert research_service.usage_window(None, until) == (datetime(2026, 3, 1, tzinfo=timezone.utc),
+                                                          datetime(2026, 3, 8, tzinfo=timezone.utc))
+    with pytest.raises(ValueError):
+        research_service.usage_window(until, until - timedelta(days=1))
+    with pytest.raises(ValueError):
+        usage_report_pipeline(until - timedelta(days=1), until, bucket="week")
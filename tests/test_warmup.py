@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.status import health_router
+from app.core import warmup
+from app.core.warmup import DONE, FAILED, SKIPPED, WarmupState, run_warmup, warmup_steps
+
+
+def _run(names, state=None):
+    return asyncio.run(run_warmup(names, state or WarmupState()))
+
+
+def test_run_warmup_records_each_step_and_becomes_ready(monkeypatch):
+    def fails():
+        raise RuntimeError("no route to host")
+
+    def skips():
+        raise warmup._Skip("nothing to do")
+
+    async def primes():
+        return "primed 2 of 2 popular queries"
+
+    monkeypatch.setattr(warmup, "STEPS", {"graph": lambda: "compiled", "llm": skips, "fetchers": fails,
+                                          "cache": primes})
+
+    state = _run(["graph", "llm", "fetchers", "cache"])
+
+    assert state.ready
+    assert [(step.name, step.status) for step in state.steps] == [
+        ("graph", DONE), ("llm", SKIPPED), ("fetchers", FAILED), ("cache", DONE)]
+    assert state.steps[2].detail == "RuntimeError: no route to host"
+    assert state.steps[3].detail == "primed 2 of 2 popular queries"
+
+
+def test_run_warmup_times_out_but_becomes_ready(monkeypatch):
+    async def hangs():
+        await asyncio.sleep(10)
+
+    monkeypatch.setattr(warmup, "STEPS", {"cache": hangs})
+    monkeypatch.setenv("WARMUP_TIMEOUT", "0.05")
+
+    state = _run(["cache"])
+
+    assert state.ready
+    assert state.steps[0].status == FAILED
+    assert state.steps[0].detail == "warm-up timed out"
+
+
+def test_warmup_steps_rejects_unknown_steps(monkeypatch):
+    monkeypatch.setenv("WARMUP_STEPS", "graph, llm")
+    assert warmup_steps() == ["graph", "llm"]
+
+    monkeypatch.setenv("WARMUP_STEPS", "graph,dns")
+    with pytest.raises(ValueError):
+        warmup_steps()
+
+
+def test_ready_reports_503_until_warmup_is_done(monkeypatch):
+    state = WarmupState()
+    monkeypatch.setattr(warmup, "_state", state)
+    app = FastAPI()
+    app.include_router(health_router)
+    client = TestClient(app)
+
+    assert client.get("/live").status_code == 200
+    assert client.get("/ready").status_code == 503
+
+    state.ready = True
+
+    response = client.get("/ready")
+    assert response.status_code == 200
+    assert response.json()["status"] == "ready"
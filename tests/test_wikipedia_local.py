@@ -0,0 +1,87 @@
+import gzip
+import json
+
+import pytest
+
+from app.fetchers.wikipedia_local import LocalWikipediaFetcher, WikipediaStore, build_store, read_abstracts_dump
+from app.workflows.research_graph import _retrieve_fetcher
+from app.workflows.research_type import ResearchType
+
+ARTICLES = [
+    {"title": "Photosynthesis", "url": "https://en.wikipedia.org/wiki/Photosynthesis",
+     "abstract": "Photosynthesis is a process used by plants to convert light energy into chemical energy."},
+    {"title": "Chlorophyll", "url": "https://en.wikipedia.org/wiki/Chlorophyll",
+     "abstract": "Chlorophyll is a green pigment that absorbs light for photosynthesis in plants."},
+    {"title": "Ångström", "url": "https://en.wikipedia.org/wiki/%C3%85ngstr%C3%B6m",
+     "abstract": "The ångström is a unit of length equal to 10⁻¹⁰ metres."},
+    {"title": "Empty", "url": "https://en.wikipedia.org/wiki/Empty", "abstract": ""},
+]
+
+ABSTRACT_DUMP = """<feed>
+<doc>
+<title>Wikipedia: Photosynthesis</title>
+<url>https://en.wikipedia.org/wiki/Photosynthesis</url>
+<abstract>Photosynthesis is a process used by plants to convert light energy into chemical energy.</abstract>
+<links><sublink linktype="nav"><anchor>Overview</anchor></sublink></links>
+</doc>
+<doc>
+<title>Wikipedia: Chlorophyll</title>
+<url>https://en.wikipedia.org/wiki/Chlorophyll</url>
+<abstract>Chlorophyll is a green pigment.</abstract>
+</doc>
+</feed>
+"""
+
+
+@pytest.fixture()
+def store(tmp_path):
+    assert build_store(ARTICLES, str(tmp_path / "store"), batch_size=2) == 3
+    return WikipediaStore(str(tmp_path / "store"))
+
+
+def test_store_reads_articles_from_mapped_file(store):
+    assert len(store) == 3
+    article = store.article(2)
+    assert article.title == "Ångström"
+    assert article.abstract == "The ångström is a unit of length equal to 10⁻¹⁰ metres."
+    with pytest.raises(KeyError):
+        store.article(3)
+
+
+def test_search_ranks_title_matches_first(store):
+    articles = store.search("How does photosynthesis work?")
+
+    assert [article.title for article in articles] == ["Photosynthesis", "Chlorophyll"]
+    assert articles[0].score >= articles[1].score > 0
+    assert store.search("what is the") == []
+
+
+def test_read_abstracts_dump_streams_xml_and_json_lines(tmp_path):
+    xml_path = tmp_path / "enwiki-latest-abstract.xml.gz"
+    with gzip.open(xml_path, "wt", encoding="utf-8") as f:
+        f.write(ABSTRACT_DUMP)
+    jsonl_path = tmp_path / "abstracts.jsonl"
+    jsonl_path.write_text("\n".join(json.dumps(article) for article in ARTICLES[:2]) + "\n", encoding="utf-8")
+
+    from_xml = list(read_abstracts_dump(str(xml_path)))
+    from_jsonl = list(read_abstracts_dump(str(jsonl_path)))
+
+    assert [record["title"] for record in from_xml] == ["Photosynthesis", "Chlorophyll"]
+    assert from_xml[0]["url"] == "https://en.wikipedia.org/wiki/Photosynthesis"
+    assert from_jsonl == ARTICLES[:2]
+
+
+def test_local_fetcher_returns_abstracts_and_urls(store):
+    fetcher = LocalWikipediaFetcher(store)
+    fetcher.max_chars = 20
+
+    result = fetcher.search("chlorophyll pigment")
+
+    assert result.documents[0] == "https://en.wikipedia.org/wiki/Chlorophyll"
+    assert result.raw_sources[0] == "Chlorophyll is a gre..."
+
+
+def test_retrieve_fetcher_uses_local_store_when_configured(store, monkeypatch):
+    monkeypatch.setenv("WIKIPEDIA_STORE_PATH", store.path)
+
+    assert isinstance(_retrieve_fetcher(ResearchType.KNOWLEDGE), LocalWikipediaFetcher)